@@ -1,6 +1,7 @@
 import time
 
 from mediawords.db.handler import DatabaseHandler
+from mediawords.db.pool import connection_pool
 from mediawords.util.config.common import CommonConfig
 from mediawords.util.log import create_logger
 from mediawords.util.perl import decode_object_from_bytes_if_needed
@@ -10,7 +11,21 @@ log = create_logger(__name__)
 
 
 def connect_to_db() -> DatabaseHandler:
-    """Connect to PostgreSQL."""
+    """Connect to PostgreSQL.
+
+    If connection pooling is enabled, an idle handler might get reused, and the handler's disconnect() will return it
+    to the pool instead of closing the connection.
+    """
+
+    pool_size = CommonConfig.database().pool_size()
+    if pool_size:
+        return connection_pool(max_idle_handlers=pool_size).acquire(connect=_connect_to_db)
+
+    return _connect_to_db()
+
+
+def _connect_to_db() -> DatabaseHandler:
+    """Open a new connection to PostgreSQL, retrying on errors."""
 
     db_config = CommonConfig.database()
     retries_config = db_config.retries()
@@ -1,4 +1,5 @@
 import tempfile
+from typing import Any
 
 import psycopg2
 from psycopg2.extras import DictCursor
@@ -14,6 +15,20 @@ class McCopyFromException(McDatabaseHandlerException):
     pass
 
 
+def copy_escape(value: Any) -> str:
+    """Escape value for COPY FROM's text format."""
+    if value is None:
+        return r'\N'
+
+    value = str(value)
+    value = value.replace('\\', '\\\\')
+    value = value.replace('\t', '\\t')
+    value = value.replace('\n', '\\n')
+    value = value.replace('\r', '\\r')
+
+    return value
+
+
 # FIXME writes everything to a temporary file first, does the actual copying in end()
 class CopyFrom(object):
     """COPY FROM helper."""
@@ -1,7 +1,8 @@
 import os
 import re
 import socket
-from typing import Union, List, Dict, Any
+from collections import OrderedDict
+from typing import Union, List, Dict, Any, Optional, Tuple
 
 import psycopg2
 import psycopg2.extras
@@ -30,6 +31,35 @@ log = create_logger(__name__)
 psycopg2.extensions.register_type(psycopg2.extensions.UNICODE, None)
 psycopg2.extensions.register_type(psycopg2.extensions.UNICODEARRAY, None)
 
+# Matches psycopg2 parameter placeholders ('%s' and '%(...)s'), or string literals and quoted identifiers (which might
+# contain something that looks like a placeholder but isn't one)
+_PLACEHOLDER_REGEX = re.compile(
+    r"(?P<quoted>[Ee]'(?:[^'\\]|\\.|'')*'|'(?:[^']|'')*'|\"(?:[^\"]|\"\")*\")|%\((?P<name>[^)]+)\)s|%s",
+    flags=re.DOTALL,
+)
+
+
+def _positional_placeholder_query(query: str) -> Tuple[str, List[Optional[str]]]:
+    """Convert psycopg2 parameter placeholders to PREPARE's positional ones ($1, $2, ...).
+
+    Return the converted query and a list of parameter names in the order of their positions (None for '%s'
+    placeholders).
+    """
+    parameter_names = []
+
+    def replace_placeholder(match) -> str:
+        if match.group('quoted') is not None:
+            return match.group(0)
+        name = match.group('name')
+        if name is not None and name in parameter_names:
+            return '$%d' % (parameter_names.index(name) + 1)
+        parameter_names.append(name)
+        return '$%d' % len(parameter_names)
+
+    query = _PLACEHOLDER_REGEX.sub(replace_placeholder, query)
+
+    return query, parameter_names
+
 
 class DatabaseHandler(object):
     """PostgreSQL middleware (imitates DBIx::Simple's interface)."""
@@ -40,6 +70,9 @@ class DatabaseHandler(object):
     # "Double percentage sign" marker (see handler's quote() for explanation)
     __DOUBLE_PERCENTAGE_SIGN_MARKER = "<DOUBLE PERCENTAGE SIGN: " + random_string(length=16) + ">"
 
+    # Max. number of server-side prepared statements to keep per connection
+    __MAX_PREPARED_STATEMENTS = 128
+
     # Whether or not "deadlock_timeout" was checked
     # * lowercase because it's not a constant
     # * class variable because we don't need to do it on every connect_to_db())
@@ -60,6 +93,16 @@ class DatabaseHandler(object):
         '__conn',
         '__db',
 
+        # Connection pool to return the handler to on disconnect() (if any)
+        '__connection_pool',
+
+        # Query -> (prepared statement name, parameter names) of statements prepared by query_prepared(), least
+        # recently used first
+        '__prepared_statements',
+
+        # query_prepared() hit / miss counters
+        '__prepared_statement_stats',
+
     ]
 
     def __init__(self,
@@ -82,6 +125,9 @@ class DatabaseHandler(object):
         self.__in_manual_transaction = False
         self.__conn = None
         self.__db = None
+        self.__connection_pool = None
+        self.__prepared_statements = OrderedDict()
+        self.__prepared_statement_stats = {'hits': 0, 'misses': 0}
 
         self.__connect(
             host=host,
@@ -157,12 +203,66 @@ class DatabaseHandler(object):
             DatabaseHandler.__deadlock_timeout_checked = True
 
     def disconnect(self) -> None:
-        """Disconnect from the database."""
-        self.__db.close()
-        self.__db = None
+        """Disconnect from the database (or return the handler to the connection pool that it came from)."""
+        if self.__connection_pool is not None:
+            self.__connection_pool.release(self)
+        else:
+            self.close()
 
-        self.__conn.close()
-        self.__db = None
+    def close(self) -> None:
+        """Close the database connection, even if the handler came from a connection pool."""
+        if self.__db is not None:
+            self.__db.close()
+            self.__db = None
+
+        if self.__conn is not None:
+            self.__conn.close()
+            self.__conn = None
+
+    def set_connection_pool(self, connection_pool) -> None:
+        """Set connection pool (mediawords.db.pool.DatabaseConnectionPool) to return the handler to on disconnect()."""
+        self.__connection_pool = connection_pool
+
+    def is_connected(self) -> bool:
+        """Return True if the connection hasn't been closed (by either side)."""
+        return self.__conn is not None and not self.__conn.closed
+
+    def ping(self) -> bool:
+        """Return True if the database still responds to queries."""
+        if not self.is_connected():
+            return False
+
+        try:
+            (result,) = self.query('SELECT 1').flat()
+        except Exception as ex:
+            log.warning(f"Database ping failed: {ex}")
+            return False
+
+        return result == 1
+
+    def reset_session(self) -> None:
+        """Reset the session to the state of a fresh connection so that the handler could be reused.
+
+        Rolls back an open (or failed) transaction, closes cursors left open by query_stream(), drops temporary tables,
+        releases session-level advisory locks and resets session parameters.
+        """
+        if not self.is_connected():
+            raise McDatabaseHandlerException("Database handler is not connected.")
+
+        # Transactions are started with manual BEGIN in autocommit mode, so psycopg2's own rollback() wouldn't do
+        if self.__conn.get_transaction_status() != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+            self.query('ROLLBACK')
+        self.__in_manual_transaction = False
+
+        self.__print_warnings = True
+
+        self.query('CLOSE ALL')
+        self.query('DISCARD TEMP')
+        self.query('SELECT pg_advisory_unlock_all()')
+        self.query('RESET ALL')
+
+        # RESET ALL might have reset client encoding too
+        self.query("SET client_encoding = 'UTF8'")
 
     # noinspection PyMethodMayBeStatic
     def dbh(self) -> None:
@@ -200,6 +300,122 @@ class DatabaseHandler(object):
                               double_percentage_sign_marker=DatabaseHandler.__DOUBLE_PERCENTAGE_SIGN_MARKER,
                               print_warnings=self.__print_warnings)
 
+    def query_prepared(self, *query_params) -> DatabaseResult:
+        """Run the query as a server-side prepared statement, return instance of DatabaseResult for accessing the result.
+
+        Accepts the same query and parameters as query(). The statement gets PREPAREd on the first call and then gets
+        EXECUTEd with new parameters on subsequent calls with the same query, so PostgreSQL doesn't have to parse and
+        plan it every time. Use it for small, frequently run queries.
+
+        Parameter types are inferred by PostgreSQL when preparing the statement, so the query has to make the types
+        clear from the context (e.g. "WHERE downloads_id = %(downloads_id)s" works, "%(value)s IS NULL" doesn't), and
+        psycopg2's tuple parameters (e.g. "WHERE id IN %(ids)s") are not supported -- use "= ANY(%(ids)s)" instead.
+        """
+
+        # MC_REWRITE_TO_PYTHON: remove after porting queries to named parameter style
+        query_params = convert_dbd_pg_arguments_to_psycopg2_format(*query_params)
+
+        if len(query_params) == 0:
+            raise McQueryException("Query is unset.")
+        if len(query_params) > 2:
+            raise McQueryException("psycopg2's execute() accepts at most 2 parameters.")
+
+        query = query_params[0]
+        params = query_params[1] if len(query_params) == 2 else None
+
+        statement = self.__prepared_statements.get(query, None)
+        if statement is None:
+            self.__prepared_statement_stats['misses'] += 1
+
+            statement_name = 'mc_prepared_%d' % self.__prepared_statement_stats['misses']
+            positional_query, parameter_names = _positional_placeholder_query(query)
+
+            self.query('PREPARE %s AS %s' % (statement_name, positional_query))
+
+            statement = (statement_name, parameter_names,)
+            self.__prepared_statements[query] = statement
+
+            if len(self.__prepared_statements) > DatabaseHandler.__MAX_PREPARED_STATEMENTS:
+                _, (evicted_statement_name, _) = self.__prepared_statements.popitem(last=False)
+                self.query('DEALLOCATE %s' % evicted_statement_name)
+
+        else:
+            self.__prepared_statement_stats['hits'] += 1
+            self.__prepared_statements.move_to_end(query)
+
+        statement_name, parameter_names = statement
+
+        if not parameter_names:
+            return self.query('EXECUTE %s' % statement_name)
+
+        if isinstance(params, dict):
+            if None in parameter_names:
+                raise McQueryException("Dictionary parameters passed to a query with '%s' placeholders.")
+            execute_params = ', '.join(['%%(%s)s' % name for name in parameter_names])
+        else:
+            if None not in parameter_names:
+                raise McQueryException("Tuple parameters passed to a query with '%(...)s' placeholders.")
+            execute_params = ', '.join(['%s'] * len(parameter_names))
+
+        return self.query('EXECUTE %s (%s)' % (statement_name, execute_params), params)
+
+    def prepared_statement_stats(self) -> Dict[str, int]:
+        """Return query_prepared() hit / miss counters and the number of currently prepared statements."""
+        stats = self.__prepared_statement_stats.copy()
+        stats['prepared'] = len(self.__prepared_statements)
+        return stats
+
+    def query_stream(self, *query_params, batch_size: int = 1000) -> DatabaseResult:
+        """Run the query using a server-side cursor, return instance of DatabaseResult for iterating over the result.
+
+        Accepts the same query and parameters as query(). Iterate over the result with iter_hashes(), iter_flat() or
+        iter_hash_batches() to fetch rows from the server "batch_size" rows at a time instead of loading them all into
+        memory at once:
+
+            with db.query_stream('SELECT * FROM story_sentences WHERE stories_id = %(a)s', {'a': 1}) as result:
+                for row in result.iter_hashes():
+                    ...
+
+        Server-side cursors only live within a transaction, so if the handler is not in a transaction already, one gets
+        started here and committed once the result gets closed; otherwise the cursor lives in the caller's transaction.
+        Either way, don't COMMIT or ROLLBACK on the same handler while iterating over the result (queries and nested
+        writes are fine and become part of the transaction). The result gets closed once fully iterated over; close it
+        explicitly (or use a "with" block) if you stop iterating early.
+        """
+
+        # MC_REWRITE_TO_PYTHON: remove after porting queries to named parameter style
+        query_params = convert_dbd_pg_arguments_to_psycopg2_format(*query_params)
+
+        if len(query_params) == 0:
+            raise McQueryException("Query is unset.")
+        if len(query_params) > 2:
+            raise McQueryException("psycopg2's execute() accepts at most 2 parameters.")
+        if batch_size < 1:
+            raise McQueryException("Batch size must be positive.")
+
+        # Unlike WITH HOLD cursors, plain ones don't get materialized into a temporary store on COMMIT
+        owns_transaction = not self.in_transaction()
+        if owns_transaction:
+            self.begin()
+
+        # Result gets its own client-side cursor to FETCH the server-side cursor's rows with
+        cursor = self.__conn.cursor(cursor_factory=psycopg2.extras.DictCursor)
+
+        try:
+            return DatabaseResult(cursor=cursor,
+                                  query_args=query_params,
+                                  double_percentage_sign_marker=DatabaseHandler.__DOUBLE_PERCENTAGE_SIGN_MARKER,
+                                  print_warnings=self.__print_warnings,
+                                  owns_cursor=True,
+                                  stream_cursor_name='stream_%s' % random_string(length=16).lower(),
+                                  stream_batch_size=batch_size,
+                                  on_close=self.commit if owns_transaction else None)
+        except Exception as ex:
+            cursor.close()
+            if owns_transaction:
+                self.rollback()
+            raise ex
+
     def primary_key_column(self, object_name: str) -> str:
         """Get INT / BIGINT primary key column name for a table or a view.
 
@@ -20,6 +20,7 @@ LOCK_TYPES = {
     'MediaWords::Job::TM::SnapshotTopic': 13,
     'MediaWords::TM::Media::media_normalized_urls': 14,
     'MediaWords::Crawler::Engine::run_fetcher': 15,
+    'MediaWords::StoryVectors::insert_story_sentences': 16,
 
     # Testing lock types
     'TestPerlWorkerLock': 900,
@@ -70,6 +71,35 @@ def get_session_lock(db: mediawords.db.DatabaseHandler, lock_type: str, lock_id:
         return r['locked']
 
 
+def get_transaction_lock(db: mediawords.db.DatabaseHandler, lock_type: str, lock_id: int) -> None:
+    """Block until a postgres advisory lock with the lock_type and lock_id as the two keys is acquired.
+
+    The lock gets released at the end of the current transaction.
+
+    Arguments:
+    db - db handle (has to be in a transaction)
+    lock_type - must be in LOCK_TYPES dict above
+    lock_id - id for the particular lock within the type
+    """
+    lock_type = str(decode_object_from_bytes_if_needed(lock_type))
+
+    if isinstance(lock_id, bytes):
+        lock_id = decode_object_from_bytes_if_needed(lock_id)
+    lock_id = int(lock_id)
+
+    log.debug("trying for transaction lock: %s, %d" % (lock_type, lock_id))
+
+    if lock_type not in LOCK_TYPES:
+        raise McDBLocksException("lock type not in LOCK_TYPES: %s" % lock_type)
+
+    if not db.in_transaction():
+        raise McDBLocksException("transaction lock requested outside of a transaction")
+
+    lock_type_id = LOCK_TYPES[lock_type]
+
+    db.query("select pg_advisory_xact_lock(%(a)s, %(b)s)", {'a': lock_type_id, 'b': lock_id})
+
+
 def release_session_lock(db: mediawords.db.DatabaseHandler, lock_type: str, lock_id: int) -> None:
     """Release the postgres advisory lock if it is held."""
     lock_type = str(decode_object_from_bytes_if_needed(lock_type))
@@ -0,0 +1,191 @@
+"""
+Process-wide pool of database connections.
+
+connect_to_db() takes a handler from the pool (or connects a new one if the pool is empty), and the handler's
+disconnect() puts it back into the pool instead of closing the connection. Before a handler gets returned to the pool,
+its session gets reset (open transaction rolled back, temporary tables dropped, session parameters reset), and
+handlers which have been sitting idle for a while get pinged before they're handed out again.
+"""
+
+import os
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+from mediawords.db.handler import DatabaseHandler
+from mediawords.util.log import create_logger
+
+log = create_logger(__name__)
+
+# Ping handlers that have been idle for longer than this many seconds before handing them out
+HEALTH_CHECK_AFTER_IDLE_SECONDS = 30
+
+# Close handlers that have been idle for longer than this many seconds instead of handing them out
+MAX_IDLE_SECONDS = 60 * 10
+
+
+class McDatabaseConnectionPoolException(Exception):
+    """Database connection pool exception."""
+    pass
+
+
+class DatabaseConnectionPool(object):
+    """Thread-safe pool of idle database handlers."""
+
+    __slots__ = [
+        '__max_idle_handlers',
+        '__lock',
+
+        # List of (handler, time when it got returned to the pool) tuples; most recently returned handler is last
+        '__idle_handlers',
+
+        # IDs of handlers that are currently handed out
+        '__in_use_ids',
+
+        # Pool metrics
+        '__stats',
+    ]
+
+    def __init__(self, max_idle_handlers: int):
+        """
+        Constructor.
+
+        :param max_idle_handlers: Max. number of idle handlers to keep around; handlers returned to a full pool get
+            closed.
+        """
+        if max_idle_handlers < 1:
+            raise McDatabaseConnectionPoolException(f"Max. idle handlers must be positive, got {max_idle_handlers}")
+
+        self.__max_idle_handlers = max_idle_handlers
+        self.__lock = threading.Lock()
+        self.__idle_handlers: List[Tuple[DatabaseHandler, float]] = []
+        self.__in_use_ids = set()
+        self.__stats = {
+            'connects': 0,
+            'reuses': 0,
+            'releases': 0,
+            'closes': 0,
+            'failed_health_checks': 0,
+            'failed_resets': 0,
+        }
+
+    def __increment(self, stat: str) -> None:
+        with self.__lock:
+            self.__stats[stat] += 1
+
+    def __close(self, db: DatabaseHandler) -> None:
+        self.__increment('closes')
+        try:
+            db.close()
+        except Exception as ex:
+            log.warning(f"Unable to close database handler: {ex}")
+
+    def __pop_idle_handler(self) -> Optional[Tuple[DatabaseHandler, float]]:
+        with self.__lock:
+            if not self.__idle_handlers:
+                return None
+            return self.__idle_handlers.pop()
+
+    def acquire(self, connect: Callable[[], DatabaseHandler]) -> DatabaseHandler:
+        """Return an idle handler from the pool or, if there are no usable ones, create a new one with connect()."""
+
+        while True:
+            idle_handler = self.__pop_idle_handler()
+            if idle_handler is None:
+                break
+
+            db, released_at = idle_handler
+            idle_seconds = time.time() - released_at
+
+            if idle_seconds > MAX_IDLE_SECONDS:
+                log.debug(f"Closing database handler that has been idle for {idle_seconds:.0f} seconds")
+                self.__close(db)
+                continue
+
+            healthy = db.is_connected()
+            if healthy and idle_seconds > HEALTH_CHECK_AFTER_IDLE_SECONDS:
+                healthy = db.ping()
+
+            if not healthy:
+                log.info("Discarding broken database handler from the pool")
+                self.__increment('failed_health_checks')
+                self.__close(db)
+                continue
+
+            self.__increment('reuses')
+            with self.__lock:
+                self.__in_use_ids.add(id(db))
+
+            return db
+
+        db = connect()
+        db.set_connection_pool(self)
+
+        self.__increment('connects')
+        with self.__lock:
+            self.__in_use_ids.add(id(db))
+
+        return db
+
+    def release(self, db: DatabaseHandler) -> None:
+        """Reset the handler's session and return it to the pool (or close it if the pool is full)."""
+
+        with self.__lock:
+            if id(db) not in self.__in_use_ids:
+                log.warning("Database handler is not handed out by this pool (disconnected twice?), not returning it")
+                return
+            self.__in_use_ids.discard(id(db))
+            self.__stats['releases'] += 1
+
+        try:
+            db.reset_session()
+        except Exception as ex:
+            log.warning(f"Unable to reset database handler's session, closing it: {ex}")
+            self.__increment('failed_resets')
+            self.__close(db)
+            return
+
+        with self.__lock:
+            if len(self.__idle_handlers) < self.__max_idle_handlers:
+                self.__idle_handlers.append((db, time.time(),))
+                return
+
+        self.__close(db)
+
+    def close_all(self) -> None:
+        """Close all idle handlers."""
+        with self.__lock:
+            idle_handlers = self.__idle_handlers
+            self.__idle_handlers = []
+
+        for db, _ in idle_handlers:
+            self.__close(db)
+
+    def stats(self) -> Dict[str, int]:
+        """Return pool metrics."""
+        with self.__lock:
+            stats = self.__stats.copy()
+            stats['idle'] = len(self.__idle_handlers)
+            stats['in_use'] = len(self.__in_use_ids)
+        return stats
+
+
+# Process-wide pool and PID of the process that has created it, created on first use
+_POOL = None
+_POOL_PID = None
+_POOL_LOCK = threading.Lock()
+
+
+def connection_pool(max_idle_handlers: int) -> DatabaseConnectionPool:
+    """Return process-wide connection pool, creating it if needed."""
+    global _POOL, _POOL_PID
+
+    with _POOL_LOCK:
+
+        # Forked children (e.g. Celery's prefork workers) must not share their parent's connections
+        if _POOL is None or _POOL_PID != os.getpid():
+            log.info(f"Creating database connection pool of up to {max_idle_handlers} idle connections")
+            _POOL = DatabaseConnectionPool(max_idle_handlers=max_idle_handlers)
+            _POOL_PID = os.getpid()
+
+    return _POOL
@@ -1,10 +1,11 @@
 import datetime
+import functools
 import itertools
 import pprint
 import re
 import textwrap
 import time
-from typing import Dict, List, Any
+from typing import Dict, List, Any, Callable, Iterator, Optional
 
 import psycopg2
 from psycopg2.extensions import TransactionRollbackError
@@ -17,20 +18,88 @@ from mediawords.util.perl import decode_object_from_bytes_if_needed
 
 log = create_logger(__name__)
 
+# How many rewritten queries to remember
+_QUERY_REWRITE_CACHE_SIZE = 1024
+
+# Queries longer than this (e.g. ones with long lists of quote()d values) are unlikely to be repeated so they don't get
+# cached
+_MAX_CACHED_QUERY_LENGTH = 1024 * 8
+
+# Matches '%' everywhere except for psycopg2 parameter placeholders ('%s' and '%(...)s')
+_LITERAL_PERCENTAGE_SIGN_REGEX = re.compile(r'%(?!(s|\(.*?\)s?))')
+
+
+def _escape_query(query: str, double_percentage_sign_marker: str) -> str:
+    """Escape literal percentage signs in a query for psycopg2's interpolation."""
+
+    # Duplicate '%' everywhere except for psycopg2 parameter placeholders ('%s' and '%(...)s')
+    query = _LITERAL_PERCENTAGE_SIGN_REGEX.sub('%%', query)
+
+    # Replace percentage signs coming from quote()d strings with double percentage signs
+    query = query.replace(double_percentage_sign_marker, '%%')
+
+    return query
+
+
+@functools.lru_cache(maxsize=_QUERY_REWRITE_CACHE_SIZE)
+def _escape_query_memoized(query: str, double_percentage_sign_marker: str) -> str:
+    return _escape_query(query=query, double_percentage_sign_marker=double_percentage_sign_marker)
+
+
+def _rewrite_query(query: str, double_percentage_sign_marker: str) -> str:
+    """Escape literal percentage signs in a query for psycopg2's interpolation, memoizing the result."""
+    if len(query) > _MAX_CACHED_QUERY_LENGTH:
+        return _escape_query(query=query, double_percentage_sign_marker=double_percentage_sign_marker)
+    return _escape_query_memoized(query=query, double_percentage_sign_marker=double_percentage_sign_marker)
+
+
+def query_rewrite_cache_stats() -> Dict[str, int]:
+    """Return query rewrite cache hit / miss counters."""
+    cache_info = _escape_query_memoized.cache_info()
+    return {
+        'hits': cache_info.hits,
+        'misses': cache_info.misses,
+        'size': cache_info.currsize,
+    }
+
 
 class DatabaseResult(object):
     """Wrapper around SQL query result."""
 
     __cursor = None  # psycopg2 cursor
 
+    # Whether the cursor was created for this result only (e.g. a server-side cursor) and should be closed with it
+    __owns_cursor = False
+
+    # Name of the server-side cursor DECLAREd for this result, if any
+    __stream_cursor_name = None
+
+    # How many rows to FETCH from the server-side cursor at once by default
+    __stream_batch_size = None
+
+    # Called after the result's own cursor gets closed (e.g. to end the transaction the cursor was declared in)
+    __on_close = None
+
+    # How many rows to fetch at once when iterating over the result
+    __DEFAULT_BATCH_SIZE = 1000
+
     def __init__(self,
                  cursor: DictCursor,
                  query_args: tuple,
                  double_percentage_sign_marker: str,
-                 print_warnings: bool = True):
+                 print_warnings: bool = True,
+                 owns_cursor: bool = False,
+                 stream_cursor_name: Optional[str] = None,
+                 stream_batch_size: Optional[int] = None,
+                 on_close: Optional[Callable[[], None]] = None):
 
         # MC_REWRITE_TO_PYTHON: 'query_args' should be decoded from 'bytes' at this point
 
+        self.__owns_cursor = owns_cursor
+        self.__stream_cursor_name = stream_cursor_name
+        self.__stream_batch_size = stream_batch_size or self.__DEFAULT_BATCH_SIZE
+        self.__on_close = on_close
+
         self.__execute(cursor=cursor,
                        query_args=query_args,
                        double_percentage_sign_marker=double_percentage_sign_marker,
@@ -60,13 +129,13 @@ class DatabaseResult(object):
                 # to execute().
                 query_args = (query_args[0], {},)
 
-            query = query_args[0]
-
-            # Duplicate '%' everywhere except for psycopg2 parameter placeholders ('%s' and '%(...)s')
-            query = re.sub(r'%(?!(s|\(.*?\)s?))', '%%', query)
+            query = _rewrite_query(query=query_args[0], double_percentage_sign_marker=double_percentage_sign_marker)
 
-            # Replace percentage signs coming from quote()d strings with double percentage signs
-            query = query.replace(double_percentage_sign_marker, '%%')
+            if self.__stream_cursor_name:
+                # psycopg2's own named cursors can't be used without WITH HOLD in autocommit mode, so the server-side
+                # cursor gets declared (after rewriting the query so that unique cursor names don't pollute the cache)
+                # and fetched from manually
+                query = 'DECLARE %s NO SCROLL CURSOR FOR %s' % (self.__stream_cursor_name, query,)
 
             query_args_list = list(query_args)
             query_args_list[0] = query
@@ -147,6 +216,21 @@ class DatabaseResult(object):
             item = str(item)
         return item
 
+    def __fetchmany(self, size: int) -> List[Any]:
+        if self.__stream_cursor_name:
+            self.__cursor.execute('FETCH FORWARD %d FROM %s' % (size, self.__stream_cursor_name,))
+            return self.__cursor.fetchall()
+        return self.__cursor.fetchmany(size)
+
+    def __fetchone(self) -> Optional[Any]:
+        rows = self.__fetchmany(1) if self.__stream_cursor_name else [self.__cursor.fetchone()]
+        return rows[0] if rows else None
+
+    def __fetchall(self) -> List[Any]:
+        if self.__stream_cursor_name:
+            self.__cursor.execute('FETCH ALL FROM %s' % self.__stream_cursor_name)
+        return self.__cursor.fetchall()
+
     def columns(self) -> List[str]:
         """Return a list of column names."""
         column_names = [desc[0] for desc in self.__cursor.description]
@@ -160,7 +244,7 @@ class DatabaseResult(object):
 
     def array(self) -> List[Any]:
         """Return a list of a single row."""
-        row_tuple = self.__cursor.fetchone()
+        row_tuple = self.__fetchone()
         if row_tuple is not None:
             row = list(row_tuple)
 
@@ -172,7 +256,7 @@ class DatabaseResult(object):
 
     def hash(self) -> Dict[str, Any]:
         """Return a dict of a single row, keyed by column name"""
-        row_tuple = self.__cursor.fetchone()
+        row_tuple = self.__fetchone()
         if row_tuple is not None:
             row = dict(row_tuple)
 
@@ -184,7 +268,7 @@ class DatabaseResult(object):
 
     def flat(self) -> List[Any]:
         """Return a flattened list of all returned (remaining) rows."""
-        all_rows = self.__cursor.fetchall()
+        all_rows = self.__fetchall()
         flat_rows = list(itertools.chain.from_iterable(all_rows))
 
         flat_rows = [self.__convert_datetime_objects_to_strings(item) for item in flat_rows]
@@ -194,7 +278,7 @@ class DatabaseResult(object):
     def hashes(self) -> List[Dict[str, Any]]:
         """Return a list of dicts of all returned (remaining) rows, keyed by column name."""
         rows = []
-        for row in self.__cursor.fetchall():
+        for row in self.__fetchall():
             row = dict(row)
 
             row = {k: self.__convert_datetime_objects_to_strings(v) for k, v in row.items()}
@@ -203,6 +287,76 @@ class DatabaseResult(object):
 
         return rows
 
+    def iter_hash_batches(self,
+                          batch_size: Optional[int] = None,
+                          stringify_datetimes: bool = True) -> Iterator[List[Dict[str, Any]]]:
+        """Yield lists of up to 'batch_size' dicts of all returned (remaining) rows, keyed by column name.
+
+        Rows are being fetched from the cursor one batch at a time, so with a server-side cursor (from
+        DatabaseHandler.query_stream()) memory usage doesn't depend on the size of the result.
+        """
+        if not batch_size:
+            batch_size = self.__stream_batch_size
+
+        try:
+            while True:
+                batch = self.__fetchmany(batch_size)
+                if not batch:
+                    break
+
+                if stringify_datetimes:
+                    yield [{k: self.__convert_datetime_objects_to_strings(v) for k, v in row.items()} for row in batch]
+                else:
+                    yield [dict(row) for row in batch]
+
+        finally:
+            if self.__owns_cursor:
+                self.close()
+
+    def iter_hashes(self, stringify_datetimes: bool = True) -> Iterator[Dict[str, Any]]:
+        """Yield dicts of all returned (remaining) rows one by one, keyed by column name."""
+        for batch in self.iter_hash_batches(stringify_datetimes=stringify_datetimes):
+            yield from batch
+
+    def iter_flat(self, stringify_datetimes: bool = True) -> Iterator[Any]:
+        """Yield a flattened sequence of all returned (remaining) rows."""
+        batch_size = self.__stream_batch_size
+
+        try:
+            while True:
+                batch = self.__fetchmany(batch_size)
+                if not batch:
+                    break
+
+                for row in batch:
+                    for item in row:
+                        yield self.__convert_datetime_objects_to_strings(item) if stringify_datetimes else item
+
+        finally:
+            if self.__owns_cursor:
+                self.close()
+
+    def close(self) -> None:
+        """Close the result's own (server-side) cursor; no-op for results that share the handler's cursor."""
+        if self.__owns_cursor and not self.__cursor.closed:
+            if self.__stream_cursor_name:
+                try:
+                    self.__cursor.execute('CLOSE %s' % self.__stream_cursor_name)
+                except psycopg2.Error as ex:
+                    log.warning('Unable to close server-side cursor: %s' % str(ex))
+            self.__cursor.close()
+
+            if self.__on_close is not None:
+                on_close = self.__on_close
+                self.__on_close = None
+                on_close()
+
+    def __enter__(self) -> 'DatabaseResult':
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.close()
+
     def text(self, text_type: str = 'neat') -> str:
         """Return a string of all returned (remaining) rows with a simple text representation of the data."""
 
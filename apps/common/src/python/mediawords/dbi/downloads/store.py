@@ -12,14 +12,16 @@ The three choices are:
 
 The default is 'postgresql', and the production system uses Amazon S3.
 """
+import os
 import re
-from typing import Optional
+from typing import Iterator, List, Optional, Tuple
 
 from mediawords.db import DatabaseHandler
 from mediawords.key_value_store import KeyValueStore
 from mediawords.key_value_store.amazon_s3 import AmazonS3Store
 from mediawords.key_value_store.cached_amazon_s3 import CachedAmazonS3Store
 from mediawords.key_value_store.database_inline import DatabaseInlineStore
+from mediawords.key_value_store.local_cache import LocalDiskCache
 from mediawords.key_value_store.multiple_stores import MultipleStoresStore
 from mediawords.key_value_store.postgresql import PostgreSQLStore
 from mediawords.util.config.common import CommonConfig, AmazonS3DownloadsConfig, DownloadStorageConfig
@@ -48,6 +50,71 @@ def _default_amazon_s3_downloads_config() -> AmazonS3DownloadsConfig:
     return CommonConfig.amazon_s3_downloads()
 
 
+# Compression methods that can be configured for newly stored downloads
+_COMPRESSION_METHODS = {
+    'gzip': KeyValueStore.Compression.GZIP,
+    'bzip2': KeyValueStore.Compression.BZIP2,
+    'zstd': KeyValueStore.Compression.ZSTD,
+    'none': KeyValueStore.Compression.NONE,
+}
+
+# Zstandard dictionaries that have been read already, keyed by path
+_ZSTD_DICTIONARIES = {}
+
+
+def _zstd_dictionary(path: str) -> bytes:
+    """Read Zstandard dictionary from a file (once per process)."""
+    if path not in _ZSTD_DICTIONARIES:
+        try:
+            with open(path, mode='rb') as f:
+                _ZSTD_DICTIONARIES[path] = f.read()
+        except Exception as ex:
+            raise McDBIDownloadsException(f"Unable to read Zstandard dictionary from '{path}': {ex}")
+    return _ZSTD_DICTIONARIES[path]
+
+
+def _compression_params(download_storage_config: DownloadStorageConfig) -> dict:
+    """Return compression parameters for PostgreSQL and Amazon S3 stores."""
+    params = {
+        'compression_method': _COMPRESSION_METHODS[download_storage_config.compression_method()],
+    }
+
+    zstd_dictionary_path = download_storage_config.zstd_dictionary_path()
+    if zstd_dictionary_path:
+        params['zstd_dictionary'] = _zstd_dictionary(zstd_dictionary_path)
+
+    return params
+
+
+# Local disk caches that have been created already, keyed by (PID, directory)
+_LOCAL_CACHES = {}
+
+
+def _local_cache(download_storage_config: DownloadStorageConfig) -> Optional[LocalDiskCache]:
+    """Return process-wide local disk cache of Amazon S3 downloads, or None if it's not configured."""
+    directory = download_storage_config.local_cache_directory()
+    if not directory:
+        return None
+
+    # Forked children get their own instance (with its own locks)
+    key = (os.getpid(), directory,)
+    if key not in _LOCAL_CACHES:
+        _LOCAL_CACHES[key] = LocalDiskCache(
+            directory=directory,
+            max_size=download_storage_config.local_cache_size_mb() * 1024 * 1024,
+        )
+
+    return _LOCAL_CACHES[key]
+
+
+def _hedge_reads_after(download_storage_config: DownloadStorageConfig) -> Optional[float]:
+    """Return hedged read delay in seconds, or None if reads are not to be hedged."""
+    hedge_reads_after_ms = download_storage_config.hedge_reads_after_ms()
+    if hedge_reads_after_ms is None:
+        return None
+    return hedge_reads_after_ms / 1000
+
+
 def _get_inline_store() -> KeyValueStore:
     """Get lazy initialized database inline store."""
     return DatabaseInlineStore()
@@ -66,10 +133,12 @@ def _get_amazon_s3_store(
         'secret_access_key': amazon_s3_downloads_config.secret_access_key(),
         'bucket_name': amazon_s3_downloads_config.bucket_name(),
         'directory_name': amazon_s3_downloads_config.directory_name(),
+        **_compression_params(download_storage_config),
     }
 
     if download_storage_config.cache_s3():
         store_params['cache_table'] = S3_RAW_DOWNLOADS_CACHE_TABLE_NAME
+        store_params['local_cache'] = _local_cache(download_storage_config)
         amazon_s3_store = CachedAmazonS3Store(**store_params)
     else:
         amazon_s3_store = AmazonS3Store(**store_params)
@@ -82,7 +151,10 @@ def _get_postgresql_store(
         download_storage_config: DownloadStorageConfig,
 ) -> KeyValueStore:
     """Get lazy initialized postgresql store, with credentials from mediawords.yml."""
-    postgresql_store = PostgreSQLStore(table=RAW_DOWNLOADS_POSTGRESQL_KVS_TABLE_NAME)
+    postgresql_store = PostgreSQLStore(
+        table=RAW_DOWNLOADS_POSTGRESQL_KVS_TABLE_NAME,
+        **_compression_params(download_storage_config),
+    )
 
     if download_storage_config.fallback_postgresql_to_s3():
         postgresql_store = MultipleStoresStore(
@@ -95,7 +167,9 @@ def _get_postgresql_store(
             ],
             stores_for_writing=[
                 postgresql_store,
-            ])
+            ],
+            hedge_reads_after=_hedge_reads_after(download_storage_config),
+        )
 
     return postgresql_store
 
@@ -118,7 +192,10 @@ def _get_store_for_writing(
         if location == 'databaseinline':
             raise McDBIDownloadsException("databaseinline location is not valid for storage")
         elif location == 'postgresql':
-            store = PostgreSQLStore(table=RAW_DOWNLOADS_POSTGRESQL_KVS_TABLE_NAME)
+            store = PostgreSQLStore(
+                table=RAW_DOWNLOADS_POSTGRESQL_KVS_TABLE_NAME,
+                **_compression_params(download_storage_config),
+            )
         elif location in ('s3', 'amazon', 'amazon_s3'):
             store = _get_amazon_s3_store(
                 amazon_s3_downloads_config=amazon_s3_downloads_config,
@@ -132,7 +209,10 @@ def _get_store_for_writing(
 
         stores.append(store)
 
-    store_for_writing = MultipleStoresStore(stores_for_writing=stores)
+    store_for_writing = MultipleStoresStore(
+        stores_for_writing=stores,
+        parallel_writes=download_storage_config.parallel_writes(),
+    )
 
     return store_for_writing
 
@@ -219,6 +299,57 @@ def fetch_content(
     return content
 
 
+def fetch_contents(
+        db: DatabaseHandler,
+        downloads: List[dict],
+        amazon_s3_downloads_config: AmazonS3DownloadsConfig = None,
+        download_storage_config: DownloadStorageConfig = None,
+) -> Iterator[Tuple[int, str]]:
+    """Fetch the content for many downloads, yield (downloads_id, content) tuples as the content gets fetched.
+
+    Downloads get grouped by the store that they're read from, and each store fetches its downloads in bulk. Content
+    of unsuccessful downloads and of downloads that couldn't be fetched doesn't get returned."""
+
+    downloads = decode_object_from_bytes_if_needed(downloads)
+
+    if not amazon_s3_downloads_config:
+        amazon_s3_downloads_config = _default_amazon_s3_downloads_config()
+    if not download_storage_config:
+        download_storage_config = _default_download_storage_config()
+
+    # Store class name -> (store, list of downloads_id)
+    stores_downloads_ids = {}
+
+    for download in downloads:
+        if not download_successful(download):
+            log.warning("Skipping unsuccessful download %d" % download['downloads_id'])
+            continue
+
+        store = _get_store_for_reading(
+            download=download,
+            amazon_s3_downloads_config=amazon_s3_downloads_config,
+            download_storage_config=download_storage_config,
+        )
+
+        # Inline content is in the download's path already
+        if isinstance(store, DatabaseInlineStore):
+            try:
+                content_bytes = store.fetch_content(db, download['downloads_id'], download['path'])
+            except Exception as ex:
+                log.warning("Unable to fetch inline content for download %d: %s" % (download['downloads_id'], ex))
+            else:
+                yield download['downloads_id'], content_bytes.decode()
+            continue
+
+        store_key = store.__class__.__name__
+        stores_downloads_ids.setdefault(store_key, (store, []))
+        stores_downloads_ids[store_key][1].append(download['downloads_id'])
+
+    for store, downloads_ids in stores_downloads_ids.values():
+        for downloads_id, content_bytes in store.fetch_contents(db, downloads_ids):
+            yield downloads_id, content_bytes.decode()
+
+
 def store_content(
         db: DatabaseHandler,
         download: dict,
@@ -1,4 +1,5 @@
-from typing import Optional
+import itertools
+from typing import Optional, List, Dict, Tuple
 
 from mediawords.db import DatabaseHandler
 from mediawords.util.log import create_logger
@@ -228,3 +229,360 @@ def add_story(db: DatabaseHandler, story: dict, feeds_id: int) -> Optional[dict]
     log.debug("added story: %s" % story['url'])
 
     return story
+
+
+def _insert_stories_urls(db: DatabaseHandler, stories_urls: List[Tuple[int, str]]) -> None:
+    """Bulk version of insert_story_urls(): insert the (stories_id, url) pairs and the normalize_url_lossy() versions of
+    the URLs into story_urls in a single query."""
+    pairs = set()
+    for stories_id, url in stories_urls:
+        for story_url in (url, normalize_url_lossy(url)):
+            if len(story_url) <= MAX_URL_LENGTH:
+                pairs.add((int(stories_id), story_url,))
+
+    if not pairs:
+        return
+
+    pairs = sorted(pairs)
+
+    # same "wasteful" existence check as in insert_story_urls() to avoid deadlocks
+    db.query(
+        """
+        insert into story_urls (stories_id, url)
+            select new_urls.stories_id, new_urls.url
+                from unnest(%(a)s::int[], %(b)s::text[]) as new_urls (stories_id, url)
+                where not exists (
+                    select 1 from story_urls
+                        where stories_id = new_urls.stories_id and url = new_urls.url
+                )
+                on conflict (url, stories_id) do nothing
+        """,
+        {'a': [pair[0] for pair in pairs], 'b': [pair[1] for pair in pairs]})
+
+
+def _title_dup_keys(story: dict) -> List[Tuple[str, str, str]]:
+    """Return keys under which stories that are title dups of each other (as per _find_dup_story()) collide."""
+    return [
+        ('title', story['_title_hash'], story['_publish_day']),
+        ('normalized_title', story['_normalized_title_hash'], story['_publish_day']),
+    ]
+
+
+def _find_dup_stories(db: DatabaseHandler, stories: List[dict]) -> Tuple[List[Optional[dict]], List[Optional[int]]]:
+    """Bulk version of _find_dup_story() for a list of stories from the same media source.
+
+    Runs one query per duplicate search strategy for the whole list of stories instead of up to three queries per story.
+
+    Returns a tuple of two lists in the order of 'stories':
+
+    * existing dup stories (or None if a story doesn't have a dup in the database);
+    * indexes of earlier stories in the list which the story is a dup of (or None), i.e. stories that add_story() would
+      find as dups of each other if they were added one by one.
+
+    If a dup story is found by title, insert the url and guid into the story_urls table.
+    """
+    stories = decode_object_from_bytes_if_needed(stories)
+
+    dup_stories = [None] * len(stories)
+    batch_dup_indexes = [None] * len(stories)
+
+    if not stories:
+        return dup_stories, batch_dup_indexes
+
+    media_id = stories[0]['media_id']
+
+    story_urls = [
+        _get_story_url_variants(story) if story['title'] != '(no title)' else []
+        for story in stories
+    ]
+
+    def _pending_indexes() -> List[int]:
+        return [i for i, story in enumerate(stories) if story_urls[i] and not dup_stories[i]]
+
+    def _set_dups_by_url(db_stories_by_url: Dict[str, dict]) -> None:
+        for i in _pending_indexes():
+            for url in story_urls[i]:
+                if url in db_stories_by_url:
+                    dup_stories[i] = db_stories_by_url[url]
+                    break
+
+    pending_urls = sorted(set(itertools.chain.from_iterable(story_urls)))
+    if not pending_urls:
+        return dup_stories, batch_dup_indexes
+
+    db_stories = db.query("""
+        SELECT s.*
+        FROM stories s
+        WHERE
+            (s.guid = any( %(urls)s ) or s.url = any( %(urls)s)) and
+            media_id = %(media_id)s
+        ORDER BY s.stories_id
+    """, {
+        'urls': pending_urls,
+        'media_id': media_id,
+    }).hashes()
+
+    db_stories_by_url = {}
+    for db_story in db_stories:
+        db_stories_by_url.setdefault(db_story['guid'], db_story)
+        db_stories_by_url.setdefault(db_story['url'], db_story)
+    _set_dups_by_url(db_stories_by_url)
+
+    pending_urls = sorted(set(itertools.chain.from_iterable(story_urls[i] for i in _pending_indexes())))
+    if pending_urls:
+        db_stories = db.query("""
+
+            -- Make sure that postgres uses the story_urls_url index
+            WITH matching_stories AS (
+                SELECT stories_id, url
+                FROM story_urls
+                WHERE url = ANY(%(story_urls)s)
+            )
+
+            SELECT matching_stories.url AS _story_url, stories.*
+            FROM stories
+                JOIN matching_stories USING (stories_id)
+            WHERE media_id = %(media_id)s
+            ORDER BY stories_id
+
+            """, {
+            'story_urls': pending_urls,
+            'media_id': media_id,
+        }).hashes()
+
+        db_stories_by_url = {}
+        for db_story in db_stories:
+            db_stories_by_url.setdefault(db_story.pop('_story_url'), db_story)
+        _set_dups_by_url(db_stories_by_url)
+
+    pending_indexes = _pending_indexes()
+    if not pending_indexes:
+        return dup_stories, batch_dup_indexes
+
+    db_stories = db.query("""
+        WITH new_stories AS (
+            SELECT
+                new_stories.ordinality,
+                md5(new_stories.title) AS title_hash,
+                md5( get_normalized_title( new_stories.title, %(media_id)s ) )::uuid AS normalized_title_hash,
+                new_stories.publish_date
+            FROM unnest(%(titles)s::text[], %(publish_dates)s::text[])
+                WITH ORDINALITY AS new_stories (title, publish_date, ordinality)
+        )
+
+        SELECT
+            new_stories.ordinality AS _ordinality,
+            new_stories.title_hash AS _title_hash,
+            new_stories.normalized_title_hash::text AS _normalized_title_hash,
+            date_trunc('day', new_stories.publish_date::date)::date::text AS _publish_day,
+            matching_stories.*
+        FROM new_stories
+            LEFT JOIN LATERAL (
+                SELECT *
+                FROM stories
+                WHERE
+                    (md5(stories.title) = new_stories.title_hash OR
+                        stories.normalized_title_hash = new_stories.normalized_title_hash)
+                    AND stories.media_id = %(media_id)s
+
+                  -- We do the goofy " + interval '1 second'" to force postgres to use the stories_title_hash index
+                  AND date_trunc('day', stories.publish_date)  + interval '1 second'
+                    = date_trunc('day', new_stories.publish_date::date) + interval '1 second'
+                LIMIT 1
+            ) AS matching_stories ON TRUE
+        ORDER BY new_stories.ordinality
+    """, {
+        'titles': [stories[i]['title'] for i in pending_indexes],
+        'publish_dates': [stories[i]['publish_date'] for i in pending_indexes],
+        'media_id': media_id,
+    }).hashes()
+
+    title_dup_urls = []
+
+    # Earlier new stories in the list, keyed by their URL variants and title keys
+    new_stories_by_url = {}
+    new_stories_by_title = {}
+
+    for db_story in db_stories:
+        i = pending_indexes[db_story.pop('_ordinality') - 1]
+        title_keys = _title_dup_keys(db_story)
+        for key in ('_title_hash', '_normalized_title_hash', '_publish_day'):
+            db_story.pop(key)
+
+        if db_story['stories_id'] is not None:
+            dup_stories[i] = db_story
+            title_dup_urls.extend([(db_story['stories_id'], u) for u in (stories[i]['url'], stories[i]['guid'])])
+            continue
+
+        for url in story_urls[i]:
+            if url in new_stories_by_url:
+                batch_dup_indexes[i] = new_stories_by_url[url]
+                break
+
+        if batch_dup_indexes[i] is None:
+            for key in title_keys:
+                if key in new_stories_by_title:
+                    batch_dup_indexes[i] = new_stories_by_title[key]
+                    break
+
+        if batch_dup_indexes[i] is None:
+            for url in story_urls[i]:
+                new_stories_by_url.setdefault(url, i)
+            for key in title_keys:
+                new_stories_by_title.setdefault(key, i)
+
+    _insert_stories_urls(db=db, stories_urls=title_dup_urls)
+
+    return dup_stories, batch_dup_indexes
+
+
+def add_stories(db: DatabaseHandler, stories: List[dict], feeds_id: int) -> List[Optional[dict]]:
+    """Bulk version of add_story() for a list of stories from the same media source, e.g. all items of a single feed.
+
+    Finds dup stories for all of the stories at once, inserts new stories with a single multi-row INSERT, and adds their
+    story_urls and feeds_stories_map rows with a single query each, all in one transaction.
+
+    Returns a list of found or created stories (or None for stories that couldn't be added) in the order of 'stories'.
+    Created stories have is_new = True set. If a story is a dup of a story that was created earlier in the same list,
+    the created story is returned for it without is_new set, just like add_story() would do if the stories were added
+    one by one.
+    """
+
+    stories = decode_object_from_bytes_if_needed(stories)
+    if isinstance(feeds_id, bytes):
+        feeds_id = decode_object_from_bytes_if_needed(feeds_id)
+    feeds_id = int(feeds_id)
+
+    if db.in_transaction():
+        raise McAddStoryException("add_stories() can't be run from within transaction.")
+
+    if not stories:
+        return []
+
+    media_ids = {int(story['media_id']) for story in stories}
+    if len(media_ids) != 1:
+        raise McAddStoryException(f"All stories have to belong to the same media source; media IDs: {media_ids}")
+    media_id = media_ids.pop()
+
+    # PostgreSQL is not a fan of NULL bytes in strings
+    stories = [
+        {k: v.replace('\x00', '') if isinstance(v, str) else v for k, v in story.items()}
+        for story in stories
+    ]
+
+    db.begin()
+
+    db.query("LOCK TABLE stories IN ROW EXCLUSIVE MODE")
+
+    dup_stories, batch_dup_indexes = _find_dup_stories(db=db, stories=stories)
+
+    medium = db.find_by_id(table='media', object_id=media_id)
+
+    new_indexes = []
+    for i, story in enumerate(stories):
+        if dup_stories[i]:
+            log.debug("found existing dup story: %s [%s]" % (story['title'], story['url']))
+            continue
+        if batch_dup_indexes[i] is not None:
+            continue
+
+        if story.get('full_text_rss', None) is None:
+            story['full_text_rss'] = medium.get('full_text_rss', False) or False
+
+            # Description can be None
+            if not story.get('description', None):
+                story['full_text_rss'] = False
+
+        if len(story['url']) >= MAX_URL_LENGTH:
+            log.error(f"Story's URL is too long: {story['url']}")
+            continue
+
+        new_indexes.append(i)
+
+    added_stories = [None] * len(stories)
+
+    if new_indexes:
+
+        columns = sorted(set(itertools.chain.from_iterable(stories[i].keys() for i in new_indexes)))
+
+        values = []
+        params = {}
+        for i in new_indexes:
+            row_values = []
+            for column in columns:
+                if column in stories[i]:
+                    param_name = f"{column}_{i}"
+                    params[param_name] = stories[i][column]
+                    row_values.append(f"%({param_name})s")
+                else:
+                    row_values.append('DEFAULT')
+            values.append('(' + ', '.join(row_values) + ')')
+
+        try:
+            inserted_stories = db.query("""
+                INSERT INTO stories (%(columns)s)
+                VALUES %(values)s
+                ON CONFLICT (guid, media_id) DO NOTHING
+                RETURNING *
+            """ % {
+                'columns': ', '.join(columns),
+                'values': ', '.join(values),
+            }, params).hashes()
+        except Exception as ex:
+            db.rollback()
+            raise McAddStoryException("Error while adding stories: {}\nStories: {}".format(
+                str(ex), str([stories[i] for i in new_indexes])
+            ))
+
+        inserted_stories_by_guid = {story['guid']: story for story in inserted_stories}
+
+        for i in new_indexes:
+            story = inserted_stories_by_guid.get(stories[i]['guid'], None)
+            if story:
+                story['is_new'] = True
+                added_stories[i] = story
+            else:
+                # FIXME get rid of this, replace with native upsert on "stories_guid" unique constraint
+                log.warning(
+                    "Failed to add story for '{}' to GUID conflict (guid = '{}')".format(
+                        stories[i]['url'], stories[i]['guid']
+                    )
+                )
+
+        new_stories = [story for story in added_stories if story]
+
+        _insert_stories_urls(db=db, stories_urls=list(itertools.chain.from_iterable(
+            [(story['stories_id'], story['url']), (story['stories_id'], story['guid'])] for story in new_stories
+        )))
+
+        # on conflict does not work with partitioned feeds_stories_map
+        db.query(
+            """
+            insert into feeds_stories_map_p ( feeds_id, stories_id )
+                select %(a)s, new_stories.stories_id
+                    from unnest(%(b)s::int[]) as new_stories (stories_id)
+                    where not exists (
+                        select 1 from feeds_stories_map
+                            where feeds_id = %(a)s and stories_id = new_stories.stories_id
+                    )
+            """,
+            {'a': feeds_id, 'b': [story['stories_id'] for story in new_stories]})
+
+    batch_dup_urls = []
+    for i in range(len(stories)):
+        if dup_stories[i]:
+            added_stories[i] = dup_stories[i]
+        elif batch_dup_indexes[i] is not None:
+            first_story = added_stories[batch_dup_indexes[i]]
+            if first_story:
+                added_stories[i] = {k: v for k, v in first_story.items() if k != 'is_new'}
+                batch_dup_urls.extend([(first_story['stories_id'], u) for u in (stories[i]['url'], stories[i]['guid'])])
+
+    # add_story() would have added URLs of stories found by title; URLs of stories found by URL are aliases anyway
+    _insert_stories_urls(db=db, stories_urls=batch_dup_urls)
+
+    db.commit()
+
+    log.debug("added stories: %d / %d" % (len([s for s in added_stories if s and s.get('is_new')]), len(stories)))
+
+    return added_stories
@@ -1,5 +1,6 @@
 import os
 import socket
+import threading
 from typing import Callable, Any, Optional, Dict, List
 
 import celery
@@ -371,8 +372,104 @@ class _WorkerTask(celery.Task):
             return return_value
 
 
+# noinspection PyUnusedLocal
+def _route_task(name, args_, kwargs_, options_, task_=None, **kw_):
+    """Route tasks to the queue with the task's name."""
+    return {
+        'queue': name,
+        'exchange': name,
+        'routing_key': name,
+    }
+
+
+def _create_celery_app(queue_name: str) -> celery.Celery:
+    """Create and configure Celery app for a queue."""
+
+    config = CommonConfig()
+
+    rabbitmq_config = config.rabbitmq()
+    broker_uri = 'amqp://{username}:{password}@{hostname}:{port}/{vhost}'.format(
+        username=rabbitmq_config.username(),
+        password=rabbitmq_config.password(),
+        hostname=rabbitmq_config.hostname(),
+        port=rabbitmq_config.port(),
+        vhost=rabbitmq_config.vhost(),
+    )
+
+    db_config = CommonConfig.database()
+    result_backend_url = 'db+postgresql+psycopg2://{username}:{password}@{hostname}:{port}/{database}'.format(
+        username=db_config.username(),
+        password=db_config.password(),
+        hostname=db_config.hostname(),
+        port=db_config.port(),
+        database=db_config.database_name(),
+    )
+
+    app = celery.Celery(queue_name, broker=broker_uri, backend=result_backend_url)
+
+    app.conf.broker_connection_timeout = rabbitmq_config.timeout()
+
+    # Concurrency is done by us, not Celery itself
+    app.conf.worker_concurrency = 1
+
+    app.conf.broker_heartbeat = 0
+
+    # Acknowledge tasks after they get run, not before
+    app.conf.task_acks_late = 1
+
+    # https://tech.labs.oliverwyman.com/blog/2015/04/30/making-celery-play-nice-with-rabbitmq-and-bigwig/
+    app.conf.broker_transport_options = {'confirm_publish': True}
+
+    app.conf.database_table_names = {
+        'task': 'celery_tasks',
+        'group': 'celery_groups',
+    }
+
+    # Fetch only one job at a time
+    app.conf.worker_prefetch_multiplier = 1
+
+    app.conf.worker_max_tasks_per_child = 1000
+
+    queue = Queue(
+        name=queue_name,
+        exchange=Exchange(queue_name),
+        routing_key=queue_name,
+        queue_arguments={
+            'x-max-priority': 3,
+            'x-queue-mode': 'lazy',
+        },
+    )
+    app.conf.task_queues = [queue]
+
+    app.conf.task_routes = (_route_task,)
+
+    return app
+
+
+# Celery apps (together with their pools of publisher connections) that have been created already, keyed by
+# (PID, queue name)
+_CELERY_APPS = {}
+_CELERY_APPS_LOCK = threading.Lock()
+
+
+def _celery_app(queue_name: str) -> celery.Celery:
+    """Return process-wide Celery app for a queue, creating it if needed."""
+
+    # Forked children (e.g. Celery's prefork workers) must not share their parent's broker connections
+    key = (os.getpid(), queue_name,)
+
+    with _CELERY_APPS_LOCK:
+        if key not in _CELERY_APPS:
+            _CELERY_APPS[key] = _create_celery_app(queue_name=queue_name)
+
+    return _CELERY_APPS[key]
+
+
 class JobBroker(object):
-    """Job broker."""
+    """Job broker.
+
+    Brokers of the same queue share a process-wide Celery app, so creating a broker is cheap, and jobs get published
+    through a pool of publisher connections that get reused between brokers."""
 
     __slots__ = [
         # celery.Celery instance
@@ -394,72 +491,7 @@ class JobBroker(object):
         assert queue_name, "Queue name is empty."
 
         self.__queue_name = queue_name
-
-        config = CommonConfig()
-
-        rabbitmq_config = config.rabbitmq()
-        broker_uri = 'amqp://{username}:{password}@{hostname}:{port}/{vhost}'.format(
-            username=rabbitmq_config.username(),
-            password=rabbitmq_config.password(),
-            hostname=rabbitmq_config.hostname(),
-            port=rabbitmq_config.port(),
-            vhost=rabbitmq_config.vhost(),
-        )
-
-        db_config = CommonConfig.database()
-        result_backend_url = 'db+postgresql+psycopg2://{username}:{password}@{hostname}:{port}/{database}'.format(
-            username=db_config.username(),
-            password=db_config.password(),
-            hostname=db_config.hostname(),
-            port=db_config.port(),
-            database=db_config.database_name(),
-        )
-
-        self.__app = celery.Celery(queue_name, broker=broker_uri, backend=result_backend_url)
-
-        self.__app.conf.broker_connection_timeout = rabbitmq_config.timeout()
-
-        # Concurrency is done by us, not Celery itself
-        self.__app.conf.worker_concurrency = 1
-
-        self.__app.conf.broker_heartbeat = 0
-
-        # Acknowledge tasks after they get run, not before
-        self.__app.conf.task_acks_late = 1
-
-        # https://tech.labs.oliverwyman.com/blog/2015/04/30/making-celery-play-nice-with-rabbitmq-and-bigwig/
-        self.__app.conf.broker_transport_options = {'confirm_publish': True}
-
-        self.__app.conf.database_table_names = {
-            'task': 'celery_tasks',
-            'group': 'celery_groups',
-        }
-
-        # Fetch only one job at a time
-        self.__app.conf.worker_prefetch_multiplier = 1
-
-        self.__app.conf.worker_max_tasks_per_child = 1000
-
-        queue = Queue(
-            name=queue_name,
-            exchange=Exchange(queue_name),
-            routing_key=queue_name,
-            queue_arguments={
-                'x-max-priority': 3,
-                'x-queue-mode': 'lazy',
-            },
-        )
-        self.__app.conf.task_queues = [queue]
-
-        # noinspection PyUnusedLocal
-        def __route_task(name, args_, kwargs_, options_, task_=None, **kw_):
-            return {
-                'queue': name,
-                'exchange': name,
-                'routing_key': name,
-            }
-
-        self.__app.conf.task_routes = (__route_task,)
+        self.__app = _celery_app(queue_name=queue_name)
 
     def queue_name(self) -> str:
         return self.__queue_name
@@ -487,6 +519,38 @@ class JobBroker(object):
 
         return self.__send_task(args=args, kwargs=kwargs)
 
+    def add_many_to_queue(self, list_of_kwargs: List[Dict[str, Any]]) -> List[str]:
+        """
+        Add many jobs to queue and return their job IDs.
+
+        All jobs get published using the same publisher connection and channel, so this is much faster than calling
+        add_to_queue() for every job.
+
+        :param list_of_kwargs: List of dictionaries of named arguments to pass to each of the jobs.
+        :return: List of job IDs (in the order of list_of_kwargs) to be potentially used by get_result().
+        """
+        list_of_kwargs = decode_object_from_bytes_if_needed(list_of_kwargs)
+
+        job_ids = []
+        self._send_many_to_queue(list_of_kwargs=list_of_kwargs, job_ids=job_ids)
+
+        return job_ids
+
+    def _send_many_to_queue(self, list_of_kwargs: List[Dict[str, Any]], job_ids: List[str]) -> None:
+        """
+        Publish many jobs, appending job IDs to "job_ids" as the jobs get published.
+
+        If publishing fails midway, "job_ids" is left with the IDs of the jobs that did get published, so the caller
+        can find out which ones didn't.
+        """
+        if not list_of_kwargs:
+            return
+
+        with self.__app.producer_or_acquire() as producer:
+            for kwargs in list_of_kwargs:
+                result = self.__app.send_task(self.__queue_name, kwargs=kwargs, producer=producer)
+                job_ids.append(result.id)
+
     @classmethod
     def get_result(cls, job_id: str, timeout: Optional[int] = None) -> Any:
         """
@@ -608,6 +672,37 @@ class StatefulJobBroker(JobBroker):
 
         return super().add_to_queue(*args, **kwargs)
 
+    def add_many_to_queue(self, list_of_kwargs: List[Dict[str, Any]]) -> List[str]:
+        list_of_kwargs = decode_object_from_bytes_if_needed(list_of_kwargs)
+
+        # Don't add "job_states_id" to the caller's dictionaries
+        list_of_kwargs = [dict(kwargs) for kwargs in list_of_kwargs]
+
+        # Create either all of the job states or none of them
+        self.__db.begin()
+        try:
+            list_of_kwargs = [self.__kwargs_with_job_states_id(kwargs=kwargs) for kwargs in list_of_kwargs]
+        except Exception as ex:
+            self.__db.rollback()
+            raise ex
+        self.__db.commit()
+
+        # Job states have to be committed before the jobs get published as workers might start on them right away (and
+        # fail to find their states), so instead of rolling back, remove states of the jobs that didn't get published
+        job_ids = []
+        try:
+            self._send_many_to_queue(list_of_kwargs=list_of_kwargs, job_ids=job_ids)
+        except Exception as ex:
+            unpublished_job_states_ids = [kwargs['job_states_id'] for kwargs in list_of_kwargs[len(job_ids):]]
+            log.error(f"Publishing jobs failed, removing {len(unpublished_job_states_ids)} unpublished job states")
+            self.__db.query(
+                "DELETE FROM job_states WHERE job_states_id = ANY(%(job_states_ids)s)",
+                {'job_states_ids': unpublished_job_states_ids},
+            )
+            raise ex
+
+        return job_ids
+
     def run_remotely(self, *args, **kwargs) -> Any:
         args = decode_object_from_bytes_if_needed(args)
         kwargs = decode_object_from_bytes_if_needed(kwargs)
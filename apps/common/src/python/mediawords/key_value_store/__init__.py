@@ -1,11 +1,14 @@
 import abc
 from enum import Enum
-from typing import Union
+from typing import Iterator, List, Optional, Tuple, Union
 
 from mediawords.db import DatabaseHandler
-from mediawords.util.compress import gzip, gunzip, bzip2, bunzip2
+from mediawords.util.compress import gzip, gunzip, bzip2, bunzip2, zstd, unzstd, is_zstd, is_gzip, is_bzip2
+from mediawords.util.log import create_logger
 from mediawords.util.perl import decode_object_from_bytes_if_needed
 
+log = create_logger(__name__)
+
 
 class McKeyValueStoreException(Exception):
     """Key-value store exception."""
@@ -29,6 +32,24 @@ class KeyValueStore(metaclass=abc.ABCMeta):
         """Read object. Returns content (in bytes) on success, None if content is not found, raises on error."""
         raise NotImplementedError("Abstract method.")
 
+    def fetch_contents(self, db: DatabaseHandler, object_ids: List[int]) -> Iterator[Tuple[int, bytes]]:
+        """Read many objects.
+
+        Yields (object ID, content) tuples as objects get read, not necessarily in the order of object IDs. Objects
+        that couldn't be read (e.g. because they don't exist) get logged and skipped, so callers should check which
+        object IDs didn't get returned.
+
+        Stores that are able to read objects in bulk or in parallel override this; the default implementation reads
+        the objects one by one with fetch_content().
+        """
+        for object_id in self._prepare_object_ids(object_ids):
+            try:
+                content = self.fetch_content(db=db, object_id=object_id)
+            except Exception as ex:
+                log.warning("Unable to fetch object ID %d: %s" % (object_id, str(ex),))
+            else:
+                yield object_id, content
+
     @abc.abstractmethod
     def store_content(self,
             db: DatabaseHandler,
@@ -48,11 +69,19 @@ class KeyValueStore(metaclass=abc.ABCMeta):
         """Test if object exists. Returns true if it does, raises on error."""
         raise NotImplementedError("Abstract method.")
 
+    def uses_db(self) -> bool:
+        """Return True if the store uses the database handler passed to it.
+
+        Database handlers are not thread-safe, so such stores have to be called from the thread that the handler
+        belongs to."""
+        return True
+
     class Compression(Enum):
         """Available compression methods."""
         NONE = 'mc-kvs-compression-none'
         GZIP = 'mc-kvs-compression-gzip'
         BZIP2 = 'mc-kvs-compression-bzip2'
+        ZSTD = 'mc-kvs-compression-zstd'
 
     @staticmethod
     def _compression_method_is_valid(compression_method: Compression) -> bool:
@@ -65,8 +94,12 @@ class KeyValueStore(metaclass=abc.ABCMeta):
         return False
 
     @staticmethod
-    def _compress_data_for_method(data: Union[bytes, str], compression_method: Compression) -> bytes:
-        """Compress data."""
+    def _compress_data_for_method(data: Union[bytes, str],
+                                  compression_method: Compression,
+                                  zstd_dictionary: Optional[bytes] = None) -> bytes:
+        """Compress data.
+
+        If Zstandard dictionary is set, it's used to compress data with ZSTD compression method."""
 
         if data is None:
             raise McKeyValueStoreCompressionException("Data is None.")
@@ -83,14 +116,22 @@ class KeyValueStore(metaclass=abc.ABCMeta):
             data = gzip(data)
         elif compression_method == KeyValueStore.Compression.BZIP2:
             data = bzip2(data)
+        elif compression_method == KeyValueStore.Compression.ZSTD:
+            data = zstd(data, dictionary=zstd_dictionary)
         else:
             raise McKeyValueStoreCompressionException("Invalid compression method: %s" % compression_method)
 
         return data
 
     @staticmethod
-    def _uncompress_data_for_method(data: bytes, compression_method: Compression) -> bytes:
-        """Uncompress data."""
+    def _uncompress_data_for_method(data: bytes,
+                                    compression_method: Compression,
+                                    zstd_dictionary: Optional[bytes] = None) -> bytes:
+        """Uncompress data.
+
+        For compressed data (any method but NONE), the actual format gets detected from the data's header, so objects
+        that were written with a different compression method (e.g. before being recompressed, or before the store's
+        compression method was changed) remain readable."""
 
         if data is None:
             raise McKeyValueStoreCompressionException("Data is None.")
@@ -101,10 +142,25 @@ class KeyValueStore(metaclass=abc.ABCMeta):
         if compression_method == KeyValueStore.Compression.NONE:
             pass
 
-        elif compression_method == KeyValueStore.Compression.GZIP:
-            data = gunzip(data)
-        elif compression_method == KeyValueStore.Compression.BZIP2:
-            data = bunzip2(data)
+        elif compression_method in (
+                KeyValueStore.Compression.GZIP,
+                KeyValueStore.Compression.BZIP2,
+                KeyValueStore.Compression.ZSTD,
+        ):
+            if is_zstd(data):
+                data = unzstd(data, dictionaries=[zstd_dictionary] if zstd_dictionary else None)
+            elif is_gzip(data):
+                data = gunzip(data)
+            elif is_bzip2(data):
+                data = bunzip2(data)
+            elif compression_method == KeyValueStore.Compression.GZIP:
+                # Let gunzip() complain about the invalid data
+                data = gunzip(data)
+            elif compression_method == KeyValueStore.Compression.BZIP2:
+                data = bunzip2(data)
+            else:
+                data = unzstd(data, dictionaries=[zstd_dictionary] if zstd_dictionary else None)
+
         else:
             raise McKeyValueStoreCompressionException("Invalid compression method: %s" % compression_method)
 
@@ -127,6 +183,24 @@ class KeyValueStore(metaclass=abc.ABCMeta):
 
         return object_id
 
+    @staticmethod
+    def _prepare_object_ids(object_ids: List[int]) -> List[int]:
+        """Prepare list of object IDs by validating, decoding and deduplicating them."""
+
+        if object_ids is None:
+            raise McKeyValueStoreException("Object IDs is None.")
+
+        prepared_object_ids = []
+        seen_object_ids = set()
+
+        for object_id in object_ids:
+            object_id = KeyValueStore._prepare_object_id(object_id)
+            if object_id not in seen_object_ids:
+                seen_object_ids.add(object_id)
+                prepared_object_ids.append(object_id)
+
+        return prepared_object_ids
+
     @staticmethod
     def _prepare_content(content: Union[str, bytes]) -> bytes:
         """Prepare content to store by validating and decoding it."""
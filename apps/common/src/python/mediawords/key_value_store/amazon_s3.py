@@ -1,6 +1,7 @@
+import concurrent.futures
 import mimetypes
 import os
-from typing import Union
+from typing import Iterator, List, Optional, Tuple, Union
 
 import boto3
 # noinspection PyPackageRequirements
@@ -49,6 +50,9 @@ class AmazonS3Store(KeyValueStore):
     __READ_ATTEMPTS = 3
     __WRITE_ATTEMPTS = 3
 
+    # Max. number of objects to read from S3 in parallel in fetch_contents()
+    __FETCH_CONTENTS_THREADS = 16
+
     __slots__ = [
         '__access_key_id',
         '__secret_access_key',
@@ -56,6 +60,7 @@ class AmazonS3Store(KeyValueStore):
         '__directory_name',
 
         '__compression_method',
+        '__zstd_dictionary',
 
         # Boto3 objects
         '__s3',
@@ -69,8 +74,12 @@ class AmazonS3Store(KeyValueStore):
                  secret_access_key: str,
                  bucket_name: str,
                  directory_name: str,
-                 compression_method: KeyValueStore.Compression = _DEFAULT_COMPRESSION_METHOD):
-        """Constructor."""
+                 compression_method: KeyValueStore.Compression = _DEFAULT_COMPRESSION_METHOD,
+                 zstd_dictionary: Optional[bytes] = None):
+        """Constructor.
+
+        Zstandard dictionary (if set) gets used to compress objects with ZSTD compression method and to uncompress
+        objects that were compressed with it."""
 
         access_key_id = decode_object_from_bytes_if_needed(access_key_id)
         secret_access_key = decode_object_from_bytes_if_needed(secret_access_key)
@@ -101,6 +110,7 @@ class AmazonS3Store(KeyValueStore):
         self.__bucket_name = bucket_name
         self.__directory_name = directory_name
         self.__compression_method = compression_method
+        self.__zstd_dictionary = zstd_dictionary
 
         self.__pid = os.getpid()
         self.__s3 = None
@@ -119,7 +129,8 @@ class AmazonS3Store(KeyValueStore):
             raise McAmazonS3StoreException("Amazon S3 request timeout is too small: %d" % request_timeout)
 
         config = BotoCoreConfig(connect_timeout=request_timeout,
-                                read_timeout=request_timeout)
+                                read_timeout=request_timeout,
+                                max_pool_connections=self.__FETCH_CONTENTS_THREADS)
 
         try:
             self.__s3 = boto3.resource(service_name='s3',
@@ -152,16 +163,11 @@ class AmazonS3Store(KeyValueStore):
         return self.__s3.Object(bucket_name=self.__bucket_name,
                                 key=self.__s3_key_for_object_id(object_id=object_id))
 
-    def fetch_content(self, db: DatabaseHandler, object_id: int, object_path: str = None) -> bytes:
-        """Read object from Amazon S3."""
-
-        object_id = self._prepare_object_id(object_id)
+    def __read_object(self, object_id: int) -> bytes:
+        """Read and uncompress object from Amazon S3, retrying a few times.
 
-        self.__initialize_s3()
-
-        if self.__CHECK_IF_EXISTS_BEFORE_FETCHING:
-            if not self.content_exists(db=db, object_id=object_id, object_path=object_path):
-                raise McAmazonS3StoreException("Object ID %d does not exist." % object_id)
+        Uses S3's low-level client which (unlike boto3's resources) is safe to share between threads.
+        """
 
         content = None
 
@@ -172,10 +178,17 @@ class AmazonS3Store(KeyValueStore):
                 log.warning("Retrying (#%d)..." % retry)
 
             try:
-                o = self.__object_for_object_id(object_id)
-                o_get = o.get()
+                o_get = self.__s3.meta.client.get_object(Bucket=self.__bucket_name,
+                                                         Key=self.__s3_key_for_object_id(object_id=object_id))
                 content = o_get['Body'].read()
 
+            except ClientError as ex:
+                if ex.response['Error']['Code'] in ('404', 'NoSuchKey'):
+                    # No point in retrying
+                    raise McAmazonS3StoreException("Object ID %d does not exist." % object_id)
+
+                log.error("Attempt to read object ID %d didn't succeed because: %s" % (object_id, str(ex),))
+
             except Exception as ex:
                 log.error("Attempt to read object ID %d didn't succeed because: %s" % (object_id, str(ex),))
 
@@ -191,7 +204,9 @@ class AmazonS3Store(KeyValueStore):
             raise McAmazonS3StoreException("Content is not bytes for object ID %d." % object_id)
 
         try:
-            content = self._uncompress_data_for_method(data=content, compression_method=self.__compression_method)
+            content = self._uncompress_data_for_method(data=content,
+                                                       compression_method=self.__compression_method,
+                                                       zstd_dictionary=self.__zstd_dictionary)
         except Exception as ex:
             raise McAmazonS3StoreException("Unable to uncompress data for object ID %d: %s" % (object_id, str(ex),))
 
@@ -202,6 +217,68 @@ class AmazonS3Store(KeyValueStore):
 
         return content
 
+    def uses_db(self) -> bool:
+        return False
+
+    def fetch_content(self, db: DatabaseHandler, object_id: int, object_path: str = None) -> bytes:
+        """Read object from Amazon S3."""
+
+        object_id = self._prepare_object_id(object_id)
+
+        self.__initialize_s3()
+
+        if self.__CHECK_IF_EXISTS_BEFORE_FETCHING:
+            if not self.content_exists(db=db, object_id=object_id, object_path=object_path):
+                raise McAmazonS3StoreException("Object ID %d does not exist." % object_id)
+
+        return self.__read_object(object_id=object_id)
+
+    def fetch_contents(self, db: DatabaseHandler, object_ids: List[int]) -> Iterator[Tuple[int, bytes]]:
+        """Read many objects from Amazon S3 in parallel, yield them as they get read."""
+
+        object_ids = self._prepare_object_ids(object_ids)
+        if not object_ids:
+            return
+
+        self.__initialize_s3()
+
+        thread_count = min(self.__FETCH_CONTENTS_THREADS, len(object_ids))
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=thread_count) as executor:
+
+            pending_object_ids = iter(object_ids)
+            futures = {}
+
+            def submit_next() -> None:
+                next_object_id = next(pending_object_ids, None)
+                if next_object_id is not None:
+                    futures[executor.submit(self.__read_object, next_object_id)] = next_object_id
+
+            # Keep only a limited number of objects in flight so that memory usage doesn't depend on how many objects
+            # are being read
+            for _ in range(thread_count * 2):
+                submit_next()
+
+            try:
+                while futures:
+                    done, _ = concurrent.futures.wait(futures, return_when=concurrent.futures.FIRST_COMPLETED)
+
+                    for future in done:
+                        object_id = futures.pop(future)
+                        submit_next()
+
+                        try:
+                            content = future.result()
+                        except Exception as ex:
+                            log.warning("Unable to fetch object ID %d: %s" % (object_id, str(ex),))
+                        else:
+                            yield object_id, content
+
+            finally:
+                # Don't bother reading the rest if the caller has stopped iterating
+                for future in futures:
+                    future.cancel()
+
     def __get_content_disposition(self, object_id: int, content_type: str) -> str:
         """Get an http content disposition header that adds an appropriate file extension."""
         extension = mimetypes.guess_extension(content_type)
@@ -234,7 +311,9 @@ class AmazonS3Store(KeyValueStore):
                     ) % object_id)
 
         try:
-            content = self._compress_data_for_method(data=content, compression_method=self.__compression_method)
+            content = self._compress_data_for_method(data=content,
+                                                     compression_method=self.__compression_method,
+                                                     zstd_dictionary=self.__zstd_dictionary)
         except Exception as ex:
             raise McAmazonS3StoreException("Unable to compress data for object ID %d: %s" % (object_id, str(ex),))
 
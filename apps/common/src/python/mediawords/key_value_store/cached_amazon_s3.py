@@ -1,8 +1,9 @@
-from typing import Union
+from typing import Iterator, List, Optional, Tuple, Union
 
 from mediawords.db import DatabaseHandler
 from mediawords.key_value_store import KeyValueStore, McKeyValueStoreException
 from mediawords.key_value_store.amazon_s3 import AmazonS3Store
+from mediawords.key_value_store.local_cache import LocalCache
 from mediawords.util.log import create_logger
 from mediawords.util.perl import decode_object_from_bytes_if_needed
 
@@ -17,14 +18,22 @@ class McCachedAmazonS3StoreException(McKeyValueStoreException):
 # FIXME merge with MultipleStoresStore because both do essentially the same thing (except that the "cached" store
 # doesn't raise if it's unable to store the object in one of the stores)
 class CachedAmazonS3Store(AmazonS3Store):
-    """Cached Amazon S3 key-value store."""
+    """Cached Amazon S3 key-value store.
+
+    Objects get looked up in the local cache (if set) first, then in the PostgreSQL cache table, and only then in S3;
+    objects fetched from a slower tier get stored in the faster ones."""
 
     # Default cache compression method
     _DEFAULT_CACHE_COMPRESSION_METHOD = KeyValueStore.Compression.GZIP
 
+    # How many objects to fetch from cache per query in fetch_contents()
+    __FETCH_CONTENTS_CHUNK_SIZE = 1000
+
     __slots__ = [
         '__cache_table',
         '__cache_compression_method',
+        '__zstd_dictionary',
+        '__local_cache',
     ]
 
     def __init__(self,
@@ -34,13 +43,18 @@ class CachedAmazonS3Store(AmazonS3Store):
                  directory_name: str,
                  cache_table: str,
                  compression_method: KeyValueStore.Compression = AmazonS3Store._DEFAULT_COMPRESSION_METHOD,
-                 cache_compression_method: KeyValueStore.Compression = _DEFAULT_CACHE_COMPRESSION_METHOD):
-        """Constructor."""
+                 cache_compression_method: KeyValueStore.Compression = _DEFAULT_CACHE_COMPRESSION_METHOD,
+                 zstd_dictionary: Optional[bytes] = None,
+                 local_cache: Optional[LocalCache] = None):
+        """Constructor.
+
+        Local cache (if set) gets used as a (per worker host) cache tier in front of the PostgreSQL cache table."""
         super().__init__(access_key_id=access_key_id,
                          secret_access_key=secret_access_key,
                          bucket_name=bucket_name,
                          directory_name=directory_name,
-                         compression_method=compression_method)
+                         compression_method=compression_method,
+                         zstd_dictionary=zstd_dictionary)
 
         cache_table = decode_object_from_bytes_if_needed(cache_table)
         if cache_table is None or len(cache_table) == 0:
@@ -55,6 +69,8 @@ class CachedAmazonS3Store(AmazonS3Store):
 
         self.__cache_table = cache_table
         self.__cache_compression_method = cache_compression_method
+        self.__zstd_dictionary = zstd_dictionary
+        self.__local_cache = local_cache
 
     def __try_storing_object_in_cache(self, db: DatabaseHandler, object_id: int, content: bytes) -> None:
         """Attempt to store object to cache, don't worry too much if it fails."""
@@ -68,7 +84,9 @@ class CachedAmazonS3Store(AmazonS3Store):
             content = content.encode('utf-8')
 
         try:
-            content = self._compress_data_for_method(data=content, compression_method=self.__cache_compression_method)
+            content = self._compress_data_for_method(data=content,
+                                                     compression_method=self.__cache_compression_method,
+                                                     zstd_dictionary=self.__zstd_dictionary)
 
             sql = "INSERT INTO %s " % self.__cache_table  # interpolated by Python
             sql += "(object_id, raw_data) "
@@ -81,6 +99,49 @@ class CachedAmazonS3Store(AmazonS3Store):
         except Exception as ex:
             log.warning("Unable to cache object ID %d: %s" % (object_id, str(ex),))
 
+    def __try_retrieving_object_from_local_cache(self, object_id: int) -> Optional[bytes]:
+        """Attempt to retrieve object from local cache (if set)."""
+        if self.__local_cache is None:
+            return None
+        return self.__local_cache.fetch(object_id=object_id)
+
+    def __try_storing_object_in_local_cache(self, object_id: int, content: Union[str, bytes]) -> None:
+        """Attempt to store object in local cache (if set)."""
+        if self.__local_cache is None:
+            return
+        if isinstance(content, str):
+            content = content.encode('utf-8')
+        self.__local_cache.store(object_id=object_id, content=content)
+
+    def __uncompress_cached_content(self, object_id: int, content: Union[bytes, memoryview, list]) -> bytes:
+        """Uncompress raw_data of a cached object."""
+
+        # MC_REWRITE_TO_PYTHON: Perl database handler returns value as array of bytes
+        if isinstance(content, list):
+            content = b''.join(content)
+
+        if isinstance(content, memoryview):
+            content = content.tobytes()
+
+        if not isinstance(content, bytes):
+            raise McCachedAmazonS3StoreException("Content is not bytes for object %d." % object_id)
+
+        try:
+            content = self._uncompress_data_for_method(data=content,
+                                                       compression_method=self.__cache_compression_method,
+                                                       zstd_dictionary=self.__zstd_dictionary)
+        except Exception as ex:
+            raise McCachedAmazonS3StoreException(
+                "Unable to uncompress data for object ID %d: %s" % (object_id, str(ex),))
+
+        if content is None:
+            raise McCachedAmazonS3StoreException("Content is None after uncompression for object ID %d" % object_id)
+        if not isinstance(content, bytes):
+            raise McCachedAmazonS3StoreException(
+                "Content is not bytes after uncompression for object ID %d" % object_id)
+
+        return content
+
     def __try_retrieving_object_from_cache(self, db: DatabaseHandler, object_id: int) -> Union[bytes, None]:
         """Attempt to retrieve object from cache, don't worry too much if it fails."""
 
@@ -96,30 +157,7 @@ class CachedAmazonS3Store(AmazonS3Store):
             if content is None or len(content) == 0:
                 raise McCachedAmazonS3StoreException("Object with ID %d was not found." % object_id)
 
-            content = content['raw_data']
-
-            # MC_REWRITE_TO_PYTHON: Perl database handler returns value as array of bytes
-            if isinstance(content, list):
-                content = b''.join(content)
-
-            if isinstance(content, memoryview):
-                content = content.tobytes()
-
-            if not isinstance(content, bytes):
-                raise McCachedAmazonS3StoreException("Content is not bytes for object %d." % object_id)
-
-            try:
-                content = self._uncompress_data_for_method(data=content,
-                                                           compression_method=self.__cache_compression_method)
-            except Exception as ex:
-                raise McCachedAmazonS3StoreException(
-                    "Unable to uncompress data for object ID %d: %s" % (object_id, str(ex),))
-
-            if content is None:
-                raise McCachedAmazonS3StoreException("Content is None after uncompression for object ID %d" % object_id)
-            if not isinstance(content, bytes):
-                raise McCachedAmazonS3StoreException(
-                    "Content is not bytes after uncompression for object ID %d" % object_id)
+            content = self.__uncompress_cached_content(object_id=object_id, content=content['raw_data'])
 
         except Exception as ex:
             log.debug("Unable to retrieve object ID %d from cache: %s" % (object_id, str(ex),))
@@ -128,6 +166,33 @@ class CachedAmazonS3Store(AmazonS3Store):
         else:
             return content
 
+    def __try_retrieving_objects_from_cache(self,
+                                            db: DatabaseHandler,
+                                            object_ids: List[int]) -> Iterator[Tuple[int, bytes]]:
+        """Attempt to retrieve many objects from cache, a chunk of objects per query; skip the ones that fail."""
+
+        sql = "SELECT object_id, raw_data "
+        sql += "FROM %s " % self.__cache_table  # interpolated by Python
+        sql += "WHERE object_id = ANY(%(object_ids)s)"  # interpolated by psycopg2
+
+        for i in range(0, len(object_ids), self.__FETCH_CONTENTS_CHUNK_SIZE):
+            chunk_object_ids = object_ids[i:i + self.__FETCH_CONTENTS_CHUNK_SIZE]
+
+            try:
+                rows = db.query(sql, {'object_ids': chunk_object_ids}).hashes()
+            except Exception as ex:
+                log.debug("Unable to retrieve %d objects from cache: %s" % (len(chunk_object_ids), str(ex),))
+                continue
+
+            for row in rows:
+                object_id = row['object_id']
+                try:
+                    content = self.__uncompress_cached_content(object_id=object_id, content=row['raw_data'])
+                except Exception as ex:
+                    log.debug("Unable to retrieve object ID %d from cache: %s" % (object_id, str(ex),))
+                else:
+                    yield object_id, content
+
     def __remove_object_from_cache(self, db: DatabaseHandler, object_id: int) -> None:
         """Attempt to remove object from cache.
 
@@ -141,11 +206,19 @@ class CachedAmazonS3Store(AmazonS3Store):
 
         db.query(sql, {'object_id': object_id})
 
+    def uses_db(self) -> bool:
+        # Objects get cached in a database table
+        return True
+
     def fetch_content(self, db: DatabaseHandler, object_id: int, object_path: str = None) -> bytes:
         """Read object from Amazon S3, try local cache first."""
 
         object_id = self._prepare_object_id(object_id)
 
+        content = self.__try_retrieving_object_from_local_cache(object_id=object_id)
+        if content is not None:
+            return content
+
         content = self.__try_retrieving_object_from_cache(db=db, object_id=object_id)
 
         if content is None:
@@ -154,8 +227,39 @@ class CachedAmazonS3Store(AmazonS3Store):
             # Cache the retrieved object because we might need it soon
             self.__try_storing_object_in_cache(db=db, object_id=object_id, content=content)
 
+        self.__try_storing_object_in_local_cache(object_id=object_id, content=content)
+
         return content
 
+    def fetch_contents(self, db: DatabaseHandler, object_ids: List[int]) -> Iterator[Tuple[int, bytes]]:
+        """Read many objects, first the cached ones from local cache and the cache table, and then the rest from Amazon
+        S3 in parallel."""
+
+        object_ids = self._prepare_object_ids(object_ids)
+
+        uncached_object_ids = []
+        for object_id in object_ids:
+            content = self.__try_retrieving_object_from_local_cache(object_id=object_id)
+            if content is None:
+                uncached_object_ids.append(object_id)
+            else:
+                yield object_id, content
+
+        cached_object_ids = set()
+        for object_id, content in self.__try_retrieving_objects_from_cache(db=db, object_ids=uncached_object_ids):
+            cached_object_ids.add(object_id)
+            self.__try_storing_object_in_local_cache(object_id=object_id, content=content)
+            yield object_id, content
+
+        uncached_object_ids = [object_id for object_id in uncached_object_ids if object_id not in cached_object_ids]
+
+        for object_id, content in super().fetch_contents(db=db, object_ids=uncached_object_ids):
+            # Cache the retrieved object because we might need it soon
+            self.__try_storing_object_in_cache(db=db, object_id=object_id, content=content)
+            self.__try_storing_object_in_local_cache(object_id=object_id, content=content)
+
+            yield object_id, content
+
     def store_content(self,
             db: DatabaseHandler,
             object_id: int,
@@ -171,15 +275,21 @@ class CachedAmazonS3Store(AmazonS3Store):
         # If we got to this point, object got stored in S3 successfully
 
         self.__try_storing_object_in_cache(db=db, object_id=object_id, content=content)
+        self.__try_storing_object_in_local_cache(object_id=object_id, content=content)
 
         return path
 
     def remove_content(self, db: DatabaseHandler, object_id: int, object_path: str = None) -> None:
-        """Remove object from Amazon S3 and local cache."""
+        """Remove object from Amazon S3, the cache table and local cache.
+
+        Only this host's local cache directory gets invalidated; local caches on other worker hosts might keep on
+        returning the removed object until it gets evicted from them."""
 
         object_id = self._prepare_object_id(object_id)
 
         self.__remove_object_from_cache(db=db, object_id=object_id)
+        if self.__local_cache is not None:
+            self.__local_cache.remove(object_id=object_id)
 
         super().remove_content(db=db, object_id=object_id)
 
@@ -188,7 +298,9 @@ class CachedAmazonS3Store(AmazonS3Store):
 
         object_id = self._prepare_object_id(object_id)
 
-        content = self.__try_retrieving_object_from_cache(db=db, object_id=object_id)
+        content = self.__try_retrieving_object_from_local_cache(object_id=object_id)
+        if content is None:
+            content = self.__try_retrieving_object_from_cache(db=db, object_id=object_id)
         if content is None:
             return super().content_exists(db=db, object_id=object_id)
 
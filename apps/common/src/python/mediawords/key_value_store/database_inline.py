@@ -15,6 +15,9 @@ class DatabaseInlineStore(KeyValueStore):
 
     __CONTENT_PREFIX = 'content:'
 
+    def uses_db(self) -> bool:
+        return False
+
     def fetch_content(self, db: DatabaseHandler, object_id: int, object_path: str = None) -> bytes:
         """Read object from PostgreSQL's 'path' row."""
 
@@ -0,0 +1,225 @@
+"""
+Local (per worker host) object caches that can be put in front of slower key-value stores.
+
+LocalDiskCache keeps uncompressed objects as files in a sharded directory tree, and evicts the least recently used
+objects once the total size of a shard grows past its share of the size limit. Many processes on the same host can
+share the same cache directory: files get written atomically, reads touch the file's modification time to mark the
+object as recently used, and eviction goes by modification times of the files that are actually on disk.
+"""
+
+import abc
+import os
+import tempfile
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+from mediawords.key_value_store import McKeyValueStoreException
+from mediawords.util.log import create_logger
+
+log = create_logger(__name__)
+
+
+class McLocalCacheException(McKeyValueStoreException):
+    """Local cache exception."""
+    pass
+
+
+class LocalCache(object, metaclass=abc.ABCMeta):
+    """Abstract class for a local object cache.
+
+    Caches are best effort: implementations are expected to return None / do nothing instead of raising if they fail
+    to read or write an object. Removal is expected to raise on failure though, as the removed object is not supposed
+    to get returned from the cache afterwards."""
+
+    @abc.abstractmethod
+    def fetch(self, object_id: int) -> Optional[bytes]:
+        """Return cached object, or None if it's not cached."""
+        raise NotImplementedError("Abstract method.")
+
+    @abc.abstractmethod
+    def store(self, object_id: int, content: bytes) -> None:
+        """Cache object."""
+        raise NotImplementedError("Abstract method.")
+
+    @abc.abstractmethod
+    def remove(self, object_id: int) -> None:
+        """Remove object from cache."""
+        raise NotImplementedError("Abstract method.")
+
+
+class _LocalDiskCacheShard(object):
+    """Single shard (subdirectory) of the local disk cache."""
+
+    __slots__ = [
+        'directory',
+        'max_size',
+        'lock',
+
+        # Approximate size of the shard: exact after a rescan, plus whatever this process has written since
+        'size',
+    ]
+
+    def __init__(self, directory: str, max_size: int):
+        self.directory = directory
+        self.max_size = max_size
+        self.lock = threading.Lock()
+        self.size = 0
+
+
+class LocalDiskCache(LocalCache):
+    """Size-bounded, sharded LRU cache of objects stored in a local directory."""
+
+    # Default number of shards (subdirectories)
+    _DEFAULT_SHARD_COUNT = 64
+
+    # After eviction, shard's size is to be at most this fraction of its size limit
+    __EVICTION_LOW_WATERMARK = 0.8
+
+    # Don't bother updating modification times of files that were used less than this many seconds ago
+    __TOUCH_INTERVAL = 60
+
+    __slots__ = [
+        '__directory',
+        '__shards',
+    ]
+
+    def __init__(self, directory: str, max_size: int, shard_count: int = _DEFAULT_SHARD_COUNT):
+        """Constructor.
+
+        :param directory: Directory to store the cached objects in (gets created if it doesn't exist).
+        :param max_size: Max. total size of cached objects in bytes.
+        :param shard_count: Number of shards (subdirectories) to split the objects into; each shard gets evicted
+            separately.
+        """
+        if not directory:
+            raise McLocalCacheException("Cache directory is unset.")
+        if max_size < 1:
+            raise McLocalCacheException(f"Max. cache size must be positive, got {max_size}")
+        if shard_count < 1:
+            raise McLocalCacheException(f"Shard count must be positive, got {shard_count}")
+
+        self.__directory = directory
+        self.__shards = []
+
+        shard_max_size = max(max_size // shard_count, 1)
+
+        for shard_number in range(shard_count):
+            shard_directory = os.path.join(directory, '%03x' % shard_number)
+            try:
+                os.makedirs(shard_directory, exist_ok=True)
+            except Exception as ex:
+                raise McLocalCacheException(f"Unable to create cache directory '{shard_directory}': {ex}")
+
+            shard = _LocalDiskCacheShard(directory=shard_directory, max_size=shard_max_size)
+            self.__rescan(shard)
+            self.__shards.append(shard)
+
+        log.info(f"Using local disk cache in '{directory}' of up to {max_size} bytes")
+
+    def __shard(self, object_id: int) -> _LocalDiskCacheShard:
+        return self.__shards[object_id % len(self.__shards)]
+
+    @staticmethod
+    def __path(shard: _LocalDiskCacheShard, object_id: int) -> str:
+        return os.path.join(shard.directory, str(object_id))
+
+    @staticmethod
+    def __rescan(shard: _LocalDiskCacheShard) -> Dict[str, Tuple[float, int]]:
+        """Recount shard's size from the files on disk; return {path: (mtime, size)} of the cached objects."""
+        files = {}
+        size = 0
+        with os.scandir(shard.directory) as entries:
+            for entry in entries:
+                # Skip temporary files that are still being written
+                if entry.name.startswith('.'):
+                    continue
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                files[entry.path] = (stat.st_mtime, stat.st_size,)
+                size += stat.st_size
+
+        shard.size = size
+        return files
+
+    def __evict(self, shard: _LocalDiskCacheShard) -> None:
+        """Remove least recently used objects from the shard until it fits under the low watermark."""
+        files = self.__rescan(shard)
+        if shard.size <= shard.max_size:
+            return
+
+        target_size = int(shard.max_size * self.__EVICTION_LOW_WATERMARK)
+        evicted_count = 0
+
+        for path, (_, size) in sorted(files.items(), key=lambda item: item[1][0]):
+            if shard.size <= target_size:
+                break
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+            shard.size -= size
+            evicted_count += 1
+
+        log.debug(f"Evicted {evicted_count} objects from '{shard.directory}'")
+
+    def fetch(self, object_id: int) -> Optional[bytes]:
+        path = self.__path(self.__shard(object_id), object_id)
+
+        try:
+            with open(path, mode='rb') as f:
+                content = f.read()
+
+                # Mark as recently used
+                if os.fstat(f.fileno()).st_mtime < time.time() - self.__TOUCH_INTERVAL:
+                    os.utime(f.fileno())
+
+        except FileNotFoundError:
+            return None
+
+        except Exception as ex:
+            log.debug(f"Unable to read object ID {object_id} from local cache: {ex}")
+            return None
+
+        return content
+
+    def store(self, object_id: int, content: bytes) -> None:
+        shard = self.__shard(object_id)
+        path = self.__path(shard, object_id)
+
+        if len(content) > shard.max_size:
+            log.debug(f"Object ID {object_id} is too big for local cache")
+            return
+
+        try:
+            # Write to a temporary file first so that other processes never read a partially written object
+            fd, temp_path = tempfile.mkstemp(dir=shard.directory, prefix='.')
+            try:
+                with os.fdopen(fd, mode='wb') as f:
+                    f.write(content)
+                os.replace(temp_path, path)
+            except Exception as ex:
+                try:
+                    os.unlink(temp_path)
+                except FileNotFoundError:
+                    pass
+                raise ex
+
+            with shard.lock:
+                shard.size += len(content)
+                if shard.size > shard.max_size:
+                    self.__evict(shard)
+
+        except Exception as ex:
+            log.warning(f"Unable to store object ID {object_id} in local cache: {ex}")
+
+    def remove(self, object_id: int) -> None:
+        path = self.__path(self.__shard(object_id), object_id)
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
+        except Exception as ex:
+            raise McLocalCacheException(f"Unable to remove object ID {object_id} from local cache: {ex}")
@@ -1,9 +1,14 @@
-from typing import List, Union
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Iterator, List, Optional, Tuple, Union
 
 from mediawords.db import DatabaseHandler
 from mediawords.key_value_store import KeyValueStore, McKeyValueStoreException
+from mediawords.util.log import create_logger
 from mediawords.util.perl import decode_object_from_bytes_if_needed
 
+log = create_logger(__name__)
+
 
 class McMultipleStoresStoreException(McKeyValueStoreException):
     """Multiple stores exception."""
@@ -16,12 +21,30 @@ class MultipleStoresStore(KeyValueStore):
     __slots__ = [
         '__stores_for_reading',
         '__stores_for_writing',
+        '__hedge_reads_after',
+        '__parallel_writes',
     ]
 
     def __init__(self,
                  stores_for_reading: List[KeyValueStore] = None,
-                 stores_for_writing: List[KeyValueStore] = None):
-        """Constructor."""
+                 stores_for_writing: List[KeyValueStore] = None,
+                 hedge_reads_after: Optional[float] = None,
+                 parallel_writes: bool = False):
+        """Constructor.
+
+        :param stores_for_reading: Stores to read from, in order of preference.
+        :param stores_for_writing: Stores to write to.
+        :param hedge_reads_after: If set, fetch_content() doesn't wait for a store to fail before trying the next one,
+            but starts fetching from the next store too if the previous one hasn't returned within this many seconds,
+            and returns whatever content comes back successfully first.
+        :param parallel_writes: If True, store_content() writes to all stores concurrently.
+
+        Only stores that don't use the database handler (see KeyValueStore.uses_db()) get called from worker threads
+        when hedging reads or writing in parallel; the rest get called from the calling thread one by one. While the
+        calling thread is fetching from a store that uses the database handler, fetches from the stores that come after
+        it get started on a timer, so if the database store is slow to fail, content from the rest of the stores is
+        already on its way.
+        """
 
         if stores_for_reading is None:
             stores_for_reading = []
@@ -31,8 +54,13 @@ class MultipleStoresStore(KeyValueStore):
         if len(stores_for_reading) + len(stores_for_writing) == 0:
             raise McMultipleStoresStoreException("At least one store for reading / writing should be present.")
 
+        if hedge_reads_after is not None and hedge_reads_after < 0:
+            raise McMultipleStoresStoreException("Hedged read delay can't be negative.")
+
         self.__stores_for_reading = stores_for_reading
         self.__stores_for_writing = stores_for_writing
+        self.__hedge_reads_after = hedge_reads_after
+        self.__parallel_writes = parallel_writes
 
     def stores_for_reading(self) -> list:
         """Return list of stores for reading."""
@@ -42,6 +70,9 @@ class MultipleStoresStore(KeyValueStore):
         """Return list of stores for writing."""
         return self.__stores_for_writing
 
+    def uses_db(self) -> bool:
+        return any(store.uses_db() for store in self.__stores_for_reading + self.__stores_for_writing)
+
     def fetch_content(self, db: DatabaseHandler, object_id: int, object_path: str = None) -> bytes:
         """Fetch content from any of the stores that might have it; raise if none of them do."""
 
@@ -54,29 +85,24 @@ class MultipleStoresStore(KeyValueStore):
 
         errors = []
 
-        content = None
-        for store in self.__stores_for_reading:
+        if self.__hedge_reads_after is not None and len(self.__stores_for_reading) > 1:
+            content = self.__fetch_content_hedged(db=db, object_id=object_id, object_path=object_path, errors=errors)
 
-            try:
+        else:
+            content = None
+            for store in self.__stores_for_reading:
 
-                # MC_REWRITE_TO_PYTHON: use named parameters after Python rewrite
-                content = store.fetch_content(db, object_id, object_path)
-                if content is None:
-                    raise McMultipleStoresStoreException("Fetching object ID %d from store %s succeeded, "
-                                                         "but the returned content is undefined." % (
-                                                             object_id, str(store),
-                                                         ))
+                try:
+                    content = self.__fetch_content_from_store(
+                        store=store, db=db, object_id=object_id, object_path=object_path,
+                    )
 
-            except Exception as ex:
-                # Silently skip through errors and die() only if content wasn't found anywhere
-                errors.append("Error fetching object ID %(object_id)d from store %(store)s: %(exception)s" % {
-                    'object_id': object_id,
-                    'store': store,
-                    'exception': str(ex),
-                })
+                except Exception as ex:
+                    # Silently skip through errors and die() only if content wasn't found anywhere
+                    errors.append(self.__fetch_error(store=store, object_id=object_id, exception=ex))
 
-            else:
-                break
+                else:
+                    break
 
         if content is None:
             raise McMultipleStoresStoreException(
@@ -88,6 +114,194 @@ class MultipleStoresStore(KeyValueStore):
 
         return content
 
+    @staticmethod
+    def __fetch_content_from_store(store: KeyValueStore,
+                                   db: DatabaseHandler,
+                                   object_id: int,
+                                   object_path: Optional[str]) -> bytes:
+        """Fetch content from a single store; raise if it's not there."""
+
+        # MC_REWRITE_TO_PYTHON: use named parameters after Python rewrite
+        content = store.fetch_content(db, object_id, object_path)
+        if content is None:
+            raise McMultipleStoresStoreException("Fetching object ID %d from store %s succeeded, "
+                                                 "but the returned content is undefined." % (
+                                                     object_id, str(store),
+                                                 ))
+
+        return content
+
+    @staticmethod
+    def __fetch_error(store: KeyValueStore, object_id: int, exception: Exception) -> str:
+        return "Error fetching object ID %(object_id)d from store %(store)s: %(exception)s" % {
+            'object_id': object_id,
+            'store': store,
+            'exception': str(exception),
+        }
+
+    @staticmethod
+    def __fetch_content_from_store_after(start_fetching: threading.Event,
+                                         delay: float,
+                                         abandoned: threading.Event,
+                                         store: KeyValueStore,
+                                         object_id: int,
+                                         object_path: Optional[str]) -> bytes:
+        """Fetch content from a single store (that doesn't use the database handler) after a delay, or earlier if
+        "start_fetching" gets set; raise if the fetch gets abandoned before it starts or the content is not there."""
+
+        start_fetching.wait(timeout=delay)
+
+        if abandoned.is_set():
+            raise McMultipleStoresStoreException("Fetching object ID %d from store %s got abandoned." % (
+                object_id, str(store),
+            ))
+
+        return MultipleStoresStore.__fetch_content_from_store(
+            store=store, db=None, object_id=object_id, object_path=object_path,
+        )
+
+    def __fetch_content_hedged(self,
+                               db: DatabaseHandler,
+                               object_id: int,
+                               object_path: Optional[str],
+                               errors: List[str]) -> Optional[bytes]:
+        """Fetch content from the first store, starting a fetch from the next store whenever the ones that are being
+        fetched from have either failed or haven't returned within the hedging delay; return the first content that
+        gets fetched successfully, or None (with errors appended to the list) if all stores fail.
+
+        Stores that use the database handler can't be hedged, so they get fetched from in the calling thread (while
+        fetches from the stores before them keep on running in worker threads, and fetches from the stores after them
+        get started in worker threads on a timer)."""
+
+        stores = self.__stores_for_reading
+
+        # Fetches that are still running after we return get abandoned (their results will be ignored); none of them
+        # have been passed the database handler
+        executor = ThreadPoolExecutor(max_workers=len(stores), thread_name_prefix='MultipleStoresStore')
+
+        # Set when we're done so that the fetches that are waiting for their timer don't start at all
+        abandoned = threading.Event()
+        start_fetching_events = []
+
+        try:
+            futures = {}
+            pending = set()
+            next_store_index = 0
+
+            while True:
+
+                timeout = self.__hedge_reads_after
+
+                # Start fetching from the next store: either this is the first one, or the previous ones have
+                # failed or haven't returned within the hedging delay
+                if next_store_index < len(stores):
+                    store = stores[next_store_index]
+                    next_store_index += 1
+
+                    if store.uses_db():
+
+                        # Fetch from the database store will block the calling thread, so start fetching from the
+                        # stores that come after it (up to the next database store) on a timer
+                        start_fetching = threading.Event()
+                        start_fetching_events.append(start_fetching)
+                        delay = 0
+
+                        while next_store_index < len(stores) and not stores[next_store_index].uses_db():
+                            delay += self.__hedge_reads_after
+
+                            timed_store = stores[next_store_index]
+                            next_store_index += 1
+
+                            future = executor.submit(
+                                self.__fetch_content_from_store_after,
+                                start_fetching=start_fetching, delay=delay, abandoned=abandoned,
+                                store=timed_store, object_id=object_id, object_path=object_path,
+                            )
+                            futures[future] = timed_store
+                            pending.add(future)
+
+                        try:
+                            return self.__fetch_content_from_store(
+                                store=store, db=db, object_id=object_id, object_path=object_path,
+                            )
+                        except Exception as ex:
+                            errors.append(self.__fetch_error(store=store, object_id=object_id, exception=ex))
+
+                            # Don't wait for the timer before fetching from the stores that come after it, or don't
+                            # wait at all if there are none
+                            start_fetching.set()
+                            if delay == 0:
+                                timeout = 0
+
+                    else:
+                        future = executor.submit(
+                            self.__fetch_content_from_store,
+                            store=store, db=None, object_id=object_id, object_path=object_path,
+                        )
+                        futures[future] = store
+                        pending.add(future)
+
+                if not pending:
+                    if next_store_index < len(stores):
+                        continue
+                    return None
+
+                # Once all stores have been tried, wait for whichever returns first
+                if next_store_index >= len(stores):
+                    timeout = None
+
+                done, pending = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+
+                # Prefer stores in their order if more than one has finished
+                for future in sorted(done, key=lambda f: stores.index(futures[f])):
+                    try:
+                        return future.result()
+                    except Exception as ex:
+                        errors.append(self.__fetch_error(store=futures[future], object_id=object_id, exception=ex))
+
+        finally:
+            abandoned.set()
+            for start_fetching in start_fetching_events:
+                start_fetching.set()
+
+            executor.shutdown(wait=False)
+
+    def fetch_contents(self, db: DatabaseHandler, object_ids: List[int]) -> Iterator[Tuple[int, bytes]]:
+        """Fetch many objects from the stores, trying the next store only for the objects that the previous ones didn't
+        return."""
+
+        object_ids = self._prepare_object_ids(object_ids)
+
+        if len(self.__stores_for_reading) == 0:
+            raise McMultipleStoresStoreException("List of stores for reading objects is empty.")
+
+        remaining_object_ids = object_ids
+
+        for store in self.__stores_for_reading:
+            if not remaining_object_ids:
+                break
+
+            fetched_object_ids = set()
+
+            try:
+                for object_id, content in store.fetch_contents(db, remaining_object_ids):
+                    fetched_object_ids.add(object_id)
+                    yield object_id, content
+
+            except Exception as ex:
+                # Silently skip through errors and try fetching the rest of the objects from the next store
+                log.warning("Error fetching objects from store %(store)s: %(exception)s" % {
+                    'store': store,
+                    'exception': str(ex),
+                })
+
+            remaining_object_ids = [
+                object_id for object_id in remaining_object_ids if object_id not in fetched_object_ids
+            ]
+
+        if remaining_object_ids:
+            log.warning("All stores failed while fetching %d objects" % len(remaining_object_ids))
+
     def store_content(self,
             db: DatabaseHandler,
             object_id: int,
@@ -103,24 +317,44 @@ class MultipleStoresStore(KeyValueStore):
 
         last_store_path = None
 
-        for store in self.__stores_for_writing:
+        if self.__parallel_writes and len(self.__stores_for_writing) > 1:
+            stores = self.__stores_for_writing
 
-            try:
-                # MC_REWRITE_TO_PYTHON: use named parameters after Python rewrite
-                last_store_path = store.store_content(db, object_id, content)
-                if last_store_path is None:
-                    raise McMultipleStoresStoreException(
-                        "Storing object ID %d to %s succeeded, but the returned path is empty." % (object_id, store,)
-                    )
+            # Future (for stores written to from worker threads), or path / exception (for the rest) for every store
+            results = [None] * len(stores)
 
-            except Exception as ex:
-                raise McMultipleStoresStoreException(
-                    "Error while saving object ID %(object_id)d to store %(store)s: %(exception)s" % {
-                        'object_id': object_id,
-                        'store': str(store),
-                        'exception': str(ex)
-                    }
-                )
+            executor = ThreadPoolExecutor(max_workers=len(stores), thread_name_prefix='MultipleStoresStore')
+            try:
+                for index, store in enumerate(stores):
+                    if not store.uses_db():
+                        results[index] = executor.submit(self.__store_content_to_store, store=store, db=None,
+                                                         object_id=object_id, content=content)
+
+                # Database handler can't be shared with worker threads
+                for index, store in enumerate(stores):
+                    if store.uses_db():
+                        try:
+                            results[index] = self.__store_content_to_store(store=store, db=db, object_id=object_id,
+                                                                           content=content)
+                        except Exception as ex:
+                            results[index] = ex
+
+            finally:
+                # Wait for all writes to finish, even if some of them fail
+                executor.shutdown(wait=True)
+
+            # Report the first failure in stores' order
+            for result in results:
+                if isinstance(result, Future):
+                    result = result.result()
+                if isinstance(result, Exception):
+                    raise result
+                last_store_path = result
+
+        else:
+            for store in self.__stores_for_writing:
+                last_store_path = self.__store_content_to_store(store=store, db=db, object_id=object_id,
+                                                                content=content)
 
         if last_store_path is None:
             raise McMultipleStoresStoreException(
@@ -129,6 +363,29 @@ class MultipleStoresStore(KeyValueStore):
 
         return last_store_path
 
+    @staticmethod
+    def __store_content_to_store(store: KeyValueStore, db: DatabaseHandler, object_id: int, content: bytes) -> str:
+        """Store content to a single store, return its path; raise on failure."""
+
+        try:
+            # MC_REWRITE_TO_PYTHON: use named parameters after Python rewrite
+            path = store.store_content(db, object_id, content)
+            if path is None:
+                raise McMultipleStoresStoreException(
+                    "Storing object ID %d to %s succeeded, but the returned path is empty." % (object_id, store,)
+                )
+
+        except Exception as ex:
+            raise McMultipleStoresStoreException(
+                "Error while saving object ID %(object_id)d to store %(store)s: %(exception)s" % {
+                    'object_id': object_id,
+                    'store': str(store),
+                    'exception': str(ex)
+                }
+            )
+
+        return path
+
     def remove_content(self, db: DatabaseHandler, object_id: int, object_path: str = None) -> None:
         """Remove content from all stores; raise if one of them fails."""
 
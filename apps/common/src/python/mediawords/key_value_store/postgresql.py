@@ -1,4 +1,4 @@
-from typing import Union
+from typing import Iterator, List, Optional, Tuple, Union
 
 from mediawords.db import DatabaseHandler
 from mediawords.key_value_store import KeyValueStore, McKeyValueStoreException
@@ -20,13 +20,23 @@ class PostgreSQLStore(KeyValueStore):
     # Default object compression method
     _DEFAULT_COMPRESSION_METHOD = KeyValueStore.Compression.GZIP
 
+    # How many objects to fetch per query in fetch_contents()
+    __FETCH_CONTENTS_CHUNK_SIZE = 1000
+
     __slots__ = [
         '__table',
         '__compression_method',
+        '__zstd_dictionary',
     ]
 
-    def __init__(self, table: str, compression_method: KeyValueStore.Compression = _DEFAULT_COMPRESSION_METHOD):
-        """Constructor."""
+    def __init__(self,
+                 table: str,
+                 compression_method: KeyValueStore.Compression = _DEFAULT_COMPRESSION_METHOD,
+                 zstd_dictionary: Optional[bytes] = None):
+        """Constructor.
+
+        Zstandard dictionary (if set) gets used to compress objects with ZSTD compression method and to uncompress
+        objects that were compressed with it."""
 
         table = decode_object_from_bytes_if_needed(table)
 
@@ -42,23 +52,10 @@ class PostgreSQLStore(KeyValueStore):
 
         self.__table = table
         self.__compression_method = compression_method
+        self.__zstd_dictionary = zstd_dictionary
 
-    def fetch_content(self, db: DatabaseHandler, object_id: int, object_path: str = None) -> bytes:
-        """Read object from PostgreSQL table."""
-
-        object_id = self._prepare_object_id(object_id)
-
-        sql = "SELECT raw_data "
-        sql += "FROM %s " % self.__table  # interpolated by Python
-        sql += "WHERE object_id = %(object_id)s"  # interpolated by psycopg2
-
-        content = db.query(sql, {'object_id': object_id}).hash()
-
-        if content is None or len(content) == 0:
-            # Clients are expected to do content_exists() before attempting to fetch content that might not exist
-            raise McPostgreSQLStoreException("Object with ID %d was not found." % object_id)
-
-        content = content['raw_data']
+    def __uncompress_content(self, object_id: int, content: Union[bytes, memoryview, list]) -> bytes:
+        """Uncompress raw_data of an object."""
 
         # MC_REWRITE_TO_PYTHON: Perl database handler returns value as array of bytes
         if isinstance(content, list):
@@ -71,7 +68,9 @@ class PostgreSQLStore(KeyValueStore):
             raise McPostgreSQLStoreException("Content is not bytes for object %d." % object_id)
 
         try:
-            content = self._uncompress_data_for_method(data=content, compression_method=self.__compression_method)
+            content = self._uncompress_data_for_method(data=content,
+                                                       compression_method=self.__compression_method,
+                                                       zstd_dictionary=self.__zstd_dictionary)
         except Exception as ex:
             raise McPostgreSQLStoreException("Unable to uncompress data for object ID %d: %s" % (object_id, str(ex),))
 
@@ -82,6 +81,49 @@ class PostgreSQLStore(KeyValueStore):
 
         return content
 
+    def fetch_content(self, db: DatabaseHandler, object_id: int, object_path: str = None) -> bytes:
+        """Read object from PostgreSQL table."""
+
+        object_id = self._prepare_object_id(object_id)
+
+        sql = "SELECT raw_data "
+        sql += "FROM %s " % self.__table  # interpolated by Python
+        sql += "WHERE object_id = %(object_id)s"  # interpolated by psycopg2
+
+        content = db.query(sql, {'object_id': object_id}).hash()
+
+        if content is None or len(content) == 0:
+            # Clients are expected to do content_exists() before attempting to fetch content that might not exist
+            raise McPostgreSQLStoreException("Object with ID %d was not found." % object_id)
+
+        return self.__uncompress_content(object_id=object_id, content=content['raw_data'])
+
+    def fetch_contents(self, db: DatabaseHandler, object_ids: List[int]) -> Iterator[Tuple[int, bytes]]:
+        """Read many objects from PostgreSQL table, a chunk of objects per query."""
+
+        object_ids = self._prepare_object_ids(object_ids)
+
+        sql = "SELECT object_id, raw_data "
+        sql += "FROM %s " % self.__table  # interpolated by Python
+        sql += "WHERE object_id = ANY(%(object_ids)s)"  # interpolated by psycopg2
+
+        for i in range(0, len(object_ids), self.__FETCH_CONTENTS_CHUNK_SIZE):
+            chunk_object_ids = object_ids[i:i + self.__FETCH_CONTENTS_CHUNK_SIZE]
+
+            rows = db.query(sql, {'object_ids': chunk_object_ids}).hashes()
+
+            for row in rows:
+                object_id = row['object_id']
+                try:
+                    content = self.__uncompress_content(object_id=object_id, content=row['raw_data'])
+                except Exception as ex:
+                    log.warning("Unable to fetch object ID %d: %s" % (object_id, str(ex),))
+                else:
+                    yield object_id, content
+
+            if len(rows) < len(chunk_object_ids):
+                log.debug("%d objects were not found" % (len(chunk_object_ids) - len(rows)))
+
     def store_content(self,
             db: DatabaseHandler,
             object_id: int,
@@ -93,7 +135,9 @@ class PostgreSQLStore(KeyValueStore):
         content = self._prepare_content(content)
 
         try:
-            content = self._compress_data_for_method(data=content, compression_method=self.__compression_method)
+            content = self._compress_data_for_method(data=content,
+                                                     compression_method=self.__compression_method,
+                                                     zstd_dictionary=self.__zstd_dictionary)
         except Exception as ex:
             raise McPostgreSQLStoreException("Unable to compress data for object ID %d: %s" % (object_id, str(ex),))
 
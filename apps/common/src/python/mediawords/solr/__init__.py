@@ -13,17 +13,36 @@ More information about Solr integration at docs/solr.markdown.
 import abc
 import copy
 import re
-from typing import Union, List, Dict, Any, Optional
+import threading
+import time
+from typing import Union, List, Dict, Any, Optional, Iterator, Tuple
 
 from mediawords.db import DatabaseHandler
 from mediawords.solr.params import SolrParams
 from mediawords.solr.request import solr_request
+from mediawords.util.config.common import CommonConfig
 from mediawords.util.log import create_logger
 from mediawords.util.parse_json import decode_json
 from mediawords.util.perl import decode_object_from_bytes_if_needed
+from mediawords.util.text import random_string
 
 log = create_logger(__name__)
 
+_STORIES_IDS_PAGE_SIZE = 100_000
+"""How many story IDs to fetch from Solr in a single page when paging through results with a cursor."""
+
+_COLLECTION_MEDIA_IDS_CACHE_TTL = 10 * 60
+"""Max. seconds to keep collection's media IDs cached for even if "media_tags_map" doesn't change."""
+
+_COLLECTION_MEDIA_IDS_CACHE_MAX_COLLECTIONS = 10_000
+"""Max. number of collections to keep media IDs cached for."""
+
+_COLLECTION_MEDIA_IDS_CACHE_VERSION_CHECK_INTERVAL = 5
+"""Min. seconds between reads of "media_tags_map_version", i.e. for how long cached media IDs might be stale.
+
+A change to "media_tags_map" (e.g. a medium getting added to a collection) might not be visible to Solr queries with
+"collections_id:" / "tags_id_media:" clauses for up to this many seconds after it got committed."""
+
 
 class _AbstractSolrException(Exception, metaclass=abc.ABCMeta):
     """Abstract .solr exception."""
@@ -89,15 +108,133 @@ def _uppercase_boolean_operators(query: Union[List[str], str]) -> Union[List[str
     return query
 
 
-def _insert_collection_media_ids(db: DatabaseHandler, q: str) -> str:
+class _CollectionMediaIDsCache(object):
+    """
+    In-process cache of collections' media IDs.
+
+    Cached media IDs get dropped whenever "media_tags_map" changes (as tracked by the "media_tags_map_version" table,
+    which gets read at most once every few seconds) or when they become older than the TTL.
+    """
+
+    __slots__ = [
+        '__lock',
+
+        # "media_tags_map_version" that the cached media IDs were fetched at
+        '__version',
+
+        # Time when "media_tags_map_version" was last read
+        '__version_checked_at',
+
+        # tags_id -> (sorted list of media IDs, time when they were fetched)
+        '__media_ids',
+
+        # Cache metrics
+        '__stats',
+    ]
+
+    def __init__(self):
+        self.__lock = threading.Lock()
+        self.__version = None
+        self.__version_checked_at = 0.0
+        self.__media_ids: Dict[int, Tuple[List[int], float]] = {}
+        self.__stats = {'hits': 0, 'misses': 0, 'invalidations': 0}
+
+    def media_ids(self, db: DatabaseHandler, tags_ids: List[int]) -> List[int]:
+        """Return sorted list of media IDs that belong to any of the given collections."""
+
+        now = time.time()
+
+        with self.__lock:
+            version_is_fresh = now - self.__version_checked_at < _COLLECTION_MEDIA_IDS_CACHE_VERSION_CHECK_INTERVAL
+
+        version = None
+        if not version_is_fresh:
+            version = db.query("SELECT version FROM media_tags_map_version").flat()[0]
+
+        media_ids = set()
+        missing_tags_ids = []
+
+        with self.__lock:
+            if version_is_fresh:
+                version = self.__version
+
+            else:
+                self.__version_checked_at = now
+
+                if version != self.__version:
+                    if self.__version is not None:
+                        self.__stats['invalidations'] += 1
+                    self.__version = version
+                    self.__media_ids = {}
+
+            for tags_id in tags_ids:
+                cached = self.__media_ids.get(tags_id, None)
+                if cached is not None and now - cached[1] < _COLLECTION_MEDIA_IDS_CACHE_TTL:
+                    self.__stats['hits'] += 1
+                    media_ids.update(cached[0])
+                else:
+                    self.__stats['misses'] += 1
+                    missing_tags_ids.append(tags_id)
+
+        if missing_tags_ids:
+
+            fetched_media_ids = {tags_id: [] for tags_id in missing_tags_ids}
+
+            for row in db.query("""
+                SELECT tags_id, media_id
+                FROM media_tags_map
+                WHERE tags_id = ANY(%(tags_ids)s)
+                ORDER BY media_id
+            """, {'tags_ids': missing_tags_ids}).hashes():
+                fetched_media_ids[row['tags_id']].append(row['media_id'])
+
+            with self.__lock:
+
+                # Don't cache media IDs fetched at a version that's not current anymore
+                if version == self.__version:
+                    if len(self.__media_ids) + len(fetched_media_ids) > _COLLECTION_MEDIA_IDS_CACHE_MAX_COLLECTIONS:
+                        self.__media_ids = {}
+
+                    for tags_id, tag_media_ids in fetched_media_ids.items():
+                        self.__media_ids[tags_id] = (tag_media_ids, now,)
+
+            for tag_media_ids in fetched_media_ids.values():
+                media_ids.update(tag_media_ids)
+
+        return sorted(media_ids)
+
+    def stats(self) -> Dict[str, int]:
+        """Return cache metrics."""
+        with self.__lock:
+            stats = self.__stats.copy()
+            stats['collections'] = len(self.__media_ids)
+        return stats
+
+
+_COLLECTION_MEDIA_IDS_CACHE = _CollectionMediaIDsCache()
+
+
+def collection_media_ids_cache_stats() -> Dict[str, int]:
+    """Return hit / miss / invalidation counters of the collection media IDs cache."""
+    return _COLLECTION_MEDIA_IDS_CACHE.stats()
+
+
+_COLLECTION_CLAUSE_REGEX = re.compile(r'(tags_id_media|collections_id):(\d+|\([^)]*\)|\[[^\]]*\])')
+"""Regex matching "tags_id_media:" and "collections_id:" clauses."""
+
+
+def _insert_collection_media_ids(db: DatabaseHandler, q: str, terms_filter: bool = False) -> str:
     """
     Transform any "tags_id_media:" or "collections_id:" clauses into "media_id:" clauses with the "media_ids" that
     corresponds to the given tags.
+
+    If "terms_filter" is True and the query consists of just a single such clause, return a "{!terms f=media_id}"
+    query instead, which is only valid as a whole filter query.
     """
 
     q = decode_object_from_bytes_if_needed(q)
 
-    def get_media_ids_clause(match) -> str:
+    def get_media_ids(match) -> List[int]:
         """Given the argument of "tags_id_media:" or "collections_id:" clause, return the corresponding "media_ids"."""
         arg = match.group(2)
 
@@ -133,25 +270,26 @@ def _insert_collection_media_ids(db: DatabaseHandler, q: str) -> str:
                     f'Unrecognized format of "tags_id_media:" or "collections_id:" clause: {arg}'
                 )
 
-        media_ids = db.query("""
-            SELECT media_id
-            FROM media_tags_map
-            WHERE tags_id IN %(tags_ids)s
-            ORDER BY media_id
-        """, {'tags_ids': tuple(tags_ids)}).flat()
+        media_ids = _COLLECTION_MEDIA_IDS_CACHE.media_ids(db=db, tags_ids=[int(_) for _ in tags_ids])
 
         # Replace empty list with an id that will always return nothing from Solr
         if not media_ids:
             media_ids = [-1]
 
-        media_clause = f"media_id:({' '.join([str(_) for _ in media_ids])})"
+        return media_ids
 
-        return media_clause
+    def get_media_ids_clause(match) -> str:
+        return f"media_id:({' '.join([str(_) for _ in get_media_ids(match)])})"
 
     if not q:
         return q
 
-    q = re.sub(r'(tags_id_media|collections_id):(\d+|\([^)]*\)|\[[^\]]*\])', get_media_ids_clause, q)
+    if terms_filter:
+        match = _COLLECTION_CLAUSE_REGEX.fullmatch(q.strip())
+        if match:
+            return f"{{!terms f=media_id}}{','.join([str(_) for _ in get_media_ids(match)])}"
+
+    q = _COLLECTION_CLAUSE_REGEX.sub(get_media_ids_clause, q)
 
     return q
 
@@ -168,21 +306,8 @@ def _replace_smart_quotes(query: Union[List[str], str]) -> Union[List[str], str]
         return query.replace(u"\u201c", '"').replace(u"\u201d", '"')
 
 
-def query_solr(db: DatabaseHandler, params: SolrParams) -> Dict[str, Any]:
-    """
-    Execute a query on the Solr server using the given parameters. Return a maximum of 1 million sentences.
-
-    The "params" argument is a dictionary of query parameters to Solr, detailed here:
-
-        https://lucene.apache.org/solr/guide/6_6/common-query-parameters.html.
-
-    The query ("params['q']") is transformed: lower case boolean operators are made uppercase to make Solr recognize
-    them as boolean queries.
-
-    Return decoded response in the format described here:
-
-        https://lucene.apache.org/solr/guide/6_6/response-writers.html#ResponseWriters-JSONResponseWriter
-    """
+def _prepare_query_params(db: DatabaseHandler, params: SolrParams) -> SolrParams:
+    """Validate and transform query parameters before passing them to Solr; return a modified copy of parameters."""
     params = decode_object_from_bytes_if_needed(params)
 
     # Avoid editing the dictionary itself
@@ -233,7 +358,14 @@ def query_solr(db: DatabaseHandler, params: SolrParams) -> Dict[str, Any]:
     if params['q']:
         params['q'] = _insert_collection_media_ids(db=db, q=params['q'])
     if params['fq']:
-        params['fq'] = [_insert_collection_media_ids(db=db, q=_) for _ in params['fq']]
+        terms_filter = CommonConfig.solr_collection_terms_filter()
+        params['fq'] = [_insert_collection_media_ids(db=db, q=_, terms_filter=terms_filter) for _ in params['fq']]
+
+    return params
+
+
+def _select(params: SolrParams) -> Dict[str, Any]:
+    """Run a "select" query with parameters prepared by _prepare_query_params(), return decoded response."""
 
     response_json = solr_request(
         path='select',
@@ -253,6 +385,26 @@ def query_solr(db: DatabaseHandler, params: SolrParams) -> Dict[str, Any]:
     return response
 
 
+def query_solr(db: DatabaseHandler, params: SolrParams) -> Dict[str, Any]:
+    """
+    Execute a query on the Solr server using the given parameters. Return a maximum of 1 million sentences.
+
+    The "params" argument is a dictionary of query parameters to Solr, detailed here:
+
+        https://lucene.apache.org/solr/guide/6_6/common-query-parameters.html.
+
+    The query ("params['q']") is transformed: lower case boolean operators are made uppercase to make Solr recognize
+    them as boolean queries.
+
+    Return decoded response in the format described here:
+
+        https://lucene.apache.org/solr/guide/6_6/response-writers.html#ResponseWriters-JSONResponseWriter
+    """
+    params = _prepare_query_params(db=db, params=params)
+
+    return _select(params=params)
+
+
 def _get_intersection_of_lists(lists: List[List[int]]) -> List[int]:
     """Given a list of lists, each of which points to a list of IDs, return an intersection between them."""
     lists = decode_object_from_bytes_if_needed(lists)
@@ -415,6 +567,9 @@ def search_solr_for_stories_ids(db: DatabaseHandler, params: SolrParams) -> List
     Return a list of all of the "stories_ids" that match the Solr query.
 
     Using Solr side grouping on the "stories_id" field.
+
+    Big result sets (with "rows" larger than a single page and no custom "start" or "sort") are fetched from Solr a
+    page at a time; use search_solr_for_stories_ids_batches() to not have to keep all of them in memory.
     """
     params = decode_object_from_bytes_if_needed(params)
 
@@ -425,6 +580,13 @@ def search_solr_for_stories_ids(db: DatabaseHandler, params: SolrParams) -> List
     if stories_ids:
         return stories_ids
 
+    rows = int(params.get('rows', None) or 0)
+    if rows > _STORIES_IDS_PAGE_SIZE and not params.get('start', None) and not params.get('sort', None):
+        stories_ids = []
+        for stories_ids_batch in search_solr_for_stories_ids_batches(db=db, params=params):
+            stories_ids.extend(stories_ids_batch)
+        return stories_ids
+
     params['fl'] = 'stories_id'
 
     response = query_solr(db=db, params=params)
@@ -434,6 +596,98 @@ def search_solr_for_stories_ids(db: DatabaseHandler, params: SolrParams) -> List
     return stories_ids
 
 
+def search_solr_for_stories_ids_batches(db: DatabaseHandler,
+                                        params: SolrParams,
+                                        page_size: int = _STORIES_IDS_PAGE_SIZE) -> Iterator[List[int]]:
+    """
+    Yield lists of "stories_ids" that match the Solr query, one page of results at a time.
+
+    Results are paged through with Solr's "cursorMark", so neither Solr nor the caller has to fit all of the matching
+    story IDs into a single response. Story IDs are returned in ascending order.
+
+    "rows" limits the total number of story IDs to return (all matching stories get returned if it's unset); "start"
+    and "sort" are not supported.
+    """
+    params = decode_object_from_bytes_if_needed(params)
+
+    # Avoid editing the dictionary itself
+    params = copy.deepcopy(params)
+
+    page_size = int(page_size)
+    if page_size < 1:
+        raise McQuerySolrInternalErrorException(f"Page size must be positive, got {page_size}")
+
+    if params.get('start', None) or params.get('sort', None):
+        raise McQuerySolrInternalErrorException("'start' and 'sort' are not supported when paging with a cursor.")
+
+    stories_ids = _get_stories_ids_from_stories_only_params(params)
+    if stories_ids:
+        for i in range(0, len(stories_ids), page_size):
+            yield stories_ids[i:i + page_size]
+        return
+
+    max_rows = params.pop('rows', None)
+    max_rows = int(max_rows) if max_rows is not None else None
+
+    params = _prepare_query_params(db=db, params=params)
+
+    params['fl'] = 'stories_id'
+
+    # Cursors require the sort to include the unique key
+    params['sort'] = 'stories_id asc'
+
+    cursor_mark = '*'
+    returned_count = 0
+
+    while max_rows is None or returned_count < max_rows:
+
+        params['rows'] = page_size if max_rows is None else min(page_size, max_rows - returned_count)
+        params['cursorMark'] = cursor_mark
+
+        response = _select(params=params)
+
+        stories_ids = [_['stories_id'] for _ in response['response']['docs']]
+        if stories_ids:
+            returned_count += len(stories_ids)
+            yield stories_ids
+
+        next_cursor_mark = response.get('nextCursorMark', None)
+        if not next_cursor_mark:
+            raise McQuerySolrInternalErrorException(f"Solr didn't return the next cursor mark for params: {params}")
+
+        # Solr returns the same cursor mark once there are no more results
+        if next_cursor_mark == cursor_mark:
+            break
+
+        cursor_mark = next_cursor_mark
+
+
+def get_temporary_solr_stories_ids_table(db: DatabaseHandler, params: SolrParams) -> str:
+    """
+    Get the name of a temporary table that contains all of the "stories_ids" matching the Solr query as an "id BIGINT"
+    field.
+
+    Story IDs are streamed into the table a page at a time, so they never all have to be kept in memory.
+    """
+    params = decode_object_from_bytes_if_needed(params)
+
+    table_name = '_tmp_solr_ids_%s' % random_string(length=16)
+
+    log.debug("Temporary Solr story IDs table: %s" % table_name)
+
+    db.query("CREATE TEMPORARY TABLE %s (id BIGINT)" % table_name)
+
+    for stories_ids in search_solr_for_stories_ids_batches(db=db, params=params):
+        copier = db.copy_from("COPY %s (id) FROM STDIN" % table_name)
+        for stories_id in stories_ids:
+            copier.put_line("%d\n" % int(stories_id))
+        copier.end()
+
+    db.query("ANALYZE %s" % table_name)
+
+    return table_name
+
+
 def search_solr_for_processed_stories_ids(db: DatabaseHandler,
                                           q: str,
                                           fq: Optional[Union[str, List[str]]],
@@ -3,8 +3,10 @@ Do GET / POST requests to Solr.
 """
 
 import abc
+import os
+import threading
 import time
-from typing import Union, Optional
+from typing import Dict, Tuple, Union, Optional
 from urllib.parse import urlencode
 
 from furl import furl
@@ -18,12 +20,18 @@ from mediawords.util.web.user_agent import UserAgent, Response, Request
 
 log = create_logger(__name__)
 
-__SOLR_STARTUP_TIMEOUT = 2 * 60
+_SOLR_STARTUP_TIMEOUT = 2 * 60
 """Timeout of Solr starting up."""
 
-__QUERY_HTTP_TIMEOUT = 15 * 60
+_QUERY_HTTP_TIMEOUT = 15 * 60
 """Timeout of a single HTTP query."""
 
+_CIRCUIT_BREAKER_MIN_BACKOFF = 5
+"""Seconds to fail requests for right away after Solr was found to be down."""
+
+_CIRCUIT_BREAKER_MAX_BACKOFF = 5 * 60
+"""Max. seconds to fail requests for right away after Solr was repeatedly found to be down."""
+
 
 class _AbstractSolrRequestException(Exception, metaclass=abc.ABCMeta):
     """Abstract .solr.request exception."""
@@ -40,6 +48,11 @@ class McSolrRequestDidNotStartInTimeException(_AbstractSolrRequestConnectionErro
     pass
 
 
+class McSolrRequestSolrIsDownException(_AbstractSolrRequestConnectionErrorException):
+    """Exception thrown when Solr was found to be down recently so the request didn't get attempted."""
+    pass
+
+
 class _AbstractSolrRequestQueryErrorException(_AbstractSolrRequestException):
     """Problems with Solr query."""
     pass
@@ -55,56 +68,198 @@ class McSolrRequestInvalidParamsException(_AbstractSolrRequestQueryErrorExceptio
     pass
 
 
-def __wait_for_solr_to_start(config: Optional[CommonConfig]) -> None:
-    """Wait for Solr to start and collections to become available, if needed."""
+def _solr_is_up(solr_url: str) -> bool:
+    """Make a single attempt to query Solr; return True if it's up and its collections are available."""
 
     # search for an empty or rare term here because searching for *:* sometimes causes a timeout for some reason
-    sample_select_url = f"{config.solr_url()}/mediacloud/select?q=BOGUSQUERYTHATRETURNSNOTHINGNADA&rows=1&wt=json"
+    sample_select_url = f"{solr_url}/mediacloud/select?q=BOGUSQUERYTHATRETURNSNOTHINGNADA&rows=1&wt=json"
 
-    connected = False
+    try:
 
-    for retry in range(0, __SOLR_STARTUP_TIMEOUT + 1):
+        ua = UserAgent()
+        ua.set_timeout(1)
+        response = ua.get(sample_select_url)
 
-        if retry > 0:
-            log.debug(f"Retrying Solr connection ({retry})...")
+        if not response.is_success():
+            raise Exception(f"Unable to connect: {response.status_line()}")
+
+        if not response.decoded_content():
+            raise Exception("Response is empty.")
 
         try:
+            result = decode_json(response.decoded_content())
+        except Exception as ex:
+            raise Exception(f"Unable to decode response: {ex}")
 
-            ua = UserAgent()
-            ua.set_timeout(1)
-            response = ua.get(sample_select_url)
+        if not isinstance(result, dict):
+            raise Exception(f"Result is not a dictionary: {response.decoded_content()}")
 
-            if not response.is_success():
-                raise Exception(f"Unable to connect: {response.status_line()}")
+        if 'response' not in result:
+            raise Exception(f"Response doesn't have 'response' key: {response.decoded_content()}")
 
-            if not response.decoded_content():
-                raise Exception("Response is empty.")
+    except Exception as ex:
 
-            try:
-                result = decode_json(response.decoded_content())
-            except Exception as ex:
-                raise Exception(f"Unable to decode response: {ex}")
+        log.warning(f"Solr is down: {ex}")
+        return False
 
-            if not isinstance(result, dict):
-                raise Exception(f"Result is not a dictionary: {response.decoded_content()}")
+    else:
+        log.debug("Solr is up!")
+        return True
 
-            if 'response' not in result:
-                raise Exception(f"Response doesn't have 'response' key: {response.decoded_content()}")
 
-        except Exception as ex:
+def _wait_for_solr_to_start(solr_url: str) -> None:
+    """Wait for Solr to start and collections to become available."""
 
-            log.warning(f"Solr is down, will retry: {ex}")
+    for retry in range(0, _SOLR_STARTUP_TIMEOUT + 1):
+
+        if retry > 0:
+            log.debug(f"Retrying Solr connection ({retry})...")
             time.sleep(1)
 
+        if _solr_is_up(solr_url=solr_url):
+            return
+
+    raise McSolrRequestDidNotStartInTimeException(
+        f"Solr is still down after {_SOLR_STARTUP_TIMEOUT} retries, giving up"
+    )
+
+
+class _SolrClient(object):
+    """
+    Keep-alive HTTP client for a single Solr server with a cached health state.
+
+    Solr gets probed only before the first request and after a request fails to connect. If Solr doesn't come up in
+    time, the circuit breaker opens: requests fail right away for a backoff period (which doubles with each further
+    failure), after which a single probe decides whether to close it again.
+    """
+
+    __slots__ = [
+        '__solr_url',
+
+        # Thread-local UserAgent (which keeps its connections alive) for every thread
+        '__local',
+
+        '__lock',
+
+        # True if Solr was up during the last probe or request
+        '__healthy',
+
+        # True if Solr has been probed already and it failed to come up in time
+        '__circuit_open',
+
+        # Time until which requests are to fail right away
+        '__circuit_open_until',
+
+        # Current circuit breaker backoff
+        '__backoff',
+    ]
+
+    def __init__(self, solr_url: str):
+        self.__solr_url = solr_url
+        self.__local = threading.local()
+        self.__lock = threading.Lock()
+        self.__healthy = False
+        self.__circuit_open = False
+        self.__circuit_open_until = 0.0
+        self.__backoff = _CIRCUIT_BREAKER_MIN_BACKOFF
+
+    def solr_url(self) -> str:
+        """Return Solr server URL."""
+        return self.__solr_url
+
+    def __user_agent(self) -> UserAgent:
+        ua = getattr(self.__local, 'ua', None)
+        if ua is None:
+            ua = UserAgent()
+            ua.set_timeout(_QUERY_HTTP_TIMEOUT)
+            ua.set_max_size(None)
+            self.__local.ua = ua
+        return ua
+
+    def __open_circuit(self) -> None:
+        with self.__lock:
+            if self.__circuit_open:
+                self.__backoff = min(self.__backoff * 2, _CIRCUIT_BREAKER_MAX_BACKOFF)
+            self.__healthy = False
+            self.__circuit_open = True
+            self.__circuit_open_until = time.time() + self.__backoff
+
+    def __mark_healthy(self) -> None:
+        with self.__lock:
+            self.__healthy = True
+            self.__circuit_open = False
+            self.__backoff = _CIRCUIT_BREAKER_MIN_BACKOFF
+
+    def __mark_unhealthy(self) -> None:
+        with self.__lock:
+            self.__healthy = False
+
+    def __ensure_solr_is_up(self) -> None:
+        """Probe Solr if its health state isn't known to be good, raise if it's down."""
+
+        with self.__lock:
+            healthy = self.__healthy
+            circuit_open = self.__circuit_open
+            circuit_open_until = self.__circuit_open_until
+
+        if healthy:
+            return
+
+        if circuit_open:
+
+            if time.time() < circuit_open_until:
+                raise McSolrRequestSolrIsDownException(
+                    f"Solr was down recently, not retrying until {circuit_open_until - time.time():.0f} seconds pass"
+                )
+
+            # Backoff is over so give Solr a single chance
+            if not _solr_is_up(solr_url=self.__solr_url):
+                self.__open_circuit()
+                raise McSolrRequestSolrIsDownException("Solr is still down")
+
         else:
-            log.debug("Solr is up!")
-            connected = True
-            break
 
-    if not connected:
-        raise McSolrRequestDidNotStartInTimeException(
-            f"Solr is still down after {__SOLR_STARTUP_TIMEOUT} retries, giving up"
-        )
+            # Solr might still be starting up so wait for it to expose the collections list
+            try:
+                _wait_for_solr_to_start(solr_url=self.__solr_url)
+            except McSolrRequestDidNotStartInTimeException:
+                self.__open_circuit()
+                raise
+
+        self.__mark_healthy()
+
+    def request(self, request: Request) -> Response:
+        """Execute request against Solr (probing it first if needed), return response."""
+
+        self.__ensure_solr_is_up()
+
+        response = self.__user_agent().request(request)
+
+        # Probe Solr before the next request if this one failed to connect
+        if response.error_is_client_side():
+            self.__mark_unhealthy()
+
+        return response
+
+
+# Solr clients by PID and Solr URL
+_SOLR_CLIENTS: Dict[Tuple[int, str], _SolrClient] = {}
+_SOLR_CLIENTS_LOCK = threading.Lock()
+
+
+def _solr_client(solr_url: str) -> _SolrClient:
+    """Return shared Solr client for the given URL, creating it if needed."""
+
+    # Forked children must not share their parent's connections
+    key = (os.getpid(), solr_url,)
+
+    with _SOLR_CLIENTS_LOCK:
+        client = _SOLR_CLIENTS.get(key, None)
+        if client is None:
+            client = _SolrClient(solr_url=solr_url)
+            _SOLR_CLIENTS[key] = client
+
+    return client
 
 
 def __solr_error_message_from_response(response: Response) -> str:
@@ -195,18 +350,11 @@ def solr_request(path: str,
     abs_uri = abs_uri.set(params)
     abs_url = str(abs_uri)
 
-    ua = UserAgent()
-    ua.set_timeout(__QUERY_HTTP_TIMEOUT)
-    ua.set_max_size(None)
-
     # Remediate CVE-2017-12629
     q_param = str(params.get('q', ''))
     if 'xmlparser' in q_param.lower():
         raise McSolrRequestQueryErrorException("XML queries are not supported.")
 
-    # Solr might still be starting up so wait for it to expose the collections list
-    __wait_for_solr_to_start(config=config)
-
     if content:
 
         if not content_type:
@@ -230,7 +378,7 @@ def solr_request(path: str,
 
     log.debug(f"Sending Solr request: {request}")
 
-    response = ua.request(request)
+    response = _solr_client(solr_url=solr_url).request(request)
 
     if not response.is_success():
         error_message = __solr_error_message_from_response(response=response)
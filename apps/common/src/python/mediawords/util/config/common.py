@@ -61,6 +61,17 @@ class DatabaseConfig(object):
         """connect_to_db() retries configuration."""
         return ConnectRetriesConfig()
 
+    @staticmethod
+    def pool_size() -> int:
+        """Max. number of idle connections to keep in a process-wide connection pool (0 disables pooling)."""
+        value = env_value('MC_DATABASE_POOL_SIZE', required=False, allow_empty_string=True)
+        if not value:
+            return 0
+        value = int(value)
+        if value < 0:
+            raise McConfigException("MC_DATABASE_POOL_SIZE must be zero or positive.")
+        return value
+
 
 class AmazonS3DownloadsConfig(object):
     """Amazon S3 raw download storage configuration."""
@@ -197,6 +208,62 @@ class DownloadStorageConfig(object):
             value = 0
         return bool(int(value))
 
+    @staticmethod
+    def hedge_reads_after_ms() -> Optional[int]:
+        """If set, start fetching a PostgreSQL download from Amazon S3 too if PostgreSQL hasn't returned it within this
+        many milliseconds (used only if PostgreSQL downloads fall back to Amazon S3)."""
+        value = env_value('MC_DOWNLOADS_HEDGE_READS_AFTER_MS', required=False, allow_empty_string=True)
+        if not value:
+            return None
+        return int(value)
+
+    @staticmethod
+    def parallel_writes() -> bool:
+        """Whether to write downloads to all storage locations concurrently."""
+        value = env_value('MC_DOWNLOADS_PARALLEL_WRITES', required=False, allow_empty_string=True)
+        if not value:
+            value = 0
+        return bool(int(value))
+
+    @staticmethod
+    def local_cache_directory() -> Optional[str]:
+        """Directory for local disk cache of Amazon S3 downloads (if any).
+
+        Local disk cache gets used in front of the PostgreSQL cache if local Amazon S3 download cache is enabled."""
+        value = env_value('MC_DOWNLOADS_LOCAL_CACHE_DIRECTORY', required=False, allow_empty_string=True)
+        if not value:
+            value = None
+        return value
+
+    @staticmethod
+    def local_cache_size_mb() -> int:
+        """Max. size of local disk cache of Amazon S3 downloads, in megabytes."""
+        value = env_value('MC_DOWNLOADS_LOCAL_CACHE_SIZE_MB', required=False, allow_empty_string=True)
+        if not value:
+            value = 1024
+        return int(value)
+
+    @staticmethod
+    def compression_method() -> str:
+        """Compression method to use for newly stored downloads ("gzip", "bzip2", "zstd" or "none").
+
+        Downloads stored previously with any other compression method remain readable."""
+        value = env_value('MC_DOWNLOADS_COMPRESSION', required=False, allow_empty_string=True)
+        if not value:
+            value = 'gzip'
+        value = value.strip().lower()
+        if value not in {'gzip', 'bzip2', 'zstd', 'none'}:
+            raise McConfigException(f"Unsupported download compression method: {value}")
+        return value
+
+    @staticmethod
+    def zstd_dictionary_path() -> Optional[str]:
+        """Path to Zstandard dictionary to compress and uncompress downloads with (if any)."""
+        value = env_value('MC_DOWNLOADS_ZSTD_DICTIONARY_PATH', required=False, allow_empty_string=True)
+        if not value:
+            value = None
+        return value
+
 
 class AuthenticatedDomain(object):
     """Single authenticated domain."""
@@ -383,6 +450,14 @@ class CommonConfig(object):
 
         return url
 
+    @staticmethod
+    def solr_collection_terms_filter() -> bool:
+        """Whether to pass filter queries on a single collection to Solr as "{!terms f=media_id}" filters."""
+        value = env_value('MC_SOLR_COLLECTION_TERMS_FILTER', required=False, allow_empty_string=True)
+        if not value:
+            value = 0
+        return bool(int(value))
+
     @staticmethod
     def extractor_api_url() -> str:
         """URL of the extractor API."""
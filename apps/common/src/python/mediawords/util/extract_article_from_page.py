@@ -1,4 +1,5 @@
-from typing import Dict, Optional
+import threading
+from typing import Dict, List, Optional
 
 from furl import furl
 
@@ -8,7 +9,7 @@ from mediawords.util.network import wait_for_tcp_port_to_open
 from mediawords.util.parse_json import encode_json, decode_json
 from mediawords.util.perl import decode_object_from_bytes_if_needed
 from mediawords.util.process import fatal_error
-from mediawords.util.web.user_agent import Request, UserAgent
+from mediawords.util.web.user_agent import Request, Response, UserAgent
 
 log = create_logger(__name__)
 
@@ -21,12 +22,255 @@ EXTRACT_TIMEOUT = 60
 EXTRACT_RETRIES = 3
 """How many times to attempt extracting the same story."""
 
+EXTRACT_BATCH_SIZE = 20
+"""Max. number of pages to send to the extraction service in a single batch request."""
+
+EXTRACT_BATCH_MAX_LENGTH = 16 * 1024 * 1024
+"""Max. total length of pages to send to the extraction service in a single batch request."""
+
 
 class McExtractArticleFromPageException(Exception):
     """extract_article_html_from_page_html() exception."""
     pass
 
 
+class ExtractorClient(object):
+    """Long-lived extraction service client which reuses its HTTP connections between requests."""
+
+    __slots__ = [
+        '__api_url',
+        '__batch_api_url',
+
+        # User agents with persistent (keep-alive) sessions for single page and batch requests; timeouts differ, and
+        # they're set once here because the client might be shared between threads
+        '__ua',
+        '__batch_ua',
+
+        # Whether we've already waited for the service to come up
+        '__service_is_up',
+
+        # Whether the service supports batch requests (older versions don't)
+        '__batch_is_supported',
+    ]
+
+    def __init__(self, config: Optional[CommonConfig] = None):
+        """
+        Constructor.
+
+        :param config: Optional CommonConfig object, useful for testing.
+        """
+        if not config:
+            config = CommonConfig()
+
+        self.__api_url = config.extractor_api_url()
+        self.__batch_api_url = str(furl(self.__api_url).add(path='batch'))
+
+        self.__ua = UserAgent()
+        self.__ua.set_max_size(EXTRACT_BATCH_MAX_LENGTH * 2)
+
+        # Wait up to a minute for extraction to finish
+        self.__ua.set_timeout(EXTRACT_TIMEOUT)
+
+        self.__batch_ua = UserAgent()
+        self.__batch_ua.set_max_size(EXTRACT_BATCH_MAX_LENGTH * 2)
+        self.__batch_ua.set_timeout(EXTRACT_TIMEOUT * EXTRACT_BATCH_SIZE)
+
+        self.__service_is_up = False
+        self.__batch_is_supported = True
+
+    def __wait_for_service(self) -> None:
+        """Wait for the extractor's HTTP port to become open as the service might be still starting up somewhere."""
+
+        if self.__service_is_up:
+            return
+
+        api_uri = furl(self.__api_url)
+        api_url_hostname = str(api_uri.host)
+        api_url_port = int(api_uri.port)
+        assert api_url_hostname, f"API URL hostname is not set for URL {self.__api_url}"
+        assert api_url_port, f"API URL port is not set for URL {self.__api_url}"
+
+        if not wait_for_tcp_port_to_open(
+                port=api_url_port,
+                hostname=api_url_hostname,
+                retries=EXTRACTOR_SERVICE_TIMEOUT,
+        ):
+            # Instead of throwing an exception, just crash the whole application
+            # because there's no point in continuing on running it whatsoever:
+            #
+            # 1) If the extractor service didn't come up in a given time, it won't
+            #    suddenly show up
+            # 2) If it's a test that's doing the extraction, it can't do its job
+            #    and should fail one way or another; exit(1) is just one of the
+            #    ways how it can fail
+            # 3) If it's some production code that needs something to get
+            #    extracted, and if we were to throw an exception instead of doing
+            #    exit(1), the caller might treat this exception as a failure to
+            #    extract this one specific input HTML file, and so it might
+            #    mis-extract a bunch of stories that way (making it hard for us to
+            #    spot the problem and time-consuming to fix it later (e.g. there
+            #    would be a need to manually re-extract a million of stories))
+            #
+            # A better solution instead of exit(1) might be to throw different
+            # kinds of exceptions and handle them appropriately in the caller, but
+            # with the Perl-Python codebase that's a bit hard to do.
+            fatal_error(
+                "Extractor service at {url} didn't come up in {timeout} seconds, exiting...".format(
+                    url=self.__api_url,
+                    timeout=EXTRACTOR_SERVICE_TIMEOUT,
+                )
+            )
+
+        self.__service_is_up = True
+
+    def __post(self, ua: UserAgent, url: str, request_json: str) -> Response:
+        """POST JSON to the service, retrying a couple of times; return the last response."""
+
+        self.__wait_for_service()
+
+        http_request = Request(method='POST', url=url)
+        http_request.set_content_type('application/json; charset=utf-8')
+        http_request.set_content(request_json)
+
+        # Try extracting multiple times
+        #
+        # UserAgent's set_timing() would only retry on retryable HTTP status codes and doesn't retry on connection
+        # errors by default as such retries might have side effects, e.g. an API getting called multiple times. So, we
+        # retry extracting the content a couple of times manually.
+        http_response = None
+        for retry in range(EXTRACT_RETRIES):
+
+            if retry > 0:
+                log.warning(f"Retrying #{retry + 1}...")
+
+            http_response = ua.request(http_request)
+            if http_response.is_success():
+                break
+
+            # Don't retry requests that the service doesn't know how to handle
+            if http_response.code() in {404, 405}:
+                break
+
+            log.error(f"Extraction attempt {retry + 1} failed: {http_response.decoded_content()}")
+
+        return http_response
+
+    def extract(self, content: str) -> Dict[str, str]:
+        """
+        Using full page HTML as a parameter, extract part of HTML that contains the news article.
+        :param content: Full page HTML.
+        :return: Dictionary with HTML that contains the news article content ("extracted_html" key) and extractor
+                 version tag ("extractor_version" key).
+        """
+        content = decode_object_from_bytes_if_needed(content)
+
+        http_response = self.__post(
+            ua=self.__ua,
+            url=self.__api_url,
+            request_json=encode_json({'html': content}),
+        )
+
+        if not http_response.is_success():
+            raise McExtractArticleFromPageException(
+                f"Extraction of {len(content)} characters; failed; last error: {http_response.decoded_content()}"
+            )
+
+        response_json = http_response.decoded_content()
+        response = decode_json(response_json)
+
+        assert 'extracted_html' in response, "Response is expected to have 'extracted_html' key."
+        assert 'extractor_version' in response, "Response is expected to have 'extractor_version' key."
+
+        return response
+
+    def __extract_batch(self, contents: List[str]) -> List[Dict[str, str]]:
+        """Extract a single batch of pages with a single request."""
+
+        if self.__batch_is_supported and len(contents) > 1:
+
+            http_response = self.__post(
+                ua=self.__batch_ua,
+                url=self.__batch_api_url,
+                request_json=encode_json({'htmls': contents}),
+            )
+
+            if http_response.is_success():
+                response = decode_json(http_response.decoded_content())
+
+                assert 'results' in response, "Response is expected to have 'results' key."
+                assert len(response['results']) == len(contents), "Response should have a result for every page."
+
+                assert 'extractor_version' in response, "Response is expected to have 'extractor_version' key."
+
+                results = []
+                for content, result in zip(contents, response['results']):
+                    if 'error' in result:
+                        # Retry (and fail properly) with a single page request
+                        log.warning(f"Batch extraction of {len(content)} characters failed: {result['error']}")
+                        result = self.extract(content)
+                    else:
+                        assert 'extracted_html' in result, "Result is expected to have 'extracted_html' key."
+                        result['extractor_version'] = response['extractor_version']
+                    results.append(result)
+
+                return results
+
+            if http_response.code() in {404, 405}:
+                log.warning("Extraction service doesn't support batch requests, extracting pages one by one")
+                self.__batch_is_supported = False
+
+            else:
+                log.error(f"Batch extraction failed, extracting pages one by one: {http_response.decoded_content()}")
+
+        return [self.extract(content) for content in contents]
+
+    def extract_batch(self, contents: List[str]) -> List[Dict[str, str]]:
+        """
+        Extract news article HTML from multiple full page HTMLs, sending them to the service in batches.
+        :param contents: List of full page HTMLs.
+        :return: List of extract() results in the same order as the input pages.
+        """
+        contents = decode_object_from_bytes_if_needed(contents)
+
+        results = []
+
+        batch = []
+        batch_length = 0
+
+        for content in contents:
+            if batch and (len(batch) >= EXTRACT_BATCH_SIZE or batch_length + len(content) > EXTRACT_BATCH_MAX_LENGTH):
+                results.extend(self.__extract_batch(batch))
+                batch = []
+                batch_length = 0
+
+            batch.append(content)
+            batch_length += len(content)
+
+        if batch:
+            results.extend(self.__extract_batch(batch))
+
+        return results
+
+
+# Process-wide client for the default configuration
+_CLIENT = None
+_CLIENT_LOCK = threading.Lock()
+
+
+def extractor_client(config: Optional[CommonConfig] = None) -> ExtractorClient:
+    """Return process-wide extractor client, or a new one if a custom configuration is passed."""
+    global _CLIENT
+
+    if config:
+        return ExtractorClient(config=config)
+
+    with _CLIENT_LOCK:
+        if _CLIENT is None:
+            _CLIENT = ExtractorClient()
+
+    return _CLIENT
+
+
 def extract_article_html_from_page_html(content: str, config: Optional[CommonConfig] = None) -> Dict[str, str]:
     """
     Using full page HTML as a parameter, extract part of HTML that contains the news article.
@@ -35,89 +279,15 @@ def extract_article_html_from_page_html(content: str, config: Optional[CommonCon
     :return: Dictionary with HTML that contains the news article content ("extracted_html" key) and extractor version
              tag ("extractor_version" key).
     """
-    content = decode_object_from_bytes_if_needed(content)
-
-    if not config:
-        config = CommonConfig()
-
-    ua = UserAgent()
-    api_url = config.extractor_api_url()
-
-    # Wait up to a minute for extraction to finish
-    ua.set_timeout(EXTRACT_TIMEOUT)
-
-    # Wait for the extractor's HTTP port to become open as the service might be still starting up somewhere
-    api_uri = furl(api_url)
-    api_url_hostname = str(api_uri.host)
-    api_url_port = int(api_uri.port)
-    assert api_url_hostname, f"API URL hostname is not set for URL {api_url}"
-    assert api_url_port, f"API URL port is not set for URL {api_url}"
-
-    if not wait_for_tcp_port_to_open(
-            port=api_url_port,
-            hostname=api_url_hostname,
-            retries=EXTRACTOR_SERVICE_TIMEOUT,
-    ):
-        # Instead of throwing an exception, just crash the whole application
-        # because there's no point in continuing on running it whatsoever:
-        #
-        # 1) If the extractor service didn't come up in a given time, it won't
-        #    suddenly show up
-        # 2) If it's a test that's doing the extraction, it can't do its job
-        #    and should fail one way or another; exit(1) is just one of the
-        #    ways how it can fail
-        # 3) If it's some production code that needs something to get
-        #    extracted, and if we were to throw an exception instead of doing
-        #    exit(1), the caller might treat this exception as a failure to
-        #    extract this one specific input HTML file, and so it might
-        #    mis-extract a bunch of stories that way (making it hard for us to
-        #    spot the problem and time-consuming to fix it later (e.g. there
-        #    would be a need to manually re-extract a million of stories))
-        #
-        # A better solution instead of exit(1) might be to throw different
-        # kinds of exceptions and handle them appropriately in the caller, but
-        # with the Perl-Python codebase that's a bit hard to do.
-        fatal_error(
-            "Extractor service at {url} didn't come up in {timeout} seconds, exiting...".format(
-                url=api_url,
-                timeout=EXTRACTOR_SERVICE_TIMEOUT,
-            )
-        )
-
-    request_json = encode_json({'html': content})
-
-    http_request = Request(method='POST', url=api_url)
-    http_request.set_content_type('application/json; charset=utf-8')
-    http_request.set_content(request_json)
-
-    # Try extracting multiple times
-    #
-    # UserAgent's set_timing() would only retry on retryable HTTP status codes and doesn't retry on connection errors by
-    # default as such retries might have side effects, e.g. an API getting called multiple times. So, we retry
-    # extracting the content a couple of times manually.
-    http_response = None
-    extraction_succeeded = False
-    for retry in range(EXTRACT_RETRIES):
-
-        if retry > 0:
-            log.warning(f"Retrying #{retry + 1}...")
-
-        http_response = ua.request(http_request)
-        if http_response.is_success():
-            extraction_succeeded = True
-            break
-        else:
-            log.error(f"Extraction attempt {retry + 1} failed: {http_response.decoded_content()}")
-
-    if not extraction_succeeded:
-        raise McExtractArticleFromPageException(
-            f"Extraction of {len(content)} characters; failed; last error: {http_response.decoded_content()}"
-        )
+    return extractor_client(config=config).extract(content)
 
-    response_json = http_response.decoded_content()
-    response = decode_json(response_json)
 
-    assert 'extracted_html' in response, "Response is expected to have 'extracted_html' key."
-    assert 'extractor_version' in response, "Response is expected to have 'extractor_version' key."
-
-    return response
+def extract_articles_html_from_pages_html(contents: List[str],
+                                          config: Optional[CommonConfig] = None) -> List[Dict[str, str]]:
+    """
+    Using a list of full page HTMLs as a parameter, extract parts of HTML that contain the news articles.
+    :param contents: List of full page HTMLs.
+    :param config: Optional CommonConfig object, useful for testing.
+    :return: List of extract_article_html_from_page_html() results in the same order as the input pages.
+    """
+    return extractor_client(config=config).extract_batch(contents)
@@ -0,0 +1,8 @@
+from mediawords.db.copy.copy_from import copy_escape
+
+
+def test_copy_escape():
+    assert copy_escape(None) == r'\N'
+    assert copy_escape(42) == '42'
+    assert copy_escape('foo') == 'foo'
+    assert copy_escape('a\tb\nc\rd\\e') == r'a\tb\nc\rd\\e'
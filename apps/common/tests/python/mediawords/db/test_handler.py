@@ -1,3 +1,4 @@
+import datetime
 import re
 from unittest import TestCase
 
@@ -6,7 +7,12 @@ import pytest
 from mediawords.db import connect_to_db
 from mediawords.db.exceptions.handler import McPrimaryKeyColumnException
 from mediawords.db.exceptions.result import McDatabaseResultException
-from mediawords.db.handler import McRequireByIDException, McUniqueConstraintException
+from mediawords.db.handler import (
+    McRequireByIDException,
+    McUniqueConstraintException,
+    _positional_placeholder_query,
+)
+from mediawords.db.result.result import query_rewrite_cache_stats
 from mediawords.util.log import create_logger
 
 log = create_logger(__name__)
@@ -328,6 +334,103 @@ class TestDatabaseHandler(TestCase):
         assert isinstance(hashes[0]['dob'], str)
         assert isinstance(hashes[1]['dob'], str)
 
+    def test_query_stream(self):
+        result = self.__db.query_stream(
+            "SELECT * FROM kardashians WHERE surname = ? ORDER BY id", 'Jenner', batch_size=2,
+        )
+        batches = list(result.iter_hash_batches())
+        assert [len(batch) for batch in batches] == [2, 2]
+        assert [row['name'] for batch in batches for row in batch] == ['Kris', 'Caitlyn', 'Kendall', 'Kylie']
+        assert isinstance(batches[0][0]['dob'], str)
+
+        with self.__db.query_stream("SELECT dob FROM kardashians ORDER BY id", batch_size=3) as result:
+            dobs = list(result.iter_flat(stringify_datetimes=False))
+        assert len(dobs) == 8
+        assert isinstance(dobs[0], datetime.date)
+
+        # Stream starts its own transaction and commits it (together with writes made while iterating) once done
+        assert self.__db.in_transaction() is False
+        names = []
+        with self.__db.query_stream("SELECT name FROM kardashians ORDER BY id", batch_size=1) as result:
+            for row in result.iter_hashes():
+                assert self.__db.in_transaction() is True
+                self.__db.query("UPDATE kardashians SET married_to_kanye = 'f' WHERE name = %(name)s", row)
+                names.append(row['name'])
+        assert len(names) == 8
+        assert self.__db.in_transaction() is False
+        (married_count,) = self.__db.query("SELECT COUNT(*) FROM kardashians WHERE married_to_kanye").flat()
+        assert married_count == 0
+
+        # Stream within the caller's transaction leaves the transaction open
+        self.__db.begin()
+        result = self.__db.query_stream("SELECT name FROM kardashians ORDER BY id", batch_size=3)
+        assert result.hash()['name'] == 'Kris'
+        assert len(result.hashes()) == 7
+        result.close()
+        assert self.__db.in_transaction() is True
+        self.__db.rollback()
+
+        # Stopping early and closing the result should close the cursor
+        result = self.__db.query_stream("SELECT * FROM kardashians ORDER BY id", batch_size=1)
+        assert next(result.iter_hashes())['name'] == 'Kris'
+        result.close()
+
+        (cursor_count,) = self.__db.query("SELECT COUNT(*) FROM pg_cursors").flat()
+        assert cursor_count == 0
+
+        with pytest.raises(McDatabaseResultException):
+            self.__db.query_stream("SELECT * FROM nonexistent_table")
+        assert self.__db.in_transaction() is False
+
+    def test_query_prepared(self):
+        stats_before = self.__db.prepared_statement_stats()
+
+        for name in ['Kris', 'Kim', 'Kylie']:
+            row = self.__db.query_prepared("""
+                SELECT *
+                FROM kardashians
+                WHERE (name = %(name)s OR surname = %(name)s)
+                  AND dob > %(dob)s
+                  AND surname LIKE 'K%'
+            """, {'name': name, 'dob': '1900-01-01'}).hash()
+            if name == 'Kris':
+                # Not a Kardashian
+                assert row is None
+            else:
+                assert row['name'] == name
+                assert isinstance(row['dob'], str)
+
+        # Tuple and DBD::Pg-style parameters
+        assert self.__db.query_prepared("SELECT name FROM kardashians WHERE id = %s", (2,)).flat() == ['Caitlyn']
+        assert self.__db.query_prepared("SELECT name FROM kardashians WHERE id = ?", 3).flat() == ['Kourtney']
+
+        # Arrays
+        names = self.__db.query_prepared(
+            "SELECT name FROM kardashians WHERE id = ANY(%(ids)s) ORDER BY id", {'ids': [1, 8]}
+        ).flat()
+        assert names == ['Kris', 'Kylie']
+
+        # No parameters
+        assert self.__db.query_prepared("SELECT COUNT(*) FROM kardashians").flat() == [8]
+
+        stats_after = self.__db.prepared_statement_stats()
+        assert stats_after['misses'] - stats_before['misses'] == 4
+        # 2 for the repeated names, 1 for the '?' query which gets converted to the same query as the '%s' one
+        assert stats_after['hits'] - stats_before['hits'] == 3
+
+        with pytest.raises(McDatabaseResultException):
+            self.__db.query_prepared("SELECT * FROM nonexistent_table WHERE id = %(id)s", {'id': 1})
+
+    def test_query_rewrite_cache(self):
+        query = "SELECT name FROM kardashians WHERE surname LIKE 'Kar%' AND id = %(id)s"
+
+        stats_before = query_rewrite_cache_stats()
+        assert self.__db.query(query, {'id': 3}).flat() == ['Kourtney']
+        assert self.__db.query(query, {'id': 4}).flat() == ['Kim']
+        stats_after = query_rewrite_cache_stats()
+
+        assert stats_after['hits'] - stats_before['hits'] >= 1
+
     def test_primary_key_column(self):
         primary_key = self.__db.primary_key_column('kardashians')
         assert primary_key == 'id'
@@ -857,3 +960,21 @@ class TestDatabaseHandler(TestCase):
                 ]
             }
         ]
+
+
+def test_positional_placeholder_query():
+    assert _positional_placeholder_query(
+        "SELECT * FROM t WHERE a = %(a)s AND b = %(b)s AND c = %(a)s"
+    ) == ("SELECT * FROM t WHERE a = $1 AND b = $2 AND c = $1", ['a', 'b'])
+
+    assert _positional_placeholder_query(
+        "SELECT * FROM t WHERE a = %s AND b = %s"
+    ) == ("SELECT * FROM t WHERE a = $1 AND b = $2", [None, None])
+
+    # Placeholder lookalikes in string literals and quoted identifiers are left alone
+    assert _positional_placeholder_query(
+        """SELECT "col%s" FROM t WHERE a LIKE '%s%' AND b = 'it''s %(b)s' AND c = E'\\'%s' AND d = %(d)s"""
+    ) == (
+        """SELECT "col%s" FROM t WHERE a LIKE '%s%' AND b = 'it''s %(b)s' AND c = E'\\'%s' AND d = $1""",
+        ['d'],
+    )
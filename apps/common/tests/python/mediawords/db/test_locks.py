@@ -1,7 +1,15 @@
 """Test mediawords.db.locks"""
 
+import pytest
+
 from mediawords.db import connect_to_db
-from mediawords.db.locks import get_session_lock, release_session_lock, list_session_locks
+from mediawords.db.locks import (
+    get_session_lock,
+    release_session_lock,
+    list_session_locks,
+    get_transaction_lock,
+    McDBLocksException,
+)
 
 
 def test_locks() -> None:
@@ -28,3 +36,23 @@ def test_locks() -> None:
     release_session_lock(db1, 'test-a', 1)
     assert get_session_lock(db2, 'test-a', 1)
     assert list_session_locks(db2, 'test-a') == [1]
+
+
+def test_transaction_locks() -> None:
+    """Test get_transaction_lock."""
+    db1 = connect_to_db()
+    db2 = connect_to_db()
+
+    with pytest.raises(McDBLocksException):
+        get_transaction_lock(db1, 'test-a', 1)
+
+    db1.begin()
+    get_transaction_lock(db1, 'test-a', 1)
+    assert list_session_locks(db1, 'test-a') == [1]
+    assert not get_session_lock(db2, 'test-a', 1, wait=False)
+    db1.commit()
+
+    # Released at the end of the transaction
+    assert list_session_locks(db1, 'test-a') == []
+    assert get_session_lock(db2, 'test-a', 1, wait=False)
+    release_session_lock(db2, 'test-a', 1)
@@ -0,0 +1,92 @@
+"""Test mediawords.db.pool"""
+
+from mediawords.db import connect_to_db
+from mediawords.db.locks import get_session_lock
+from mediawords.db.pool import DatabaseConnectionPool
+
+
+def test_pool_reuse() -> None:
+    """Test that disconnected handlers get reused."""
+    pool = DatabaseConnectionPool(max_idle_handlers=1)
+
+    db1 = pool.acquire(connect=connect_to_db)
+    db2 = pool.acquire(connect=connect_to_db)
+    assert db1 != db2
+
+    stats = pool.stats()
+    assert stats['connects'] == 2
+    assert stats['in_use'] == 2
+
+    db1.disconnect()
+    assert db1.is_connected()
+
+    # Pool is full so the second handler gets closed
+    db2.disconnect()
+    assert not db2.is_connected()
+
+    db3 = pool.acquire(connect=connect_to_db)
+    assert db3 == db1
+    assert db3.ping()
+
+    stats = pool.stats()
+    assert stats['reuses'] == 1
+    assert stats['releases'] == 2
+    assert stats['closes'] == 1
+    assert stats['idle'] == 0
+    assert stats['in_use'] == 1
+
+    # Disconnecting twice shouldn't put the same handler into the pool twice
+    db3.disconnect()
+    db3.disconnect()
+    assert pool.stats()['idle'] == 1
+
+    pool.close_all()
+    assert not db1.is_connected()
+
+
+def test_pool_reset_session() -> None:
+    """Test that session state gets reset before the handler is reused."""
+    pool = DatabaseConnectionPool(max_idle_handlers=1)
+
+    db = pool.acquire(connect=connect_to_db)
+
+    db.query("SET application_name = 'test_pool_reset_session'")
+    db.query('CREATE TEMPORARY TABLE test_pool_temp (foo INT)')
+    assert get_session_lock(db, 'test-pool', 1)
+
+    db.begin()
+    db.query('SELECT 1')
+    db.set_print_warn(False)
+
+    db.disconnect()
+
+    db = pool.acquire(connect=connect_to_db)
+    assert pool.stats()['reuses'] == 1
+
+    assert not db.in_transaction()
+    assert db.print_warn()
+
+    (application_name,) = db.query('SHOW application_name').flat()
+    assert application_name != 'test_pool_reset_session'
+
+    (temp_table_count,) = db.query("SELECT COUNT(*) FROM pg_tables WHERE tablename = 'test_pool_temp'").flat()
+    assert temp_table_count == 0
+
+    other_db = connect_to_db()
+    assert get_session_lock(other_db, 'test-pool', 1, wait=False)
+    other_db.disconnect()
+
+    # Failed transaction gets rolled back too
+    db.begin()
+    try:
+        db.query('SELECT no_such_column FROM no_such_table')
+    except Exception:
+        pass
+
+    db.disconnect()
+
+    db = pool.acquire(connect=connect_to_db)
+    assert not db.in_transaction()
+    assert db.query('SELECT 1').flat() == [1]
+
+    pool.close_all()
@@ -2,6 +2,7 @@
 from mediawords.dbi.downloads.store import (
     McDBIDownloadsException,
     fetch_content,
+    fetch_contents,
     _default_amazon_s3_downloads_config,
     _get_store_for_reading,
 )
@@ -55,3 +56,21 @@ class TestFetchContent(TestDownloadsDB):
             download_storage_config=DoNotReadAllFromS3DownloadStorageConfig(),
         )
         assert got_content == content.decode()
+
+        # Bulk fetch skips unsuccessful downloads
+        error_download = dict(self.test_download)
+        error_download['state'] = 'error'
+
+        inline_download = dict(self.test_download)
+        inline_download['downloads_id'] = self.test_download['downloads_id'] + 1
+        inline_download['path'] = 'content:inline foo'
+
+        got_contents = list(fetch_contents(
+            db=db,
+            downloads=[self.test_download, error_download, inline_download],
+            download_storage_config=DoNotReadAllFromS3DownloadStorageConfig(),
+        ))
+        assert sorted(got_contents) == sorted([
+            (self.test_download['downloads_id'], content.decode()),
+            (inline_download['downloads_id'], 'inline foo'),
+        ])
@@ -0,0 +1,78 @@
+from mediawords.db import connect_to_db
+from mediawords.dbi.stories.stories import add_stories, add_story
+from mediawords.test.db.create import create_test_medium, create_test_feed
+
+
+def test_add_stories():
+    """Test adding a list of stories with dups in both the database and the list itself."""
+
+    db = connect_to_db()
+
+    medium = create_test_medium(db=db, label='test')
+    feed = create_test_feed(db=db, label='test', medium=medium)
+
+    def _story(url: str, title: str, guid: str = None) -> dict:
+        return {
+            'url': url,
+            'guid': guid or url,
+            'media_id': medium['media_id'],
+            'title': title,
+            'description': 'description',
+            'publish_date': '2016-10-15 08:00:00',
+        }
+
+    existing_story = add_story(
+        db=db,
+        story=_story(url='http://test/existing', title='existing'),
+        feeds_id=feed['feeds_id'],
+    )
+
+    stories = [
+        # New
+        _story(url='http://test/1', title='first title'),
+
+        # Dup of a story in the database by URL
+        _story(url='http://test/existing', title='different title'),
+
+        # Dup of the first story in the list by GUID
+        _story(url='http://test/2', title='second title', guid='http://test/1'),
+
+        # Dup of the first story in the list by title
+        _story(url='http://test/3', title='first title'),
+
+        # New
+        _story(url='http://test/4', title='fourth title'),
+    ]
+
+    added_stories = add_stories(db=db, stories=stories, feeds_id=feed['feeds_id'])
+    assert len(added_stories) == len(stories)
+
+    assert added_stories[0]['is_new']
+    assert added_stories[0]['url'] == 'http://test/1'
+
+    assert added_stories[1]['stories_id'] == existing_story['stories_id']
+    assert not added_stories[1].get('is_new', False)
+
+    assert added_stories[2]['stories_id'] == added_stories[0]['stories_id']
+    assert not added_stories[2].get('is_new', False)
+
+    assert added_stories[3]['stories_id'] == added_stories[0]['stories_id']
+    assert not added_stories[3].get('is_new', False)
+
+    assert added_stories[4]['is_new']
+    assert added_stories[4]['url'] == 'http://test/4'
+
+    assert len(db.select(table='stories', what_to_select='*').hashes()) == 3
+    assert len(db.select(table='feeds_stories_map', what_to_select='*').hashes()) == 3
+
+    # Title dup's URL got added as an alias of the first story
+    story_urls = db.query(
+        "SELECT url FROM story_urls WHERE stories_id = %(stories_id)s",
+        {'stories_id': added_stories[0]['stories_id']},
+    ).flat()
+    assert 'http://test/3' in story_urls
+
+    # Adding the same list again doesn't add anything new
+    added_stories = add_stories(db=db, stories=stories, feeds_id=feed['feeds_id'])
+    assert not [story for story in added_stories if story.get('is_new', False)]
+    assert len(db.select(table='stories', what_to_select='*').hashes()) == 3
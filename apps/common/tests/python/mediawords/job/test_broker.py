@@ -44,3 +44,16 @@ class TestBroker(AbstractBrokerTestCase):
 
             result = worker.app.get_result(job_id=job_id)
             assert result == 7, f"Result is correct for worker {worker}"
+
+    def test_add_many_to_queue(self):
+        """Test add_many_to_queue()."""
+
+        for worker in self.WORKERS:
+            job_ids = worker.app.add_many_to_queue([{'x': 1, 'y': 2}, {'x': 3, 'y': 4}, {'x': 5, 'y': 6}])
+            assert len(job_ids) == 3, f"Job IDs are returned for worker {worker}"
+            assert len(set(job_ids)) == 3, f"Job IDs are unique for worker {worker}"
+
+            results = [worker.app.get_result(job_id=job_id) for job_id in job_ids]
+            assert results == [3, 7, 11], f"Results are correct for worker {worker}"
+
+            assert worker.app.add_many_to_queue([]) == []
@@ -1,7 +1,9 @@
 import dataclasses
 import socket
 import time
-from typing import List, Optional, Type
+from typing import Any, Dict, List, Optional, Type
+
+import pytest
 
 from mediawords.db import connect_to_db
 from mediawords.job import JobBroker, StatefulJobBroker
@@ -14,6 +16,14 @@ from .setup_broker_test import AbstractBrokerTestCase, Worker
 log = create_logger(__name__)
 
 
+class _FailingStatefulJobBroker(StatefulJobBroker):
+    """Stateful job broker which manages to publish only the first job of a batch."""
+
+    def _send_many_to_queue(self, list_of_kwargs: List[Dict[str, Any]], job_ids: List[str]) -> None:
+        super()._send_many_to_queue(list_of_kwargs=list_of_kwargs[:1], job_ids=job_ids)
+        raise Exception("Publishing failed")
+
+
 class TestBrokerState(AbstractBrokerTestCase):
 
     @classmethod
@@ -97,6 +107,32 @@ class TestBrokerState(AbstractBrokerTestCase):
 
         super().setUpClass()
 
+    def test_add_many_to_queue_state(self):
+        queue_name = 'TestPythonWorkerStateQueued'
+
+        def job_states_count() -> int:
+            return self.DB.query(
+                "SELECT COUNT(*) FROM job_states WHERE class = %(queue_name)s",
+                {'queue_name': queue_name},
+            ).flat()[0]
+
+        list_of_kwargs = [{'x': 1, 'y': 2}, {'x': 3, 'y': 4}, {'x': 5, 'y': 6}]
+
+        job_ids = StatefulJobBroker(queue_name=queue_name).add_many_to_queue(list_of_kwargs)
+        assert len(job_ids) == 3
+        assert job_states_count() == 3
+
+        # Caller's arguments are left alone
+        assert list_of_kwargs == [{'x': 1, 'y': 2}, {'x': 3, 'y': 4}, {'x': 5, 'y': 6}]
+
+        # States of the jobs that didn't get published get removed
+        with pytest.raises(Exception, match='Publishing failed'):
+            _FailingStatefulJobBroker(queue_name=queue_name).add_many_to_queue(list_of_kwargs)
+        assert job_states_count() == 3 + 1
+
+        # Clean up for test_state()
+        self.DB.query("DELETE FROM job_states WHERE class = %(queue_name)s", {'queue_name': queue_name})
+
     def test_state(self):
 
         common_kwargs = {'x': 2, 'y': 3}
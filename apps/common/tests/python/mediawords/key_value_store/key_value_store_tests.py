@@ -76,6 +76,16 @@ class TestKeyValueStoreTestCase(TestCase, metaclass=abc.ABCMeta):
                                            object_id=self._TEST_OBJECT_ID,
                                            object_path=path) is True
 
+        # Bulk fetch (skips nonexistent and repeated objects)
+        contents = list(self.store().fetch_contents(db=self._db, object_ids=[
+            self._TEST_OBJECT_ID,
+            self._TEST_OBJECT_ID_NONEXISTENT,
+            self._TEST_OBJECT_ID,
+        ]))
+        assert contents == [(self._TEST_OBJECT_ID, self._TEST_CONTENT_UTF_8)]
+
+        assert list(self.store().fetch_contents(db=self._db, object_ids=[])) == []
+
         # UTF-8 string
         self.store().store_content(db=self._db,
                                    object_id=self._TEST_OBJECT_ID,
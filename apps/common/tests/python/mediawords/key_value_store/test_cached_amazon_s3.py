@@ -1,4 +1,8 @@
+from typing import Optional
+
+from mediawords.db import connect_to_db
 from mediawords.key_value_store.cached_amazon_s3 import CachedAmazonS3Store
+from mediawords.key_value_store.local_cache import LocalCache
 from mediawords.util.text import random_string
 from .amazon_s3_credentials import (
     TestAmazonS3CredentialsTestCase,
@@ -23,3 +27,69 @@ class TestCachedAmazonS3StoreTestCase(TestAmazonS3CredentialsTestCase):
 
     def test_key_value_store(self):
         self._test_key_value_store()
+
+
+class _FakeLocalCache(LocalCache):
+    """In-memory local cache which records object IDs that it gets asked for."""
+
+    def __init__(self):
+        self.objects = {}
+        self.fetched_object_ids = []
+
+    def fetch(self, object_id: int) -> Optional[bytes]:
+        self.fetched_object_ids.append(object_id)
+        return self.objects.get(object_id)
+
+    def store(self, object_id: int, content: bytes) -> None:
+        self.objects[object_id] = content
+
+    def remove(self, object_id: int) -> None:
+        self.objects.pop(object_id, None)
+
+
+def test_local_cache():
+    db = connect_to_db()
+
+    cache_table = 'cache.s3_raw_downloads_cache'
+    local_cache = _FakeLocalCache()
+
+    store = CachedAmazonS3Store(
+        access_key_id=test_credentials.access_key_id(),
+        secret_access_key=test_credentials.secret_access_key(),
+        bucket_name=test_credentials.bucket_name(),
+        directory_name=test_credentials.directory_name() + '/' + random_string(16),
+        cache_table=cache_table,
+        local_cache=local_cache,
+    )
+
+    object_id = 1
+    content = b'foo'
+
+    store.store_content(db=db, object_id=object_id, content=content)
+    assert local_cache.objects[object_id] == content
+
+    # Local cache hit gets returned without looking at the cache table or S3
+    local_cache.objects[object_id] = b'local content'
+    assert store.fetch_content(db=db, object_id=object_id) == b'local content'
+    assert dict(store.fetch_contents(db=db, object_ids=[object_id])) == {object_id: b'local content'}
+
+    # Local cache miss gets filled from the cache table
+    local_cache.objects.clear()
+    assert store.fetch_content(db=db, object_id=object_id) == content
+    assert local_cache.objects[object_id] == content
+
+    # ...or from S3
+    local_cache.objects.clear()
+    db.query("DELETE FROM " + cache_table + " WHERE object_id = %(object_id)s", {'object_id': object_id})
+    assert dict(store.fetch_contents(db=db, object_ids=[object_id])) == {object_id: content}
+    assert local_cache.objects[object_id] == content
+
+    # Existence gets tested with local cache first
+    local_cache.fetched_object_ids.clear()
+    assert store.content_exists(db=db, object_id=object_id)
+    assert local_cache.fetched_object_ids == [object_id]
+
+    # Removed object gets invalidated in local cache too
+    store.remove_content(db=db, object_id=object_id)
+    assert object_id not in local_cache.objects
+    assert not store.content_exists(db=db, object_id=object_id)
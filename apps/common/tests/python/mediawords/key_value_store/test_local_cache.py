@@ -0,0 +1,73 @@
+import os
+import tempfile
+import time
+
+import pytest
+
+from mediawords.key_value_store.local_cache import LocalDiskCache, McLocalCacheException
+
+
+def test_local_disk_cache():
+    with tempfile.TemporaryDirectory() as directory:
+        cache = LocalDiskCache(directory=directory, max_size=1024 * 1024, shard_count=4)
+
+        assert cache.fetch(object_id=1) is None
+
+        cache.store(object_id=1, content=b'foo')
+        cache.store(object_id=2, content=b'bar')
+        cache.store(object_id=5, content=b'')
+
+        assert cache.fetch(object_id=1) == b'foo'
+        assert cache.fetch(object_id=2) == b'bar'
+        assert cache.fetch(object_id=5) == b''
+
+        # Overwrite
+        cache.store(object_id=1, content=b'baz')
+        assert cache.fetch(object_id=1) == b'baz'
+
+        # Another instance (e.g. in a different process) sees the same objects
+        other_cache = LocalDiskCache(directory=directory, max_size=1024 * 1024, shard_count=4)
+        assert other_cache.fetch(object_id=1) == b'baz'
+
+        cache.remove(object_id=1)
+        assert cache.fetch(object_id=1) is None
+        assert other_cache.fetch(object_id=1) is None
+
+        # Removing nonexistent object is fine
+        cache.remove(object_id=1)
+
+
+def test_local_disk_cache_eviction():
+    with tempfile.TemporaryDirectory() as directory:
+        object_size = 100
+        cache = LocalDiskCache(directory=directory, max_size=object_size * 10, shard_count=1)
+
+        # Make the first object look like the least recently used one
+        cache.store(object_id=1, content=b'x' * object_size)
+        os.utime(os.path.join(directory, '000', '1'), (time.time() - 3600, time.time() - 3600,))
+
+        for object_id in range(2, 12):
+            cache.store(object_id=object_id, content=b'x' * object_size)
+
+        assert cache.fetch(object_id=1) is None
+        assert cache.fetch(object_id=11) == b'x' * object_size
+
+        total_size = sum(os.path.getsize(os.path.join(directory, '000', name))
+                         for name in os.listdir(os.path.join(directory, '000')))
+        assert total_size <= object_size * 10
+
+        # Objects bigger than the cache don't get cached
+        cache.store(object_id=100, content=b'x' * object_size * 11)
+        assert cache.fetch(object_id=100) is None
+
+
+def test_local_disk_cache_bad_input():
+    with pytest.raises(McLocalCacheException):
+        LocalDiskCache(directory='', max_size=1024)
+
+    with tempfile.TemporaryDirectory() as directory:
+        with pytest.raises(McLocalCacheException):
+            LocalDiskCache(directory=directory, max_size=0)
+
+        with pytest.raises(McLocalCacheException):
+            LocalDiskCache(directory=directory, max_size=1024, shard_count=0)
@@ -1,6 +1,15 @@
+import threading
+import time
+from typing import Union
+
+import pytest
+
+from mediawords.db import connect_to_db
+from mediawords.key_value_store import KeyValueStore
 from mediawords.key_value_store.amazon_s3 import AmazonS3Store
-from mediawords.key_value_store.multiple_stores import MultipleStoresStore
+from mediawords.key_value_store.multiple_stores import MultipleStoresStore, McMultipleStoresStoreException
 from mediawords.key_value_store.postgresql import PostgreSQLStore
+from mediawords.test.db.create import create_test_medium, create_test_feed, create_test_story, create_download_for_story
 from .amazon_s3_credentials import (
     TestAmazonS3CredentialsTestCase,
     get_test_s3_credentials,
@@ -32,3 +41,193 @@ class TestMultipleStoresStoreTestCase(TestAmazonS3CredentialsTestCase, TestMockD
 
     def test_key_value_store(self):
         self._test_key_value_store()
+
+
+class _SlowMemoryStore(KeyValueStore):
+    """In-memory store which takes a while to respond (and fails if there's no such object)."""
+
+    def __init__(self, name: str, delay: float):
+        self.name = name
+        self.delay = delay
+        self.objects = {}
+        self.store_threads = set()
+        self.fetch_started_at = None
+
+    def fetch_content(self, db, object_id: int, object_path: str = None) -> bytes:
+        self.fetch_started_at = time.time()
+        time.sleep(self.delay)
+        if object_id not in self.objects:
+            raise Exception("Object %d not found in %s" % (object_id, self.name))
+        return self.objects[object_id]
+
+    def store_content(self, db, object_id: int, content: Union[str, bytes], content_type: str = None) -> str:
+        time.sleep(self.delay)
+        self.store_threads.add(threading.get_ident())
+        self.objects[object_id] = content
+        return '%s:' % self.name
+
+    def remove_content(self, db, object_id: int, object_path: str = None) -> None:
+        self.objects.pop(object_id, None)
+
+    def content_exists(self, db, object_id: int, object_path: str = None) -> bool:
+        return object_id in self.objects
+
+    def uses_db(self) -> bool:
+        return False
+
+
+class _ThreadRecordingPostgreSQLStore(PostgreSQLStore):
+    """PostgreSQL store which records threads that it gets called from (and optionally takes a while to fetch)."""
+
+    def __init__(self, table: str, delay: float = 0):
+        super().__init__(table=table)
+        self.delay = delay
+        self.threads = set()
+        self.fetch_returned_at = None
+
+    def fetch_content(self, db, object_id: int, object_path: str = None) -> bytes:
+        self.threads.add(threading.get_ident())
+        time.sleep(self.delay)
+        try:
+            return super().fetch_content(db, object_id, object_path)
+        finally:
+            self.fetch_returned_at = time.time()
+
+    def store_content(self, db, object_id: int, content: Union[str, bytes], content_type: str = None) -> str:
+        self.threads.add(threading.get_ident())
+        return super().store_content(db, object_id, content)
+
+
+def test_hedged_reads():
+    slow_store = _SlowMemoryStore(name='slow', delay=2)
+    fast_store = _SlowMemoryStore(name='fast', delay=0)
+
+    slow_store.objects[1] = b'slow content'
+    fast_store.objects[1] = b'fast content'
+
+    store = MultipleStoresStore(stores_for_reading=[slow_store, fast_store], hedge_reads_after=0.1)
+
+    # Second store gets tried if the first one doesn't return in time
+    start = time.time()
+    assert store.fetch_content(db=None, object_id=1) == b'fast content'
+    assert time.time() - start < 1
+
+    # Second store gets tried right away if the first one fails
+    failing_store = _SlowMemoryStore(name='failing', delay=0)
+    store = MultipleStoresStore(stores_for_reading=[failing_store, slow_store], hedge_reads_after=10)
+    start = time.time()
+    assert store.fetch_content(db=None, object_id=1) == b'slow content'
+    assert time.time() - start < 5
+
+    # First store wins if it's fast enough
+    store = MultipleStoresStore(stores_for_reading=[fast_store, slow_store], hedge_reads_after=1)
+    assert store.fetch_content(db=None, object_id=1) == b'fast content'
+
+    # All stores fail
+    store = MultipleStoresStore(stores_for_reading=[failing_store, fast_store], hedge_reads_after=0.1)
+    with pytest.raises(McMultipleStoresStoreException):
+        store.fetch_content(db=None, object_id=2)
+
+
+def test_parallel_writes():
+    first_store = _SlowMemoryStore(name='first', delay=1)
+    second_store = _SlowMemoryStore(name='second', delay=1)
+
+    store = MultipleStoresStore(stores_for_writing=[first_store, second_store], parallel_writes=True)
+
+    start = time.time()
+    path = store.store_content(db=None, object_id=1, content=b'content')
+    assert time.time() - start < 1.9
+
+    # Path comes from the last store
+    assert path == 'second:'
+    assert first_store.objects[1] == b'content'
+    assert second_store.objects[1] == b'content'
+    assert first_store.store_threads != second_store.store_threads
+
+    # Failure of any store gets reported
+    class _FailingStore(_SlowMemoryStore):
+        def store_content(self, db, object_id: int, content: Union[str, bytes], content_type: str = None) -> str:
+            raise Exception("Failing to store")
+
+    store = MultipleStoresStore(
+        stores_for_writing=[_FailingStore(name='failing', delay=0), second_store],
+        parallel_writes=True,
+    )
+    with pytest.raises(McMultipleStoresStoreException):
+        store.store_content(db=None, object_id=2, content=b'content')
+
+    # Other stores get written to regardless
+    assert second_store.objects[2] == b'content'
+
+
+def test_hedged_reads_and_parallel_writes_with_db():
+    db = connect_to_db()
+
+    medium = create_test_medium(db=db, label='foo')
+    feed = create_test_feed(db=db, label='foo', medium=medium)
+    story = create_test_story(db=db, label='foo', feed=feed)
+    download = create_download_for_story(db=db, feed=feed, story=story)
+    object_id = download['downloads_id']
+
+    postgresql_store = _ThreadRecordingPostgreSQLStore(table='raw_downloads')
+    slow_store = _SlowMemoryStore(name='slow', delay=1)
+
+    store = MultipleStoresStore(
+        stores_for_reading=[slow_store, postgresql_store],
+        stores_for_writing=[slow_store, postgresql_store],
+        hedge_reads_after=0.1,
+        parallel_writes=True,
+    )
+    assert store.uses_db()
+
+    store.store_content(db=db, object_id=object_id, content=b'content')
+    assert slow_store.objects[object_id] == b'content'
+
+    # Hedged PostgreSQL store returns first
+    start = time.time()
+    assert store.fetch_content(db=db, object_id=object_id) == b'content'
+    assert time.time() - start < 0.9
+
+    # Store which uses the database handler is called only from the thread that the handler belongs to
+    assert postgresql_store.threads == {threading.get_ident()}
+    assert threading.get_ident() not in slow_store.store_threads
+
+    # Handler is still usable right away even though the slow fetch might still be running
+    assert db.query("SELECT 1").flat() == [1]
+
+
+def test_hedged_reads_with_db_store_first():
+    db = connect_to_db()
+
+    medium = create_test_medium(db=db, label='foo')
+    feed = create_test_feed(db=db, label='foo', medium=medium)
+    story = create_test_story(db=db, label='foo', feed=feed)
+    download = create_download_for_story(db=db, feed=feed, story=story)
+    object_id = download['downloads_id']
+
+    # Same order as the PostgreSQL store with fallback to S3
+    postgresql_store = _ThreadRecordingPostgreSQLStore(table='raw_downloads', delay=2)
+    slow_store = _SlowMemoryStore(name='slow', delay=1)
+    slow_store.objects[object_id] = b'slow content'
+
+    store = MultipleStoresStore(stores_for_reading=[postgresql_store, slow_store], hedge_reads_after=0.1)
+
+    # PostgreSQL store doesn't have the object, and the slow store gets fetched from while PostgreSQL is slow to fail
+    start = time.time()
+    assert store.fetch_content(db=db, object_id=object_id) == b'slow content'
+    assert time.time() - start < 2.9
+    assert slow_store.fetch_started_at < postgresql_store.fetch_returned_at
+
+    # Store which uses the database handler is still called only from the calling thread
+    assert postgresql_store.threads == {threading.get_ident()}
+
+    # Slow store doesn't get fetched from at all if the PostgreSQL store returns before the hedging delay
+    postgresql_store.store_content(db=db, object_id=object_id, content=b'postgresql content')
+    postgresql_store.delay = 0
+    slow_store.fetch_started_at = None
+
+    store = MultipleStoresStore(stores_for_reading=[postgresql_store, slow_store], hedge_reads_after=1)
+    assert store.fetch_content(db=db, object_id=object_id) == b'postgresql content'
+    time.sleep(1.5)
+    assert slow_store.fetch_started_at is None
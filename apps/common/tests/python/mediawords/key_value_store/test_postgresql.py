@@ -1,3 +1,4 @@
+from mediawords.key_value_store import KeyValueStore
 from mediawords.key_value_store.postgresql import PostgreSQLStore
 from .mock_download import TestMockDownloadTestCase
 
@@ -11,3 +12,25 @@ class TestPostgreSQLStoreTestCase(TestMockDownloadTestCase):
 
     def test_key_value_store(self):
         self._test_key_value_store()
+
+
+class TestPostgreSQLStoreZstdTestCase(TestMockDownloadTestCase):
+    def _initialize_store(self) -> PostgreSQLStore:
+        return PostgreSQLStore(table='raw_downloads', compression_method=KeyValueStore.Compression.ZSTD)
+
+    def _expected_path_prefix(self) -> str:
+        return 'postgresql:'
+
+    def test_key_value_store(self):
+        self._test_key_value_store()
+
+    def test_read_other_compression_methods(self):
+        """Objects written with a different compression method remain readable."""
+        gzip_store = PostgreSQLStore(table='raw_downloads', compression_method=KeyValueStore.Compression.GZIP)
+        zstd_store = self._initialize_store()
+
+        gzip_store.store_content(db=self._db, object_id=self._TEST_OBJECT_ID, content='gzip content')
+        assert zstd_store.fetch_content(db=self._db, object_id=self._TEST_OBJECT_ID) == b'gzip content'
+
+        zstd_store.store_content(db=self._db, object_id=self._TEST_OBJECT_ID, content='zstd content')
+        assert gzip_store.fetch_content(db=self._db, object_id=self._TEST_OBJECT_ID) == b'zstd content'
@@ -1,8 +1,14 @@
 from typing import List, Dict, Any
 
+import mediawords.solr
 from mediawords.db import connect_to_db, DatabaseHandler
 # noinspection PyProtectedMember
-from mediawords.solr import _insert_collection_media_ids
+from mediawords.solr import (
+    _insert_collection_media_ids,
+    collection_media_ids_cache_stats,
+    _CollectionMediaIDsCache,
+    _COLLECTION_MEDIA_IDS_CACHE_VERSION_CHECK_INTERVAL,
+)
 from mediawords.test.db.create import create_test_medium
 
 
@@ -33,10 +39,21 @@ def __verify_collections_id_result(db: DatabaseHandler, tags: List[Dict[str, Any
         got_q = _insert_collection_media_ids(db=db, q=f"collections_id:{q_or_arg}")
         assert expected_q == got_q, f'{label}: collections_id with "or"s'
 
+    expected_terms_q = f"{{!terms f=media_id}}{','.join([str(_) for _ in expected_media_ids])}"
+    got_q = _insert_collection_media_ids(db=db, q=f"collections_id:{q_arg}", terms_filter=True)
+    assert expected_terms_q == got_q, f"{label}: terms filter"
 
-def test_collections_id_queries():
+    # Terms filter can't be a part of a bigger query
+    got_q = _insert_collection_media_ids(db=db, q=f"foo AND collections_id:{q_arg}", terms_filter=True)
+    assert f"foo AND {expected_q}" == got_q, f"{label}: terms filter in a bigger query"
+
+
+def test_collections_id_queries(monkeypatch):
     db = connect_to_db()
 
+    # Don't wait for "media_tags_map_version" to get reread
+    monkeypatch.setattr(mediawords.solr, '_COLLECTION_MEDIA_IDS_CACHE_VERSION_CHECK_INTERVAL', 0)
+
     num_tags = 10
     num_media_per_tag = 10
 
@@ -65,3 +82,67 @@ def test_collections_id_queries():
     __verify_collections_id_result(db=db, tags=[tags[0]], label='Single "tags_id"')
     __verify_collections_id_result(db=db, tags=tags, label='All tags')
     __verify_collections_id_result(db=db, tags=tags[:3], label='Three tags')
+
+    # Cached media IDs get invalidated on changes to media_tags_map
+    hits_before = collection_media_ids_cache_stats()['hits']
+    __verify_collections_id_result(db=db, tags=[tags[0]], label='Single "tags_id" (cached)')
+    assert collection_media_ids_cache_stats()['hits'] > hits_before
+
+    medium = create_test_medium(db=db, label="tag 1 new medium")
+    db.query("""
+        INSERT INTO media_tags_map (tags_id, media_id)
+        VALUES (%(tags_id)s, %(media_id)s)
+    """, {
+        'tags_id': tags[0]['tags_id'],
+        'media_id': medium['media_id'],
+    })
+    tags[0]['media'].append(medium)
+
+    __verify_collections_id_result(db=db, tags=[tags[0]], label='Single "tags_id" (after media_tags_map change)')
+
+
+class _FakeClock(object):
+    """Stand-in for the "time" module with a clock that moves only when told to."""
+
+    def __init__(self):
+        self.now = 1000000.0
+
+    def time(self) -> float:
+        return self.now
+
+
+def test_collection_media_ids_cache_staleness(monkeypatch):
+    db = connect_to_db()
+
+    clock = _FakeClock()
+    monkeypatch.setattr(mediawords.solr, 'time', clock)
+
+    tag_set = db.create(table='tag_sets', insert_hash={'name': 'test'})
+    tag = db.create(table='tags', insert_hash={'tag_sets_id': tag_set['tag_sets_id'], 'tag': 'test'})
+
+    media_ids = []
+    for medium_i in range(2):
+        medium = create_test_medium(db=db, label=f"medium {medium_i}")
+        media_ids.append(medium['media_id'])
+
+    db.query("""
+        INSERT INTO media_tags_map (tags_id, media_id)
+        VALUES (%(tags_id)s, %(media_id)s)
+    """, {'tags_id': tag['tags_id'], 'media_id': media_ids[0]})
+
+    cache = _CollectionMediaIDsCache()
+    assert cache.media_ids(db=db, tags_ids=[tag['tags_id']]) == media_ids[:1]
+
+    db.query("""
+        INSERT INTO media_tags_map (tags_id, media_id)
+        VALUES (%(tags_id)s, %(media_id)s)
+    """, {'tags_id': tag['tags_id'], 'media_id': media_ids[1]})
+
+    # Change is not visible until "media_tags_map_version" gets reread after the version check interval
+    clock.now += _COLLECTION_MEDIA_IDS_CACHE_VERSION_CHECK_INTERVAL - 1
+    assert cache.media_ids(db=db, tags_ids=[tag['tags_id']]) == media_ids[:1]
+    assert cache.stats()['invalidations'] == 0
+
+    clock.now += 1
+    assert cache.media_ids(db=db, tags_ids=[tag['tags_id']]) == sorted(media_ids)
+    assert cache.stats()['invalidations'] == 1
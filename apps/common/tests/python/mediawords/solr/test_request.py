@@ -0,0 +1,184 @@
+import threading
+
+import pytest
+
+import mediawords.solr.request
+from mediawords.solr.request import (
+    solr_request,
+    McSolrRequestDidNotStartInTimeException,
+    McSolrRequestSolrIsDownException,
+)
+# noinspection PyProtectedMember
+from mediawords.solr.request import (
+    _solr_client,
+    _SolrClient,
+    _CIRCUIT_BREAKER_MIN_BACKOFF,
+    _CIRCUIT_BREAKER_MAX_BACKOFF,
+)
+from mediawords.util.config.common import CommonConfig
+from mediawords.util.parse_json import decode_json
+from mediawords.util.web.user_agent import Request
+
+
+def test_solr_client_is_shared():
+    solr_url = CommonConfig.solr_url()
+
+    assert _solr_client(solr_url=solr_url) is _solr_client(solr_url=solr_url)
+    assert _solr_client(solr_url=solr_url) is not _solr_client(solr_url=solr_url + '/other')
+
+
+def test_solr_request():
+    # Second request reuses the client's cached health state
+    for _ in range(2):
+        response = decode_json(solr_request(path='select', params={'q': '*:*', 'rows': 0, 'wt': 'json'}))
+        assert 'response' in response
+
+
+class _FakeClock(object):
+    """Stand-in for the "time" module with a clock that moves only when told to."""
+
+    def __init__(self):
+        self.now = 1000000.0
+
+    def time(self) -> float:
+        return self.now
+
+    def sleep(self, seconds: float) -> None:
+        self.now += seconds
+
+
+class _FakeResponse(object):
+    def __init__(self, client_side_error: bool):
+        self.__client_side_error = client_side_error
+
+    def error_is_client_side(self) -> bool:
+        return self.__client_side_error
+
+
+class _FakeUserAgent(object):
+    """UserAgent which doesn't connect anywhere and records the threads that it gets used from."""
+
+    # Every instance that has been created
+    instances = []
+
+    # Whether responses are to fail with a client side (connection) error
+    client_side_error = False
+
+    def __init__(self):
+        self.threads = set()
+        _FakeUserAgent.instances.append(self)
+
+    def set_timeout(self, timeout: int) -> None:
+        pass
+
+    def set_max_size(self, max_size: int) -> None:
+        pass
+
+    def request(self, request: Request) -> _FakeResponse:
+        self.threads.add(threading.get_ident())
+        return _FakeResponse(client_side_error=self.client_side_error)
+
+
+def test_solr_client_circuit_breaker(monkeypatch):
+    clock = _FakeClock()
+    solr_is_up = {'up': False}
+    probes = []
+
+    def _wait_for_solr_to_start(solr_url: str) -> None:
+        probes.append('wait')
+        if not solr_is_up['up']:
+            raise McSolrRequestDidNotStartInTimeException("Solr didn't start")
+
+    def _solr_is_up(solr_url: str) -> bool:
+        probes.append('probe')
+        return solr_is_up['up']
+
+    monkeypatch.setattr(mediawords.solr.request, 'time', clock)
+    monkeypatch.setattr(mediawords.solr.request, '_wait_for_solr_to_start', _wait_for_solr_to_start)
+    monkeypatch.setattr(mediawords.solr.request, '_solr_is_up', _solr_is_up)
+    monkeypatch.setattr(mediawords.solr.request, 'UserAgent', _FakeUserAgent)
+    monkeypatch.setattr(_FakeUserAgent, 'instances', [])
+
+    client = _SolrClient(solr_url='http://solr.example.com')
+    request = Request(method='GET', url='http://solr.example.com/mediacloud/select')
+
+    # Circuit opens after Solr fails to come up
+    with pytest.raises(McSolrRequestDidNotStartInTimeException):
+        client.request(request)
+    assert probes == ['wait']
+
+    backoff = _CIRCUIT_BREAKER_MIN_BACKOFF
+    for _ in range(8):
+
+        # Requests fail fast without probing Solr until the backoff is over
+        clock.now += backoff - 1
+        probes.clear()
+        with pytest.raises(McSolrRequestSolrIsDownException):
+            client.request(request)
+        assert probes == []
+
+        # Then Solr gets probed once, and another failure doubles the backoff (up to the cap)
+        clock.now += 1
+        with pytest.raises(McSolrRequestSolrIsDownException):
+            client.request(request)
+        assert probes == ['probe']
+
+        backoff = min(backoff * 2, _CIRCUIT_BREAKER_MAX_BACKOFF)
+
+    assert backoff == _CIRCUIT_BREAKER_MAX_BACKOFF
+
+    # Single successful probe closes the circuit
+    solr_is_up['up'] = True
+    clock.now += backoff
+    probes.clear()
+    assert not client.request(request).error_is_client_side()
+    assert probes == ['probe']
+
+    # Solr doesn't get probed while it's healthy
+    probes.clear()
+    client.request(request)
+    assert probes == []
+
+    # Failed request makes the next one probe Solr again, and the backoff starts from the minimum once more
+    solr_is_up['up'] = False
+    monkeypatch.setattr(_FakeUserAgent, 'client_side_error', True)
+    assert client.request(request).error_is_client_side()
+
+    with pytest.raises(McSolrRequestDidNotStartInTimeException):
+        client.request(request)
+    assert probes == ['wait']
+
+    clock.now += _CIRCUIT_BREAKER_MIN_BACKOFF - 1
+    with pytest.raises(McSolrRequestSolrIsDownException):
+        client.request(request)
+    assert probes == ['wait']
+
+    clock.now += 1
+    with pytest.raises(McSolrRequestSolrIsDownException):
+        client.request(request)
+    assert probes == ['wait', 'probe']
+
+
+def test_solr_client_user_agent_per_thread(monkeypatch):
+    monkeypatch.setattr(mediawords.solr.request, '_wait_for_solr_to_start', lambda solr_url: None)
+    monkeypatch.setattr(mediawords.solr.request, 'UserAgent', _FakeUserAgent)
+    monkeypatch.setattr(_FakeUserAgent, 'instances', [])
+
+    client = _SolrClient(solr_url='http://solr.example.com')
+    request = Request(method='GET', url='http://solr.example.com/mediacloud/select')
+
+    # Same thread keeps on reusing its UserAgent (and its kept alive connections)
+    client.request(request)
+    client.request(request)
+    assert len(_FakeUserAgent.instances) == 1
+
+    threads = [threading.Thread(target=client.request, args=(request,)) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    # Every thread gets its own UserAgent
+    assert len(_FakeUserAgent.instances) == 3
+    for ua in _FakeUserAgent.instances:
+        assert len(ua.threads) == 1
@@ -7,6 +7,8 @@ from mediawords.solr import (
     get_solr_num_found,
     search_solr_for_processed_stories_ids,
     search_solr_for_stories_ids,
+    search_solr_for_stories_ids_batches,
+    get_temporary_solr_stories_ids_table,
     query_solr,
     McQuerySolrRangeQueryException,
 )
@@ -68,6 +70,27 @@ class TestSolr(TestCase):
         got_stories_ids = search_solr_for_stories_ids(db=self.DB, params={'q': f"stories_id:{story['stories_id']}"})
         assert [story['stories_id']] == got_stories_ids, "search_solr_for_stories_ids()"
 
+    def test_search_solr_for_stories_ids_batches(self):
+        """search_solr_for_stories_ids_batches()."""
+        expected_stories_ids = self.DB.query("SELECT stories_id FROM stories ORDER BY stories_id").flat()
+
+        batches = list(search_solr_for_stories_ids_batches(db=self.DB, params={'q': '*:*'}, page_size=7))
+        assert [len(_) for _ in batches[:-1]] == [7] * (len(batches) - 1)
+        assert [stories_id for batch in batches for stories_id in batch] == expected_stories_ids
+
+        # "rows" limits the total number of stories returned
+        batches = list(search_solr_for_stories_ids_batches(db=self.DB, params={'q': '*:*', 'rows': 10}, page_size=7))
+        assert [len(_) for _ in batches] == [7, 3]
+        assert [stories_id for batch in batches for stories_id in batch] == expected_stories_ids[:10]
+
+    def test_get_temporary_solr_stories_ids_table(self):
+        """get_temporary_solr_stories_ids_table()."""
+        expected_stories_ids = self.DB.query("SELECT stories_id FROM stories ORDER BY stories_id").flat()
+
+        table_name = get_temporary_solr_stories_ids_table(db=self.DB, params={'q': '*:*'})
+        got_stories_ids = self.DB.query(f"SELECT id FROM {table_name} ORDER BY id").flat()
+        assert got_stories_ids == expected_stories_ids
+
     def test_range_queries(self):
         with pytest.raises(McQuerySolrRangeQueryException, message="Range queries should not be allowed"):
             query_solr(db=self.DB, params={'q': "publish_date:[foo TO bar]"})
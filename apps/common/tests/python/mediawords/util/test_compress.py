@@ -5,10 +5,18 @@ from mediawords.util.compress import (
     gunzip,
     bzip2,
     bunzip2,
+    zstd,
+    unzstd,
+    is_zstd,
+    is_gzip,
+    is_bzip2,
+    train_zstd_dictionary,
     McBunzip2Exception,
     McGunzipException,
     McGzipException,
     McBzip2Exception,
+    McZstdException,
+    McUnzstdException,
 )
 
 
@@ -96,12 +104,93 @@ def test_bzip2_bad_input():
         bunzip2(b'No way this is valid Bzip2 data')
 
 
+def test_zstd():
+    def __inner_test_zstd(data_: bytes) -> None:
+        zstd_data = zstd(data_)
+        assert len(zstd_data) > 0
+        assert isinstance(zstd_data, bytes)
+        assert zstd_data != data_
+
+        unzstd_data = unzstd(zstd_data)
+        assert unzstd_data == data_
+
+    for data in __COMPRESS_TEST_DATA:
+        __inner_test_zstd(data_=data)
+
+
+def test_zstd_bad_input():
+    with pytest.raises(McZstdException):
+        # noinspection PyTypeChecker
+        zstd(None)
+
+    with pytest.raises(McUnzstdException):
+        # noinspection PyTypeChecker
+        unzstd(None)
+
+    with pytest.raises(McUnzstdException):
+        unzstd(b'')
+
+    with pytest.raises(McUnzstdException):
+        unzstd(b'No way this is valid Zstandard data')
+
+
+def test_zstd_dictionary():
+    samples = [
+        (
+            '<html><head><title>Story %d</title></head><body><div class="article">'
+            '<p>Media Cloud story number %d about topic %d.</p></div></body></html>' % (i, i, i % 7)
+        ).encode('utf-8')
+        for i in range(1000)
+    ]
+
+    dictionary = train_zstd_dictionary(samples=samples, dictionary_size=4 * 1024)
+    assert isinstance(dictionary, bytes)
+    assert len(dictionary) > 0
+
+    data = samples[42]
+    zstd_data = zstd(data, dictionary=dictionary)
+
+    # Compressing with the dictionary helps with small documents
+    assert len(zstd_data) < len(zstd(data))
+
+    assert unzstd(zstd_data, dictionaries=[dictionary]) == data
+
+    # Dictionary is required to uncompress the data
+    with pytest.raises(McUnzstdException):
+        unzstd(zstd_data)
+
+    # Data compressed without a dictionary doesn't need one
+    assert unzstd(zstd(data), dictionaries=[dictionary]) == data
+
+    with pytest.raises(McZstdException):
+        train_zstd_dictionary(samples=[])
+
+
+def test_compression_format_detection():
+    data = b"Media Cloud"
+
+    assert is_zstd(zstd(data))
+    assert not is_zstd(gzip(data))
+    assert not is_zstd(data)
+
+    assert is_gzip(gzip(data))
+    assert not is_gzip(bzip2(data))
+
+    assert is_bzip2(bzip2(data))
+    assert not is_bzip2(zstd(data))
+
+    # noinspection PyTypeChecker
+    assert not is_zstd(None)
+
+
 def test_wrong_algorithm():
     def __inner_test_wrong_algorithm(data_: bytes) -> None:
         with pytest.raises(McBunzip2Exception):
             bunzip2(gzip(data_))
         with pytest.raises(McGunzipException):
             gunzip(bzip2(data_))
+        with pytest.raises(McUnzstdException):
+            unzstd(gzip(data_))
 
     for data in __COMPRESS_TEST_DATA:
         __inner_test_wrong_algorithm(data_=data)
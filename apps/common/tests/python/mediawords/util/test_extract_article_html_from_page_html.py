@@ -4,7 +4,10 @@ from unittest import TestCase
 
 from mediawords.test.hash_server import HashServer
 from mediawords.util.config.common import CommonConfig
-from mediawords.util.extract_article_from_page import extract_article_html_from_page_html
+from mediawords.util.extract_article_from_page import (
+    extract_article_html_from_page_html,
+    extract_articles_html_from_pages_html,
+)
 from mediawords.util.network import random_unused_port
 from mediawords.util.parse_json import encode_json
 
@@ -36,6 +39,27 @@ def test_extract_article_html_from_page_html():
     assert "readability-lxml" in response['extractor_version']
 
 
+def test_extract_articles_html_from_pages_html():
+    """Batch test."""
+
+    contents = [
+        "<html><head><title>First title</title></head><body><p>First paragraph.</p></body></html>",
+        "<html><head><title>Second title</title></head><body><p>Second paragraph.</p></body></html>",
+        "",
+    ]
+
+    responses = extract_articles_html_from_pages_html(contents=contents)
+
+    assert len(responses) == len(contents)
+
+    assert "First paragraph." in responses[0]['extracted_html']
+    assert "Second paragraph." in responses[1]['extracted_html']
+    assert responses[2]['extracted_html'] == ''
+
+    for response in responses:
+        assert "readability-lxml" in response['extractor_version']
+
+
 class TestExtractConnectionErrors(TestCase):
     """Extract the page but fail the first response."""
 
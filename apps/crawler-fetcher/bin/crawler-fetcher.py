@@ -1,6 +1,11 @@
 #!/usr/bin/env python3
 
+from crawler_fetcher.config import CrawlerConfig
 from crawler_fetcher.engine import run_fetcher
+from crawler_fetcher.pipeline import run_pipelined_fetcher
 
 if __name__ == '__main__':
-    run_fetcher()
+    if CrawlerConfig.fetcher_concurrency() > 1:
+        run_pipelined_fetcher()
+    else:
+        run_fetcher()
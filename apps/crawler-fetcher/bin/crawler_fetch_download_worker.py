@@ -0,0 +1,42 @@
+#!/usr/bin/env python3
+
+from mediawords.db import connect_to_db
+from mediawords.job import JobBroker
+from mediawords.util.log import create_logger
+from mediawords.util.perl import decode_object_from_bytes_if_needed
+
+from crawler_fetcher.engine import fetch_and_handle_download_id
+
+log = create_logger(__name__)
+
+
+class McCrawlerFetchDownloadJobException(Exception):
+    """CrawlerFetchDownloadJob exception."""
+    pass
+
+
+def run_crawler_fetch_download(downloads_id: int) -> None:
+    """Fetch and handle a download pushed to the job queue by the crawler provider."""
+    if isinstance(downloads_id, bytes):
+        downloads_id = decode_object_from_bytes_if_needed(downloads_id)
+
+    if downloads_id is None:
+        raise McCrawlerFetchDownloadJobException("'downloads_id' is None.")
+
+    downloads_id = int(downloads_id)
+
+    db = connect_to_db()
+
+    log.info(f"Fetching download {downloads_id}...")
+
+    try:
+        fetch_and_handle_download_id(db=db, downloads_id=downloads_id)
+    finally:
+        db.disconnect()
+
+    log.info(f"Finished fetching download {downloads_id}")
+
+
+if __name__ == '__main__':
+    app = JobBroker(queue_name='MediaWords::Job::Crawler::FetchDownload')
+    app.start_worker(handler=run_crawler_fetch_download)
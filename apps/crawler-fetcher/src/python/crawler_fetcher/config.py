@@ -15,3 +15,21 @@ class CrawlerConfig(object):
     def univision_client_secret() -> Optional[str]:
         """Univision API client secret (secret key)."""
         return env_value(name='MC_UNIVISION_CLIENT_SECRET', required=False, allow_empty_string=True)
+
+    @staticmethod
+    def fetcher_batch_size() -> int:
+        """Number of queued downloads that a single fetcher claims from the queue at once."""
+        batch_size = env_value(name='MC_CRAWLER_FETCHER_BATCH_SIZE', required=False)
+        return int(batch_size) if batch_size else 1
+
+    @staticmethod
+    def fetcher_concurrency() -> int:
+        """Number of downloads that a single fetcher keeps in flight at once; 1 disables the concurrent pipeline."""
+        concurrency = env_value(name='MC_CRAWLER_FETCHER_CONCURRENCY', required=False)
+        return int(concurrency) if concurrency else 1
+
+    @staticmethod
+    def fetcher_store_workers() -> int:
+        """Number of threads (and database connections) that store fetched responses in the concurrent pipeline."""
+        store_workers = env_value(name='MC_CRAWLER_FETCHER_STORE_WORKERS', required=False)
+        return int(store_workers) if store_workers else 4
@@ -2,17 +2,22 @@
 Controls and coordinates the work of the crawler provider, fetchers, and handlers.
 
 The crawler engine coordinates the work of a single crawler_fetcher process.  A crawler_fetcher sits in a polling
-loop looking for new download_ids in queued_downloads and, when one is found, fetching and handling the given
-download.
+loop looking for new download_ids in queued_downloads and, when some are found, fetching and handling the given
+downloads.
+
+Each loop iteration claims up to a configurable number of queued downloads (MC_CRAWLER_FETCHER_BATCH_SIZE) in a single
+round trip, together with the types of their feeds, and handles them one by one using a single database connection.
 """
 
 import time
-from typing import Optional
+from typing import Optional, List, Tuple
 
 from mediawords.db import DatabaseHandler, connect_to_db
+from mediawords.db.exceptions.handler import McTupleAlreadyMovedError
 from mediawords.util.log import create_logger
 from mediawords.util.perl import decode_object_from_bytes_if_needed
 
+from crawler_fetcher.config import CrawlerConfig
 from crawler_fetcher.exceptions import McCrawlerFetcherHardError, McCrawlerFetcherSoftError
 from crawler_fetcher.handler import AbstractDownloadHandler
 from crawler_fetcher.handlers.content import DownloadContentHandler
@@ -28,18 +33,26 @@ _SLEEP_SECONDS_ON_NO_DOWNLOADS = 10
 """How many seconds to sleep when no downloads are in the queue."""
 
 
-def handler_for_download(db: DatabaseHandler, download: dict) -> AbstractDownloadHandler:
-    """Returns correct handler for download."""
+def handler_for_download(db: DatabaseHandler,
+                         download: dict,
+                         feed_type: Optional[str] = None) -> AbstractDownloadHandler:
+    """Returns correct handler for download.
+
+    If the type of the download's feed is already known (e.g. it was fetched together with the download), it can be
+    passed as 'feed_type' to avoid looking up the feed.
+    """
 
     download = decode_object_from_bytes_if_needed(download)
+    feed_type = decode_object_from_bytes_if_needed(feed_type)
 
     downloads_id = int(download['downloads_id'])
     download_type = download['type']
 
     if download_type == 'feed':
         feeds_id = int(download['feeds_id'])
-        feed = db.find_by_id(table='feeds', object_id=feeds_id)
-        feed_type = feed['type']
+        if not feed_type:
+            feed = db.find_by_id(table='feeds', object_id=feeds_id)
+            feed_type = feed['type']
 
         if feed_type == 'syndicated':
             handler = DownloadFeedSyndicatedHandler()
@@ -119,31 +132,168 @@ def _log_download_error(db: DatabaseHandler, download: Optional[dict], error_mes
             ))
 
 
-def run_fetcher(no_daemon: bool = False) -> None:
-    """Poll queued_downloads for new downloads and call fetch_and_handle_download()."""
+def _pop_queued_downloads(db: DatabaseHandler, batch_size: int) -> List[Tuple[dict, Optional[str]]]:
+    """Claim up to 'batch_size' queued downloads; return a list of (download, feed type) tuples."""
+
+    # Run over and over again by every fetcher, so prepare it once
+    rows = db.query_prepared("""
+        SELECT
+            downloads.*,
+            feeds.type AS _feed_type
+        FROM pop_queued_downloads(%(batch_size)s) AS popped (downloads_id)
+            INNER JOIN downloads
+                ON popped.downloads_id = downloads.downloads_id
+            LEFT JOIN feeds
+                ON downloads.feeds_id = feeds.feeds_id
+        ORDER BY downloads.downloads_id DESC
+    """, {'batch_size': batch_size}).hashes()
+
+    downloads = []
+    for row in rows:
+        feed_type = row.pop('_feed_type')
+        downloads.append((row, feed_type,))
+
+    return downloads
+
+
+def _requeue_downloads(db: DatabaseHandler, downloads_ids: List[int]) -> None:
+    """Put claimed but not yet handled downloads back into queued_downloads, e.g. after a hard error."""
+    if not downloads_ids:
+        return
+
+    log.warning(f"Requeueing {len(downloads_ids)} unhandled downloads")
+
+    try:
+        if db.in_transaction():
+            db.rollback()
+
+        db.query("""
+            INSERT INTO queued_downloads (downloads_id)
+                SELECT UNNEST(%(downloads_ids)s::BIGINT[])
+            ON CONFLICT (downloads_id) DO NOTHING
+        """, {'downloads_ids': downloads_ids})
+
+    except Exception as ex:
+        log.error(f"Unable to requeue downloads {downloads_ids}: {ex}")
+
+
+def fetch_and_handle_download_id(db: DatabaseHandler, downloads_id: int) -> None:
+    """Fetch and handle a single download pushed to the fetch download job queue by the crawler provider.
+
+    Soft errors get logged to the download; hard and uncategorized errors get logged and passed up.
+    """
+    if isinstance(downloads_id, bytes):
+        downloads_id = decode_object_from_bytes_if_needed(downloads_id)
+    downloads_id = int(downloads_id)
+
+    # Claim the download atomically so that duplicate pushes or parallel workers don't fetch it twice
+    try:
+        download = db.query("""
+            UPDATE downloads
+            SET state = 'fetching',
+                download_time = NOW()
+            WHERE downloads_id = %(downloads_id)s
+              AND state = 'pending'
+            RETURNING *
+        """, {'downloads_id': downloads_id}).hash()
+    except McTupleAlreadyMovedError as ex:
+        # Download's row has been moved to another partition by a concurrent update, i.e. some other worker has
+        # claimed it first
+        log.info(f"Some other worker got to download {downloads_id} first: {ex}")
+        return
+
+    if not download:
+        state = db.query(
+            "SELECT state FROM downloads WHERE downloads_id = %(downloads_id)s",
+            {'downloads_id': downloads_id},
+        ).flat()
+        if not state:
+            raise McCrawlerFetcherHardError(f"Download {downloads_id} was not found.")
+
+        log.info(f"Skipping download {downloads_id} with state '{state[0]}'")
+        return
+
+    try:
+        handler = handler_for_download(db=db, download=download)
+
+        _fetch_and_handle_download(db=db, download=download, handler=handler)
+
+    except McCrawlerFetcherSoftError as ex:
+        if db.in_transaction():
+            db.rollback()
+        _log_claimed_download_error(db=db, download=download, error_message=str(ex))
+
+    except Exception as ex:
+        _log_claimed_download_error(db=db, download=download, error_message=str(ex))
+        raise ex
+
+
+def _log_claimed_download_error(db: DatabaseHandler, download: dict, error_message: str) -> None:
+    """Log error to a download that has been claimed by this worker.
+
+    Claimed download is in 'fetching' state which _log_download_error() would leave alone, and nobody else is going
+    to pick it up, so the error gets logged to it regardless.
+    """
+    _log_download_error(db=db, download={**download, 'state': 'pending'}, error_message=error_message)
+
+
+def run_fetcher(no_daemon: bool = False, batch_size: Optional[int] = None) -> None:
+    """Poll queued_downloads for new downloads and call fetch_and_handle_download().
+
+    Up to 'batch_size' downloads (MC_CRAWLER_FETCHER_BATCH_SIZE by default) are claimed on every poll. The database
+    connection is reused between polls and reestablished only after an error.
+    """
+
+    if not batch_size:
+        batch_size = CrawlerConfig.fetcher_batch_size()
+    if batch_size < 1:
+        raise McCrawlerFetcherHardError(f"Batch size must be positive, got {batch_size}")
 
     idle_timer = Timer('idle').start()
 
+    db = None
+
     while True:
 
-        # Reconnect
-        db = connect_to_db()
+        if db is None:
+            db = connect_to_db()
 
         download = None
         try:
-            downloads_id = db.query("SELECT pop_queued_download()").flat()[0]
-            if downloads_id:
-                download = db.find_by_id(table='downloads', object_id=downloads_id)
+            queued_downloads = _pop_queued_downloads(db=db, batch_size=batch_size)
+            if queued_downloads:
 
                 idle_timer.stop()
 
-                if download['state'] != 'pending':
-                    log.info(f"Skipping download {downloads_id} with state '{download['state']}'")
-                    continue
+                # Claimed downloads are gone from queued_downloads already, so if handling one of them fails with a
+                # hard error, the rest of the batch has to be put back
+                handled_count = 0
+                try:
+                    for download, feed_type in queued_downloads:
+                        handled_count += 1
+
+                        if download['state'] != 'pending':
+                            log.info(f"Skipping download {download['downloads_id']} with state '{download['state']}'")
+                            continue
+
+                        try:
+                            handler = handler_for_download(db=db, download=download, feed_type=feed_type)
+
+                            _fetch_and_handle_download(db=db, download=download, handler=handler)
 
-                handler = handler_for_download(db=db, download=download)
+                        except McCrawlerFetcherSoftError as ex:
+                            # Soft errors get logged (if possible), and the rest of the batch gets processed
+                            if db.in_transaction():
+                                db.rollback()
+                            _log_download_error(db=db, download=download, error_message=str(ex))
 
-                _fetch_and_handle_download(db=db, download=download, handler=handler)
+                finally:
+                    _requeue_downloads(
+                        db=db,
+                        downloads_ids=[download_['downloads_id'] for download_, _ in queued_downloads[handled_count:]],
+                    )
+
+                download = None
 
                 idle_timer.start()
             else:
@@ -153,12 +303,17 @@ def run_fetcher(no_daemon: bool = False) -> None:
             # Soft errors get logged (if possible)
             _log_download_error(db=db, download=download, error_message=str(ex))
 
+            # Start afresh with a new connection
+            db.disconnect()
+            db = None
+
         except Exception as ex:
             # Hard errors and uncategorized errors both get logged (if possible) and passed up
             _log_download_error(db=db, download=download, error_message=str(ex))
+            db.disconnect()
             raise ex
 
-        db.disconnect()
-
         if no_daemon:
+            if db is not None:
+                db.disconnect()
             break
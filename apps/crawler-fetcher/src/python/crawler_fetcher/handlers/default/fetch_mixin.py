@@ -28,7 +28,15 @@ class DefaultFetchMixin(AbstractDownloadHandler, metaclass=abc.ABCMeta):
         """
         return download['url']
 
-    def fetch_download(self, db: DatabaseHandler, download: dict) -> Optional[Response]:
+    def start_fetching_download(self, db: DatabaseHandler, download: dict) -> Optional[str]:
+        """
+        Mark the download as being fetched and return an URL that should be fetched for it.
+
+        Returns None if the download shouldn't be fetched because some other fetcher got to it first.
+
+        This is the part of fetch_download() that touches the database; the part that does the actual HTTP request is
+        fetch_url() which can be run without a database handler, e.g. in a separate thread.
+        """
         download = decode_object_from_bytes_if_needed(download)
 
         url = self._download_url(download=download)
@@ -53,7 +61,23 @@ class DefaultFetchMixin(AbstractDownloadHandler, metaclass=abc.ABCMeta):
             # Raise further on misc. errors
             raise ex
 
+        return url
+
+    # noinspection PyMethodMayBeStatic
+    def fetch_url(self, url: str) -> Response:
+        """Fetch download's URL (as returned by start_fetching_download()) and return the response."""
+        url = decode_object_from_bytes_if_needed(url)
+
         ua = UserAgent()
         response = ua.get_follow_http_html_redirects(url)
 
         return response
+
+    def fetch_download(self, db: DatabaseHandler, download: dict) -> Optional[Response]:
+        download = decode_object_from_bytes_if_needed(download)
+
+        url = self.start_fetching_download(db=db, download=download)
+        if not url:
+            return None
+
+        return self.fetch_url(url=url)
@@ -2,7 +2,7 @@ from typing import List, Dict, Any
 
 from mediawords.db import DatabaseHandler
 from mediawords.dbi.downloads.store import get_media_id
-from mediawords.dbi.stories.stories import add_story
+from mediawords.dbi.stories.stories import add_stories
 from mediawords.feed.parse import parse_feed
 from mediawords.util.log import create_logger
 from mediawords.util.perl import decode_object_from_bytes_if_needed
@@ -11,7 +11,7 @@ from crawler_fetcher.exceptions import McCrawlerFetcherSoftError
 from crawler_fetcher.handler import AbstractDownloadHandler
 from crawler_fetcher.handlers.default.fetch_mixin import DefaultFetchMixin
 from crawler_fetcher.handlers.feed import AbstractDownloadFeedHandler
-from crawler_fetcher.new_story import add_story_and_content_download
+from crawler_fetcher.new_story import add_stories_and_content_downloads
 from crawler_fetcher.stories_checksum import stories_checksum_matches_feed
 
 log = create_logger(__name__)
@@ -109,25 +109,33 @@ class DownloadFeedSyndicatedHandler(DefaultFetchMixin, AbstractDownloadFeedHandl
         if stories_checksum_matches_feed(db=db, feeds_id=download['feeds_id'], stories=stories):
             return []
 
-        new_story_ids = []
+        # FIXME None of the helpers like keys they don't know about
+        stories_without_enclosures = []
         for story in stories:
-
-            # FIXME None of the helpers like keys they don't know about
             story_without_enclosures = story.copy()
             story_without_enclosures.pop('enclosures')
+            stories_without_enclosures.append(story_without_enclosures)
 
-            if self._add_content_download_for_new_stories():
-                added_story = add_story_and_content_download(
-                    db=db,
-                    story=story_without_enclosures,
-                    parent_download=download,
-                )
-            else:
-                added_story = add_story(
-                    db=db,
-                    story=story_without_enclosures,
-                    feeds_id=download['feeds_id'],
-                )
+        if self._add_content_download_for_new_stories():
+            added_stories = add_stories_and_content_downloads(
+                db=db,
+                stories=stories_without_enclosures,
+                parent_download=download,
+            )
+        else:
+            added_stories = add_stories(
+                db=db,
+                stories=stories_without_enclosures,
+                feeds_id=download['feeds_id'],
+            )
+
+        new_story_ids = []
+
+        # Enclosures of all of the new stories, keyed by (stories_id, URL) because some stories have multiple enclosures
+        # pointing to the same URL
+        new_enclosures = {}
+
+        for story, added_story in zip(stories, added_stories):
 
             # We might have received None due to a GUID conflict
             if added_story:
@@ -137,26 +145,31 @@ class DownloadFeedSyndicatedHandler(DefaultFetchMixin, AbstractDownloadFeedHandl
 
                 if story_is_new:
 
-                    # Add all of the enclosures
                     for enclosure in story['enclosures']:
                         # ...provided that the URL is set
                         if enclosure['url']:
-                            db.query("""
-                                INSERT INTO story_enclosures (stories_id, url, mime_type, length)
-                                VALUES (%(stories_id)s, %(url)s, %(mime_type)s, %(length)s)
-                                
-                                -- Some stories have multiple enclosures pointing to the same URL
-                                ON CONFLICT (stories_id, url) DO NOTHING
-                            """, {
-                                'stories_id': stories_id,
-                                'url': enclosure['url'],
-                                'mime_type': enclosure['mime_type'],
-                                'length': enclosure['length'],
-                            })
+                            new_enclosures.setdefault((stories_id, enclosure['url'],), enclosure)
 
                     # Append to the list of newly added storyes
                     new_story_ids.append(stories_id)
 
+        # Add all of the enclosures
+        if new_enclosures:
+            db.query("""
+                INSERT INTO story_enclosures (stories_id, url, mime_type, length)
+                    SELECT stories_id, url, mime_type, length
+                    FROM unnest(%(stories_ids)s::int[], %(urls)s::text[], %(mime_types)s::text[], %(lengths)s::bigint[])
+                        AS new_enclosures (stories_id, url, mime_type, length)
+
+                -- Some stories have multiple enclosures pointing to the same URL
+                ON CONFLICT (stories_id, url) DO NOTHING
+            """, {
+                'stories_ids': [key[0] for key in new_enclosures.keys()],
+                'urls': [key[1] for key in new_enclosures.keys()],
+                'mime_types': [enclosure['mime_type'] for enclosure in new_enclosures.values()],
+                'lengths': [enclosure['length'] for enclosure in new_enclosures.values()],
+            })
+
         log.info(f"add_stories_from_feed: new stories: {len(new_story_ids)} / {len(stories)}")
 
         return new_story_ids
@@ -1,13 +1,31 @@
 import datetime
-from typing import Optional
+from typing import Optional, List
 
 from mediawords.db import DatabaseHandler
-from mediawords.dbi.stories.stories import add_story
+from mediawords.dbi.stories.stories import add_story, add_stories
 from mediawords.util.perl import decode_object_from_bytes_if_needed
 from mediawords.util.sql import get_sql_date_from_epoch
 from mediawords.util.url import get_url_host
 
 
+def _content_download_time(db: DatabaseHandler, media_id: int) -> Optional[str]:
+    """Return the time at which content downloads for a new story in the medium should be fetched, or None if they
+    should be fetched right away."""
+    content_delay = db.query("""
+        SELECT content_delay
+        FROM media
+        WHERE media_id = %(media_id)s
+    """, {'media_id': media_id}).flat()[0]
+    if content_delay:
+        # Delay download of content this many hours. his is useful for sources that are likely to significantly change
+        # content in the hours after it is first published.
+        now = int(datetime.datetime.now(datetime.timezone.utc).timestamp())
+        download_at_timestamp = now + (content_delay * 60 * 60)
+        return get_sql_date_from_epoch(download_at_timestamp)
+
+    return None
+
+
 def _create_child_download_for_story(db: DatabaseHandler, story: dict, parent_download: dict) -> None:
     """Create a pending download for the story's URL."""
     story = decode_object_from_bytes_if_needed(story)
@@ -26,21 +44,52 @@ def _create_child_download_for_story(db: DatabaseHandler, story: dict, parent_do
         'extracted': False,
     }
 
-    content_delay = db.query("""
-        SELECT content_delay
-        FROM media
-        WHERE media_id = %(media_id)s
-    """, {'media_id': story['media_id']}).flat()[0]
-    if content_delay:
-        # Delay download of content this many hours. his is useful for sources that are likely to significantly change
-        # content in the hours after it is first published.
-        now = int(datetime.datetime.now(datetime.timezone.utc).timestamp())
-        download_at_timestamp = now + (content_delay * 60 * 60)
-        download['download_time'] = get_sql_date_from_epoch(download_at_timestamp)
+    download_time = _content_download_time(db=db, media_id=story['media_id'])
+    if download_time:
+        download['download_time'] = download_time
 
     db.create(table='downloads', insert_hash=download)
 
 
+def _create_child_downloads_for_stories(db: DatabaseHandler, stories: List[dict], parent_download: dict) -> None:
+    """Create pending downloads for the URLs of a list of stories from the same medium in a single query."""
+    stories = decode_object_from_bytes_if_needed(stories)
+    parent_download = decode_object_from_bytes_if_needed(parent_download)
+
+    if not stories:
+        return
+
+    download_time = _content_download_time(db=db, media_id=stories[0]['media_id'])
+
+    db.query("""
+        INSERT INTO downloads (
+            feeds_id, stories_id, parent, url, host, type, sequence, state, priority, extracted, download_time
+        )
+            SELECT
+                %(feeds_id)s,
+                new_downloads.stories_id,
+                %(parent)s,
+                new_downloads.url,
+                new_downloads.host,
+                'content'::download_type,
+                1,
+                'pending'::download_state,
+                %(priority)s,
+                'f',
+                COALESCE(%(download_time)s::timestamp, NOW())
+            FROM unnest(%(stories_ids)s::int[], %(urls)s::text[], %(hosts)s::text[])
+                AS new_downloads (stories_id, url, host)
+    """, {
+        'feeds_id': parent_download['feeds_id'],
+        'parent': parent_download['downloads_id'],
+        'priority': parent_download['priority'],
+        'download_time': download_time,
+        'stories_ids': [story['stories_id'] for story in stories],
+        'urls': [story['url'] for story in stories],
+        'hosts': [get_url_host(story['url']) for story in stories],
+    })
+
+
 def add_story_and_content_download(db: DatabaseHandler, story: dict, parent_download: dict) -> Optional[dict]:
     """If the story is new, add it to the database and also add a pending download for the story content."""
     story = decode_object_from_bytes_if_needed(story)
@@ -53,3 +102,22 @@ def add_story_and_content_download(db: DatabaseHandler, story: dict, parent_down
             _create_child_download_for_story(db=db, story=story, parent_download=parent_download)
 
     return story
+
+
+def add_stories_and_content_downloads(db: DatabaseHandler,
+                                      stories: List[dict],
+                                      parent_download: dict) -> List[Optional[dict]]:
+    """Bulk version of add_story_and_content_download() for a list of stories from the same medium, e.g. all items of a
+    single feed."""
+    stories = decode_object_from_bytes_if_needed(stories)
+    parent_download = decode_object_from_bytes_if_needed(parent_download)
+
+    stories = add_stories(db=db, stories=stories, feeds_id=parent_download['feeds_id'])
+
+    _create_child_downloads_for_stories(
+        db=db,
+        stories=[story for story in stories if story and story.get('is_new', False)],
+        parent_download=parent_download,
+    )
+
+    return stories
@@ -0,0 +1,222 @@
+"""
+Concurrent fetch pipeline for a single crawler_fetcher process.
+
+run_fetcher() fetches and stores one download at a time, so the only way to crawl faster with it is to start more
+fetcher processes. run_pipelined_fetcher() instead keeps up to MC_CRAWLER_FETCHER_CONCURRENCY downloads in flight within
+a single process:
+
+* the main thread owns the main database connection; it claims queued downloads, picks handlers for them and marks them
+  as being fetched;
+* HTTP requests are made by a pool of fetch threads which don't touch the database at all;
+* fetched responses are stored by a smaller, bounded pool of store threads, each with its own database connection.
+"""
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, Future, wait, FIRST_COMPLETED
+from typing import Optional, Dict, List, Tuple
+
+from mediawords.db import DatabaseHandler, connect_to_db
+from mediawords.util.log import create_logger
+from mediawords.util.web.user_agent import Response
+
+from crawler_fetcher.config import CrawlerConfig
+from crawler_fetcher.engine import (
+    handler_for_download,
+    _log_download_error,
+    _pop_queued_downloads,
+    _requeue_downloads,
+    _SLEEP_SECONDS_ON_NO_DOWNLOADS,
+)
+from crawler_fetcher.exceptions import McCrawlerFetcherHardError, McCrawlerFetcherSoftError
+from crawler_fetcher.handler import AbstractDownloadHandler
+from crawler_fetcher.handlers.default.fetch_mixin import DefaultFetchMixin
+
+log = create_logger(__name__)
+
+_WAIT_SECONDS_WHILE_IN_FLIGHT = 1
+"""How many seconds to wait for in-flight downloads before checking the queue for more."""
+
+
+class _StoreWorkerPool(object):
+    """Bounded pool of threads that store fetched responses, each thread using its own database connection."""
+
+    __slots__ = [
+        '__executor',
+        '__local',
+        '__connections',
+        '__connections_lock',
+    ]
+
+    def __init__(self, workers: int):
+        self.__executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='store')
+        self.__local = threading.local()
+        self.__connections = []
+        self.__connections_lock = threading.Lock()
+
+    def __db(self) -> DatabaseHandler:
+        """Return store thread's own database handler, connect if needed."""
+        db = getattr(self.__local, 'db', None)
+        if db is None:
+            db = connect_to_db()
+            self.__local.db = db
+            with self.__connections_lock:
+                self.__connections.append(db)
+        return db
+
+    def __store(self, download: dict, handler: AbstractDownloadHandler, response: Response) -> None:
+        db = self.__db()
+
+        downloads_id = download['downloads_id']
+        url = download['url']
+
+        try:
+            handler.store_response(db=db, download=download, response=response)
+
+        except McCrawlerFetcherSoftError as ex:
+            if db.in_transaction():
+                db.rollback()
+            _log_download_error(db=db, download=download, error_message=str(ex))
+
+        except Exception as ex:
+            log.error(f"Error in handle_response() for downloads_id {downloads_id} {url}: {ex}")
+            if db.in_transaction():
+                db.rollback()
+            _log_download_error(db=db, download=download, error_message=str(ex))
+            raise ex
+
+        log.info(f"Fetch done: {downloads_id} {url}")
+
+    def submit(self, download: dict, handler: AbstractDownloadHandler, response: Response) -> Future:
+        """Schedule the response to be stored."""
+        return self.__executor.submit(self.__store, download, handler, response)
+
+    def shutdown(self) -> None:
+        """Wait for all scheduled responses to get stored, disconnect from the database."""
+        self.__executor.shutdown(wait=True)
+        with self.__connections_lock:
+            for db in self.__connections:
+                db.disconnect()
+            self.__connections = []
+
+
+def run_pipelined_fetcher(no_daemon: bool = False,
+                          concurrency: Optional[int] = None,
+                          store_workers: Optional[int] = None) -> None:
+    """Poll queued_downloads for new downloads and fetch and store up to 'concurrency' of them at the same time.
+
+    With 'no_daemon' set, claim queued downloads only once, wait for them to get fetched and stored, and return.
+    """
+
+    if not concurrency:
+        concurrency = CrawlerConfig.fetcher_concurrency()
+    if not store_workers:
+        store_workers = CrawlerConfig.fetcher_store_workers()
+
+    if concurrency < 1:
+        raise McCrawlerFetcherHardError(f"Concurrency must be positive, got {concurrency}")
+    if store_workers < 1:
+        raise McCrawlerFetcherHardError(f"Store worker count must be positive, got {store_workers}")
+
+    db = connect_to_db()
+
+    fetch_executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='fetch')
+    store_pool = _StoreWorkerPool(workers=store_workers)
+
+    # Futures of downloads that are being fetched / stored at the moment
+    fetching: Dict[Future, Tuple[dict, AbstractDownloadHandler]] = {}
+    storing: Dict[Future, dict] = {}
+
+    def store(download_: dict, handler_: AbstractDownloadHandler, response_: Optional[Response]) -> None:
+        if response_:
+            storing[store_pool.submit(download=download_, handler=handler_, response=response_)] = download_
+        else:
+            log.warning(f"Response for download {download_['downloads_id']} is None")
+
+    try:
+        claim_downloads = True
+
+        while True:
+
+            queued_downloads: List[Tuple[dict, Optional[str]]] = []
+
+            if claim_downloads:
+                free_slots = concurrency - len(fetching) - len(storing)
+                if free_slots > 0:
+                    queued_downloads = _pop_queued_downloads(db=db, batch_size=free_slots)
+
+                # Put the rest of the claimed downloads back if starting one of them fails with a hard error
+                started_count = 0
+                try:
+                    for download, feed_type in queued_downloads:
+                        started_count += 1
+
+                        if download['state'] != 'pending':
+                            log.info(f"Skipping download {download['downloads_id']} with state '{download['state']}'")
+                            continue
+
+                        log.info(f"Fetch: {download['downloads_id']} {download['url']}...")
+
+                        try:
+                            handler = handler_for_download(db=db, download=download, feed_type=feed_type)
+
+                            if isinstance(handler, DefaultFetchMixin):
+                                url = handler.start_fetching_download(db=db, download=download)
+                                if url:
+                                    fetching[fetch_executor.submit(handler.fetch_url, url)] = (download, handler,)
+                                else:
+                                    log.warning(f"Response for download {download['downloads_id']} is None")
+                            else:
+                                # Handler doesn't know how to fetch without a database handler, so fetch in this
+                                # thread
+                                store(download, handler, handler.fetch_download(db=db, download=download))
+
+                        except McCrawlerFetcherSoftError as ex:
+                            _log_download_error(db=db, download=download, error_message=str(ex))
+
+                finally:
+                    _requeue_downloads(
+                        db=db,
+                        downloads_ids=[download_['downloads_id'] for download_, _ in queued_downloads[started_count:]],
+                    )
+
+                if no_daemon:
+                    claim_downloads = False
+
+            if not (fetching or storing):
+                if no_daemon:
+                    break
+                if not queued_downloads:
+                    time.sleep(_SLEEP_SECONDS_ON_NO_DOWNLOADS)
+                continue
+
+            done, _ = wait(
+                list(fetching.keys()) + list(storing.keys()),
+                timeout=_WAIT_SECONDS_WHILE_IN_FLIGHT,
+                return_when=FIRST_COMPLETED,
+            )
+
+            for future in done:
+
+                if future in fetching:
+                    download, handler = fetching.pop(future)
+                    try:
+                        response = future.result()
+                    except McCrawlerFetcherSoftError as ex:
+                        _log_download_error(db=db, download=download, error_message=str(ex))
+                    except Exception as ex:
+                        _log_download_error(db=db, download=download, error_message=str(ex))
+                        raise ex
+                    else:
+                        store(download, handler, response)
+
+                else:
+                    storing.pop(future)
+
+                    # Store workers log download errors themselves, so just pass hard errors up
+                    future.result()
+
+    finally:
+        fetch_executor.shutdown(wait=True)
+        store_pool.shutdown()
+        db.disconnect()
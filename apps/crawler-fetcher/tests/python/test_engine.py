@@ -1,3 +1,7 @@
+import pytest
+
+# noinspection PyProtectedMember
+from crawler_fetcher import engine
 from crawler_fetcher.engine import run_fetcher
 from mediawords.db import connect_to_db
 from mediawords.test.db.create import create_test_medium, create_test_feed, create_test_story
@@ -41,3 +45,95 @@ def test_run_fetcher():
 
     test_download = db.find_by_id(table='downloads', object_id=download['downloads_id'])
     assert test_download['state'] == 'success'
+
+
+def test_run_fetcher_batch():
+    db = connect_to_db()
+
+    medium = create_test_medium(db=db, label='foo')
+    feed = create_test_feed(db=db, label='foo', medium=medium)
+    story = create_test_story(db=db, label='foo', feed=feed)
+
+    port = random_unused_port()
+    pages = {
+        '/foo': 'foo',
+        '/bar': 'bar',
+    }
+
+    hs = HashServer(port=port, pages=pages)
+    hs.start()
+
+    downloads = []
+    for path in pages.keys():
+        downloads.append(db.create(table='downloads', insert_hash={
+            'state': 'pending',
+            'feeds_id': feed['feeds_id'],
+            'stories_id': story['stories_id'],
+            'type': 'content',
+            'sequence': 1,
+            'priority': 1,
+            'url': f"http://localhost:{port}{path}",
+            'host': 'localhost',
+        }))
+
+    db.query("""
+        INSERT INTO queued_downloads (downloads_id)
+        SELECT downloads_id FROM downloads
+    """)
+
+    run_fetcher(no_daemon=True, batch_size=len(downloads))
+
+    queued_count = db.query("SELECT COUNT(*) FROM queued_downloads").flat()[0]
+    assert queued_count == 0
+
+    for download in downloads:
+        test_download = db.find_by_id(table='downloads', object_id=download['downloads_id'])
+        assert test_download['state'] == 'success'
+
+
+def test_run_fetcher_batch_hard_error(monkeypatch):
+    db = connect_to_db()
+
+    medium = create_test_medium(db=db, label='foo')
+    feed = create_test_feed(db=db, label='foo', medium=medium)
+    story = create_test_story(db=db, label='foo', feed=feed)
+
+    downloads = []
+    for path in ('/foo', '/bar', '/baz'):
+        downloads.append(db.create(table='downloads', insert_hash={
+            'state': 'pending',
+            'feeds_id': feed['feeds_id'],
+            'stories_id': story['stories_id'],
+            'type': 'content',
+            'sequence': 1,
+            'priority': 1,
+            'url': f"http://localhost{path}",
+            'host': 'localhost',
+        }))
+
+    db.query("""
+        INSERT INTO queued_downloads (downloads_id)
+        SELECT downloads_id FROM downloads
+    """)
+
+    # noinspection PyUnusedLocal
+    def _fail_hard(db, download, handler):
+        raise Exception("Hard error")
+
+    monkeypatch.setattr(engine, '_fetch_and_handle_download', _fail_hard)
+
+    with pytest.raises(Exception):
+        run_fetcher(no_daemon=True, batch_size=len(downloads))
+
+    # Batch gets claimed in the descending order of download IDs, and the first download fails
+    downloads_ids = sorted([download['downloads_id'] for download in downloads], reverse=True)
+    failed_downloads_id = downloads_ids[0]
+
+    db = connect_to_db()
+
+    failed_download = db.find_by_id(table='downloads', object_id=failed_downloads_id)
+    assert failed_download['state'] == 'error'
+
+    # The rest of the batch gets put back
+    queued_downloads_ids = db.query("SELECT downloads_id FROM queued_downloads ORDER BY downloads_id DESC").flat()
+    assert queued_downloads_ids == downloads_ids[1:]
@@ -0,0 +1,87 @@
+import pytest
+
+from crawler_fetcher.engine import fetch_and_handle_download_id
+from crawler_fetcher.exceptions import McCrawlerFetcherHardError
+from mediawords.db import connect_to_db
+from mediawords.test.db.create import create_test_medium, create_test_feed, create_test_story
+from mediawords.test.hash_server import HashServer
+from mediawords.util.network import random_unused_port
+
+
+def test_fetch_and_handle_download_id():
+    db = connect_to_db()
+
+    medium = create_test_medium(db=db, label='foo')
+    feed = create_test_feed(db=db, label='foo', medium=medium)
+    story = create_test_story(db=db, label='foo', feed=feed)
+
+    port = random_unused_port()
+    pages = {
+        '/foo': 'foo',
+        '/bar': 'bar',
+    }
+
+    hs = HashServer(port=port, pages=pages)
+    hs.start()
+
+    downloads = {}
+    for path in pages.keys():
+        downloads[path] = db.create(table='downloads', insert_hash={
+            'state': 'pending',
+            'feeds_id': feed['feeds_id'],
+            'stories_id': story['stories_id'],
+            'type': 'content',
+            'sequence': 1,
+            'priority': 1,
+            'url': f"http://localhost:{port}{path}",
+            'host': 'localhost',
+        })
+
+    foo_downloads_id = downloads['/foo']['downloads_id']
+    fetch_and_handle_download_id(db=db, downloads_id=foo_downloads_id)
+
+    foo_download = db.find_by_id(table='downloads', object_id=foo_downloads_id)
+    assert foo_download['state'] == 'success'
+
+    # Duplicate push of the same download doesn't fetch it again
+    fetch_and_handle_download_id(db=db, downloads_id=foo_downloads_id)
+    assert db.find_by_id(table='downloads', object_id=foo_downloads_id)['download_time'] == foo_download[
+        'download_time']
+
+    # Download that has been claimed by some other worker doesn't get fetched
+    bar_downloads_id = downloads['/bar']['downloads_id']
+    db.update_by_id(table='downloads', object_id=bar_downloads_id, update_hash={'state': 'fetching'})
+
+    fetch_and_handle_download_id(db=db, downloads_id=bar_downloads_id)
+    assert db.find_by_id(table='downloads', object_id=bar_downloads_id)['state'] == 'fetching'
+
+    hs.stop()
+
+    with pytest.raises(McCrawlerFetcherHardError):
+        fetch_and_handle_download_id(db=db, downloads_id=bar_downloads_id + 1000)
+
+
+def test_fetch_and_handle_download_id_error():
+    db = connect_to_db()
+
+    medium = create_test_medium(db=db, label='foo')
+    feed = create_test_feed(db=db, label='foo', medium=medium)
+    story = create_test_story(db=db, label='foo', feed=feed)
+
+    download = db.create(table='downloads', insert_hash={
+        'state': 'pending',
+        'feeds_id': feed['feeds_id'],
+        'stories_id': story['stories_id'],
+        'type': 'content',
+        'sequence': 1,
+        'priority': 1,
+        'url': 'ftp://localhost/foo',
+        'host': 'localhost',
+    })
+
+    # Soft error gets logged to the claimed download instead of leaving it in 'fetching' state
+    fetch_and_handle_download_id(db=db, downloads_id=download['downloads_id'])
+
+    download = db.find_by_id(table='downloads', object_id=download['downloads_id'])
+    assert download['state'] == 'error'
+    assert 'not HTTP' in download['error_message']
@@ -0,0 +1,56 @@
+from crawler_fetcher.pipeline import run_pipelined_fetcher
+from mediawords.db import connect_to_db
+from mediawords.test.db.create import create_test_medium, create_test_feed, create_test_story
+from mediawords.test.hash_server import HashServer
+from mediawords.util.network import random_unused_port
+
+
+def test_run_pipelined_fetcher():
+    db = connect_to_db()
+
+    medium = create_test_medium(db=db, label='foo')
+    feed = create_test_feed(db=db, label='foo', medium=medium)
+    story = create_test_story(db=db, label='foo', feed=feed)
+
+    port = random_unused_port()
+    pages = {
+        '/foo': 'foo',
+        '/bar': 'bar',
+        '/baz': 'baz',
+        '/404': {'content': 'not found', 'http_status_code': 404},
+    }
+
+    hs = HashServer(port=port, pages=pages)
+    hs.start()
+
+    downloads = {}
+    for path in pages.keys():
+        downloads[path] = db.create(table='downloads', insert_hash={
+            'state': 'pending',
+            'feeds_id': feed['feeds_id'],
+            'stories_id': story['stories_id'],
+            'type': 'content',
+            'sequence': 1,
+            'priority': 1,
+            'url': f"http://localhost:{port}{path}",
+            'host': 'localhost',
+        })
+
+    db.query("""
+        INSERT INTO queued_downloads (downloads_id)
+        SELECT downloads_id FROM downloads
+    """)
+
+    run_pipelined_fetcher(no_daemon=True, concurrency=len(downloads), store_workers=2)
+
+    hs.stop()
+
+    queued_count = db.query("SELECT COUNT(*) FROM queued_downloads").flat()[0]
+    assert queued_count == 0
+
+    for path, download in downloads.items():
+        test_download = db.find_by_id(table='downloads', object_id=download['downloads_id'])
+        if path == '/404':
+            assert test_download['state'] == 'error'
+        else:
+            assert test_download['state'] == 'success'
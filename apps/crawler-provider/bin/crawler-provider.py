@@ -1,9 +1,13 @@
 #!/usr/bin/env python3
 
 from mediawords.db import connect_to_db
-from crawler_provider import run_provider
+from crawler_provider import run_provider, run_scheduling_provider
+from crawler_provider.config import CrawlerProviderConfig
 
 
 if __name__ == '__main__':
     db = connect_to_db()
-    run_provider(db)
+    if CrawlerProviderConfig.push_to_job_queue():
+        run_scheduling_provider(db)
+    else:
+        run_provider(db)
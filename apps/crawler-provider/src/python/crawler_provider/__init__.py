@@ -18,13 +18,21 @@ new jobs to the queue if there are more than MAX_QUEUE_SIZE jobs in the table.
 throttline by keeping the crawler jobs queue relatively small, thus limiting the number of requests for each
 host over a period of several minutes, while allowing the crawler_fetcher jobs to acts as simple stupid
 worker jobs that just do a quick query of queued_downloads to grab the oldest queued download.
+
+Alternatively, run_scheduling_provider() keeps pending downloads in an in-memory per-host scheduler (see
+crawler_provider.scheduler) and pushes them straight to the fetch download job queue, so fetchers don't have to poll
+queued_downloads at all.
 """
 
 import time
+from typing import Dict, List, Any, Set
 
 from mediawords.db import DatabaseHandler
+from mediawords.job import JobBroker
 from mediawords.util.log import create_logger
 
+from crawler_provider.scheduler import HostScheduler
+
 log = create_logger(__name__)
 
 # how often to download each feed (seconds)
@@ -45,6 +53,18 @@ QUEUE_INTERVAL = 1
 # truncate table queued_downloads after this many seconds to avoid dead row bloat in the table
 QUEUE_TRUNCATE_INTERVAL = 3600
 
+# job queue to which run_scheduling_provider() pushes downloads
+FETCH_DOWNLOAD_QUEUE = 'MediaWords::Job::Crawler::FetchDownload'
+
+# reload pending downloads into the scheduler after this many seconds
+SCHEDULER_REFRESH_INTERVAL = 30
+
+# load at most this many pending downloads per host on every reload
+SCHEDULER_DOWNLOADS_PER_HOST = SCHEDULER_REFRESH_INTERVAL // QUEUE_INTERVAL
+
+# check the scheduler for downloads that are ready to be fetched every this many seconds
+SCHEDULER_TICK_INTERVAL = 0.1
+
 
 def _timeout_stale_downloads(db: DatabaseHandler) -> None:
     """Move fetching downloads back to pending after STALE_DOWNLOAD_INTERVAL.
@@ -215,3 +235,104 @@ def run_provider(db: DatabaseHandler, daemon: bool = True) -> None:
 
         if not daemon:
             break
+
+
+def _load_pending_downloads(db: DatabaseHandler, downloads_per_host: int) -> List[Dict[str, Any]]:
+    """Return up to 'downloads_per_host' pending downloads for every host with pending downloads."""
+
+    # same recursive "loose index scan" over hosts as in get_downloads_for_queue() to avoid a scan of the whole
+    # (host, priority, downloads_id) index
+    downloads = db.query(
+        """
+        WITH RECURSIVE hosts AS (
+            (SELECT host FROM downloads_pending ORDER BY host LIMIT 1)
+            UNION ALL
+            SELECT (SELECT host FROM downloads_pending WHERE host > hosts.host ORDER BY host LIMIT 1)
+            FROM hosts
+            WHERE hosts.host IS NOT NULL
+        )
+        SELECT host_downloads.downloads_id,
+               host_downloads.host,
+               host_downloads.priority
+        FROM hosts
+            CROSS JOIN LATERAL (
+                SELECT downloads_id, host, priority
+                FROM downloads_pending
+                WHERE downloads_pending.host = hosts.host
+                ORDER BY priority, downloads_id DESC NULLS LAST
+                LIMIT %(a)s
+            ) AS host_downloads
+        WHERE hosts.host IS NOT NULL
+        """,
+        {'a': downloads_per_host}).hashes()
+
+    return downloads
+
+
+def _still_pending_downloads_ids(db: DatabaseHandler, downloads_ids: Set[int]) -> Set[int]:
+    """Return the subset of 'downloads_ids' that no fetcher has gotten to yet."""
+    if not downloads_ids:
+        return set()
+
+    still_pending = db.query(
+        "select downloads_id from downloads_pending where downloads_id = any(%(a)s)",
+        {'a': list(downloads_ids)}).flat()
+
+    return set(still_pending)
+
+
+def run_scheduling_provider(db: DatabaseHandler, daemon: bool = True) -> None:
+    """Run the provider daemon that pushes pending downloads to the fetch download job queue.
+
+    Every SCHEDULER_REFRESH_INTERVAL seconds, reload up to SCHEDULER_DOWNLOADS_PER_HOST pending downloads for each host
+    into an in-memory scheduler. In between the reloads, hand out the downloads in the same order as
+    provide_download_ids() does while rate limiting each host to one download every QUEUE_INTERVAL seconds.
+
+    Downloads that were pushed to the job queue but are still pending are not pushed again, and no more than
+    MAX_QUEUE_SIZE of such downloads are allowed to wait in the job queue.
+    """
+    scheduler = HostScheduler(rate_per_host=1 / QUEUE_INTERVAL)
+    broker = JobBroker(queue_name=FETCH_DOWNLOAD_QUEUE)
+
+    queued_downloads_ids = set()
+    last_refresh_time = 0
+
+    while True:
+        if time.time() - last_refresh_time > SCHEDULER_REFRESH_INTERVAL:
+            _timeout_stale_downloads(db)
+
+            _add_stale_feeds(db)
+
+            queued_downloads_ids = _still_pending_downloads_ids(db, queued_downloads_ids)
+
+            log.info("loading pending downloads into the scheduler ...")
+
+            scheduler.clear()
+            for download in _load_pending_downloads(db, SCHEDULER_DOWNLOADS_PER_HOST):
+                if download['downloads_id'] not in queued_downloads_ids:
+                    scheduler.add(
+                        downloads_id=download['downloads_id'],
+                        host=download['host'],
+                        priority=download['priority'])
+
+            log.info("scheduled downloads: %d, hosts: %d" % (len(scheduler), scheduler.host_count()))
+
+            last_refresh_time = time.time()
+
+        free_queue_slots = MAX_QUEUE_SIZE - len(queued_downloads_ids)
+        if free_queue_slots > 0:
+            downloads_ids = scheduler.pop_ready(limit=free_queue_slots)
+
+            if downloads_ids:
+                log.info("adding to downloads to job queue: %d" % len(downloads_ids))
+
+            broker.add_many_to_queue([{'downloads_id': downloads_id} for downloads_id in downloads_ids])
+            queued_downloads_ids.update(downloads_ids)
+
+        else:
+            log.warning("job queue is full: %d" % len(queued_downloads_ids))
+
+        if not daemon:
+            break
+
+        time.sleep(SCHEDULER_TICK_INTERVAL)
@@ -0,0 +1,12 @@
+from mediawords.util.config import env_value
+
+
+class CrawlerProviderConfig(object):
+    """Crawler provider configuration."""
+
+    @staticmethod
+    def push_to_job_queue() -> bool:
+        """Whether to push pending downloads to the fetch download job queue instead of adding them to
+        queued_downloads."""
+        value = env_value(name='MC_CRAWLER_PROVIDER_PUSH_TO_JOB_QUEUE', required=False, allow_empty_string=True)
+        return value is not None and value.lower() in {'1', 'true', 'yes'}
@@ -0,0 +1,166 @@
+"""
+In-memory per-host download scheduler.
+
+Pending downloads are kept in per-host priority queues (ordered by "priority ASC, downloads_id DESC", just like
+get_downloads_for_queue() does it), and every host is rate limited with its own token bucket.
+"""
+
+import heapq
+import time
+from typing import Dict, List, Optional, Set, Tuple
+
+from mediawords.util.perl import decode_object_from_bytes_if_needed
+
+
+class McHostSchedulerException(Exception):
+    """Host scheduler exception."""
+    pass
+
+
+class TokenBucket(object):
+    """Token bucket that refills at 'rate' tokens per second up to 'capacity' tokens."""
+
+    __slots__ = [
+        '__rate',
+        '__capacity',
+        '__tokens',
+        '__last_refill_time',
+    ]
+
+    def __init__(self, rate: float, capacity: float, now: float):
+        if rate <= 0:
+            raise McHostSchedulerException(f"Rate must be positive, got {rate}")
+        if capacity < 1:
+            raise McHostSchedulerException(f"Capacity must be at least 1, got {capacity}")
+
+        self.__rate = rate
+        self.__capacity = capacity
+        self.__tokens = capacity
+        self.__last_refill_time = now
+
+    def __refill(self, now: float) -> None:
+        elapsed = max(now - self.__last_refill_time, 0)
+        self.__tokens = min(self.__capacity, self.__tokens + elapsed * self.__rate)
+        self.__last_refill_time = now
+
+    def is_full(self, now: float) -> bool:
+        """Return True if the bucket is full, i.e. forgetting about it wouldn't change anything."""
+        self.__refill(now=now)
+        return self.__tokens >= self.__capacity
+
+    def try_take(self, now: float) -> bool:
+        """Take a single token if one is available; return True if it was taken."""
+        self.__refill(now=now)
+        if self.__tokens < 1:
+            return False
+        self.__tokens -= 1
+        return True
+
+
+class HostScheduler(object):
+    """Per-host priority queues of pending downloads with a token bucket rate limit for every host."""
+
+    __slots__ = [
+        '__rate_per_host',
+        '__burst_per_host',
+
+        # Host -> heap of (priority, -downloads_id) tuples
+        '__queues',
+
+        # Host -> token bucket
+        '__buckets',
+
+        # Download IDs that are currently in one of the queues
+        '__scheduled_ids',
+    ]
+
+    def __init__(self, rate_per_host: float, burst_per_host: float = 1):
+        """
+        Constructor.
+
+        :param rate_per_host: How many downloads per second to hand out for a single host.
+        :param burst_per_host: How many downloads to hand out at once for a host that has been idle for a while.
+        """
+        if rate_per_host <= 0:
+            raise McHostSchedulerException(f"Rate per host must be positive, got {rate_per_host}")
+        if burst_per_host < 1:
+            raise McHostSchedulerException(f"Burst per host must be at least 1, got {burst_per_host}")
+
+        self.__rate_per_host = rate_per_host
+        self.__burst_per_host = burst_per_host
+        self.__queues: Dict[str, List[Tuple[int, int]]] = {}
+        self.__buckets: Dict[str, TokenBucket] = {}
+        self.__scheduled_ids: Set[int] = set()
+
+    def __len__(self) -> int:
+        return len(self.__scheduled_ids)
+
+    def host_count(self) -> int:
+        """Return the number of hosts with scheduled downloads."""
+        return len(self.__queues)
+
+    def add(self, downloads_id: int, host: str, priority: int) -> bool:
+        """Schedule a download; return False if it was scheduled already."""
+        host = decode_object_from_bytes_if_needed(host)
+
+        downloads_id = int(downloads_id)
+        priority = int(priority or 0)
+
+        if downloads_id in self.__scheduled_ids:
+            return False
+
+        host = (host or '').lower()
+
+        heapq.heappush(self.__queues.setdefault(host, []), (priority, -downloads_id,))
+        self.__scheduled_ids.add(downloads_id)
+
+        return True
+
+    def clear(self) -> None:
+        """Forget about all scheduled downloads but keep the hosts' rate limits."""
+        self.__queues = {}
+        self.__scheduled_ids = set()
+
+    def pop_ready(self, limit: int, now: Optional[float] = None) -> List[int]:
+        """Return up to 'limit' download IDs from hosts which are not rate limited at the moment."""
+        if now is None:
+            now = time.time()
+
+        downloads_ids = []
+
+        while len(downloads_ids) < limit:
+            popped_in_round = False
+
+            # Go around all hosts taking at most a single download from each so that a host with a big burst doesn't
+            # get ahead of the others
+            for host in list(self.__queues.keys()):
+                if len(downloads_ids) >= limit:
+                    break
+
+                bucket = self.__buckets.get(host, None)
+                if bucket is None:
+                    bucket = TokenBucket(rate=self.__rate_per_host, capacity=self.__burst_per_host, now=now)
+                    self.__buckets[host] = bucket
+
+                if not bucket.try_take(now=now):
+                    continue
+
+                queue = self.__queues[host]
+                priority, negative_downloads_id = heapq.heappop(queue)
+                if not queue:
+                    del self.__queues[host]
+
+                downloads_id = -negative_downloads_id
+                self.__scheduled_ids.discard(downloads_id)
+                downloads_ids.append(downloads_id)
+                popped_in_round = True
+
+            if not popped_in_round:
+                break
+
+        # Full buckets of hosts with nothing scheduled would get recreated in the exact same state
+        for host in list(self.__buckets.keys()):
+            if host not in self.__queues and self.__buckets[host].is_full(now=now):
+                del self.__buckets[host]
+
+        return downloads_ids
@@ -0,0 +1,72 @@
+from typing import Any, Dict, List
+
+import crawler_provider
+from crawler_provider import run_scheduling_provider, FETCH_DOWNLOAD_QUEUE
+from mediawords.test.db.create import create_test_medium, create_test_feed
+from mediawords.db import connect_to_db
+
+
+class _RecordingJobBroker(object):
+    """Job broker which records the jobs instead of publishing them."""
+
+    jobs = []
+
+    def __init__(self, queue_name: str):
+        assert queue_name == FETCH_DOWNLOAD_QUEUE
+
+    def add_to_queue(self, **kwargs) -> str:
+        self.jobs.append(kwargs)
+        return str(len(self.jobs))
+
+    def add_many_to_queue(self, list_of_kwargs: List[Dict[str, Any]]) -> List[str]:
+        return [self.add_to_queue(**kwargs) for kwargs in list_of_kwargs]
+
+
+def test_run_scheduling_provider(monkeypatch):
+    db = connect_to_db()
+
+    medium = create_test_medium(db, 'foo')
+    feed = create_test_feed(db, 'foo', medium=medium)
+
+    hosts = ('foo.bar', 'bar.bat', 'bat.baz')
+    downloads_per_host = 3
+
+    for host in hosts:
+        for i in range(downloads_per_host):
+            db.create('downloads', {
+                'feeds_id': feed['feeds_id'],
+                'state': 'pending',
+                'priority': 1,
+                'sequence': 1,
+                'type': 'content',
+                'url': 'http://' + host + '/' + str(i),
+                'host': host,
+            })
+
+    monkeypatch.setattr(crawler_provider, 'JobBroker', _RecordingJobBroker)
+    _RecordingJobBroker.jobs = []
+
+    run_scheduling_provider(db, daemon=False)
+
+    pushed_downloads_ids = [job['downloads_id'] for job in _RecordingJobBroker.jobs]
+    assert len(pushed_downloads_ids) == len(set(pushed_downloads_ids)), "Downloads are pushed only once"
+
+    pushed_downloads = db.query("""
+        SELECT downloads_id, host, state
+        FROM downloads
+        WHERE downloads_id = ANY(%(downloads_ids)s)
+    """, {'downloads_ids': pushed_downloads_ids}).hashes()
+    assert len(pushed_downloads) == len(pushed_downloads_ids)
+
+    # Every host is rate limited to a single download at first; +1 for the test feed
+    assert len(pushed_downloads) == len(hosts) + 1
+    pushed_hosts = [download['host'] for download in pushed_downloads]
+    for host in hosts:
+        assert pushed_hosts.count(host) == 1
+
+    # Provider only pushes the downloads, fetchers claim them
+    for download in pushed_downloads:
+        assert download['state'] == 'pending'
+
+    # Nothing gets added to "queued_downloads" in this mode
+    assert db.query("SELECT COUNT(*) FROM queued_downloads").flat()[0] == 0
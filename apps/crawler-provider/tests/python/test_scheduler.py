@@ -0,0 +1,63 @@
+from crawler_provider.scheduler import HostScheduler, TokenBucket
+
+
+def test_token_bucket():
+    bucket = TokenBucket(rate=1, capacity=2, now=0)
+
+    assert bucket.try_take(now=0)
+    assert bucket.try_take(now=0)
+    assert not bucket.try_take(now=0)
+
+    assert not bucket.try_take(now=0.5)
+    assert bucket.try_take(now=1)
+    assert not bucket.is_full(now=1)
+    assert bucket.is_full(now=10)
+
+
+def test_host_scheduler_order():
+    scheduler = HostScheduler(rate_per_host=1000, burst_per_host=1000)
+
+    scheduler.add(downloads_id=1, host='foo.com', priority=1)
+    scheduler.add(downloads_id=2, host='foo.com', priority=0)
+    scheduler.add(downloads_id=3, host='foo.com', priority=1)
+
+    # Duplicates get ignored
+    assert not scheduler.add(downloads_id=3, host='foo.com', priority=1)
+    assert len(scheduler) == 3
+
+    # Lowest priority first, then newest download first
+    assert scheduler.pop_ready(limit=10, now=0) == [2, 3, 1]
+    assert len(scheduler) == 0
+    assert scheduler.host_count() == 0
+
+
+def test_host_scheduler_rate_limit():
+    scheduler = HostScheduler(rate_per_host=1)
+
+    for downloads_id in range(1, 4):
+        scheduler.add(downloads_id=downloads_id, host='foo.com', priority=0)
+        scheduler.add(downloads_id=downloads_id + 10, host='bar.com', priority=0)
+
+    # One download per host per second
+    assert sorted(scheduler.pop_ready(limit=10, now=0)) == [3, 13]
+    assert scheduler.pop_ready(limit=10, now=0.5) == []
+    assert sorted(scheduler.pop_ready(limit=10, now=1)) == [2, 12]
+
+    # Limit is respected
+    assert len(scheduler.pop_ready(limit=1, now=2)) == 1
+    assert len(scheduler) == 1
+
+
+def test_host_scheduler_clear_keeps_rate_limits():
+    scheduler = HostScheduler(rate_per_host=1)
+
+    scheduler.add(downloads_id=1, host='foo.com', priority=0)
+    scheduler.add(downloads_id=2, host='foo.com', priority=0)
+    assert scheduler.pop_ready(limit=10, now=0) == [2]
+
+    scheduler.clear()
+    assert len(scheduler) == 0
+
+    scheduler.add(downloads_id=1, host='foo.com', priority=0)
+    assert scheduler.pop_ready(limit=10, now=0.5) == []
+    assert scheduler.pop_ready(limit=10, now=1) == [1]
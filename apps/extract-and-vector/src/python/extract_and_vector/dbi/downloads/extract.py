@@ -1,11 +1,15 @@
 """Functions for extracting downloads."""
 
 import re
-from typing import Optional
+from typing import List, Optional
 
 from mediawords.db import DatabaseHandler
 from mediawords.dbi.downloads.store import fetch_content
-from mediawords.util.extract_article_from_page import extract_article_html_from_page_html
+from mediawords.util.extract_article_from_page import (
+    extract_article_html_from_page_html,
+    extract_articles_html_from_pages_html,
+    EXTRACT_BATCH_SIZE,
+)
 from mediawords.util.parse_html import html_strip
 from mediawords.util.log import create_logger
 from mediawords.util.perl import decode_object_from_bytes_if_needed
@@ -116,6 +120,49 @@ def extract(db: DatabaseHandler, download: dict, extractor_args: PyExtractorArgu
     return results
 
 
+def _extract_batch(db: DatabaseHandler, downloads: List[dict], extractor_args: PyExtractorArguments) -> List[dict]:
+    """Extract the content for the given downloads, sending the ones that need extraction to the extractor at once.
+
+    Returns:
+    list of extract() results in the same order as downloads
+    """
+    results = [None] * len(downloads)
+
+    indexes_to_extract = []
+    contents_to_extract = []
+
+    for i, download in enumerate(downloads):
+        downloads_id = download['downloads_id']
+
+        if extractor_args.use_cache():
+            log.debug("Fetching cached extractor results for download {}...".format(downloads_id))
+            results[i] = _get_extractor_results_cache(db, download)
+            if results[i] is not None:
+                continue
+
+        log.debug("Fetching content for download {}...".format(downloads_id))
+        indexes_to_extract.append(i)
+        contents_to_extract.append(fetch_content(db, download))
+
+    log.debug("Extracting content of {} downloads...".format(len(contents_to_extract)))
+    extracted = extract_contents(contents_to_extract)
+    log.debug("Done extracting content of {} downloads.".format(len(contents_to_extract)))
+
+    for i, result in zip(indexes_to_extract, extracted):
+        results[i] = result
+
+        if extractor_args.use_cache():
+            log.debug("Caching extractor results for download {}...".format(downloads[i]['downloads_id']))
+            _set_extractor_results_cache(db, downloads[i], result)
+
+    return results
+
+
+def _content_needs_extractor(content: str) -> bool:
+    """Return True if the content is long enough or has HTML to be worth running through the extractor."""
+    return len(content) >= MIN_CONTENT_LENGTH_TO_EXTRACT or re.search(r'<.*>', content) is not None
+
+
 def _call_extractor_on_html(content: str) -> dict:
     """Call extractor on the content."""
     content = decode_object_from_bytes_if_needed(content)
@@ -149,7 +196,7 @@ def extract_content(content: str) -> dict:
     content = decode_object_from_bytes_if_needed(content)
 
     # Don't run through expensive extractor if the content is short and has no html
-    if len(content) < MIN_CONTENT_LENGTH_TO_EXTRACT and re.search(r'<.*>', content) is None:
+    if not _content_needs_extractor(content):
         log.debug("Content length is less than MIN_CONTENT_LENGTH_TO_EXTRACT and has no HTML so skipping extraction")
         ret = {
             'extracted_html': content,
@@ -162,15 +209,49 @@ def extract_content(content: str) -> dict:
     return ret
 
 
-def extract_and_create_download_text(db: DatabaseHandler, download: dict, extractor_args: PyExtractorArguments) -> dict:
-    """Extract the download and create a download_text from the extracted download."""
-    download = decode_object_from_bytes_if_needed(download)
+def extract_contents(contents: List[str]) -> List[dict]:
+    """Extract text and html from a list of HTML contents, sending the ones that need extraction to the extractor at
+    once.
 
-    downloads_id = download['downloads_id']
+    Arguments:
+    contents - list of html from which to extract
 
-    log.debug("Extracting download {}...".format(downloads_id))
-    extraction_result = extract(db=db, download=download, extractor_args=extractor_args)
-    log.debug("Done extracting download {}.".format(downloads_id))
+    Returns:
+    list of extract_content() results in the same order as contents
+
+    """
+    contents = decode_object_from_bytes_if_needed(contents)
+
+    results = [None] * len(contents)
+
+    indexes_to_extract = []
+    for i, content in enumerate(contents):
+        if _content_needs_extractor(content):
+            indexes_to_extract.append(i)
+        else:
+            results[i] = extract_content(content)
+
+    if indexes_to_extract:
+        extractor_results = extract_articles_html_from_pages_html([contents[i] for i in indexes_to_extract])
+
+        for i, extractor_result in zip(indexes_to_extract, extractor_results):
+            extracted_html = extractor_result['extracted_html']
+            results[i] = {
+                'extracted_html': extracted_html,
+                'extracted_text': html_strip(extracted_html),
+                'extractor_version': extractor_result['extractor_version'],
+            }
+
+    return results
+
+
+def _create_download_text(db: DatabaseHandler,
+                          download: dict,
+                          extraction_result: dict,
+                          extractor_args: PyExtractorArguments) -> dict:
+    """Create a download_text from the extracted download."""
+
+    downloads_id = download['downloads_id']
 
     download_text = None
     if extractor_args.use_existing():
@@ -198,6 +279,56 @@ def extract_and_create_download_text(db: DatabaseHandler, download: dict, extrac
     return download_text
 
 
+def extract_and_create_download_text(db: DatabaseHandler, download: dict, extractor_args: PyExtractorArguments) -> dict:
+    """Extract the download and create a download_text from the extracted download."""
+    download = decode_object_from_bytes_if_needed(download)
+
+    downloads_id = download['downloads_id']
+
+    log.debug("Extracting download {}...".format(downloads_id))
+    extraction_result = extract(db=db, download=download, extractor_args=extractor_args)
+    log.debug("Done extracting download {}.".format(downloads_id))
+
+    return _create_download_text(
+        db=db,
+        download=download,
+        extraction_result=extraction_result,
+        extractor_args=extractor_args,
+    )
+
+
+def extract_and_create_download_texts(db: DatabaseHandler,
+                                      downloads: List[dict],
+                                      extractor_args: PyExtractorArguments) -> List[dict]:
+    """Extract the downloads (which might belong to different stories) in chunks and create download_texts from them.
+
+    Downloads of every chunk get sent to the extractor in a single batch request.
+
+    Returns:
+    list of download_texts in the same order as downloads
+    """
+    downloads = decode_object_from_bytes_if_needed(downloads)
+
+    download_texts = []
+
+    for chunk_start in range(0, len(downloads), EXTRACT_BATCH_SIZE):
+        chunk = downloads[chunk_start:chunk_start + EXTRACT_BATCH_SIZE]
+
+        log.debug("Extracting {} downloads...".format(len(chunk)))
+        extraction_results = _extract_batch(db=db, downloads=chunk, extractor_args=extractor_args)
+        log.debug("Done extracting {} downloads.".format(len(chunk)))
+
+        for download, extraction_result in zip(chunk, extraction_results):
+            download_texts.append(_create_download_text(
+                db=db,
+                download=download,
+                extraction_result=extraction_result,
+                extractor_args=extractor_args,
+            ))
+
+    return download_texts
+
+
 def process_download_for_extractor(db: DatabaseHandler,
                                    download: dict,
                                    extractor_args: PyExtractorArguments = PyExtractorArguments()) -> None:
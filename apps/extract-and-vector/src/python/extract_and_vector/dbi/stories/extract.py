@@ -2,7 +2,7 @@ from mediawords.db import DatabaseHandler
 from mediawords.util.log import create_logger
 from mediawords.util.perl import decode_object_from_bytes_if_needed
 from extract_and_vector.dbi.stories.extractor_arguments import PyExtractorArguments
-from extract_and_vector.dbi.downloads.extract import extract_and_create_download_text
+from extract_and_vector.dbi.downloads.extract import extract_and_create_download_texts
 from extract_and_vector.dbi.stories.process import process_extracted_story
 
 log = create_logger(__name__)
@@ -31,9 +31,8 @@ def extract_and_process_story(db: DatabaseHandler,
     if downloads is None:
         downloads = []
 
-    for download in downloads:
-        log.debug("Extracting download {} for story {}...".format(download['downloads_id'], stories_id))
-        extract_and_create_download_text(db=db, download=download, extractor_args=extractor_args)
+    log.debug("Extracting {} downloads for story {}...".format(len(downloads), stories_id))
+    extract_and_create_download_texts(db=db, downloads=downloads, extractor_args=extractor_args)
 
     log.debug("Processing extracted story {}...".format(stories_id))
     process_extracted_story(db=db, story=story, extractor_args=extractor_args)
@@ -1,7 +1,10 @@
 import re
-from typing import List, Dict
+import zlib
+from typing import Any, Dict, List, Tuple
 
 from mediawords.db import DatabaseHandler
+from mediawords.db.copy.copy_from import copy_escape
+from mediawords.db.locks import get_transaction_lock
 from mediawords.dbi.stories.ap import is_syndicated
 from mediawords.languages.factory import LanguageFactory
 from mediawords.util.identify_language import language_code_for_text, identification_would_be_reliable
@@ -14,39 +17,13 @@ from extract_and_vector.dbi.stories.extractor_arguments import PyExtractorArgume
 log = create_logger(__name__)
 
 
-class McMediumIsLockedException(Exception):
-    """medium_is_locked() exception.
-
-    If thrown, doesn't mean that medium is (un)locked, just that an error has occurred while testing if it is."""
-    pass
-
-
 class McUpdateStorySentencesAndLanguageException(Exception):
     """update_story_sentences_and_language() exception."""
     pass
 
 
-def medium_is_locked(db: DatabaseHandler, media_id: int) -> bool:
-    """Use a new blocking check to see if the given media_id is locked by a postgres advisory lock (used within
-    _insert_story_sentences below). Return True if it is locked, False otherwise."""
-
-    if isinstance(media_id, bytes):
-        media_id = decode_object_from_bytes_if_needed(media_id)
-    media_id = int(media_id)
-
-    got_lock = db.query("SELECT pg_try_advisory_lock(%(media_id)s)", {'media_id': media_id}).flat()[0]
-    if got_lock:
-        db.query("SELECT pg_advisory_unlock(%(media_id)s)", {'media_id': media_id})
-
-    return not got_lock
-
-
-def _get_db_escaped_story_sentence_dicts(
-        db: DatabaseHandler,
-        story: dict,
-        sentences: List[str],
-) -> List[Dict[str, str]]:
-    """Given a list of text sentences, return a list of sentences with properly escaped values for insertion."""
+def _get_story_sentence_dicts(story: dict, sentences: List[str]) -> List[Dict[str, Any]]:
+    """Given a list of text sentences, return a list of sentence dicts for insertion into "story_sentences"."""
     story = decode_object_from_bytes_if_needed(story)
     sentences = decode_object_from_bytes_if_needed(sentences)
 
@@ -63,12 +40,12 @@ def _get_db_escaped_story_sentence_dicts(
                 sentence_lang = ''
 
         sentence_dicts.append({
-            'sentence': db.quote_varchar(sentence),
-            'language': db.quote_varchar(sentence_lang),
-            'sentence_number': str(sentence_num),
-            'stories_id': str(story['stories_id']),
-            'media_id': str(story['media_id']),
-            'publish_date': db.quote_timestamp(story['publish_date']),
+            'sentence': sentence,
+            'language': sentence_lang,
+            'sentence_number': sentence_num,
+            'stories_id': story['stories_id'],
+            'media_id': story['media_id'],
+            'publish_date': story['publish_date'],
         })
 
         sentence_num += 1
@@ -91,133 +68,237 @@ def _get_unique_sentences_in_story(sentences: List[str]) -> List[str]:
     return unique_sentences
 
 
-def _insert_story_sentences(
+def _media_week_lock_id(media_id: int, week_days: int) -> int:
+    """Return advisory lock ID (signed 32 bit integer) for a (media source, week) pair."""
+    lock_id = zlib.crc32(('%d-%d' % (media_id, week_days,)).encode('utf-8'))
+    if lock_id >= 2 ** 31:
+        lock_id -= 2 ** 32
+    return lock_id
+
+
+def _insert_stories_sentences(
         db: DatabaseHandler,
-        story: dict,
-        sentences: List[str],
+        stories_sentences: List[Tuple[dict, List[str]]],
         no_dedup_sentences: bool = False,
-) -> List[str]:
-    """Insert the story sentences into story_sentences, optionally skipping duplicate sentences by setting is_dup = 't'
-    to the found duplicates that are already in the table.
+) -> Dict[int, List[str]]:
+    """Insert sentences of multiple stories into story_sentences, optionally skipping duplicate sentences by setting
+    is_dup = 't' to the found duplicates that are already in the table.
 
-    Returns list of sentences that were inserted into the table.
+    Sentences get COPYed into a temporary staging table and then deduplicated against sentences of the same media
+    source from the same week (and against each other) with a single query. Instead of locking the whole media source
+    for the duration of the insert, only (media source, week) pairs that are being inserted into are locked until the
+    end of the transaction.
+
+    The query assumes that there are no existing sentences for these stories in the "story_sentences" table, so if you
+    are reextracting stories, DELETE their sentences from "story_sentences" before running this.
+
+    Returns dict of story IDs to lists of sentences that were inserted into the table.
     """
 
-    story = decode_object_from_bytes_if_needed(story)
-    sentences = decode_object_from_bytes_if_needed(sentences)
+    stories_sentences = decode_object_from_bytes_if_needed(stories_sentences)
     if isinstance(no_dedup_sentences, bytes):
         no_dedup_sentences = decode_object_from_bytes_if_needed(no_dedup_sentences)
     no_dedup_sentences = bool(int(no_dedup_sentences))
 
-    stories_id = story['stories_id']
-    media_id = story['media_id']
+    inserted_sentences = {}
+    sentence_dicts = []
 
-    # Story's publish date is the same for all the sentences, so we might as well pass it as a constant
-    escaped_story_publish_date = db.quote_date(story['publish_date'])
+    for story, sentences in stories_sentences:
+        stories_id = story['stories_id']
+        inserted_sentences[stories_id] = []
 
-    if len(sentences) == 0:
-        log.warning("Story sentences are empty for story {}.".format(stories_id))
-        return []
+        if len(sentences) == 0:
+            log.warning("Story sentences are empty for story {}.".format(stories_id))
+            continue
 
-    if no_dedup_sentences:
-        log.debug("Won't de-duplicate sentences for story {} because 'no_dedup_sentences' is set.".format(stories_id))
+        if no_dedup_sentences:
+            log.debug("Won't de-duplicate sentences for story {} because 'no_dedup_sentences' is set.".format(
+                stories_id
+            ))
+        else:
+            # Limit to unique sentences within a story
+            sentences = _get_unique_sentences_in_story(sentences)
+
+        sentence_dicts.extend(_get_story_sentence_dicts(story=story, sentences=sentences))
+
+    if not sentence_dicts:
+        return inserted_sentences
 
+    use_transaction = not db.in_transaction()
+    if use_transaction:
+        db.begin()
+
+    db.query("""
+        CREATE TEMPORARY TABLE IF NOT EXISTS story_sentences_staging (
+            -- Order in which sentences were passed to us, earlier duplicates win
+            position            INT         NOT NULL,
+            stories_id          INT         NOT NULL,
+            sentence_number     INT         NOT NULL,
+            sentence            TEXT        NOT NULL,
+            media_id            INT         NOT NULL,
+            publish_date        TIMESTAMP   NULL,
+            language            VARCHAR(3)  NULL
+        )
+    """)
+    db.query("TRUNCATE story_sentences_staging")
+
+    log.debug("Copying {} sentences into staging table...".format(len(sentence_dicts)))
+
+    staging_columns = ['position', 'stories_id', 'sentence_number', 'sentence', 'media_id', 'publish_date', 'language']
+
+    copy = db.copy_from("COPY story_sentences_staging ({}) FROM STDIN".format(', '.join(staging_columns)))
+    for position, sentence_dict in enumerate(sentence_dicts):
+        sentence_dict['position'] = position
+        copy.put_line('\t'.join(copy_escape(sentence_dict[column]) for column in staging_columns))
+    copy.end()
+
+    # Lock (media source, week) pairs that we're about to deduplicate against; sort to avoid deadlocks
+    media_weeks = db.query("""
+        SELECT DISTINCT
+            media_id,
+            COALESCE(week_start_date(publish_date::date) - '1970-01-01'::date, 0) AS week_days
+        FROM story_sentences_staging
+    """).hashes()
+    lock_ids = {_media_week_lock_id(media_id=mw['media_id'], week_days=mw['week_days']) for mw in media_weeks}
+    for lock_id in sorted(lock_ids):
+        get_transaction_lock(db=db, lock_type='MediaWords::StoryVectors::insert_story_sentences', lock_id=lock_id)
+
+    if no_dedup_sentences:
         dedup_sentences_statement = """
 
             -- Nothing to deduplicate, return empty list
-            SELECT NULL
+            SELECT NULL::TEXT AS sentence, NULL::INT AS media_id, NULL::DATE AS week_start_date
             WHERE 1 = 0
 
         """
 
-    else:
+        new_sentences_statement = """
 
-        # Limit to unique sentences within a story
-        sentences = _get_unique_sentences_in_story(sentences)
+            SELECT *, 1 AS position_in_group, 1 AS group_size
+            FROM story_sentences_staging
+
+        """
+
+    else:
 
         # Set is_dup = 't' to sentences already in the table, return those to be later skipped on INSERT of new
         # sentences
         dedup_sentences_statement = """
 
-            -- noinspection SqlResolve
-            UPDATE story_sentences
+            UPDATE story_sentences_p
             SET is_dup = 't'
+            FROM (
+                SELECT DISTINCT
+                    half_md5(sentence) AS sentence_md5,
+                    media_id,
+                    week_start_date(publish_date::date) AS week_start_date
+                FROM story_sentences_staging
+            ) AS new_sentences
+            WHERE half_md5(story_sentences_p.sentence) = new_sentences.sentence_md5
+              AND week_start_date(story_sentences_p.publish_date::date) = new_sentences.week_start_date
+              AND story_sentences_p.media_id = new_sentences.media_id
+            RETURNING
+                story_sentences_p.sentence,
+                story_sentences_p.media_id,
+                new_sentences.week_start_date
+
+        """
+
+        # Duplicates within the batch itself: the first one gets inserted (and marked as a duplicate), others skipped
+        new_sentences_statement = """
+
+            SELECT
+                *,
+                ROW_NUMBER() OVER same_sentences AS position_in_group,
+                COUNT(*) OVER same_sentences AS group_size
+            FROM story_sentences_staging
+            WINDOW same_sentences AS (
+                PARTITION BY sentence, media_id, week_start_date(publish_date::date)
+                ORDER BY position
+            )
+
+        """
+
+    sentences_to_insert = db.query("""
+        WITH duplicate_sentences AS (
+            {dedup_sentences_statement}
+        ),
+
+        new_sentences AS (
+            {new_sentences_statement}
+        ),
+
+        sentences_to_insert AS (
+            SELECT *
             FROM new_sentences
-            WHERE half_md5(story_sentences.sentence) = half_md5(new_sentences.sentence)
-              AND week_start_date(story_sentences.publish_date::date) = week_start_date({})
-              AND story_sentences.media_id = new_sentences.media_id
-            RETURNING story_sentences.sentence
-
-        """.format(escaped_story_publish_date)
-
-    # Convert to list of dicts (values escaped for insertion into database)
-    sentence_dicts = _get_db_escaped_story_sentence_dicts(db=db, story=story, sentences=sentences)
-
-    # Ordered list of columns
-    story_sentences_columns = sorted(sentence_dicts[0].keys())
-    str_story_sentences_columns = ', '.join(story_sentences_columns)
-
-    # List of sentences (in predefined column order)
-    new_sentences_sql = []
-    for sentence_dict in sentence_dicts:
-        new_sentence_sql = []
-        for column in story_sentences_columns:
-            new_sentence_sql.append(sentence_dict[column])
-        new_sentences_sql.append('({})'.format(', '.join(new_sentence_sql)))
-    str_new_sentences_sql = "\n{}".format(",\n".join(new_sentences_sql))
-
-    sql = """
-
-        -- noinspection SqlType,SqlResolve
-        WITH new_sentences ({str_story_sentences_columns}) AS (VALUES
-            -- New sentences to potentially insert
-            {str_new_sentences_sql}
+            WHERE position_in_group = 1
+              AND NOT EXISTS (
+                -- Skip the ones for which we've just set is_dup = 't'
+                SELECT 1
+                FROM duplicate_sentences
+                WHERE duplicate_sentences.sentence = new_sentences.sentence
+                  AND duplicate_sentences.media_id = new_sentences.media_id
+                  AND duplicate_sentences.week_start_date = week_start_date(new_sentences.publish_date::date)
+            )
         ),
-        duplicate_sentences AS (
-            -- Either a list of duplicate sentences already found in the table or an empty list if deduplication is
-            -- disabled
-            --
-            -- The query assumes that there are no existing sentences for this story in the "story_sentences" table, so
-            -- if you are reextracting a story, DELETE its sentences from "story_sentences" before running this query.
-            {dedup_sentences_statement}
-        )
-        INSERT INTO story_sentences ({str_story_sentences_columns})
-        SELECT {str_story_sentences_columns}
-        FROM new_sentences
-        WHERE sentence NOT IN (
-            -- Skip the ones for which we've just set is_dup = 't'
-            SELECT sentence
-            FROM duplicate_sentences
+
+        inserted_sentences AS (
+            -- Partition trigger on the master table will route rows to the right partitions
+            INSERT INTO story_sentences_p (
+                stories_id, sentence_number, sentence, media_id, publish_date, language, is_dup
+            )
+                SELECT
+                    stories_id,
+                    sentence_number,
+                    sentence,
+                    media_id,
+                    publish_date,
+                    language,
+                    CASE WHEN group_size > 1 THEN 't'::BOOLEAN ELSE NULL END
+                FROM sentences_to_insert
         )
-        RETURNING story_sentences.sentence
 
+        SELECT stories_id, sentence
+        FROM sentences_to_insert
+        ORDER BY position
     """.format(
-        str_story_sentences_columns=str_story_sentences_columns,
-        str_new_sentences_sql=str_new_sentences_sql,
         dedup_sentences_statement=dedup_sentences_statement,
-    )
+        new_sentences_statement=new_sentences_statement,
+    )).hashes()
+
+    db.query("TRUNCATE story_sentences_staging")
 
-    # sometimes the big story_sentences query below deadlocks sticks in an idle state, holding this lock so we set a
-    # short idle timeout for postgres just while we do this query. the timeout should not kick in while the 
-    # big story_sentences query is actively processing, so we can set it pretty short. we usually set this timeout
-    # to 0 globally, but just to be safe store and reset the pre-existing value.
-    idle_timeout = db.query("show idle_in_transaction_session_timeout").flat()[0]
-    db.query("set idle_in_transaction_session_timeout = 5000")
+    if use_transaction:
+        db.commit()
+
+    for sentence in sentences_to_insert:
+        inserted_sentences[sentence['stories_id']].append(sentence['sentence'])
+
+    return inserted_sentences
 
-    log.debug("Adding advisory lock on media ID {}...".format(media_id))
-    db.query("SELECT pg_advisory_lock(%(media_id)s)", {'media_id': media_id})
 
-    log.debug("Running sentence insertion + deduplication query:\n{}".format(sql))
+def _insert_story_sentences(
+        db: DatabaseHandler,
+        story: dict,
+        sentences: List[str],
+        no_dedup_sentences: bool = False,
+) -> List[str]:
+    """Insert the story sentences into story_sentences, optionally skipping duplicate sentences by setting is_dup = 't'
+    to the found duplicates that are already in the table.
 
-    # Insert sentences
-    inserted_sentences = db.query(sql).flat()
+    Returns list of sentences that were inserted into the table.
+    """
 
-    log.debug("Removing advisory lock on media ID {}...".format(media_id))
-    db.query("SELECT pg_advisory_unlock(%(media_id)s)", {'media_id': media_id})
+    story = decode_object_from_bytes_if_needed(story)
+    sentences = decode_object_from_bytes_if_needed(sentences)
 
-    db.query("set idle_in_transaction_session_timeout = %(a)s", {'a': idle_timeout})
+    inserted_sentences = _insert_stories_sentences(
+        db=db,
+        stories_sentences=[(story, sentences,)],
+        no_dedup_sentences=no_dedup_sentences,
+    )
 
-    return inserted_sentences
+    return inserted_sentences[story['stories_id']]
 
 
 def _get_sentences_from_story_text(story_text: str, story_lang: str) -> List[str]:
@@ -0,0 +1,32 @@
+from mediawords.dbi.downloads.store import store_content
+from mediawords.test.db.create import create_download_for_story, create_test_story
+
+from extract_and_vector.dbi.downloads.extract import extract_and_create_download_texts
+from extract_and_vector.dbi.stories.extractor_arguments import PyExtractorArguments
+from .setup_test_extract import TestExtractDB
+
+
+class TestExtractAndCreateDownloadTexts(TestExtractDB):
+
+    def test_extract_and_create_download_texts(self):
+        other_story = create_test_story(self.db, label='other story', feed=self.test_feed)
+        other_download = create_download_for_story(self.db, feed=self.test_feed, story=other_story)
+        store_content(db=self.db, download=other_download, content='<p>bar</p>')
+
+        short_story = create_test_story(self.db, label='short story', feed=self.test_feed)
+        short_download = create_download_for_story(self.db, feed=self.test_feed, story=short_story)
+        store_content(db=self.db, download=short_download, content='baz')
+
+        downloads = [self.test_download, other_download, short_download]
+
+        download_texts = extract_and_create_download_texts(
+            db=self.db,
+            downloads=downloads,
+            extractor_args=PyExtractorArguments(),
+        )
+
+        assert len(download_texts) == 3
+        assert [dt['downloads_id'] for dt in download_texts] == [d['downloads_id'] for d in downloads]
+        assert download_texts[0]['download_text'] == 'foo.'
+        assert download_texts[1]['download_text'] == 'bar.'
+        assert 'baz' in download_texts[2]['download_text']
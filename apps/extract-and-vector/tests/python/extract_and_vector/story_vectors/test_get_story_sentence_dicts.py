@@ -0,0 +1,31 @@
+from .setup_test_story_vectors import TestStoryVectors
+# noinspection PyProtectedMember
+from extract_and_vector.story_vectors import _get_story_sentence_dicts
+
+
+class TestStorySentenceDicts(TestStoryVectors):
+
+    def test_get_story_sentence_dicts(self):
+        sentence_dicts = _get_story_sentence_dicts(
+            story=self.test_story,
+            sentences=[
+
+                # Single quotes
+                "It's toasted!",
+
+                # Non-English language
+                'Įlinkdama fechtuotojo špaga sublykčiojusi pragręžė apvalų arbūzą.',
+
+            ]
+        )
+        assert len(sentence_dicts) == 2
+
+        assert sentence_dicts[0]['media_id'] == self.test_medium['media_id']
+        assert sentence_dicts[0]['stories_id'] == self.test_story['stories_id']
+        assert sentence_dicts[0]['publish_date'] == self.test_story['publish_date']
+        assert sentence_dicts[0]['sentence'] == "It's toasted!"
+        assert sentence_dicts[0]['sentence_number'] == 0
+        assert sentence_dicts[0]['language'] == 'en'
+
+        assert sentence_dicts[1]['sentence_number'] == 1
+        assert sentence_dicts[1]['language'] == 'lt'
@@ -0,0 +1,74 @@
+# noinspection PyProtectedMember
+from extract_and_vector.story_vectors import _insert_stories_sentences
+from mediawords.test.db.create import create_test_story
+from .setup_test_story_vectors import TestStoryVectors
+
+
+class TestInsertStoriesSentences(TestStoryVectors):
+
+    def test_insert_stories_sentences(self):
+        test_story_2 = create_test_story(self.db, label='test story 2', feed=self.test_feed)
+        test_story_3 = create_test_story(self.db, label='test story 3', feed=self.test_feed)
+
+        inserted_sentences = _insert_stories_sentences(
+            db=self.db,
+            stories_sentences=[
+                (self.test_story, ["First story's sentence.", "Shared sentence.", "Tab\tand\\backslash."]),
+                (test_story_2, ["Shared sentence.", "Second story's sentence."]),
+                (test_story_3, []),
+            ],
+        )
+
+        assert inserted_sentences == {
+            self.test_story['stories_id']: ["First story's sentence.", "Shared sentence.", "Tab\tand\\backslash."],
+            test_story_2['stories_id']: ["Second story's sentence."],
+            test_story_3['stories_id']: [],
+        }
+
+        db_sentences = self.db.query("""
+            SELECT stories_id, sentence_number, sentence, is_dup
+            FROM story_sentences
+            ORDER BY stories_id, sentence_number
+        """).hashes()
+
+        assert db_sentences == [
+            {
+                'stories_id': self.test_story['stories_id'],
+                'sentence_number': 0,
+                'sentence': "First story's sentence.",
+                'is_dup': None,
+            },
+            {
+                'stories_id': self.test_story['stories_id'],
+                'sentence_number': 1,
+                'sentence': "Shared sentence.",
+                # Duplicate found in the second story of the batch
+                'is_dup': True,
+            },
+            {
+                'stories_id': self.test_story['stories_id'],
+                'sentence_number': 2,
+                'sentence': "Tab\tand\\backslash.",
+                'is_dup': None,
+            },
+            {
+                'stories_id': test_story_2['stories_id'],
+                'sentence_number': 1,
+                'sentence': "Second story's sentence.",
+                'is_dup': None,
+            },
+        ]
+
+        # Next batch should get deduplicated against the sentences that are already in the table
+        test_story_4 = create_test_story(self.db, label='test story 4', feed=self.test_feed)
+        inserted_sentences = _insert_stories_sentences(
+            db=self.db,
+            stories_sentences=[(test_story_4, ["Second story's sentence.", "Fourth story's sentence."])],
+        )
+        assert inserted_sentences == {test_story_4['stories_id']: ["Fourth story's sentence."]}
+
+        (is_dup,) = self.db.query(
+            "SELECT is_dup FROM story_sentences WHERE sentence = %(sentence)s",
+            {'sentence': "Second story's sentence."},
+        ).flat()
+        assert is_dup is True
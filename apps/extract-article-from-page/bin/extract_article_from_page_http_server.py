@@ -2,7 +2,7 @@
 
 """
 
-Single-threaded HTTP server that extracts article's HTML from a full page HTML.
+Multi-threaded HTTP server that extracts article's HTML from a full page HTML.
 
 Accepts POST requests to "/extract" endpoint with body JSON:
 
@@ -23,11 +23,35 @@ On errors, returns HTTP 4xx / 5xx and error message:
         "error": "You're using it wrong."
     }
 
+Also accepts POST requests to "/extract/batch" endpoint with multiple pages to extract:
+
+    {
+        "htmls": [
+            "<html><title>Title</title><body><p>Paragraph.</p></html>",
+            "<html><title>Other title</title><body><p>Other paragraph.</p></html>"
+        ]
+    }
+
+On success, returns HTTP 200 and a result for every page in the same order; pages that failed to get extracted have
+an error message instead:
+
+    {
+        "results": [
+            {"extracted_html": "Title\n\n<body id=\"readabilityBody\"><p>Paragraph.</p></body>"},
+            {"error": "Unable to extract article HTML from page HTML: ..."}
+        ],
+        "extractor_version": "readability-lxml-0.6.1"
+    }
+
+Connections are kept alive between requests (HTTP/1.1); every connection gets served by its own thread, and idle
+connections get closed after a timeout.
+
 """
 
 import argparse
 from http import HTTPStatus
-from http.server import BaseHTTPRequestHandler, HTTPServer
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Union
 from urllib.parse import urlparse
 
 from mediawords.util.parse_json import encode_json, decode_json
@@ -42,9 +66,25 @@ _MAX_HTML_LENGTH = 4 * 1024 * 1024
 _MAX_REQUEST_LENGTH = _MAX_HTML_LENGTH + (10 * 1024)
 """HTTP server will refuse to serve requests larger than this."""
 
+_MAX_BATCH_SIZE = 100
+"""Extractor will refuse to extract more pages than this in a single batch request."""
+
+_MAX_BATCH_REQUEST_LENGTH = 32 * 1024 * 1024
+"""HTTP server will refuse to serve batch requests larger than this."""
+
+_IDLE_CONNECTION_TIMEOUT = 60
+"""Seconds to wait for the next request on a kept alive connection before closing it."""
+
 
 class ServerHandler(BaseHTTPRequestHandler):
     _API_ENDPOINT_PATH = "/extract"
+    _BATCH_API_ENDPOINT_PATH = "/extract/batch"
+
+    # Keep connections alive between requests
+    protocol_version = "HTTP/1.1"
+
+    # Don't let idle kept alive connections hang around (and hold up threads) forever
+    timeout = _IDLE_CONNECTION_TIMEOUT
 
     def __json_response(self, status: int, response: dict) -> bytes:
         json_response = encode_json(response)
@@ -59,6 +99,10 @@ class ServerHandler(BaseHTTPRequestHandler):
 
     def __error_response(self, status: int, message: str) -> bytes:
         log.error(message)
+
+        # Request body might have not been read, so the connection can't be reused
+        self.close_connection = True
+
         return self.__json_response(status=status, response={"error": message})
 
     def __success_response(self, status: int, response: dict) -> bytes:
@@ -66,13 +110,8 @@ class ServerHandler(BaseHTTPRequestHandler):
         log.info(f"Returning response ({len(response)} bytes)")
         return response
 
-    def __post(self) -> bytes:
-        uri = urlparse(self.path)
-        if uri.path != self._API_ENDPOINT_PATH:
-            return self.__error_response(
-                status=HTTPStatus.NOT_FOUND.value,
-                message=f"Only {self._API_ENDPOINT_PATH} is implemented.",
-            )
+    def __read_json_body(self, max_length: int) -> Union[dict, bytes]:
+        """Read and decode request JSON; return error response bytes on errors."""
 
         content_length = int(self.headers.get('Content-Length', 0))
 
@@ -84,10 +123,10 @@ class ServerHandler(BaseHTTPRequestHandler):
                 message="Content-Length header is not set.",
             )
 
-        if content_length > _MAX_REQUEST_LENGTH:
+        if content_length > max_length:
             return self.__error_response(
                 status=HTTPStatus.REQUEST_ENTITY_TOO_LARGE.value,
-                message=f"Request is larger than {_MAX_REQUEST_LENGTH} bytes."
+                message=f"Request is larger than {max_length} bytes."
             )
 
         encoded_body = self.rfile.read(content_length)
@@ -108,6 +147,13 @@ class ServerHandler(BaseHTTPRequestHandler):
                 message=f"Unable to decode request JSON: {ex}",
             )
 
+        return body
+
+    def __extract(self) -> bytes:
+        body = self.__read_json_body(max_length=_MAX_REQUEST_LENGTH)
+        if isinstance(body, bytes):
+            return body
+
         if "html" not in body:
             return self.__error_response(
                 status=HTTPStatus.BAD_REQUEST.value,
@@ -134,16 +180,71 @@ class ServerHandler(BaseHTTPRequestHandler):
             response=response,
         )
 
+    def __extract_batch(self) -> bytes:
+        body = self.__read_json_body(max_length=_MAX_BATCH_REQUEST_LENGTH)
+        if isinstance(body, bytes):
+            return body
+
+        if not isinstance(body.get("htmls", None), list):
+            return self.__error_response(
+                status=HTTPStatus.BAD_REQUEST.value,
+                message="Request JSON doesn't have 'htmls' list.",
+            )
+
+        htmls = body["htmls"]
+
+        if len(htmls) > _MAX_BATCH_SIZE:
+            return self.__error_response(
+                status=HTTPStatus.REQUEST_ENTITY_TOO_LARGE.value,
+                message=f"Request has more than {_MAX_BATCH_SIZE} pages."
+            )
+
+        results = []
+        for html in htmls:
+            if len(html) > _MAX_HTML_LENGTH:
+                results.append({'error': f"Page is larger than {_MAX_HTML_LENGTH} characters."})
+                continue
+
+            try:
+                results.append({'extracted_html': extract_article_from_page(html)})
+            except Exception as ex:
+                log.error(f"Unable to extract article HTML from page HTML: {ex}")
+                results.append({'error': f"Unable to extract article HTML from page HTML: {ex}"})
+
+        response = {
+            'results': results,
+            'extractor_version': extractor_name(),
+        }
+
+        return self.__success_response(
+            status=HTTPStatus.OK.value,
+            response=response,
+        )
+
+    def __post(self) -> bytes:
+        uri = urlparse(self.path)
+
+        if uri.path == self._API_ENDPOINT_PATH:
+            return self.__extract()
+
+        if uri.path == self._BATCH_API_ENDPOINT_PATH:
+            return self.__extract_batch()
+
+        return self.__error_response(
+            status=HTTPStatus.NOT_FOUND.value,
+            message=f"Only {self._API_ENDPOINT_PATH} and {self._BATCH_API_ENDPOINT_PATH} are implemented.",
+        )
+
     # noinspection PyPep8Naming
     def do_POST(self) -> None:
         self.wfile.write(self.__post())
 
     # noinspection PyPep8Naming
     def do_GET(self):
-        return self.__error_response(
+        self.wfile.write(self.__error_response(
             status=HTTPStatus.METHOD_NOT_ALLOWED.value,
             message="Try POST instead!",
-        )
+        ))
 
 
 def start_http_server(port: int) -> None:
@@ -151,7 +252,7 @@ def start_http_server(port: int) -> None:
 
     log.info(f"Listening on port {port}...")
 
-    server = HTTPServer(('', port), ServerHandler)
+    server = ThreadingHTTPServer(('', port), ServerHandler)
 
     try:
         server.serve_forever()
@@ -6,7 +6,7 @@ import abc
 import os
 import json
 import pickle
-from typing import List
+from typing import List, Tuple
 
 import gensim
 from keras.models import load_model
@@ -16,6 +16,9 @@ import numpy as np
 DEFAULT_MAX_PREDICTIONS = 30
 """Max. predictions to come up with."""
 
+PREDICT_BATCH_SIZE = 32
+"""Number of texts to run through Keras models at once."""
+
 
 class MissingModelsException(Exception):
     """Exception that's thrown when the models are missing."""
@@ -84,6 +87,15 @@ class _BaseModel(_BaseLoader, metaclass=abc.ABCMeta):
         """
         raise NotImplemented("Abstract method.")
 
+    def predict_many(self, texts: List[str], max_predictions: int = DEFAULT_MAX_PREDICTIONS) -> List[List[Prediction]]:
+        """
+        Predict many texts.
+        :param texts: Texts to run predictions against.
+        :param max_predictions: Max. predictions to come up with for every text.
+        :return: Predictions for every text, in the same order as texts.
+        """
+        return [self.predict(text=text, max_predictions=max_predictions) for text in texts]
+
 
 class Word2vecModel(_BaseModel):
     """Google News word2vec model."""
@@ -190,41 +202,86 @@ class _TopicDetectionBaseModel(_BaseModel, metaclass=abc.ABCMeta):
 
         super().__init__(models_dir=models_dir)
 
-    def predict(self, text: str, max_predictions: int = DEFAULT_MAX_PREDICTIONS) -> List[Prediction]:
+    def _sample_shape(self) -> Tuple[int, int]:
+        """
+        Return shape of a single sample that the Keras model expects.
+        :return: (sample length, embedding size) tuple.
+        """
         if type(self._keras_model.input) == list:
             _, sample_length, embedding_size = self._keras_model.input_shape[0]
         else:
             _, sample_length, embedding_size = self._keras_model.input_shape
 
-        words = [w.lower() for w in word_tokenize(text)
-                 if w not in self._PUNCTUATION][:sample_length]
-        x_matrix = np.zeros((1, sample_length, embedding_size))
+        return sample_length, embedding_size
+
+    def _x_matrix(self, texts: List[str]) -> np.ndarray:
+        """
+        Return input matrix of scaled word vectors of the texts.
+        :param texts: Texts to build the input matrix for.
+        :return: Matrix of (len(texts), sample length, embedding size) shape.
+        """
+        sample_length, embedding_size = self._sample_shape()
+
+        x_matrix = np.zeros((len(texts), sample_length, embedding_size))
+
+        # Positions and vocabulary indices of all known words in all texts
+        text_indices = []
+        word_indices = []
+        vocab_indices = []
+
+        vocab = self._raw_word2vec_model.vocab
 
-        for i, w in enumerate(words):
-            if w in self._raw_word2vec_model:
-                word_vector = self._raw_word2vec_model[w].reshape(1, -1)
-                scaled_vector = self._raw_scaler.transform(word_vector, copy=True)[0]
-                x_matrix[0][i] = scaled_vector
+        for text_index, text in enumerate(texts):
+            words = [w.lower() for w in word_tokenize(text)
+                     if w not in self._PUNCTUATION][:sample_length]
+
+            for word_index, word in enumerate(words):
+                if word in vocab:
+                    text_indices.append(text_index)
+                    word_indices.append(word_index)
+                    vocab_indices.append(vocab[word].index)
+
+        if vocab_indices:
+            # Look up and scale vectors of all words at once
+            word_vectors = self._raw_word2vec_model.vectors[vocab_indices]
+            x_matrix[text_indices, word_indices] = self._raw_scaler.transform(word_vectors, copy=True)
+
+        return x_matrix
+
+    def predict_many(self, texts: List[str], max_predictions: int = DEFAULT_MAX_PREDICTIONS) -> List[List[Prediction]]:
+        if not texts:
+            return []
+
+        x_matrix = self._x_matrix(texts)
 
         if type(self._keras_model.input) == list:
             x = [x_matrix] * len(self._keras_model.input)
         else:
             x = [x_matrix]
 
-        y_predicted = self._keras_model.predict(x)
-
-        zipped = zip(self._labels, y_predicted[0])
-
-        raw_predictions = sorted(zipped, key=lambda elem: elem[1], reverse=True)
+        y_predicted = self._keras_model.predict(x, batch_size=PREDICT_BATCH_SIZE)
 
-        predictions = [
+        labels = [
             # Filter out 'count' in all_descriptors.json
-            Prediction(label=x[0] if isinstance(x[0], str) else x[0]['word'], score=x[1])
-            for x in raw_predictions[:max_predictions]
+            label if isinstance(label, str) else label['word']
+            for label in self._labels
         ]
 
+        predictions = []
+
+        for scores in y_predicted:
+            scores = scores[:len(labels)]
+
+            # Stable sort to keep the order of equally scored labels
+            top_indices = np.argsort(-scores, kind='stable')[:max_predictions]
+
+            predictions.append([Prediction(label=labels[i], score=scores[i]) for i in top_indices])
+
         return predictions
 
+    def predict(self, text: str, max_predictions: int = DEFAULT_MAX_PREDICTIONS) -> List[Prediction]:
+        return self.predict_many(texts=[text], max_predictions=max_predictions)[0]
+
 
 class Descriptors600Model(_TopicDetectionBaseModel):
 
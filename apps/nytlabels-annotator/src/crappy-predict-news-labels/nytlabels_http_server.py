@@ -5,10 +5,12 @@ NYTLabels annotator HTTP service.
 """
 
 import json
+import queue
+import threading
 from http import HTTPStatus
-from http.server import HTTPServer, BaseHTTPRequestHandler
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
 from sys import argv
-from typing import Union, Dict, List
+from typing import Union, Dict, List, Optional
 
 from nytlabels import (
     Descriptors600Model,
@@ -19,6 +21,12 @@ from nytlabels import (
     JustTaxonomiesModel,
     Scaler)
 
+# Max. number of texts (from one or more concurrent requests) to run through the models at once
+MAX_BATCH_SIZE = 32
+
+# Max. number of texts to accept in a single /predict_batch.json request
+MAX_REQUEST_TEXTS = 1000
+
 # Models
 MODEL_600 = None
 MODEL_3000 = None
@@ -51,6 +59,137 @@ the series since its debut in 1997.
 """
 
 
+def _predictions_to_dicts(predictions) -> List[Dict[str, str]]:
+    return [{'label': x.label, 'score': "{0:.5f}".format(x.score)} for x in predictions]
+
+
+def _predict_many(texts: List[str]) -> List[Dict[str, List[Dict[str, str]]]]:
+    """Run all models against a batch of texts, return results for every text."""
+    results_600 = MODEL_600.predict_many(texts)
+    results_3000 = MODEL_3000.predict_many(texts)
+    results_all = MODEL_ALL.predict_many(texts)
+    results_with_tax = MODEL_WITH_TAX.predict_many(texts)
+    results_just_tax = MODEL_JUST_TAX.predict_many(texts)
+
+    results = []
+
+    for i in range(len(texts)):
+        results.append({
+            'descriptors600': _predictions_to_dicts(results_600[i]),
+            'descriptors3000': _predictions_to_dicts(results_3000[i]),
+            'allDescriptors': _predictions_to_dicts(results_all[i]),
+            'descriptorsAndTaxonomies': _predictions_to_dicts(results_with_tax[i]),
+            'taxonomies': _predictions_to_dicts(results_just_tax[i]),
+        })
+
+    return results
+
+
+class _PendingPrediction(object):
+    """Texts of a single request waiting to be run through the models."""
+
+    __slots__ = [
+        'texts',
+        'results',
+        'error',
+        'done',
+    ]
+
+    def __init__(self, texts: List[str]):
+        self.texts = texts
+        self.results = None
+        self.error = None
+        self.done = threading.Event()
+
+
+class PredictionBatcher(object):
+    """
+    Coalesces texts of concurrent requests into batches and runs the models against them.
+
+    Request handler threads submit texts with predict(); a single thread (the one that has loaded the models, as Keras
+    models are not safe to use from multiple threads) runs the models in run_forever().
+    """
+
+    __slots__ = [
+        '__queue',
+        '__max_batch_size',
+    ]
+
+    def __init__(self, max_batch_size: int = MAX_BATCH_SIZE):
+        assert max_batch_size > 0, "Max. batch size should be positive."
+        self.__queue = queue.Queue()
+        self.__max_batch_size = max_batch_size
+
+    def predict(self, texts: List[str]) -> List[Dict[str, List[Dict[str, str]]]]:
+        """Wait for texts to get run through the models, return results for every text."""
+        pending = _PendingPrediction(texts=texts)
+        self.__queue.put(pending)
+        pending.done.wait()
+
+        if pending.error is not None:
+            raise pending.error
+
+        return pending.results
+
+    def __next_batch(self) -> List[_PendingPrediction]:
+        """Block until there's at least one pending request, return it together with other pending requests."""
+        batch = [self.__queue.get()]
+        batch_size = len(batch[0].texts)
+
+        while batch_size < self.__max_batch_size:
+            try:
+                pending = self.__queue.get_nowait()
+            except queue.Empty:
+                break
+            batch.append(pending)
+            batch_size += len(pending.texts)
+
+        return batch
+
+    def __predict_many(self, texts: List[str]) -> List[Dict[str, List[Dict[str, str]]]]:
+        """Run all models against texts in chunks of up to max. batch size, return results for every text."""
+        results = []
+        for offset in range(0, len(texts), self.__max_batch_size):
+            results.extend(_predict_many(texts[offset:offset + self.__max_batch_size]))
+        return results
+
+    def run_once(self) -> None:
+        """Run the models against the next batch of pending requests."""
+        batch = self.__next_batch()
+
+        try:
+            texts = [text for pending in batch for text in pending.texts]
+            results = self.__predict_many(texts)
+
+            offset = 0
+            for pending in batch:
+                pending.results = results[offset:offset + len(pending.texts)]
+                offset += len(pending.texts)
+
+        except Exception as ex:
+            if len(batch) == 1:
+                batch[0].error = ex
+            else:
+                # Don't fail every request of the batch because of a single one
+                for pending in batch:
+                    try:
+                        pending.results = self.__predict_many(pending.texts)
+                    except Exception as pending_ex:
+                        pending.error = pending_ex
+
+        finally:
+            for pending in batch:
+                pending.done.set()
+
+    def run_forever(self) -> None:
+        """Keep running the models against pending requests."""
+        while True:
+            self.run_once()
+
+
+BATCHER = None  # type: Optional[PredictionBatcher]
+
+
 # noinspection PyPep8Naming
 class NYTLabelsRequestHandler(BaseHTTPRequestHandler):
 
@@ -62,6 +201,7 @@ class NYTLabelsRequestHandler(BaseHTTPRequestHandler):
         assert MODEL_ALL, "MODEL_ALL is not loaded."
         assert MODEL_WITH_TAX, "MODEL_WITH_TAX is not loaded."
         assert MODEL_JUST_TAX, "MODEL_JUST_TAX is not loaded."
+        assert BATCHER, "BATCHER is not started."
 
     def __respond(self, http_status: HTTPStatus, response: Union[dict, list]):
         self.send_response(http_status.value)
@@ -78,34 +218,6 @@ class NYTLabelsRequestHandler(BaseHTTPRequestHandler):
     def do_HEAD(self):
         self.__respond_with_error(http_status=HTTPStatus.BAD_REQUEST, message='HEAD requests are not supported.')
 
-    @staticmethod
-    def _predict(text: str) -> Dict[str, List[Dict[str, str]]]:
-        result_600 = MODEL_600.predict(text)
-        result_3000 = MODEL_3000.predict(text)
-        result_all = MODEL_ALL.predict(text)
-        result_with_tax = MODEL_WITH_TAX.predict(text)
-        result_just_tax = MODEL_JUST_TAX.predict(text)
-
-        result = {
-            'descriptors600': [
-                {'label': x.label, 'score': "{0:.5f}".format(x.score)} for x in result_600
-            ],
-            'descriptors3000': [
-                {'label': x.label, 'score': "{0:.5f}".format(x.score)} for x in result_3000
-            ],
-            'allDescriptors': [
-                {'label': x.label, 'score': "{0:.5f}".format(x.score)} for x in result_all
-            ],
-            'descriptorsAndTaxonomies': [
-                {'label': x.label, 'score': "{0:.5f}".format(x.score)} for x in result_with_tax
-            ],
-            'taxonomies': [
-                {'label': x.label, 'score': "{0:.5f}".format(x.score)} for x in result_just_tax
-            ],
-        }
-
-        return result
-
     def do_POST(self):
         content_length = int(self.headers.get('Content-Length', 0))
         if not content_length:
@@ -130,16 +242,35 @@ class NYTLabelsRequestHandler(BaseHTTPRequestHandler):
             self.__respond_with_error(http_status=HTTPStatus.BAD_REQUEST, message="Payload JSON is not a dictionary.")
             return
 
-        text = payload.get('text', None)
-        if text is None:
-            self.__respond_with_error(
-                http_status=HTTPStatus.BAD_REQUEST,
-                message="Payload doesn't have 'text' attribute.",
-            )
-            return
+        # Batch endpoint accepts a list of texts and returns a list of results
+        is_batch = self.path.split('?')[0].rstrip('/') == '/predict_batch.json'
+
+        if is_batch:
+            texts = payload.get('texts', None)
+            if not isinstance(texts, list) or not all(isinstance(text, str) for text in texts):
+                self.__respond_with_error(
+                    http_status=HTTPStatus.BAD_REQUEST,
+                    message="Payload doesn't have 'texts' attribute with a list of texts.",
+                )
+                return
+            if len(texts) > MAX_REQUEST_TEXTS:
+                self.__respond_with_error(
+                    http_status=HTTPStatus.REQUEST_ENTITY_TOO_LARGE,
+                    message="Payload has more than %d texts." % MAX_REQUEST_TEXTS,
+                )
+                return
+        else:
+            text = payload.get('text', None)
+            if text is None:
+                self.__respond_with_error(
+                    http_status=HTTPStatus.BAD_REQUEST,
+                    message="Payload doesn't have 'text' attribute.",
+                )
+                return
+            texts = [text]
 
         try:
-            result = self._predict(text)
+            results = BATCHER.predict(texts) if texts else []
         except Exception as ex:
             self.__respond_with_error(
                 http_status=HTTPStatus.INTERNAL_SERVER_ERROR,
@@ -147,7 +278,7 @@ class NYTLabelsRequestHandler(BaseHTTPRequestHandler):
             )
             return
 
-        self.__respond(http_status=HTTPStatus.OK, response=result)
+        self.__respond(http_status=HTTPStatus.OK, response=results if is_batch else results[0])
 
 
 def run(port: int = 8080):
@@ -156,6 +287,7 @@ def run(port: int = 8080):
     global MODEL_ALL
     global MODEL_WITH_TAX
     global MODEL_JUST_TAX
+    global BATCHER
 
     print("Loading models...")
     word2vec_model = Word2vecModel()
@@ -177,10 +309,17 @@ def run(port: int = 8080):
         print()
     print("Done running self-test.")
 
+    BATCHER = PredictionBatcher()
+
     server_address = ('', port)
-    httpd = HTTPServer(server_address, NYTLabelsRequestHandler)
+    httpd = ThreadingHTTPServer(server_address, NYTLabelsRequestHandler)
     print('Starting NYTLabels annotator on port %d...' % port)
-    httpd.serve_forever()
+
+    # Serve requests in background threads, run models in this (main) thread which has loaded them
+    server_thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    server_thread.start()
+
+    BATCHER.run_forever()
 
 
 if __name__ == "__main__":
@@ -26,7 +26,7 @@ CREATE OR REPLACE FUNCTION set_database_schema_version() RETURNS boolean AS $$
 DECLARE
     -- Database schema version number (same as a SVN revision number)
     -- Increase it by 1 if you make major database schema changes.
-    MEDIACLOUD_DATABASE_SCHEMA_VERSION CONSTANT INT := 4757;
+    MEDIACLOUD_DATABASE_SCHEMA_VERSION CONSTANT INT := 4759;
 BEGIN
 
     -- Update / set database schema version
@@ -441,6 +441,35 @@ create table media_tags_map (
 create unique index media_tags_map_media on media_tags_map (media_id, tags_id);
 create index media_tags_map_tag on media_tags_map (tags_id);
 
+-- Token that changes with every transaction that changes "media_tags_map" so that in-process caches of collections'
+-- media IDs (see mediawords.solr) know when to invalidate themselves
+create table media_tags_map_version (
+    version     text    not null
+);
+
+insert into media_tags_map_version (version) values (md5(random()::text));
+
+create or replace function media_tags_map_update_version() returns trigger as $$
+begin
+
+    -- Bump the version only once per transaction; updating the single row locks it until the end of the
+    -- transaction anyway, so further updates would just add dead tuples
+    if coalesce(current_setting('mediawords.media_tags_map_version_txid', true), '') = txid_current()::text then
+        return null;
+    end if;
+
+    update media_tags_map_version set version = md5(random()::text || clock_timestamp()::text);
+
+    perform set_config('mediawords.media_tags_map_version_txid', txid_current()::text, true);
+
+    return null;
+
+end;
+$$ language plpgsql;
+
+create trigger media_tags_map_update_version after insert or update or delete or truncate
+    on media_tags_map for each statement execute procedure media_tags_map_update_version();
+
 create view media_with_media_types as
     select m.*, mtm.tags_id media_type_tags_id, t.label media_type
     from
@@ -1479,6 +1508,25 @@ end;
 
 $$ language plpgsql;
 
+-- pop up to "max_downloads" queued downloads in a single statement for fetchers that work in batches
+create function pop_queued_downloads(max_downloads int) returns setof bigint as $$
+
+begin
+
+    return query
+        delete from queued_downloads
+        where downloads_id in (
+            select downloads_id
+                from queued_downloads
+                order by downloads_id desc
+                limit max_downloads for
+                update skip locked
+        )
+        returning downloads_id;
+end;
+
+$$ language plpgsql;
+
 -- efficiently query downloads_pending for the latest downloads_id per host.  postgres is not able to do this through
 -- its normal query planning (it just does an index scan of the whole index).  this turns a query that 
 -- takes ~22 seconds for a 100 million row table into one that takes ~0.25 seconds
@@ -0,0 +1,69 @@
+--
+-- This is a Media Cloud PostgreSQL schema difference file (a "diff") between schema
+-- versions 4758 and 4759.
+--
+-- If you are running Media Cloud with a database that was set up with a schema version
+-- 4758, and you would like to upgrade both the Media Cloud and the
+-- database to be at version 4759, import this SQL file:
+--
+--     psql mediacloud < mediawords-4758-4759.sql
+--
+-- You might need to import some additional schema diff files to reach the desired version.
+--
+--
+-- 1 of 2. Import the output of 'apgdiff':
+--
+
+-- Token that changes with every transaction that changes "media_tags_map" so that in-process caches of collections'
+-- media IDs (see mediawords.solr) know when to invalidate themselves
+create table media_tags_map_version (
+    version     text    not null
+);
+
+insert into media_tags_map_version (version) values (md5(random()::text));
+
+create or replace function media_tags_map_update_version() returns trigger as $$
+begin
+
+    -- Bump the version only once per transaction; updating the single row locks it until the end of the
+    -- transaction anyway, so further updates would just add dead tuples
+    if coalesce(current_setting('mediawords.media_tags_map_version_txid', true), '') = txid_current()::text then
+        return null;
+    end if;
+
+    update media_tags_map_version set version = md5(random()::text || clock_timestamp()::text);
+
+    perform set_config('mediawords.media_tags_map_version_txid', txid_current()::text, true);
+
+    return null;
+
+end;
+$$ language plpgsql;
+
+create trigger media_tags_map_update_version after insert or update or delete or truncate
+    on media_tags_map for each statement execute procedure media_tags_map_update_version();
+
+--
+-- 2 of 2. Reset the database version.
+--
+
+CREATE OR REPLACE FUNCTION set_database_schema_version() RETURNS boolean AS $$
+DECLARE
+
+    -- Database schema version number (same as a SVN revision number)
+    -- Increase it by 1 if you make major database schema changes.
+    MEDIACLOUD_DATABASE_SCHEMA_VERSION CONSTANT INT := 4759;
+
+BEGIN
+
+    -- Update / set database schema version
+    DELETE FROM database_variables WHERE name = 'database-schema-version';
+    INSERT INTO database_variables (name, value) VALUES ('database-schema-version', MEDIACLOUD_DATABASE_SCHEMA_VERSION::int);
+
+    return true;
+
+END;
+$$
+LANGUAGE 'plpgsql';
+
+SELECT set_database_schema_version();
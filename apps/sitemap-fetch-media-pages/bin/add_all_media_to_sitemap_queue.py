@@ -15,9 +15,10 @@ def add_all_media_to_sitemap_queue(db: DatabaseHandler):
         FROM media
         ORDER BY media_id
     """).flat()
-    for media_id in media_ids:
-        log.info("Adding media ID %d" % media_id)
-        JobBroker(queue_name='MediaWords::Job::Sitemap::FetchMediaPages').add_to_queue(media_id=media_id)
+    log.info("Adding %d media IDs..." % len(media_ids))
+    JobBroker(queue_name='MediaWords::Job::Sitemap::FetchMediaPages').add_many_to_queue(
+        [{'media_id': media_id} for media_id in media_ids]
+    )
 
 
 def add_us_media_to_sitemap_queue():
@@ -0,0 +1,251 @@
+#!/usr/bin/env python3
+
+"""
+Train Zstandard dictionary for raw downloads, and recompress existing raw downloads with Zstandard.
+
+Usage:
+
+    # Train a dictionary on a random sample of 10,000 successful downloads
+    recompress_downloads.py train-dictionary --output downloads.zstd-dict --samples 10000
+
+    # Recompress downloads stored in PostgreSQL (skips objects that are compressed with Zstandard already)
+    recompress_downloads.py recompress --location postgresql --dictionary downloads.zstd-dict
+
+    # Recompress downloads stored in Amazon S3, resuming from a specific object ID
+    recompress_downloads.py recompress --location s3 --dictionary downloads.zstd-dict --start-object-id 123456
+
+Objects get read with format detection so they can be recompressed whatever their current compression method is, and
+stores keep being able to read both recompressed and not yet recompressed objects. Set MC_DOWNLOADS_COMPRESSION to
+"zstd" and MC_DOWNLOADS_ZSTD_DICTIONARY_PATH to the dictionary's path to have new downloads stored with Zstandard too.
+"""
+
+import argparse
+import random
+from typing import List, Optional
+
+from mediawords.db import DatabaseHandler, connect_to_db
+from mediawords.dbi.downloads.store import (
+    fetch_contents,
+    RAW_DOWNLOADS_POSTGRESQL_KVS_TABLE_NAME,
+)
+from mediawords.key_value_store import KeyValueStore
+from mediawords.key_value_store.amazon_s3 import AmazonS3Store
+from mediawords.key_value_store.postgresql import PostgreSQLStore
+from mediawords.util.compress import train_zstd_dictionary, ZSTD_DEFAULT_DICTIONARY_SIZE
+from mediawords.util.config.common import CommonConfig
+from mediawords.util.log import create_logger
+
+log = create_logger(__name__)
+
+# How many downloads to fetch at once
+DEFAULT_BATCH_SIZE = 1000
+
+# How many random download IDs to try at once when sampling
+SAMPLE_BATCH_SIZE = 1000
+
+# Zstandard frame magic number as stored in PostgreSQL's "bytea" column
+_ZSTD_MAGIC_BYTEA = '\\x28b52ffd'
+
+
+def _read_dictionary(path: Optional[str]) -> Optional[bytes]:
+    if not path:
+        return None
+    with open(path, mode='rb') as f:
+        return f.read()
+
+
+def _sample_downloads(db: DatabaseHandler, sample_count: int) -> List[dict]:
+    """Return random sample of successful content downloads."""
+    max_downloads_id = db.query("SELECT MAX(downloads_id) FROM downloads").flat()[0]
+    if not max_downloads_id:
+        return []
+
+    downloads = {}
+    attempts = 0
+    max_attempts = max(sample_count * 10, SAMPLE_BATCH_SIZE)
+
+    while len(downloads) < sample_count and attempts < max_attempts:
+        random_ids = [random.randint(1, max_downloads_id) for _ in range(SAMPLE_BATCH_SIZE)]
+        attempts += SAMPLE_BATCH_SIZE
+
+        batch = db.query("""
+            SELECT *
+            FROM downloads
+            WHERE downloads_id = ANY(%(downloads_ids)s)
+              AND type = 'content'
+              AND state = 'success'
+        """, {'downloads_ids': random_ids}).hashes()
+
+        for download in batch:
+            downloads[download['downloads_id']] = download
+
+        log.info(f"Sampled {len(downloads)} / {sample_count} downloads...")
+
+    return list(downloads.values())[:sample_count]
+
+
+def train_dictionary(db: DatabaseHandler, output_path: str, sample_count: int, dictionary_size: int) -> None:
+    """Train Zstandard dictionary on a random sample of downloads and write it to a file."""
+    downloads = _sample_downloads(db=db, sample_count=sample_count)
+    if not downloads:
+        raise Exception("No downloads to train the dictionary on.")
+
+    log.info(f"Fetching content of {len(downloads)} downloads...")
+    samples = [content.encode('utf-8', errors='replace') for _, content in fetch_contents(db, downloads)]
+
+    log.info(f"Training {dictionary_size}-byte dictionary on {len(samples)} samples...")
+    dictionary = train_zstd_dictionary(samples=samples, dictionary_size=dictionary_size)
+
+    with open(output_path, mode='wb') as f:
+        f.write(dictionary)
+
+    log.info(f"Wrote dictionary to {output_path}")
+
+
+def _postgresql_object_ids(db: DatabaseHandler, after_object_id: int, batch_size: int) -> List[int]:
+    """Return next batch of PostgreSQL object IDs that are not compressed with Zstandard yet."""
+    return db.query("""
+        SELECT object_id
+        FROM """ + RAW_DOWNLOADS_POSTGRESQL_KVS_TABLE_NAME + """
+        WHERE object_id > %(after_object_id)s
+          AND SUBSTRING(raw_data FROM 1 FOR 4) != %(zstd_magic)s::bytea
+        ORDER BY object_id
+        LIMIT %(batch_size)s
+    """, {
+        'after_object_id': after_object_id,
+        'zstd_magic': _ZSTD_MAGIC_BYTEA,
+        'batch_size': batch_size,
+    }).flat()
+
+
+def _s3_object_ids(db: DatabaseHandler, after_object_id: int, batch_size: int) -> List[int]:
+    """Return next batch of object IDs of downloads that might be stored in Amazon S3.
+
+    Downloads' paths don't tell reliably whether they're in S3 (downloads with no path prefix get read from S3, and
+    "postgresql:" downloads might have been moved there), so all successful content downloads get returned, and the
+    ones that are not in S3 get skipped when fetching.
+    """
+    return db.query("""
+        SELECT downloads_id
+        FROM downloads
+        WHERE downloads_id > %(after_object_id)s
+          AND type = 'content'
+          AND state = 'success'
+        ORDER BY downloads_id
+        LIMIT %(batch_size)s
+    """, {'after_object_id': after_object_id, 'batch_size': batch_size}).flat()
+
+
+def _amazon_s3_store(compression_method: KeyValueStore.Compression, zstd_dictionary: Optional[bytes]) -> AmazonS3Store:
+    config = CommonConfig.amazon_s3_downloads()
+    if not config.access_key_id():
+        raise Exception("Amazon S3 download store is not configured.")
+
+    return AmazonS3Store(
+        access_key_id=config.access_key_id(),
+        secret_access_key=config.secret_access_key(),
+        bucket_name=config.bucket_name(),
+        directory_name=config.directory_name(),
+        compression_method=compression_method,
+        zstd_dictionary=zstd_dictionary,
+    )
+
+
+def recompress(db: DatabaseHandler,
+               location: str,
+               zstd_dictionary: Optional[bytes],
+               start_object_id: int,
+               batch_size: int) -> None:
+    """Recompress objects in a download store with Zstandard."""
+
+    if location == 'postgresql':
+        # Source store uncompresses objects with whatever method they've been compressed with
+        source_store = PostgreSQLStore(table=RAW_DOWNLOADS_POSTGRESQL_KVS_TABLE_NAME, zstd_dictionary=zstd_dictionary)
+        target_store = PostgreSQLStore(
+            table=RAW_DOWNLOADS_POSTGRESQL_KVS_TABLE_NAME,
+            compression_method=KeyValueStore.Compression.ZSTD,
+            zstd_dictionary=zstd_dictionary,
+        )
+        next_object_ids = _postgresql_object_ids
+
+    elif location == 's3':
+        source_store = _amazon_s3_store(
+            compression_method=KeyValueStore.Compression.GZIP,
+            zstd_dictionary=zstd_dictionary,
+        )
+        target_store = _amazon_s3_store(
+            compression_method=KeyValueStore.Compression.ZSTD,
+            zstd_dictionary=zstd_dictionary,
+        )
+        next_object_ids = _s3_object_ids
+
+    else:
+        raise Exception(f"Unknown location: {location}")
+
+    last_object_id = start_object_id - 1
+    recompressed_count = 0
+    skipped_count = 0
+
+    while True:
+        object_ids = next_object_ids(db=db, after_object_id=last_object_id, batch_size=batch_size)
+        if not object_ids:
+            break
+
+        # Objects that don't exist in the source store get logged and skipped by fetch_contents()
+        batch_recompressed_count = 0
+        for object_id, content in source_store.fetch_contents(db=db, object_ids=object_ids):
+            target_store.store_content(db=db, object_id=object_id, content=content)
+            batch_recompressed_count += 1
+
+        recompressed_count += batch_recompressed_count
+        skipped_count += len(object_ids) - batch_recompressed_count
+
+        last_object_id = object_ids[-1]
+        log.info(
+            f"Recompressed {recompressed_count} objects, skipped {skipped_count} missing objects, "
+            f"last object ID: {last_object_id}"
+        )
+
+    log.info(f"Done, recompressed {recompressed_count} objects, skipped {skipped_count} missing objects")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recompress raw downloads with Zstandard.")
+    subparsers = parser.add_subparsers(dest='command')
+    subparsers.required = True
+
+    train_parser = subparsers.add_parser('train-dictionary', help="Train Zstandard dictionary on sample downloads.")
+    train_parser.add_argument('--output', type=str, required=True, help="Path to write the dictionary to.")
+    train_parser.add_argument('--samples', type=int, default=10000, help="Number of downloads to sample.")
+    train_parser.add_argument('--dictionary-size', type=int, default=ZSTD_DEFAULT_DICTIONARY_SIZE,
+                              help="Dictionary size in bytes.")
+
+    recompress_parser = subparsers.add_parser('recompress', help="Recompress existing downloads with Zstandard.")
+    recompress_parser.add_argument('--location', type=str, required=True, choices=['postgresql', 's3'],
+                                   help="Download store to recompress.")
+    recompress_parser.add_argument('--dictionary', type=str, required=False,
+                                   help="Path to Zstandard dictionary to compress with.")
+    recompress_parser.add_argument('--start-object-id', type=int, default=1,
+                                   help="Object ID to start (or resume) recompressing from.")
+    recompress_parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE,
+                                   help="Number of objects to recompress at once.")
+
+    args = parser.parse_args()
+
+    db = connect_to_db()
+
+    if args.command == 'train-dictionary':
+        train_dictionary(db=db, output_path=args.output, sample_count=args.samples,
+                         dictionary_size=args.dictionary_size)
+    else:
+        recompress(
+            db=db,
+            location=args.location,
+            zstd_dictionary=_read_dictionary(args.dictionary),
+            start_object_id=args.start_object_id,
+            batch_size=args.batch_size,
+        )
+
+
+if __name__ == '__main__':
+    main()
@@ -1,8 +1,179 @@
+import hashlib
+import re
+import sre_constants
+import sre_parse
+import threading
+import warnings
+from collections import OrderedDict
+from typing import Iterable, List, Optional, Set
+
 import re2
 
 from mediawords.db import DatabaseHandler
 from mediawords.db.exceptions.result import McDatabaseResultException
 
+# Only the first megabyte of the content gets tested against the topic pattern
+_MAX_MATCHED_CONTENT_LENGTH = 1024 * 1024
+
+# Don't bother prefiltering with literals shorter than this
+_MIN_PREFILTER_LITERAL_LENGTH = 3
+
+# Standalone POSIX character class, e.g. "[[:space:]]"
+_POSIX_CHARACTER_CLASS_REGEX = re.compile(r'\[\[:\^?[a-z]+:\]\]')
+
+# Max. number of compiled topic pattern matchers to keep around
+_MAX_CACHED_MATCHERS = 128
+
+
+def _sequence_required_literals(items: Iterable) -> Optional[Set[str]]:
+    """Return a set of literals at least one of which has to be present in any string matched by the parsed sequence.
+
+    Return None if no such set can be determined.
+    """
+    candidates = []
+    literal_run = []
+
+    def flush_literal_run():
+        if literal_run:
+            candidates.append({''.join(literal_run)})
+            literal_run.clear()
+
+    for op, av in items:
+        if op is sre_constants.LITERAL:
+            literal_run.append(chr(av))
+            continue
+
+        flush_literal_run()
+
+        literals = None
+        if op is sre_constants.SUBPATTERN:
+            literals = _sequence_required_literals(av[-1])
+        elif op is sre_constants.BRANCH:
+            literals = _branch_required_literals(av[1])
+        elif op in (sre_constants.MAX_REPEAT, sre_constants.MIN_REPEAT) and av[0] >= 1:
+            literals = _sequence_required_literals(av[2])
+
+        if literals:
+            candidates.append(literals)
+
+    flush_literal_run()
+
+    # any single item of the sequence has to match, so pick the one with the most selective literals
+    return max(candidates, key=lambda c: min(len(literal) for literal in c), default=None)
+
+
+def _branch_required_literals(branches: list) -> Optional[Set[str]]:
+    """Return a set of literals at least one of which has to be present in any string matched by any of the branches.
+
+    Return None if no such set can be determined.
+    """
+    literals = set()
+    for branch in branches:
+        branch_literals = _sequence_required_literals(branch)
+        if not branch_literals:
+            return None
+        literals |= branch_literals
+
+    return literals
+
+
+def _pattern_required_literals(pattern: str) -> Optional[Set[str]]:
+    """Return a set of literals at least one of which has to be present in any string matched by the pattern.
+
+    Return None if no such set can be determined, e.g. if the pattern uses RE2 syntax that Python's parser doesn't
+    understand the same way.
+    """
+    # Python doesn't know about POSIX character classes, so replace standalone ones with a "match anything" dot (which
+    # might only make the prefilter less selective) and give up on the rest
+    pattern = _POSIX_CHARACTER_CLASS_REGEX.sub('.', pattern)
+    if '[:' in pattern:
+        return None
+
+    try:
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            parsed = sre_parse.parse(pattern, sre_constants.SRE_FLAG_IGNORECASE | sre_constants.SRE_FLAG_VERBOSE)
+    except (sre_constants.error, RecursionError, OverflowError):
+        return None
+
+    literals = _sequence_required_literals(parsed)
+    if not literals or min(len(literal) for literal in literals) < _MIN_PREFILTER_LITERAL_LENGTH:
+        return None
+
+    return literals
+
+
+class TopicPatternMatcher(object):
+    """Compiled topic pattern with a literal prefilter.
+
+    Texts that don't contain any of the literals required by the pattern get rejected by a (case insensitive) search
+    for all of those literals at once, so that the full pattern has to be run only on the texts that might match it.
+    """
+
+    __slots__ = [
+        '__regex',
+        '__prefilter',
+    ]
+
+    def __init__(self, pattern: str):
+        self.__regex = re2.compile(pattern, re2.I | re2.X | re2.S)
+
+        self.__prefilter = None
+        literals = _pattern_required_literals(pattern)
+        if literals:
+            self.__prefilter = re2.compile('|'.join(re2.escape(literal) for literal in sorted(literals)), re2.I | re2.S)
+
+    def has_prefilter(self) -> bool:
+        """Return True if texts get prefiltered by literals before getting matched against the pattern."""
+        return self.__prefilter is not None
+
+    def matches(self, content: Optional[str]) -> bool:
+        """Test whether the first megabyte of the content matches the pattern."""
+        if content is None:
+            return False
+
+        content = content[0:_MAX_MATCHED_CONTENT_LENGTH]
+
+        # for some reason I can't reproduce in dev, in production a small number of fields come from
+        # the database into the stories fields or the text value produced in the query below in _story_matches_topic
+        # as bytes objects, which re2.search chokes on
+        if isinstance(content, bytes):
+            content = content.decode('utf8', 'backslashreplace')
+
+        if self.__prefilter is not None and self.__prefilter.search(content) is None:
+            return False
+
+        return self.__regex.search(content) is not None
+
+    def matches_many(self, contents: Iterable[Optional[str]]) -> List[bool]:
+        """Test whether each of the contents matches the pattern; return a list of results in the same order."""
+        return [self.matches(content) for content in contents]
+
+
+_MATCHERS = OrderedDict()
+_MATCHERS_LOCK = threading.Lock()
+
+
+def get_topic_pattern_matcher(topic: dict) -> TopicPatternMatcher:
+    """Return a compiled matcher for topic['pattern'], cached by topic ID and pattern hash."""
+    pattern = topic['pattern']
+    key = (topic.get('topics_id'), hashlib.md5(pattern.encode('utf-8', 'backslashreplace')).hexdigest())
+
+    with _MATCHERS_LOCK:
+        matcher = _MATCHERS.get(key)
+        if matcher is not None:
+            _MATCHERS.move_to_end(key)
+            return matcher
+
+    matcher = TopicPatternMatcher(pattern)
+
+    with _MATCHERS_LOCK:
+        _MATCHERS[key] = matcher
+        while len(_MATCHERS) > _MAX_CACHED_MATCHERS:
+            _MATCHERS.popitem(last=False)
+
+    return matcher
+
 
 def content_matches_topic(content: str, topic: dict, assume_match: bool = False) -> bool:
     """Test whether the content matches the topic['pattern'] regex.
@@ -21,20 +192,15 @@ def content_matches_topic(content: str, topic: dict, assume_match: bool = False)
     if assume_match:
         return True
 
-    if content is None:
-        return False
-
-    content = content[0:1024 * 1024]
+    return get_topic_pattern_matcher(topic).matches(content)
 
-    # for some reason I can't reproduce in dev, in production a small number of fields come from
-    # the database into the stories fields or the text value produced in the query below in _story_matches_topic
-    # as bytes objects, which re2.search chokes on
-    if isinstance(content, bytes):
-        content = content.decode('utf8', 'backslashreplace')
 
-    r = re2.search(topic['pattern'], content, re2.I | re2.X | re2.S) is not None
+def contents_match_topic(contents: List[Optional[str]], topic: dict) -> List[bool]:
+    """Test whether each of the contents matches the topic['pattern'] regex; return a list of results.
 
-    return r
+    Same as calling content_matches_topic() on every content but faster for many contents.
+    """
+    return get_topic_pattern_matcher(topic).matches_many(contents)
 
 
 def try_update_topic_link_ref_stories_id(db: DatabaseHandler, topic_fetch_url: dict) -> None:
@@ -49,6 +49,12 @@ MAX_EXTRACTOR_WAIT = 600
 # how many seconds to poll to make sure we can fetch stored content
 STORE_CONTENT_TIMEOUT = 10
 
+# how many stories to fetch (or count sentences of) per query when looking for and merging duplicate stories
+_DUP_STORIES_CHUNK_SIZE = 1000
+
+# how many duplicate story groups to merge per transaction
+_DUP_STORY_GROUPS_MERGE_BATCH_SIZE = 100
+
 
 class McTMStoriesException(Exception):
     """Default exception for package."""
@@ -833,30 +839,37 @@ def copy_stories_to_topic(db: DatabaseHandler, source_topics_id: int, target_top
     db.query("drop table _stories; drop table _urls; drop table _tsu;")
 
 
-def _merge_dup_stories(db, topic, stories):
-    """Merge a list of stories into a single story, keeping the story with the most sentences."""
-    log.debug("merge dup stories")
+def _get_story_sentence_counts(db: DatabaseHandler, stories_ids: list) -> dict:
+    """Return a dict of sentence counts by stories_id for the given stories; stories without sentences get 0."""
+    sentence_counts = {stories_id: 0 for stories_id in stories_ids}
 
-    stories_ids = [s['stories_id'] for s in stories]
+    for i in range(0, len(stories_ids), _DUP_STORIES_CHUNK_SIZE):
+        story_sentence_counts = db.query(
+            """
+            select stories_id, count(*) sentence_count
+                from story_sentences
+                where stories_id = ANY(%(a)s)
+                group by stories_id
+            """,
+            {'a': stories_ids[i:i + _DUP_STORIES_CHUNK_SIZE]}).hashes()
 
-    story_sentence_counts = db.query(
-        """
-        select stories_id, count(*) sentence_count
-            from story_sentences
-            where stories_id = ANY(%(a)s)
-            group by stories_id
-        """,
-        {'a': stories_ids}).hashes()
+        for count in story_sentence_counts:
+            sentence_counts[count['stories_id']] = count['sentence_count']
 
-    ssc = {}
+    return sentence_counts
 
-    for s in stories:
-        ssc[s['stories_id']] = 0
 
-    for count in story_sentence_counts:
-        ssc[count['stories_id']] = count['sentence_count']
+def _merge_dup_stories(db, topic, stories, sentence_counts: Optional[dict] = None):
+    """Merge a list of stories into a single story, keeping the story with the most sentences.
 
-    stories = sorted(stories, key=lambda x: ssc[x['stories_id']], reverse=True)
+    If sentence_counts (as returned by _get_story_sentence_counts()) is not passed, the sentence counts get fetched.
+    """
+    log.debug("merge dup stories")
+
+    if sentence_counts is None:
+        sentence_counts = _get_story_sentence_counts(db, [s['stories_id'] for s in stories])
+
+    stories = sorted(stories, key=lambda x: sentence_counts.get(x['stories_id'], 0), reverse=True)
 
     keep_story = stories.pop(0)
 
@@ -899,37 +912,31 @@ def _get_dup_story_groups(db: DatabaseHandler, topic: dict) -> list:
     Find all stories within a topic that have duplicate normalized titles with a given day and media_id.  Return a
     list of story lists.  Each story list is a list of stories that are duplicated os each other.
     """
-    story_pairs = db.query(
+    dup_stories_ids_groups = db.query(
         """
-        select a.stories_id stories_id_a, b.stories_id stories_id_b
-            from snap.live_stories a,
-                snap.live_stories b
+        select array_agg(stories_id order by stories_id) as stories_ids
+            from snap.live_stories
             where
-                a.topics_id = %(a)s and
-                a.topics_id = b.topics_id and
-                a.stories_id < b.stories_id and
-                a.media_id = b.media_id and
-                a.normalized_title_hash = b.normalized_title_hash and
-                date_trunc('day', a.publish_date) = date_trunc('day', b.publish_date)
-            order by stories_id_a, stories_id_b
+                topics_id = %(a)s and
+                normalized_title_hash is not null and
+                publish_date is not null
+            group by media_id, normalized_title_hash, date_trunc('day', publish_date)
+            having count(*) > 1
+            order by min(stories_id)
         """,
         {'a': topic['topics_id']}).hashes()
 
-    story_groups = {}
-    ignore_stories = {}
-    for story_pair in story_pairs:
-        if story_pair['stories_id_b'] in ignore_stories:
-            continue
-
-        story_a = db.require_by_id('stories', story_pair['stories_id_a'])
-        story_b = db.require_by_id('stories', story_pair['stories_id_b'])
-
-        story_groups.setdefault(story_a['stories_id'], [story_a])
-        story_groups[story_a['stories_id']].append(story_b)
+    stories_ids = [stories_id for g in dup_stories_ids_groups for stories_id in g['stories_ids']]
 
-        ignore_stories[story_b['stories_id']] = True
+    stories = {}
+    for i in range(0, len(stories_ids), _DUP_STORIES_CHUNK_SIZE):
+        chunk_stories = db.query(
+            "select * from stories where stories_id = any(%(a)s)",
+            {'a': stories_ids[i:i + _DUP_STORIES_CHUNK_SIZE]}).hashes()
+        for story in chunk_stories:
+            stories[story['stories_id']] = story
 
-    return list(story_groups.values())
+    return [[stories[stories_id] for stories_id in g['stories_ids']] for g in dup_stories_ids_groups]
 
 
 def find_and_merge_dup_stories(db: DatabaseHandler, topic: dict) -> None:
@@ -945,4 +952,12 @@ def find_and_merge_dup_stories(db: DatabaseHandler, topic: dict) -> None:
     dup_story_groups = _get_dup_story_groups(db, topic)
 
     log.info("merging %d duplicate story groups ..." % len(dup_story_groups))
-    [_merge_dup_stories(db, topic, g) for g in dup_story_groups]
+
+    sentence_counts = _get_story_sentence_counts(db, [s['stories_id'] for g in dup_story_groups for s in g])
+
+    # merge a batch of groups per transaction instead of doing a transaction per merged story
+    for i in range(0, len(dup_story_groups), _DUP_STORY_GROUPS_MERGE_BATCH_SIZE):
+        db.begin()
+        for dup_story_group in dup_story_groups[i:i + _DUP_STORY_GROUPS_MERGE_BATCH_SIZE]:
+            _merge_dup_stories(db, topic, dup_story_group, sentence_counts)
+        db.commit()
@@ -0,0 +1,56 @@
+# noinspection PyProtectedMember
+from topics_base.fetch_link_utils import (
+    TopicPatternMatcher,
+    contents_match_topic,
+    get_topic_pattern_matcher,
+    _pattern_required_literals,
+)
+
+
+def test_pattern_required_literals():
+    assert _pattern_required_literals('foo') == {'foo'}
+    assert _pattern_required_literals(' foo ') == {'foo'}
+    assert _pattern_required_literals(r'( (?:^|\W)obama | (?:^|\W)trump.*(?:^|\W)clinton )') == {'obama', 'clinton'}
+    assert _pattern_required_literals(r'(?:^|\W)climate[[:space:]]+change') == {'climate'}
+    assert _pattern_required_literals('fo+bar') == {'bar'}
+
+    # Too short literals
+    assert _pattern_required_literals('a|bcd') is None
+
+    # Nothing required
+    assert _pattern_required_literals('(foo)?') is None
+    assert _pattern_required_literals('x*') is None
+
+    # Unknown syntax
+    assert _pattern_required_literals(r'[^[:space:]]foo') is None
+    assert _pattern_required_literals(r'\pLfoo') is None
+
+
+def test_topic_pattern_matcher():
+    matcher = TopicPatternMatcher(r'( (?:^|\W)obama | (?:^|\W)trump.*(?:^|\W)clinton )')
+    assert matcher.has_prefilter()
+
+    assert matcher.matches('President OBAMA said')
+    assert matcher.matches('trump and clinton')
+    assert not matcher.matches('clinton and trump')
+    assert not matcher.matches('barack')
+    assert not matcher.matches(None)
+    assert matcher.matches(b'obama')
+
+    assert matcher.matches_many(['obama', 'foo', None, 'trump vs. clinton']) == [True, False, False, True]
+
+    # Patterns without a usable prefilter still match
+    matcher = TopicPatternMatcher('a|bcd')
+    assert not matcher.has_prefilter()
+    assert matcher.matches('A')
+    assert not matcher.matches('bc')
+
+
+def test_get_topic_pattern_matcher():
+    topic = {'topics_id': 1, 'pattern': 'foo'}
+    assert get_topic_pattern_matcher(topic) is get_topic_pattern_matcher(topic)
+
+    # Changed pattern gets recompiled
+    assert get_topic_pattern_matcher(topic) is not get_topic_pattern_matcher({'topics_id': 1, 'pattern': 'bar'})
+
+    assert contents_match_topic(['foo', 'bar', 'FOO'], topic) == [True, False, True]
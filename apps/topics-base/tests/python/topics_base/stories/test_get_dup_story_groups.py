@@ -35,5 +35,7 @@ def test_get_dup_story_groups():
     assert len(dup_story_groups) == 3
 
     for dsg in dup_story_groups:
+        assert len(dsg) == 3
+        assert [s['stories_id'] for s in dsg] == sorted(s['stories_id'] for s in dsg)
         for story in dsg:
             assert dsg[0]['title'].lower() == story['title'].lower()
@@ -2,7 +2,7 @@ from mediawords.db import connect_to_db
 from mediawords.test.db.create import create_test_topic, create_test_medium, create_test_feed, create_test_story
 
 # noinspection PyProtectedMember
-from topics_base.stories import add_to_topic_stories, _merge_dup_stories
+from topics_base.stories import add_to_topic_stories, _merge_dup_stories, _get_story_sentence_counts
 
 
 def test_merge_dup_stories():
@@ -37,3 +37,6 @@ def test_merge_dup_stories():
         {'a': topic['topics_id'], 'b': stories_ids}).flat()
 
     assert merged_stories == [stories_ids[-1]]
+
+    sentence_counts = _get_story_sentence_counts(db, stories_ids)
+    assert sentence_counts == {stories_id: i for i, stories_id in enumerate(stories_ids)}
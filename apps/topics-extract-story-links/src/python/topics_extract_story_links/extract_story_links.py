@@ -2,9 +2,10 @@
 
 import re
 import traceback
-from typing import List
+from io import BytesIO, StringIO
+from typing import List, Optional
 
-from bs4 import BeautifulSoup
+from lxml import etree
 
 from extract_and_vector.dbi.downloads.extract import extract_content
 
@@ -20,6 +21,167 @@ from topics_base.ignore_link_pattern import IGNORE_LINK_PATTERN
 log = create_logger(__name__)
 
 
+class _HTMLDocument(object):
+    """HTML parsed (once) with lxml."""
+
+    __slots__ = [
+        # Parsed tree or None if the HTML is empty or unparseable
+        '__tree',
+    ]
+
+    def __init__(self, html: str):
+        self.__tree = None
+
+        if not html:
+            return
+
+        try:
+            try:
+                self.__tree = etree.parse(StringIO(html), etree.HTMLParser())
+            except ValueError:
+                # lxml refuses to parse Unicode strings with an encoding declaration
+                self.__tree = etree.parse(BytesIO(html.encode('utf-8')), etree.HTMLParser(encoding='utf-8'))
+        except Exception as ex:
+            log.warning(f"Unable to parse HTML: {ex}")
+
+    def __attribute_values(self, xpath: str) -> List[str]:
+        if self.__tree is None or self.__tree.getroot() is None:
+            return []
+
+        # Convert lxml's "smart" strings to plain ones so that they don't keep a reference to the whole tree
+        return [str(value) for value in self.__tree.xpath(xpath)]
+
+    def links(self) -> List[str]:
+        """Return a list of all absolute links that appear in the HTML."""
+        links = []
+
+        # get everything with an href= element rather than just <a /> links
+        for url in self.__attribute_values('//*[@href]/@href'):
+
+            if re.search(IGNORE_LINK_PATTERN, url, flags=re.I) is not None:
+                continue
+
+            if not is_http_url(url):
+                continue
+
+            url = re.sub(r'(https)?://www[a-z0-9]+.nytimes', r'\1://www.nytimes', url, flags=re.I)
+
+            links.append(url)
+
+        return links
+
+    def youtube_embed_links(self) -> List[str]:
+        """Return a list of src= attributes of all iframes that include the string 'youtube'."""
+        links = []
+
+        for url in self.__attribute_values('//iframe[@src]/@src'):
+
+            if 'youtube' not in url:
+                continue
+
+            if not url.lower().startswith('http'):
+                url = 'http:' + url
+
+            url = url.strip()
+
+            url = url.replace('youtube-embed', 'youtube')
+
+            links.append(url)
+
+        return links
+
+
+class _StoryDocument(object):
+    """Story's first content download, fetched, extracted and parsed only once for all the link mining passes."""
+
+    __slots__ = [
+        '__db',
+        '__story',
+
+        # Lazily fetched / computed values; use accessors
+        '__download',
+        '__html',
+        '__html_document',
+        '__extracted_html',
+        '__extracted_html_document',
+    ]
+
+    # Marker of values that haven't been fetched yet (as None might be a valid value)
+    __NOT_FETCHED = object()
+
+    def __init__(self, db: DatabaseHandler, story: dict):
+        self.__db = db
+        self.__story = story
+
+        self.__download = self.__NOT_FETCHED
+        self.__html = None
+        self.__html_document = None
+        self.__extracted_html = None
+        self.__extracted_html_document = None
+
+    def download(self) -> Optional[dict]:
+        """Return story's first successfully fetched content download, or None if there is none."""
+        if self.__download is self.__NOT_FETCHED:
+            self.__download = self.__db.query(
+                """
+                with d as (
+                    select * from downloads
+                        where
+                            stories_id = %(a)s and
+                            type = 'content' and
+                            state = 'success'
+                ) -- goofy cte to avoid bad query plan
+
+                select * from d order by downloads_id limit 1
+                """,
+                {'a': self.__story['stories_id']}).hash()
+
+        return self.__download
+
+    def html(self) -> str:
+        """Return full HTML of the story's download (empty string if there's no download)."""
+        if self.__html is None:
+            download = self.download()
+            self.__html = fetch_content(self.__db, download) if download else ''
+
+        return self.__html
+
+    def html_document(self) -> _HTMLDocument:
+        """Return parsed full HTML of the story's download."""
+        if self.__html_document is None:
+            self.__html_document = _HTMLDocument(self.html())
+
+        return self.__html_document
+
+    def extracted_html(self) -> str:
+        """Return extracted HTML of the story's download (empty string if there's no download).
+
+        We don't store the extracted html of a story, so we have to run the extractor on the download.
+        """
+        if self.__extracted_html is None:
+            html = self.html()
+
+            # avoid extracting large binary files
+            if '<' not in html[0:1000]:
+                if 'http' in html:
+                    self.__extracted_html = html[0:1000000]
+                else:
+                    self.__extracted_html = ''
+
+            else:
+                extract = extract_content(html)
+                self.__extracted_html = extract['extracted_html']
+
+        return self.__extracted_html
+
+    def extracted_html_document(self) -> _HTMLDocument:
+        """Return parsed extracted HTML of the story's download."""
+        if self.__extracted_html_document is None:
+            self.__extracted_html_document = _HTMLDocument(self.extracted_html())
+
+        return self.__extracted_html_document
+
+
 def _get_links_from_html(html: str) -> List[str]:
     """Return a list of all links that appear in the html.
 
@@ -33,25 +195,7 @@ def _get_links_from_html(html: str) -> List[str]:
     list of string urls
 
     """
-    soup = BeautifulSoup(html, 'lxml')
-
-    links = []
-
-    # get everything with an href= element rather than just <a /> links
-    for tag in soup.find_all(href=True):
-        url = tag['href']
-
-        if re.search(IGNORE_LINK_PATTERN, url, flags=re.I) is not None:
-            continue
-
-        if not is_http_url(url):
-            continue
-
-        url = re.sub(r'(https)?://www[a-z0-9]+.nytimes', r'\1://www.nytimes', url, flags=re.I)
-
-        links.append(url)
-
-    return links
+    return _HTMLDocument(html).links()
 
 
 def _get_youtube_embed_links(db: DatabaseHandler, story: dict) -> List[str]:
@@ -69,31 +213,7 @@ def _get_youtube_embed_links(db: DatabaseHandler, story: dict) -> List[str]:
     list of string urls
 
     """
-    download = db.query(
-        "select * from downloads where stories_id = %(a)s order by stories_id limit 1",
-        {'a': story['stories_id']}).hash()
-
-    html = fetch_content(db, download)
-
-    soup = BeautifulSoup(html, 'lxml')
-
-    links = []
-    for tag in soup.find_all('iframe', src=True):
-        url = tag['src']
-
-        if 'youtube' not in url:
-            continue
-
-        if not url.lower().startswith('http'):
-            url = 'http:' + url
-
-        url = url.strip()
-
-        url = url.replace('youtube-embed', 'youtube')
-
-        links.append(url)
-
-    return links
+    return _StoryDocument(db, story).html_document().youtube_embed_links()
 
 
 def _get_extracted_html(db: DatabaseHandler, story: dict) -> str:
@@ -103,52 +223,29 @@ def _get_extracted_html(db: DatabaseHandler, story: dict) -> str:
     and run the extractor on it.
 
     """
-    download = db.query(
-        """
-        with d as (
-            select * from downloads
-                where
-                    stories_id = %(a)s and
-                    type = 'content' and
-                    state = 'success'
-        ) -- goofy cte to avoid bad query plan
-
-        select * from d order by downloads_id limit 1
-        """,
-        {'a': story['stories_id']}).hash()
-
-    if not download:
-        return ''
+    return _StoryDocument(db, story).extracted_html()
 
-    html = fetch_content(db, download)
 
-    # avoid extracting large binary files
-    if '<' not in html[0:1000]:
-        if 'http' in html:
-            return html[0:1000000]
-        else:
-            return ''
+def _get_links_from_story_text(db: DatabaseHandler, story: dict, download: Optional[dict] = None) -> List[str]:
+    """Get all urls that appear in the text or description of the story using a simple regex.
 
-    extract = extract_content(html)
-    extracted_html = extract['extracted_html']
-
-    return extracted_html
-
-
-def _get_links_from_story_text(db: DatabaseHandler, story: dict) -> List[str]:
-    """Get all urls that appear in the text or description of the story using a simple regex."""
+    If the story's first download was already fetched, pass it as 'download' to not look it up again.
+    """
     # just get the first download, because the download_texts query plan breaks with multiple downloads,
     # and multiple download stories are rare
-    download_ids = db.query("""
-        SELECT downloads_id
-        FROM downloads
-        WHERE stories_id = %(stories_id)s
-            AND type = 'content'
-            AND state = 'success'
-        ORDER BY downloads_id ASC
-        LIMIT 1
-        """, {'stories_id': story['stories_id']}
-                            ).flat()
+    if download is None:
+        download_ids = db.query("""
+            SELECT downloads_id
+            FROM downloads
+            WHERE stories_id = %(stories_id)s
+                AND type = 'content'
+                AND state = 'success'
+            ORDER BY downloads_id ASC
+            LIMIT 1
+            """, {'stories_id': story['stories_id']}
+                                ).flat()
+    else:
+        download_ids = [download['downloads_id']]
 
     download_texts = db.query("""
         SELECT *
@@ -186,11 +283,12 @@ def _get_links_from_story(db: DatabaseHandler, story: dict) -> List[str]:
 
     """
     try:
-        extracted_html = _get_extracted_html(db, story)
+        # Fetch and parse the story's download only once for all the passes
+        story_document = _StoryDocument(db, story)
 
-        html_links = _get_links_from_html(extracted_html)
-        text_links = _get_links_from_story_text(db, story)
-        youtube_links = _get_youtube_embed_links(db, story)
+        html_links = story_document.extracted_html_document().links()
+        text_links = _get_links_from_story_text(db, story, download=story_document.download())
+        youtube_links = story_document.html_document().youtube_embed_links()
 
         all_links = html_links + text_links + youtube_links
 
@@ -0,0 +1,52 @@
+from mediawords.dbi.downloads.store import store_content
+# noinspection PyProtectedMember
+from topics_extract_story_links.extract_story_links import _StoryDocument, _HTMLDocument
+from .setup_test_extract_story_links import TestExtractStoryLinksDB
+
+
+def test_html_document():
+    assert _HTMLDocument('').links() == []
+    assert _HTMLDocument('').youtube_embed_links() == []
+
+    # Encoding declarations shouldn't break parsing of decoded HTML
+    html = '<?xml version="1.0" encoding="utf-8"?><html><body><a href="http://foo.com/ą">foo</a></body></html>'
+    assert _HTMLDocument(html).links() == ['http://foo.com/ą']
+
+
+class TestStoryDocument(TestExtractStoryLinksDB):
+
+    def test_story_document(self) -> None:
+        html = """
+        <html><body>
+        <p>foo <a href="http://foo.com/bar">bar</a></p>
+        <iframe src="//youtube.com/embed/1234" />
+        </body></html>
+        """
+
+        store_content(self.db, self.test_download, html)
+
+        story_document = _StoryDocument(self.db, self.test_story)
+
+        assert story_document.download()['downloads_id'] == self.test_download['downloads_id']
+        assert story_document.html() == html
+
+        assert story_document.html_document().youtube_embed_links() == ['http://youtube.com/embed/1234']
+        assert 'http://foo.com/bar' in story_document.html_document().links()
+
+        # Parsed documents get reused
+        assert story_document.html_document() is story_document.html_document()
+        assert story_document.extracted_html_document() is story_document.extracted_html_document()
+
+        # Content gets fetched only once
+        store_content(self.db, self.test_download, '<p>baz</p>')
+        assert story_document.html() == html
+
+    def test_story_document_without_download(self) -> None:
+        self.db.query("DELETE FROM downloads WHERE stories_id = %(a)s", {'a': self.test_story['stories_id']})
+
+        story_document = _StoryDocument(self.db, self.test_story)
+
+        assert story_document.download() is None
+        assert story_document.html() == ''
+        assert story_document.extracted_html() == ''
+        assert story_document.extracted_html_document().links() == []
@@ -1,11 +1,11 @@
 #!/usr/bin/env python3
 
 """Topic Mapper job that generates timespan_maps for a timespans or all timespans in a snapshot."""
-import argparse
 
 from mediawords.db import connect_to_db
 from mediawords.job import JobBroker
-from topics_map.map import generate_and_store_maps
+from topics_map.config import TopicsMapConfig
+from topics_map.map import generate_and_store_timespans_maps
 from mediawords.util.log import create_logger
 from mediawords.util.perl import decode_object_from_bytes_if_needed
 
@@ -15,9 +15,6 @@ QUEUE_NAME = 'MediaWords::Job::TM::Map'
 
 _consecutive_requeues = None
 
-_memory_limit_mb = None
-"""Memory limit (MB) for Java subprocess."""
-
 
 class McTopicMapJobException(Exception):
     """Exceptions dealing with job setup and routing."""
@@ -27,7 +24,6 @@ class McTopicMapJobException(Exception):
 def run_job(snapshots_id: int = None, timespans_id: int = None) -> None:
     """Generate and store network maps for either a single timespan or all timespans in a snapshot."""
     global _consecutive_requeues
-    global _memory_limit_mb
 
     if isinstance(snapshots_id, bytes):
         snapshots_id = decode_object_from_bytes_if_needed(snapshots_id)
@@ -42,29 +38,19 @@ def run_job(snapshots_id: int = None, timespans_id: int = None) -> None:
     if bool(snapshots_id) == bool(timespans_id):
         raise McTopicMapJobException("exactly one of snapshots_id or timespans_id must be set.")
 
-    db = connect_to_db()
-
     if snapshots_id:
+        db = connect_to_db()
         timespans_ids = db.query(
             "select timespans_id from timespans where snapshots_id = %(a)s",
             {'a': snapshots_id}
         ).flat()
+        db.disconnect()
     else:
         timespans_ids = [timespans_id]
 
-    for timespans_id in timespans_ids:
-        log.info("generating maps for timespan %s" % timespans_id)
-        generate_and_store_maps(db=db, timespans_id=timespans_id, memory_limit_mb=_memory_limit_mb)
+    generate_and_store_timespans_maps(timespans_ids=timespans_ids, processes=TopicsMapConfig.processes())
 
 
 if __name__ == '__main__':
-    parser = argparse.ArgumentParser(description="Run topics map worker.")
-    parser.add_argument("-m", "--memory_limit_mb", type=int, required=True,
-                        help="Memory limit (MB) for Java subprocess")
-    args = parser.parse_args()
-
-    _memory_limit_mb = args.memory_limit_mb
-    assert _memory_limit_mb, "Memory limit is not set (no idea what to set -Xmx to)."
-
     app = JobBroker(queue_name=QUEUE_NAME)
     app.start_worker(handler=run_job)
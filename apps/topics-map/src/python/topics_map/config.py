@@ -0,0 +1,11 @@
+from mediawords.util.config import env_value
+
+
+class TopicsMapConfig(object):
+    """Topic map generation configuration."""
+
+    @staticmethod
+    def processes() -> int:
+        """Number of processes to generate maps of a snapshot's timespans in."""
+        processes = env_value(name='MC_TOPICS_MAP_PROCESSES', required=False)
+        return int(processes) if processes else 1
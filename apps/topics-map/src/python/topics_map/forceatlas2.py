@@ -0,0 +1,389 @@
+"""
+In-process ForceAtlas2 graph layout.
+
+Implements ForceAtlas2 (Jacomy et al., "ForceAtlas2, a Continuous Graph Layout Algorithm for Handy Network
+Visualization Designed for the Gephi Software", 2014) with vectorized NumPy force computation. Repulsion is either
+computed exactly between all pairs of nodes (a chunk of nodes at a time to bound memory usage) or, for big graphs,
+approximated with a Barnes-Hut quadtree which gets built and traversed a level at a time for all nodes at once.
+"""
+
+import math
+from typing import Dict, Hashable, Optional, Tuple
+
+import networkx as nx
+import numpy as np
+
+from mediawords.util.log import create_logger
+
+log = create_logger(__name__)
+
+BARNES_HUT_MIN_NODES = 1000
+"""Approximate repulsion with Barnes-Hut for graphs with at least this many nodes (unless told otherwise)."""
+
+_EXACT_REPULSION_CHUNK_PAIRS = 4_000_000
+"""Max. number of node pairs to compute exact repulsion for at once."""
+
+_MIN_DISTANCE = 0.01
+"""Distance to assume between nodes that are closer than that to avoid huge repulsion forces."""
+
+_QUADTREE_MAX_DEPTH = 24
+"""Max. depth of the Barnes-Hut quadtree; nodes that are still together at this depth share a cell."""
+
+
+class McForceAtlas2Exception(Exception):
+    """ForceAtlas2 layout exception."""
+    pass
+
+
+def _accumulate(values: np.ndarray, indexes: np.ndarray, node_count: int) -> np.ndarray:
+    """Sum up (N, 2) "values" by "indexes" into a (node_count, 2) array."""
+    return np.column_stack((
+        np.bincount(indexes, weights=values[:, 0], minlength=node_count),
+        np.bincount(indexes, weights=values[:, 1], minlength=node_count),
+    ))
+
+
+def _exact_repulsion(positions: np.ndarray, masses: np.ndarray, scaling_ratio: float) -> np.ndarray:
+    """Compute repulsion forces between all pairs of nodes."""
+    node_count = len(positions)
+    forces = np.zeros_like(positions)
+
+    chunk_size = max(1, _EXACT_REPULSION_CHUNK_PAIRS // node_count)
+
+    for start in range(0, node_count, chunk_size):
+        end = min(start + chunk_size, node_count)
+
+        deltas = positions[start:end, np.newaxis, :] - positions[np.newaxis, :, :]
+        distances_squared = np.maximum(np.einsum('ijk,ijk->ij', deltas, deltas), _MIN_DISTANCE ** 2)
+
+        factors = scaling_ratio * masses[start:end, np.newaxis] * masses[np.newaxis, :] / distances_squared
+
+        # Nodes don't repel themselves
+        factors[np.arange(end - start), np.arange(start, end)] = 0
+
+        forces[start:end] = np.einsum('ij,ijk->ik', factors, deltas)
+
+    return forces
+
+
+class _Quadtree(object):
+    """Barnes-Hut quadtree over node positions, stored as flat arrays of cells."""
+
+    __slots__ = [
+        # Per-cell arrays
+        'masses',
+        'centers',
+        'sizes',
+        'levels',
+        'is_leaf',
+
+        # Children of a cell are "child_counts[cell]" consecutive cells starting at "child_starts[cell]"
+        'child_starts',
+        'child_counts',
+
+        # (level, node) -> cell that contains the node at that level, or -1 if the node is in a leaf by then
+        'node_cells',
+    ]
+
+    def __init__(self, positions: np.ndarray, masses: np.ndarray):
+        node_count = len(positions)
+
+        min_position = positions.min(axis=0)
+        span = max(float((positions.max(axis=0) - min_position).max()), _MIN_DISTANCE)
+
+        # Node coordinates normalized to [0, 1)
+        normalized = (positions - min_position) / span
+
+        cell_masses = []
+        cell_centers = []
+        cell_sizes = []
+        cell_levels = []
+        cell_is_leaf = []
+        cell_parents = []
+
+        node_cells = np.full((_QUADTREE_MAX_DEPTH + 1, node_count), -1, dtype=np.int64)
+
+        # Nodes that are in cells that have to be split further
+        active_nodes = np.arange(node_count)
+
+        cell_count = 0
+        level = 0
+
+        while active_nodes.size:
+            cells_per_side = 1 << level
+            grid = np.minimum((normalized[active_nodes] * cells_per_side).astype(np.int64), cells_per_side - 1)
+            keys = grid[:, 0] * cells_per_side + grid[:, 1]
+
+            if level:
+                parents = node_cells[level - 1, active_nodes]
+
+                # Order cells by parent so that every cell's children end up next to each other
+                order = np.lexsort((keys, parents))
+                active_nodes = active_nodes[order]
+                keys = keys[order]
+                parents = parents[order]
+            else:
+                parents = np.full(active_nodes.size, -1, dtype=np.int64)
+
+            # Cells are sorted by (parent, key) so a new cell starts wherever either changes
+            new_cell = np.ones(active_nodes.size, dtype=bool)
+            new_cell[1:] = (keys[1:] != keys[:-1]) | (parents[1:] != parents[:-1])
+            level_cells = np.cumsum(new_cell) - 1
+            level_cell_count = int(level_cells[-1]) + 1
+
+            active_masses = masses[active_nodes]
+            level_masses = np.bincount(level_cells, weights=active_masses, minlength=level_cell_count)
+            level_centers = _accumulate(
+                positions[active_nodes] * active_masses[:, np.newaxis], level_cells, level_cell_count
+            ) / level_masses[:, np.newaxis]
+            level_node_counts = np.bincount(level_cells, minlength=level_cell_count)
+
+            level_is_leaf = level_node_counts == 1
+            if level == _QUADTREE_MAX_DEPTH:
+                level_is_leaf[:] = True
+
+            cell_masses.append(level_masses)
+            cell_centers.append(level_centers)
+            cell_sizes.append(np.full(level_cell_count, span / cells_per_side))
+            cell_levels.append(np.full(level_cell_count, level, dtype=np.int64))
+            cell_is_leaf.append(level_is_leaf)
+            cell_parents.append(parents[new_cell])
+
+            node_cells[level, active_nodes] = level_cells + cell_count
+
+            cell_count += level_cell_count
+            active_nodes = active_nodes[~level_is_leaf[level_cells]]
+            level += 1
+
+        self.masses = np.concatenate(cell_masses)
+        self.centers = np.concatenate(cell_centers)
+        self.sizes = np.concatenate(cell_sizes)
+        self.levels = np.concatenate(cell_levels)
+        self.is_leaf = np.concatenate(cell_is_leaf)
+        self.node_cells = node_cells
+
+        # Cells are numbered level by level and ordered by parent within a level, so children are contiguous
+        parents = np.concatenate(cell_parents)
+        self.child_counts = np.bincount(parents[parents >= 0], minlength=cell_count)
+        self.child_starts = np.zeros(cell_count, dtype=np.int64)
+        has_children = self.child_counts > 0
+        self.child_starts[has_children] = np.searchsorted(parents, np.nonzero(has_children)[0])
+
+
+def _barnes_hut_repulsion(positions: np.ndarray,
+                          masses: np.ndarray,
+                          scaling_ratio: float,
+                          theta: float) -> np.ndarray:
+    """Approximate repulsion forces by treating far away quadtree cells as single bodies."""
+    node_count = len(positions)
+    forces = np.zeros_like(positions)
+
+    tree = _Quadtree(positions=positions, masses=masses)
+
+    # (node, cell) pairs to evaluate, starting with every node against the root cell
+    pair_nodes = np.arange(node_count)
+    pair_cells = np.zeros(node_count, dtype=np.int64)
+
+    while pair_nodes.size:
+        deltas = positions[pair_nodes] - tree.centers[pair_cells]
+        distances_squared = np.einsum('ij,ij->i', deltas, deltas)
+
+        is_leaf = tree.is_leaf[pair_cells]
+        contains_node = tree.node_cells[tree.levels[pair_cells], pair_nodes] == pair_cells
+        is_far = tree.sizes[pair_cells] ** 2 < (theta ** 2) * distances_squared
+
+        # Leaves and far away cells which don't contain the node itself act as a single body
+        accepted = (is_leaf | is_far) & ~contains_node
+        if accepted.any():
+            factors = scaling_ratio * masses[pair_nodes[accepted]] * tree.masses[pair_cells[accepted]] / np.maximum(
+                distances_squared[accepted], _MIN_DISTANCE ** 2
+            )
+            forces += _accumulate(deltas[accepted] * factors[:, np.newaxis], pair_nodes[accepted], node_count)
+
+        # Leaves at max. depth might contain other nodes besides the node itself, so repel from the rest of them
+        own_leaves = is_leaf & contains_node
+        if own_leaves.any():
+            own_nodes = pair_nodes[own_leaves]
+            own_cells = pair_cells[own_leaves]
+            other_masses = tree.masses[own_cells] - masses[own_nodes]
+            has_others = other_masses > 1e-9
+            if has_others.any():
+                own_nodes = own_nodes[has_others]
+                own_cells = own_cells[has_others]
+                other_masses = other_masses[has_others]
+                other_centers = (
+                    tree.centers[own_cells] * tree.masses[own_cells][:, np.newaxis] -
+                    positions[own_nodes] * masses[own_nodes][:, np.newaxis]
+                ) / other_masses[:, np.newaxis]
+                own_deltas = positions[own_nodes] - other_centers
+                factors = scaling_ratio * masses[own_nodes] * other_masses / np.maximum(
+                    np.einsum('ij,ij->i', own_deltas, own_deltas), _MIN_DISTANCE ** 2
+                )
+                forces += _accumulate(own_deltas * factors[:, np.newaxis], own_nodes, node_count)
+
+        # Open up the rest of the cells and evaluate their children on the next round
+        opened = ~is_leaf & ~accepted
+        opened_nodes = pair_nodes[opened]
+        opened_cells = pair_cells[opened]
+
+        child_counts = tree.child_counts[opened_cells]
+        pair_nodes = np.repeat(opened_nodes, child_counts)
+        child_offsets = np.arange(pair_nodes.size) - np.repeat(np.cumsum(child_counts) - child_counts, child_counts)
+        pair_cells = np.repeat(tree.child_starts[opened_cells], child_counts) + child_offsets
+
+    return forces
+
+
+def forceatlas2_layout(graph: nx.Graph,
+                       max_iterations: int = 1000,
+                       target_change_per_node: float = 0.5,
+                       seed: int = 0,
+                       barnes_hut: Optional[bool] = None,
+                       barnes_hut_theta: float = 1.2,
+                       scaling_ratio: float = 2.0,
+                       gravity: float = 1.0,
+                       strong_gravity: bool = False,
+                       lin_log: bool = False,
+                       outbound_attraction_distribution: bool = False,
+                       edge_weight_influence: float = 1.0,
+                       jitter_tolerance: float = 1.0,
+                       weight: Optional[str] = 'weight') -> Dict[Hashable, Tuple[float, float]]:
+    """Compute ForceAtlas2 layout of the graph.
+
+    Layout is deterministic for the same graph and seed.
+
+    :param graph: Graph to layout.
+    :param max_iterations: Max. number of iterations to run.
+    :param target_change_per_node: Stop once the average node moves by less than this in a single iteration.
+    :param seed: Seed for random initial positions.
+    :param barnes_hut: Whether to approximate repulsion with Barnes-Hut (default is to do so for graphs with at least
+        BARNES_HUT_MIN_NODES nodes).
+    :param barnes_hut_theta: Barnes-Hut accuracy; lower is more accurate but slower.
+    :param scaling_ratio: Repulsion strength; higher makes the graph sparser.
+    :param gravity: Strength of attraction to the center.
+    :param strong_gravity: Whether gravity should grow with the distance to the center.
+    :param lin_log: Whether to use logarithmic attraction which makes clusters tighter.
+    :param outbound_attraction_distribution: Whether to dissuade hubs (by dividing attraction by node's mass).
+    :param edge_weight_influence: How much edge weights matter (0 ignores them, 1 uses them as they are).
+    :param jitter_tolerance: How much swinging to tolerate; higher is faster but less precise.
+    :param weight: Edge attribute to use as edge weight (None for all edges to weigh 1).
+    :return: Dictionary of node -> (x, y) position.
+    """
+    if max_iterations < 1:
+        raise McForceAtlas2Exception(f"Max. iterations must be positive, got {max_iterations}")
+
+    nodes = list(graph.nodes())
+    node_count = len(nodes)
+    if node_count == 0:
+        return {}
+
+    if barnes_hut is None:
+        barnes_hut = node_count >= BARNES_HUT_MIN_NODES
+
+    node_indexes = {node: index for index, node in enumerate(nodes)}
+
+    edges = list(graph.edges(data=True))
+    sources = np.array([node_indexes[edge[0]] for edge in edges], dtype=np.int64)
+    targets = np.array([node_indexes[edge[1]] for edge in edges], dtype=np.int64)
+    if weight is not None and edge_weight_influence != 0:
+        weights = np.array([float(edge[2].get(weight, 1)) for edge in edges]) ** edge_weight_influence
+    else:
+        weights = np.ones(len(edges))
+
+    # Mass is degree + 1 so that nodes with more edges repel more
+    masses = 1.0 + np.bincount(sources, minlength=node_count) + np.bincount(targets, minlength=node_count)
+
+    outbound_attraction_compensation = float(masses.mean()) if outbound_attraction_distribution else 1.0
+
+    random_state = np.random.RandomState(seed)
+    positions = random_state.uniform(-1, 1, (node_count, 2)) * 10 * math.sqrt(node_count)
+
+    old_forces = np.zeros_like(positions)
+    speed = 1.0
+    speed_efficiency = 1.0
+
+    log.info(f"Running ForceAtlas2 on {node_count} nodes, {len(edges)} edges (Barnes-Hut: {barnes_hut})...")
+
+    iteration = 0
+    for iteration in range(1, max_iterations + 1):
+
+        # Repulsion
+        if barnes_hut:
+            forces = _barnes_hut_repulsion(
+                positions=positions, masses=masses, scaling_ratio=scaling_ratio, theta=barnes_hut_theta,
+            )
+        else:
+            forces = _exact_repulsion(positions=positions, masses=masses, scaling_ratio=scaling_ratio)
+
+        # Gravity
+        if strong_gravity:
+            forces -= positions * (scaling_ratio * gravity * masses)[:, np.newaxis]
+        else:
+            distances = np.sqrt(np.einsum('ij,ij->i', positions, positions))
+            factors = np.divide(gravity * masses, distances, out=np.zeros(node_count), where=distances > 0)
+            forces -= positions * factors[:, np.newaxis]
+
+        # Attraction
+        if len(edges):
+            deltas = positions[sources] - positions[targets]
+            if lin_log:
+                distances = np.sqrt(np.einsum('ij,ij->i', deltas, deltas))
+                factors = -weights * np.log1p(distances) / np.maximum(distances, _MIN_DISTANCE)
+            else:
+                factors = -weights
+            if outbound_attraction_distribution:
+                factors = factors * outbound_attraction_compensation / masses[sources]
+
+            edge_forces = deltas * factors[:, np.newaxis]
+            forces += _accumulate(edge_forces, sources, node_count) - _accumulate(edge_forces, targets, node_count)
+
+        # Adjust speed by how much nodes swing (change direction) vs. move in a consistent direction
+        swinging = masses * np.sqrt(np.einsum('ij,ij->i', forces - old_forces, forces - old_forces))
+        traction = masses * np.sqrt(np.einsum('ij,ij->i', forces + old_forces, forces + old_forces)) / 2
+        total_swinging = float(swinging.sum())
+        total_traction = float(traction.sum())
+
+        estimated_optimal_jitter_tolerance = 0.05 * math.sqrt(node_count)
+        min_jitter_tolerance = math.sqrt(estimated_optimal_jitter_tolerance)
+        max_jitter_tolerance = 10
+        jt = jitter_tolerance * max(
+            min_jitter_tolerance,
+            min(max_jitter_tolerance, estimated_optimal_jitter_tolerance * total_traction / (node_count ** 2)),
+        )
+
+        min_speed_efficiency = 0.05
+
+        # Protect against erratic behavior
+        if total_traction > 0 and total_swinging / total_traction > 2.0:
+            if speed_efficiency > min_speed_efficiency:
+                speed_efficiency *= 0.5
+            jt = max(jt, jitter_tolerance)
+
+        if total_swinging == 0:
+            target_speed = float('inf')
+        else:
+            target_speed = jt * speed_efficiency * total_traction / total_swinging
+
+        if total_swinging > jt * total_traction:
+            if speed_efficiency > min_speed_efficiency:
+                speed_efficiency *= 0.7
+        elif speed < 1000:
+            speed_efficiency *= 1.3
+
+        # Don't let the speed rise too quickly as that would make convergence drop dramatically
+        max_rise = 0.5
+        speed = speed + min(target_speed - speed, max_rise * speed)
+
+        # Move nodes; swinging nodes move slower
+        displacements = forces * (speed / (1.0 + np.sqrt(speed * swinging)))[:, np.newaxis]
+        positions += displacements
+
+        old_forces = forces
+
+        change_per_node = float(np.sqrt(np.einsum('ij,ij->i', displacements, displacements)).mean())
+        if change_per_node < target_change_per_node:
+            break
+
+    log.info(f"ForceAtlas2 finished after {iteration} iterations")
+
+    return {node: (float(positions[index][0]), float(positions[index][1])) for index, node in enumerate(nodes)}
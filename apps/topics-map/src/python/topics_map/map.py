@@ -4,20 +4,19 @@ generate network maps for topics
 
 import io
 import math
-import os
-import subprocess
-import tempfile
 from typing import Optional, List, Dict, Any, Tuple
 
+import billiard
 import community
 import matplotlib.pyplot as plt
 import networkx as nx
 
-from mediawords.db import DatabaseHandler
+from mediawords.db import DatabaseHandler, connect_to_db
 from mediawords.util.colors import get_consistent_color, hex_to_rgb
 from mediawords.util.log import create_logger
 from mediawords.util.parse_json import encode_json
 from mediawords.util.public_store import store_content, get_content_url, TIMESPAN_MAPS_TYPE
+from topics_map.forceatlas2 import forceatlas2_layout
 
 log = create_logger(__name__)
 
@@ -233,64 +232,17 @@ def remove_platforms_from_graph(graph: nx.Graph, platform_media_ids: Optional[Li
     return graph.subgraph(include_nodes)
 
 
-def run_fa2_layout(graph: nx.Graph, memory_limit_mb: int) -> None:
+def run_fa2_layout(graph: nx.Graph) -> None:
     """Generate force atlas 2 layout for the graph.
 
-    Run an external java library on the graph to assign a position to each node.
-
     Assign a 'position' attribute to each node in the graph that is a [x, y] tuple.
     """
+    log.info("running layout...")
 
-    with tempfile.TemporaryDirectory('topic_map') as temp_dir:
-
-        input_file = os.path.join(temp_dir, 'input.gexf')
-        output_template = os.path.join(temp_dir, 'output')
-        output_file = output_template + ".txt"
-
-        export_graph = graph.copy()
-        for node in export_graph.nodes(data=True):
-            for key in list(node[1].keys()):
-                del node[1][key]
-
-        nx.write_gexf(export_graph, input_file)
-
-        log.info("running layout...")
-
-        output = subprocess.check_output(
-            [
-                "java",
-                "-Djava.awt.headless=true",
-                f"-Xmx{memory_limit_mb}m",
-                "-cp", "/opt/fa2l/forceatlas2.jar:/opt/fa2l/gephi-toolkit.jar",
-                "kco.forceatlas2.Main",
-                "--input", input_file,
-                "--targetChangePerNode", "0.5",
-                "--output", output_template,
-                "--directed",
-                # "--scalingRatio", "10",
-                # "--gravity", "100",
-                "--2d"
-            ],
-        )
-
-        assert isinstance(output, bytes)
-        output = output.decode('utf-8', errors='replace')
-
-        log.info(f"fa2 layout: {str(output)}")
+    positions = forceatlas2_layout(graph=graph)
 
-        f = open(output_file)
-        lines = f.readlines()
-
-        del lines[0]
-
-        for line in lines:
-            (i, x, y) = line.split()
-
-            i = int(i)
-            x = float(x)
-            y = float(y)
-
-            graph.nodes[i]['position'] = [x, y]
+    for node, (x, y) in positions.items():
+        graph.nodes[node]['position'] = [x, y]
 
 
 def int_or_zero(value: str) -> int:
@@ -309,12 +261,18 @@ def assign_colors(db: DatabaseHandler, graph: nx.Graph, color_by: str, bool: boo
     Assign colors according to the color_by attribute.
     """
     log.warning(f'assign colors by {color_by}')
+
+    # look up every distinct value's color only once
+    value_colors = {}
+
     for n in graph.nodes:
         value = str(graph.nodes[n].get(color_by, 'null'))
         if bool:
             graph.nodes[n]['color'] = 'b4771f' if int_or_zero(value) > 0 else 'dddddd'
         else:
-            graph.nodes[n]['color'] = get_consistent_color(db, color_by, value)
+            if value not in value_colors:
+                value_colors[value] = get_consistent_color(db, color_by, value)
+            graph.nodes[n]['color'] = value_colors[value]
 
 
 def assign_sizes(graph: nx.Graph, attribute: str, scale: int = MAX_NODE_SIZE) -> None:
@@ -644,7 +602,6 @@ def get_default_size_attribute(db: DatabaseHandler, timespans_id: int) -> str:
 
 def generate_and_layout_graph(db: DatabaseHandler,
                               timespans_id: int,
-                              memory_limit_mb: int,
                               remove_platforms: bool = True,
                               color_by: str = 'community') -> nx.Graph:
     """Generate and layout a graph of the network of media for the given timespan.
@@ -653,7 +610,7 @@ def generate_and_layout_graph(db: DatabaseHandler,
     """
     graph = generate_graph(db=db, timespans_id=timespans_id, remove_platforms=remove_platforms)
     # run layout with all nodes in giant component, before reducing to smaler number to display
-    run_fa2_layout(graph=graph, memory_limit_mb=memory_limit_mb)
+    run_fa2_layout(graph=graph)
 
     graph = get_display_subgraph_by_attribute(graph=graph, attribute='media_inlink_count', num_nodes=1000)
     log.info(f"graph after attribute ranking: {len(graph.nodes())} nodes")
@@ -677,10 +634,9 @@ def generate_and_layout_graph(db: DatabaseHandler,
 
 def generate_and_draw_graph(db: DatabaseHandler,
                             timespans_id: int,
-                            memory_limit_mb: int,
                             graph_format: str = 'svg') -> bytes:
     """Generate, layout, and draw a graph of the media network for the given timespan."""
-    graph = generate_and_layout_graph(db=db, timespans_id=timespans_id, memory_limit_mb=memory_limit_mb)
+    graph = generate_and_layout_graph(db=db, timespans_id=timespans_id)
 
     return draw_graph(graph=graph, graph_format=graph_format)
 
@@ -762,13 +718,11 @@ def store_map(db: DatabaseHandler,
 def generate_and_store_maps(
         db: DatabaseHandler,
         timespans_id: int,
-        memory_limit_mb: int,
         remove_platforms: bool = True) -> None:
     """Generate and layout graph and store various formats of the graph in timespans_maps."""
     graph = generate_and_layout_graph(
         db=db,
         timespans_id=timespans_id,
-        memory_limit_mb=memory_limit_mb,
         remove_platforms=remove_platforms)
 
     for color_by in ('community', 'retweet_partisanship', 'twitter_partisanship'):
@@ -779,3 +733,51 @@ def generate_and_store_maps(
 
         image = draw_graph(graph=graph, graph_format='svg')
         store_map(db=db, timespans_id=timespans_id, content=image, graph_format='svg', color_by=color_by)
+
+
+def _generate_and_store_timespan_maps(timespans_id: int, remove_platforms: bool = True) -> int:
+    """Generate and store maps for a single timespan using a new database connection; return timespans_id."""
+    db = connect_to_db()
+
+    try:
+        log.info("generating maps for timespan %s" % timespans_id)
+        generate_and_store_maps(db=db, timespans_id=timespans_id, remove_platforms=remove_platforms)
+    finally:
+        db.disconnect()
+
+    return timespans_id
+
+
+def generate_and_store_timespans_maps(
+        timespans_ids: List[int],
+        processes: int = 1,
+        remove_platforms: bool = True) -> None:
+    """Generate and store maps for many timespans, processing up to 'processes' timespans in parallel.
+
+    The graph and its layout get built only once per timespan, and all of the timespan's map variants get derived from
+    it. Each timespan gets processed in a separate process (with its own database connection) if 'processes' > 1.
+    """
+    if processes <= 1 or len(timespans_ids) <= 1:
+        for timespans_id in timespans_ids:
+            _generate_and_store_timespan_maps(timespans_id=timespans_id, remove_platforms=remove_platforms)
+        return
+
+    log.info(f"generating maps for {len(timespans_ids)} timespans in {processes} processes...")
+
+    # billiard (Celery's fork of multiprocessing) is able to start child processes from within Celery's (daemonic)
+    # worker processes while multiprocessing isn't
+    pool = billiard.Pool(processes=processes)
+
+    try:
+        results = [
+            pool.apply_async(_generate_and_store_timespan_maps, args=(timespans_id, remove_platforms,))
+            for timespans_id in timespans_ids
+        ]
+
+        for result in results:
+            timespans_id = result.get()
+            log.info(f"generated maps for timespan {timespans_id}")
+
+    finally:
+        pool.terminate()
+        pool.join()
@@ -0,0 +1,58 @@
+import math
+
+import networkx as nx
+
+from topics_map.forceatlas2 import forceatlas2_layout
+
+
+def _two_cliques_graph(clique_size: int) -> nx.Graph:
+    """Return graph of two cliques connected by a single edge."""
+    graph = nx.Graph()
+
+    for offset in (0, clique_size):
+        for i in range(offset, offset + clique_size):
+            for j in range(i + 1, offset + clique_size):
+                graph.add_edge(i, j, weight=1)
+
+    graph.add_edge(0, clique_size, weight=1)
+
+    return graph
+
+
+def _mean_distance(positions: dict, nodes_a: list, nodes_b: list) -> float:
+    distances = []
+    for a in nodes_a:
+        for b in nodes_b:
+            if a != b:
+                distances.append(math.sqrt(
+                    (positions[a][0] - positions[b][0]) ** 2 + (positions[a][1] - positions[b][1]) ** 2
+                ))
+    return sum(distances) / len(distances)
+
+
+def test_forceatlas2_layout():
+    assert forceatlas2_layout(graph=nx.Graph()) == {}
+
+    clique_size = 20
+    graph = _two_cliques_graph(clique_size=clique_size)
+    clique_a = list(range(0, clique_size))
+    clique_b = list(range(clique_size, clique_size * 2))
+
+    for barnes_hut in (False, True):
+        positions = forceatlas2_layout(graph=graph, barnes_hut=barnes_hut)
+
+        assert set(positions.keys()) == set(graph.nodes())
+        for position in positions.values():
+            assert len(position) == 2
+            assert all(math.isfinite(_) for _ in position)
+
+        # Nodes in the same clique end up closer to each other than to nodes in the other clique
+        within_distance = _mean_distance(positions, clique_a, clique_a)
+        between_distance = _mean_distance(positions, clique_a, clique_b)
+        assert within_distance < between_distance, f"Barnes-Hut: {barnes_hut}"
+
+        # Layout is deterministic
+        assert forceatlas2_layout(graph=graph, barnes_hut=barnes_hut) == positions
+
+    # Different seed, different layout
+    assert forceatlas2_layout(graph=graph, seed=1) != forceatlas2_layout(graph=graph, seed=2)
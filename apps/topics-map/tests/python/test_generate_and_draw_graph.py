@@ -11,7 +11,6 @@ class TestGenerateAndDrawGraph(TestMap):
         svg = generate_and_draw_graph(
             db=db,
             timespans_id=self.timespan['timespans_id'],
-            memory_limit_mb=512,
         ).decode('UTF-8')
 
         assert len(svg) > 100 * len(self.connected_media)
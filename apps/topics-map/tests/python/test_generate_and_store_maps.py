@@ -14,7 +14,7 @@ class TestGenerateAndStoreMaps(TestMap):
     def test_generate_and_store_maps(self):
         db = self.db
 
-        generate_and_store_maps(db=db, timespans_id=self.timespan['timespans_id'], memory_limit_mb=512)
+        generate_and_store_maps(db=db, timespans_id=self.timespan['timespans_id'])
 
         timespan_maps = db.query(
             "SELECT * FROM timespan_maps WHERE timespans_id = %(a)s",
@@ -0,0 +1,59 @@
+from mediawords.test.db.create import create_test_timespan
+from topics_map.map import generate_and_store_timespans_maps
+
+from .setup_test_map import TestMap
+
+
+class TestGenerateAndStoreTimespansMaps(TestMap):
+
+    def test_generate_and_store_timespans_maps(self):
+        db = self.db
+
+        snapshot = db.require_by_id('snapshots', self.timespan['snapshots_id'])
+        other_timespan = create_test_timespan(db, self.topic, snapshot)
+
+        db.query(
+            """
+                INSERT INTO snap.medium_links (timespans_id, source_media_id, ref_media_id, link_count)
+                    SELECT %(b)s, source_media_id, ref_media_id, link_count
+                    FROM snap.medium_links
+                    WHERE timespans_id = %(a)s
+            """,
+            {'a': self.timespan['timespans_id'], 'b': other_timespan['timespans_id']}
+        )
+
+        db.query(
+            """
+                INSERT INTO snap.medium_link_counts (
+                    timespans_id,
+                    media_id,
+                    media_inlink_count,
+                    outlink_count,
+                    story_count,
+                    inlink_count,
+                    sum_media_inlink_count
+                )
+                    SELECT
+                        %(b)s,
+                        media_id,
+                        media_inlink_count,
+                        outlink_count,
+                        story_count,
+                        inlink_count,
+                        sum_media_inlink_count
+                    FROM snap.medium_link_counts
+                    WHERE timespans_id = %(a)s
+            """,
+            {'a': self.timespan['timespans_id'], 'b': other_timespan['timespans_id']}
+        )
+
+        timespans_ids = [self.timespan['timespans_id'], other_timespan['timespans_id']]
+
+        generate_and_store_timespans_maps(timespans_ids=timespans_ids, processes=2)
+
+        for timespans_id in timespans_ids:
+            map_count = db.query(
+                "SELECT COUNT(*) FROM timespan_maps WHERE timespans_id = %(a)s",
+                {'a': timespans_id}
+            ).flat()[0]
+            assert map_count == 3 * len(('gexf', 'svg'))
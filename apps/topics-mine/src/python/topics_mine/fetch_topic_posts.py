@@ -1,13 +1,14 @@
 import datetime
 import random
 import re
-from typing import Optional
+from typing import List, Optional, Tuple
 
 from mediawords.db import DatabaseHandler
+from mediawords.db.copy.copy_from import copy_escape
 from mediawords.util.log import create_logger
 from mediawords.util.parse_json import encode_json, decode_json
 
-from topics_base.fetch_link_utils import content_matches_topic
+from topics_base.fetch_link_utils import contents_match_topic
 from topics_base.twitter_url import get_tweet_urls
 
 from topics_mine.posts import AbstractPostFetcher
@@ -24,6 +25,9 @@ log = create_logger(__name__)
 # list of fields to copy from fetched posts to the topic_posts row
 POST_FIELDS = ('content', 'post_id', 'author', 'channel', 'publish_date', 'url')
 
+# how many topic posts to regenerate urls for at a time
+REGENERATE_POST_URLS_BATCH_SIZE = 10 * 1000
+
 
 class McFetchTopicPostsDataException(Exception):
     """exception indicating an error in the external data fetched by this module."""
@@ -35,16 +39,44 @@ class McFetchTopicPostsConfigException(Exception):
     pass
 
 
-def _insert_post_urls(db: DatabaseHandler, topic_post: dict, urls: list) -> None:
-    """Insert list of urls into topic_post_urls."""
-    for url in urls:
-        db.query(
-            """
-            insert into topic_post_urls( topic_posts_id, url )
-                values( %(a)s, %(b)s )
-                on conflict do nothing
-            """,
-            {'a': topic_post['topic_posts_id'], 'b': url[0:1023]})
+def _insert_post_urls(db: DatabaseHandler, post_urls: List[Tuple[int, str]]) -> None:
+    """Insert list of (topic_posts_id, url) tuples into topic_post_urls, skipping the ones that already exist.
+
+    The urls get COPYed into a temporary staging table first and then get inserted into topic_post_urls in a single
+    statement.
+    """
+    if not post_urls:
+        return
+
+    use_transaction = not db.in_transaction()
+    if use_transaction:
+        db.begin()
+
+    db.query("""
+        create temporary table if not exists topic_post_urls_staging (
+            topic_posts_id  int             not null,
+            url             varchar(1024)   not null
+        )
+    """)
+    db.query("truncate topic_post_urls_staging")
+
+    copy = db.copy_from("copy topic_post_urls_staging (topic_posts_id, url) from stdin")
+    for (topic_posts_id, url) in post_urls:
+        copy.put_line(copy_escape(topic_posts_id) + '\t' + copy_escape(url[0:1023]))
+    copy.end()
+
+    db.query(
+        """
+        insert into topic_post_urls ( topic_posts_id, url )
+            select distinct topic_posts_id, url
+                from topic_post_urls_staging
+            on conflict do nothing
+        """)
+
+    db.query("truncate topic_post_urls_staging")
+
+    if use_transaction:
+        db.commit()
 
 
 def _remove_json_tree_nulls(d: dict) -> None:
@@ -56,71 +88,142 @@ def _remove_json_tree_nulls(d: dict) -> None:
             d[k] = d[k].replace('\x00', '')
 
 
-def _store_post_and_urls(db: DatabaseHandler, topic_post_day: dict, post: dict) -> None:
+def _store_posts_and_urls(db: DatabaseHandler, topic_post_day: dict, posts: list) -> None:
     """
-    Store the tweet in topic_posts and its urls in topic_post_urls, using the data in post.
+    Store the posts in topic_posts and their urls in topic_post_urls.
+
+    Posts get COPYed into a temporary staging table first and then get inserted into topic_posts in a single statement.
+    Posts that already exist for the day (or are repeated in the list) are not stored again, but their urls still get
+    added.
 
     Arguments:
     db - database handler
-    topic - topic dict
     topic_post_day - topic_post_day dict
-    post - post dict
+    posts - list of post dicts
 
     Return:
     None
     """
-    log.debug("remove nulls")
-    _remove_json_tree_nulls(post)
+    if not posts:
+        return
 
-    log.debug("encode json")
-    data_json = encode_json(post)
+    use_transaction = not db.in_transaction()
+    if use_transaction:
+        db.begin()
 
-    # null characters are not legal in json but for some reason get stuck in these tweets
-    # data_json = data_json.replace('\x00', '')
+    db.query("""
+        create temporary table if not exists topic_posts_staging (
+            -- order in which posts were passed to us, earlier duplicates win
+            position        int             not null,
+            data            jsonb           not null,
+            post_id         varchar(1024)   not null,
+            content         text            not null,
+            publish_date    timestamp       not null,
+            author          varchar(1024)   not null,
+            channel         varchar(1024)   not null,
+            url             text            null
+        )
+    """)
+    db.query("truncate topic_posts_staging")
 
-    data = {}
+    staging_columns = ('position', 'data') + POST_FIELDS
 
-    for field in POST_FIELDS:
-        data[field] = post.get(field, None)
+    log.debug("copy %d posts into staging table" % len(posts))
 
-    data['topic_post_days_id'] = topic_post_day['topic_post_days_id']
-    data['data'] = data_json
+    copy = db.copy_from("copy topic_posts_staging ({}) from stdin".format(', '.join(staging_columns)))
+    for (position, post) in enumerate(posts):
+        _remove_json_tree_nulls(post)
 
-    topic_post = db.query(
-            "select * from topic_posts where topic_post_days_id = %(a)s and post_id = %(b)s::text",
-        {'a': topic_post_day['topic_post_days_id'], 'b': data['post_id']}).hash()
+        data = {field: post.get(field, None) for field in POST_FIELDS}
+        data['position'] = position
+        data['data'] = encode_json(post)
 
-    if not topic_post:
-        log.debug("insert topic post")
-        topic_post = db.create('topic_posts', data)
+        copy.put_line('\t'.join(copy_escape(data[column]) for column in staging_columns))
+    copy.end()
 
-    log.debug("insert tweet urls")
-    _insert_post_urls(db, topic_post, post['urls'])
-
-    log.debug("done")
+    log.debug("insert topic posts")
 
+    db.query(
+        """
+        insert into topic_posts ( topic_post_days_id, {columns} )
+            select %(a)s, {columns}
+                from (
+                    select distinct on ( post_id ) *
+                        from topic_posts_staging
+                        order by post_id, position
+                ) as p
+                order by position
+            on conflict ( topic_post_days_id, post_id ) do nothing
+        """.format(columns=', '.join(('data',) + POST_FIELDS)),
+        {'a': topic_post_day['topic_post_days_id']})
 
-def regenerate_post_urls(db: DatabaseHandler, topic: dict) -> None:
-    """Reparse the tweet json for a given topic and try to reinsert all tweet urls."""
     topic_posts_ids = db.query(
         """
-        select tt.topic_posts_id
-            from topic_posts tt
-                join topic_post_days ttd using ( topic_post_days_id )
-                join topic_seed_queries tsg using ( topic_seed_queries_id )
+        select tp.post_id, tp.topic_posts_id
+            from topic_posts tp
             where
-                topics_id = %(a)s
+                tp.topic_post_days_id = %(a)s and
+                tp.post_id in ( select post_id from topic_posts_staging )
         """,
-        {'a': topic['topics_id']}).flat()
+        {'a': topic_post_day['topic_post_days_id']}).hashes()
+    topic_posts_ids = {row['post_id']: row['topic_posts_id'] for row in topic_posts_ids}
+
+    db.query("truncate topic_posts_staging")
+
+    log.debug("insert post urls")
+
+    post_urls = []
+    for post in posts:
+        topic_posts_id = topic_posts_ids[str(post['post_id'])]
+        post_urls.extend((topic_posts_id, url) for url in post['urls'])
+
+    _insert_post_urls(db, post_urls)
+
+    if use_transaction:
+        db.commit()
+
+    log.debug("done")
+
+
+def regenerate_post_urls(db: DatabaseHandler, topic: dict) -> None:
+    """Reparse the tweet json for a given topic and try to reinsert all tweet urls.
+
+    Posts get read in batches of REGENERATE_POST_URLS_BATCH_SIZE by topic_posts_id, and every batch's urls get
+    committed separately.
+    """
+    num_topic_posts = 0
+    last_topic_posts_id = 0
+
+    while True:
+        topic_posts_batch = db.query(
+            """
+            select tt.topic_posts_id, tt.data
+                from topic_posts tt
+                    join topic_post_days ttd using ( topic_post_days_id )
+                    join topic_seed_queries tsg using ( topic_seed_queries_id )
+                where
+                    topics_id = %(a)s and
+                    tt.topic_posts_id > %(b)s
+                order by tt.topic_posts_id
+                limit %(c)s
+            """,
+            {'a': topic['topics_id'], 'b': last_topic_posts_id, 'c': REGENERATE_POST_URLS_BATCH_SIZE}).hashes()
+
+        if not topic_posts_batch:
+            break
+
+        log.info('regenerate tweet urls: %d' % num_topic_posts)
+
+        post_urls = []
+        for topic_post in topic_posts_batch:
+            data = decode_json(topic_post['data'])
+            urls = get_tweet_urls(data['data']['tweet'])
+            post_urls.extend((topic_post['topic_posts_id'], url) for url in urls)
 
-    for (i, topic_posts_id) in enumerate(topic_posts_ids):
-        if i % 1000 == 0:
-            log.info('regenerate tweet urls: %d/%d' % (i, len(topic_posts_ids)))
+        _insert_post_urls(db, post_urls)
 
-        topic_post = db.require_by_id('topic_posts', topic_posts_id)
-        data = decode_json(topic_post['data'])
-        urls = get_tweet_urls(data['data']['tweet'])
-        _insert_post_urls(db, topic_post, urls)
+        num_topic_posts += len(topic_posts_batch)
+        last_topic_posts_id = topic_posts_batch[-1]['topic_posts_id']
 
 
 def _store_posts_for_day(db: DatabaseHandler, topic_post_day: dict, posts: list) -> None:
@@ -139,7 +242,8 @@ def _store_posts_for_day(db: DatabaseHandler, topic_post_day: dict, posts: list)
 
     tsq = db.require_by_id('topic_seed_queries', topic_post_day['topic_seed_queries_id'])
     topic = db.require_by_id('topics', tsq['topics_id'])
-    posts = list(filter(lambda p: content_matches_topic(p['content'], topic), posts))
+    matches = contents_match_topic([p['content'] for p in posts], topic)
+    posts = [p for (p, match) in zip(posts, matches) if match]
 
     num_posts_fetched = len(posts)
 
@@ -149,7 +253,7 @@ def _store_posts_for_day(db: DatabaseHandler, topic_post_day: dict, posts: list)
 
     log.debug("inserting into topic_posts ...")
 
-    [_store_post_and_urls(db, topic_post_day, meta_tweet) for meta_tweet in posts]
+    _store_posts_and_urls(db, topic_post_day, posts)
 
     db.query(
         """
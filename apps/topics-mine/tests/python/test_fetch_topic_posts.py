@@ -7,7 +7,7 @@ from mediawords.test.db.create import create_test_topic
 from mediawords.util.log import create_logger
 
 # noinspection PyProtectedMember
-from topics_mine.fetch_topic_posts import POST_FIELDS, fetch_topic_posts
+from topics_mine.fetch_topic_posts import POST_FIELDS, fetch_topic_posts, _store_posts_and_urls
 # noinspection PyProtectedMember
 from topics_mine.posts.csv_generic import CSVStaticPostFetcher
 
@@ -155,3 +155,70 @@ def test_fetch_topic_posts() -> None:
     _validate_topic_posts(db, topic, mock_posts)
 
     _validate_topic_post_urls(db, mock_posts)
+
+
+def test_store_posts_and_urls() -> None:
+    """Test storing posts in bulk."""
+    db = connect_to_db()
+
+    topic = create_test_topic(db, 'test')
+
+    tsq = db.create('topic_seed_queries', {
+        'topics_id': topic['topics_id'],
+        'platform': 'generic_post',
+        'source': 'csv',
+        'query': 'foo'})
+
+    topic_post_day = db.create('topic_post_days', {
+        'topic_seed_queries_id': tsq['topic_seed_queries_id'],
+        'day': MOCK_START_DATE,
+        'num_posts_stored': 0,
+        'num_posts_fetched': 0,
+        'posts_fetched': False})
+
+    def _post(post_id: int, content: str, urls: list) -> dict:
+        return {
+            'post_id': post_id,
+            'content': content,
+            'publish_date': MOCK_START_DATE,
+            'author': 'author\twith\\special\ncharacters',
+            'channel': 'channel',
+            'url': None,
+            'urls': urls,
+        }
+
+    _store_posts_and_urls(db, topic_post_day, [
+        _post(1, 'first', ['http://a.com/', 'http://b.com/']),
+        _post(2, 'second', []),
+
+        # Repeated post doesn't get stored again, but its urls do
+        _post(1, 'first again', ['http://c.com/']),
+    ])
+
+    # Existing posts don't get stored again either
+    _store_posts_and_urls(db, topic_post_day, [_post(2, 'second again', ['http://a.com/', 'http://a.com/'])])
+
+    topic_posts = db.query(
+        "select * from topic_posts where topic_post_days_id = %(a)s order by post_id",
+        {'a': topic_post_day['topic_post_days_id']}).hashes()
+
+    assert [p['content'] for p in topic_posts] == ['first', 'second']
+    assert topic_posts[0]['author'] == 'author\twith\\special\ncharacters'
+    assert topic_posts[0]['url'] is None
+
+    topic_post_urls = db.query(
+        """
+        select tp.post_id, tpu.url
+            from topic_post_urls tpu
+                join topic_posts tp using ( topic_posts_id )
+            where tp.topic_post_days_id = %(a)s
+            order by tp.post_id, tpu.url
+        """,
+        {'a': topic_post_day['topic_post_days_id']}).hashes()
+
+    assert [(u['post_id'], u['url']) for u in topic_post_urls] == [
+        ('1', 'http://a.com/'),
+        ('1', 'http://b.com/'),
+        ('1', 'http://c.com/'),
+        ('2', 'http://a.com/'),
+    ]
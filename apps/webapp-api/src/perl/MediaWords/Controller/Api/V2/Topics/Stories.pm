@@ -190,11 +190,8 @@ SQL
     {
         $q = "timespans_id:$timespans_id and ( $q )";
 
-        my $solr_stories_id = MediaWords::Solr::search_solr_for_stories_ids( $c->dbis, { q => $q, rows => 10_000_000 } );
-
-        $solr_stories_id = [ map { int( $_ ) } @{ $solr_stories_id } ];
-
-        my $ids_table = $c->dbis->get_temporary_ids_table( $solr_stories_id );
+        my $ids_table =
+          MediaWords::Solr::get_temporary_solr_stories_ids_table( $c->dbis, { q => $q, rows => 10_000_000 } );
         push( @{ $clauses }, "slc.stories_id in ( select id from $ids_table )" );
     }
 
@@ -60,27 +60,32 @@ def __forceatlas2_layout(graph: nx.Graph,
     # linearly step down by dt on each iteration so last iteration is size dt.
     dt = t / float(iterations + 1)
     displacement = np.zeros((dim, nnodes))
+
+    # compute forces for a chunk of rows at a time to bound the memory used by the (rows x nodes x dim) arrays
+    adj_matrix_rows = graph_adj_matrix.tocsr()
+    row_chunk_size = max(1, 1000000 // nnodes)
+
     for iteration in range(iterations):
         displacement *= 0
-        # loop over rows
-        for i in range(graph_adj_matrix.shape[0]):
-            # difference between this row's node position and all others
-            delta = (pos[i] - pos).T
+        for start in range(0, nnodes, row_chunk_size):
+            end = min(start + row_chunk_size, nnodes)
+            # difference between these rows' node positions and all others
+            delta = pos[start:end, np.newaxis, :] - pos[np.newaxis, :, :]
             # distance between points
-            distance = np.sqrt((delta ** 2).sum(axis=0))
+            distance = np.sqrt((delta ** 2).sum(axis=2))
             # enforce minimum distance
             distance = np.where(distance < min_length, min_length, distance)
-            # the adjacency matrix row
-            adj_matrix_row = np.asarray(graph_adj_matrix.getrowview(i).toarray())
+            # the adjacency matrix rows
+            adj_matrix_chunk = adj_matrix_rows[start:end].toarray()
             # displacement "force"
             displacement_force = (k * k / distance ** 2) * scale
             if nohubs:
-                displacement_force = displacement_force / float(adj_matrix_row.sum(axis=1) + 1)
+                displacement_force = displacement_force / (adj_matrix_chunk.sum(axis=1, keepdims=True) + 1)
             if linlog:
                 displacement_force = np.log(displacement_force + 1)
-            displacement[:, i] += \
-                (delta * (displacement_force - adj_matrix_row * distance / k)).sum(axis=1)
-            # update positions
+            displacement[:, start:end] += \
+                (delta * (displacement_force - adj_matrix_chunk * distance / k)[:, :, np.newaxis]).sum(axis=1).T
+        # update positions
         length = np.sqrt((displacement ** 2).sum(axis=0))
         length = np.where(length < min_length, min_length, length)
         pos += (displacement * t / length).T
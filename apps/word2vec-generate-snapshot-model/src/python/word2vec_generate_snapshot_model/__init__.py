@@ -1,10 +1,12 @@
 import os
 import shutil
 import tempfile
+from typing import Optional
 
 import gensim
 
 from mediawords.util.log import create_logger
+from word2vec_generate_snapshot_model.config import Word2vecConfig
 from word2vec_generate_snapshot_model.exceptions import McWord2vecException
 from word2vec_generate_snapshot_model.model_stores import AbstractModelStore
 from word2vec_generate_snapshot_model.sentence_iterators import AbstractSentenceIterator
@@ -12,32 +14,98 @@ from word2vec_generate_snapshot_model.sentence_iterators import AbstractSentence
 log = create_logger(__name__)
 
 
+def write_corpus_file(sentence_iterator: AbstractSentenceIterator, corpus_path: str) -> int:
+    """Write tokenized sentences to a corpus file in gensim's LineSentence format.
+
+    The file has a single sentence per line with its words separated by spaces, so that the sentences have to be
+    fetched and tokenized only once and not on every training pass.
+
+    :param sentence_iterator: Sentence iterator to fetch training sentences from
+    :param corpus_path: Path to the corpus file to write
+    :return Number of sentences written
+    """
+
+    sentence_count = 0
+
+    with open(corpus_path, mode='w', encoding='utf-8') as corpus_file:
+        for words in sentence_iterator:
+
+            # Words are separated by whitespace in the file, so whitespace within a (multi-word) token gets joined with
+            # underscores instead for the token to remain a single word
+            line = ' '.join('_'.join(word.split()) for word in words if word.strip())
+            if not line:
+                continue
+
+            corpus_file.write(line + '\n')
+            sentence_count += 1
+
+    return sentence_count
+
+
 def train_word2vec_model(sentence_iterator: AbstractSentenceIterator,
-                         model_store: AbstractModelStore) -> int:
+                         model_store: AbstractModelStore,
+                         worker_count: Optional[int] = None) -> int:
     """Train word2vec model.
 
+    Sentences get written to a temporary corpus file first, and then the model gets trained off that file.
+
     :param sentence_iterator: Sentence iterator to fetch training sentences from
     :param model_store: Model store to write the trained model to
+    :param worker_count: Number of worker threads to train the model with (default is set in configuration)
     :return ID of the model that was generated
     """
 
+    if worker_count is None:
+        worker_count = Word2vecConfig.worker_count()
+
     temp_directory = tempfile.mkdtemp()
+    temp_corpus_path = os.path.join(temp_directory, 'corpus.txt')
     temp_model_path = os.path.join(temp_directory, 'model.word2vec')
 
-    # Occupy only a single code to leave resources for other stuff to happen on the machine
-    worker_count = 1
+    try:
+        log.info("Writing sentences to a temporary corpus file '%s'..." % temp_corpus_path)
+        sentence_count = write_corpus_file(sentence_iterator=sentence_iterator, corpus_path=temp_corpus_path)
+        log.info("Wrote %d sentences" % sentence_count)
+
+        models_id = _train_and_store_model(corpus_path=temp_corpus_path,
+                                           model_path=temp_model_path,
+                                           model_store=model_store,
+                                           worker_count=worker_count)
+
+    finally:
+        log.info("Cleaning up temporary directory '%s'..." % temp_directory)
+        shutil.rmtree(temp_directory)
+
+    log.info("Done!")
+
+    return models_id
+
+
+def _train_and_store_model(corpus_path: str,
+                           model_path: str,
+                           model_store: AbstractModelStore,
+                           worker_count: int) -> int:
+    """Train word2vec model off a corpus file, write it to a temporary path and then store it to a model store."""
 
     word2vec_min_count = 1
     word2vec_size = 100
     word2vec_max_vocab_size = 5000
 
-    log.info("Creating model...")
+    # Training off a corpus file scales with the number of workers as they don't have to wait for a single producer
+    # thread to feed them sentences, but it's only available if gensim was built with the extension for it
+    if getattr(gensim.models.word2vec, 'CORPUSFILE_VERSION', -1) >= 0:
+        corpus = {'corpus_file': corpus_path}
+    else:
+        log.warning("gensim can't train from a corpus file, falling back to reading sentences from it")
+        corpus = {'sentences': gensim.models.word2vec.LineSentence(corpus_path)}
+
+    log.info("Creating model with %d workers..." % worker_count)
     model = gensim.models.Word2Vec(
-        sentences=sentence_iterator,
         size=word2vec_size,
         min_count=word2vec_min_count,
         workers=worker_count,
         max_vocab_size=word2vec_max_vocab_size,
+        **corpus
     )
 
     # No model trimming (by converting it to KeyedVectors) to avoid compatibility issues
@@ -48,22 +116,15 @@ def train_word2vec_model(sentence_iterator: AbstractSentenceIterator,
     del model
 
     # Saving in in the same format used by the original C word2vec-tool, for compatibility
-    log.info("Saving model to a temporary path '%s'..." % temp_model_path)
-    word_vectors.save_word2vec_format(temp_model_path, binary=True)
+    log.info("Saving model to a temporary path '%s'..." % model_path)
+    word_vectors.save_word2vec_format(model_path, binary=True)
 
-    if not os.path.isfile(temp_model_path):
-        raise McWord2vecException("word2vec model not found at path: %s" % temp_model_path)
+    if not os.path.isfile(model_path):
+        raise McWord2vecException("word2vec model not found at path: %s" % model_path)
 
     log.info("Reading model from a temporary path...")
-    with open(temp_model_path, mode='rb') as model_file:
+    with open(model_path, mode='rb') as model_file:
         model_data = model_file.read()
 
     log.info("Storing model to in a model store...")
-    models_id = model_store.store_model(model_data=model_data)
-
-    log.info("Cleaning up temporary directory '%s'..." % temp_directory)
-    shutil.rmtree(temp_directory)
-
-    log.info("Done!")
-
-    return models_id
+    return model_store.store_model(model_data=model_data)
@@ -0,0 +1,11 @@
+from mediawords.util.config import env_value
+
+
+class Word2vecConfig(object):
+    """word2vec model generation configuration."""
+
+    @staticmethod
+    def worker_count() -> int:
+        """Number of worker threads to train a single model with."""
+        worker_count = env_value(name='MC_WORD2VEC_WORKER_COUNT', required=False)
+        return int(worker_count) if worker_count else 2
@@ -1,10 +1,10 @@
 import abc
 from abc import ABC
-from collections import deque
 from collections.abc import Iterator
 from typing import List, Optional
 
 from mediawords.db import DatabaseHandler
+from mediawords.db.result.result import DatabaseResult
 from mediawords.languages.factory import LanguageFactory
 from mediawords.util.identify_language import identification_would_be_reliable, language_code_for_text
 from mediawords.util.log import create_logger
@@ -27,8 +27,12 @@ class SnapshotSentenceIterator(AbstractSentenceIterator, metaclass=abc.ABCMeta):
         '__db',
         '__snapshots_id',
 
-        # Deque of sentences
-        '__sentences_deque',
+        # Server-side cursor result of the current chunk's sentences, and its iterator
+        '__chunk_result',
+        '__chunk_rows',
+
+        # How many sentences were read from the current chunk so far
+        '__chunk_sentence_count',
 
         # How many stories (and their sentences) to fetch in a single chunk
         '__stories_id_chunk_size',
@@ -49,22 +53,26 @@ class SnapshotSentenceIterator(AbstractSentenceIterator, metaclass=abc.ABCMeta):
         self.__snapshots_id = snapshots_id
         self.__stories_id_chunk_size = stories_id_chunk_size
 
-        self.__sentences_deque = deque()
+        self.__chunk_result = None
+        self.__chunk_rows = None
+        self.__chunk_sentence_count = 0
         self.__last_encountered_stories_id = 0
 
         # Verify that the snapshot exists
         if db.find_by_id(table='snapshots', object_id=snapshots_id) is None:
             raise McWord2vecException("Snapshot with ID %d does not exist." % snapshots_id)
 
-    def __fetch_next_sentences_chunk(self) -> List[str]:
-        """Fetch next chunk of story sentences of the current stories_id offset; might return an empty list.
+    def __fetch_next_sentences_chunk(self) -> DatabaseResult:
+        """Start streaming next chunk of story sentences of the current stories_id offset; might return no rows.
 
         When a snapshot has many (300k+) stories, SELECTs from story_sentences with WHERE or INNER JOIN to snap.stories
         all lead to sequential scans which take forever. To prevent that, we fetch sentences for up to
         "stories_id_chunk_size" stories at a time, feed them in __next__(), and then fetch another chunk.
+
+        Sentences of the chunk are read from a server-side cursor so that they don't have to be all kept in memory.
         """
 
-        chunk = self.__db.query("""
+        return self.__db.query_stream("""
             SELECT stories_id, sentence
             FROM story_sentences
             WHERE stories_id IN (
@@ -84,35 +92,38 @@ class SnapshotSentenceIterator(AbstractSentenceIterator, metaclass=abc.ABCMeta):
             'snapshots_id': self.__snapshots_id,
             'last_encountered_stories_id': self.__last_encountered_stories_id,
             'stories_id_chunk_size': self.__stories_id_chunk_size,
-        }).hashes()
-
-        if len(chunk):
-            self.__last_encountered_stories_id = chunk[-1]['stories_id']
-
-        sentences = [x['sentence'] for x in chunk]
-
-        return sentences
+        })
 
     def __next_sentence(self) -> Optional[str]:
         """(Fetch if needed and) return next sentence; return None if no more sentences are to be found."""
 
-        if len(self.__sentences_deque) == 0:
+        while True:
+
+            if self.__chunk_rows is None:
+                log.info("Fetching sentences with stories_id offset {} for up to {} stories...".format(
+                    self.__last_encountered_stories_id,
+                    self.__stories_id_chunk_size,
+                ))
+                self.__chunk_result = self.__fetch_next_sentences_chunk()
+                self.__chunk_rows = self.__chunk_result.iter_hashes()
+                self.__chunk_sentence_count = 0
 
-            log.info("Fetching sentences with stories_id offset {} for up to {} stories...".format(
-                self.__last_encountered_stories_id,
-                self.__stories_id_chunk_size,
-            ))
-            chunk = self.__fetch_next_sentences_chunk()
-            self.__sentences_deque.extend(chunk)
+            row = next(self.__chunk_rows, None)
+            if row is not None:
+                self.__chunk_sentence_count += 1
+                self.__last_encountered_stories_id = row['stories_id']
+                return row['sentence']
 
-            log.info("Fetched {} sentences".format(len(chunk)))
+            log.info("Fetched {} sentences".format(self.__chunk_sentence_count))
+
+            self.__chunk_result.close()
+            self.__chunk_result = None
+            self.__chunk_rows = None
 
             # Still empty after a fetch?
-            if len(self.__sentences_deque) == 0:
+            if self.__chunk_sentence_count == 0:
                 return None
 
-        return self.__sentences_deque.popleft()
-
     def __next__(self) -> List[str]:
         """Return list of next sentence's words to be added to the word2vec vector."""
 
@@ -21,7 +21,8 @@ class TestTrainWord2vecModel(TestWord2vec):
         model_store = SnapshotDatabaseModelStore(db=self.db, snapshots_id=self.snapshots_id)
 
         models_id = train_word2vec_model(sentence_iterator=sentence_iterator,
-                                         model_store=model_store)
+                                         model_store=model_store,
+                                         worker_count=2)
 
         model_data = model_store.read_model(models_id=models_id)
         assert model_data is not None
@@ -0,0 +1,51 @@
+import os
+import shutil
+import tempfile
+
+from word2vec_generate_snapshot_model import write_corpus_file
+from word2vec_generate_snapshot_model.sentence_iterators import SnapshotSentenceIterator
+from .setup_test_word2vec import TestWord2vec
+
+
+class TestWriteCorpusFile(TestWord2vec):
+
+    def test_write_corpus_file(self):
+        sentence_iterator = SnapshotSentenceIterator(
+            db=self.db,
+            snapshots_id=self.snapshots_id,
+            stories_id_chunk_size=self.TEST_STORIES_ID_CHUNK_SIZE,
+        )
+
+        temp_directory = tempfile.mkdtemp()
+        corpus_path = os.path.join(temp_directory, 'corpus.txt')
+
+        sentence_count = write_corpus_file(sentence_iterator=sentence_iterator, corpus_path=corpus_path)
+        assert sentence_count == self.TEST_STORY_COUNT * self.TEST_SENTENCE_PER_STORY_COUNT
+
+        with open(corpus_path, mode='r', encoding='utf-8') as corpus_file:
+            lines = corpus_file.read().splitlines()
+
+        assert len(lines) == sentence_count
+        for line in lines:
+            words = line.split(' ')
+            assert 'story' in words
+            assert 'sentence' in words
+            assert '' not in words
+
+        shutil.rmtree(temp_directory)
+
+
+def test_write_corpus_file_skips_empty_sentences():
+    temp_directory = tempfile.mkdtemp()
+    corpus_path = os.path.join(temp_directory, 'corpus.txt')
+
+    sentences = [['foo', 'bar'], [], ['  '], ['baz qux', ' quux ']]
+    # noinspection PyTypeChecker
+    sentence_count = write_corpus_file(sentence_iterator=iter(sentences), corpus_path=corpus_path)
+    assert sentence_count == 2
+
+    with open(corpus_path, mode='r', encoding='utf-8') as corpus_file:
+        # Multi-word tokens remain single words
+        assert corpus_file.read() == "foo bar\nbaz_qux quux\n"
+
+    shutil.rmtree(temp_directory)